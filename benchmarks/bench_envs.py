@@ -0,0 +1,164 @@
+"""
+各環境をランダム行動で動かした際の steps/sec を計測する
+
+1ステップ = get_state + get_avail_actions + get_obs + step
+（EpisodeRunnerが1ステップごとに呼ぶものと同じ）
+"""
+import importlib
+import inspect
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+from common import load_config, median, seed_everything, time_calls
+
+# smac は自身を "smac" パッケージとしてimportするので、envs_pymarl.smac をその名前でも登録しておく
+# （envs_pymarl を sys.path に入れると envs_pymarl/utils が src/utils を隠してしまう）
+sys.modules.setdefault("smac", importlib.import_module("envs_pymarl.smac"))
+
+# 名前: (モジュール, クラス名, 設定ファイル名)
+ENVS = {
+    "diamond": ("envs.diamond.diamond", "DiamondEnv", "diamond"),
+    "crossroads": ("envs.crossroads.crossroads", "CrossroadsEnv", "crossroads"),
+    "randezvous": ("envs.randezvous.randezvous", "RandezvousEnv", "randezvous"),
+    "foodbank": ("envs_pymarl.foodbank.food_allocation", "FoodAllocationEnv", "foodbank"),
+    "checkers": ("envs_pymarl.checkers.checkers", "Checkers", "checkers"),
+    "sc2": ("smac.env.starcraft2.starcraft2", "StarCraft2Env", "sc2"),
+}
+
+# 計測時に上書きする環境の設定（StarCraft2Env はゲーム本体の代わりに代替のコントローラで動かす）
+ENV_OVERRIDES = {
+    "sc2": {"stand_in": "synthetic", "map_name": "27m_vs_30m"},
+}
+
+# n_envs 個をまとめて動かすベクトル化環境
+VECTOR_ENVS = {
+    "diamond": ("envs.diamond.diamond_vector", "VectorDiamondEnv", "diamond"),
+    "crossroads": ("envs.crossroads.crossroads_vector", "VectorCrossroadsEnv", "crossroads"),
+    "foodbank": ("envs_pymarl.foodbank.food_allocation_vector", "VectorFoodAllocationEnv", "foodbank"),
+}
+
+
+def make_env(name, **env_overrides):
+    module_name, class_name, config_name = ENVS[name]
+    env_cls = getattr(importlib.import_module(module_name), class_name)
+    args = load_config(config_name)
+    env = env_cls(**{**args.env_args, **env_overrides})
+    # n_actionsなどはget_env_info()の中で設定される（Runnerと同じ順番で呼ぶ）
+    env.get_env_info()
+    return env
+
+
+def _reset(env, episode):
+    # Checkersだけ reset() が引数を取らない
+    if "episode" in inspect.signature(env.reset).parameters:
+        env.reset(episode)
+    else:
+        env.reset()
+
+
+def bench_env(name, n_steps, repeats, seed=0, tag=None, **env_overrides):
+    """
+    n_steps ステップ分のランダム行動を repeats 回計測して中央値を返す
+    """
+    seed_everything(seed)
+    env = make_env(name, **env_overrides)
+    rng = np.random.RandomState(seed)
+    state = {"episode": 0}
+    _reset(env, state["episode"])
+
+    def run_steps():
+        for _ in range(n_steps):
+            env.get_state()
+            avail_actions = np.asarray(env.get_avail_actions())
+            env.get_obs()
+            actions = [rng.choice(np.flatnonzero(avail)) for avail in avail_actions]
+            _, terminated, _ = env.step(actions)
+            if terminated:
+                state["episode"] += 1
+                _reset(env, state["episode"])
+
+    times = time_calls(run_steps, repeats)
+    env.close()
+    return {"env/{}/steps_per_sec".format(tag or name): n_steps / median(times)}
+
+
+def bench_vector_env(name, n_envs, n_steps, repeats, seed=0):
+    """
+    n_envs 個の環境を n_steps ステップ動かした時の（全環境合計の）steps/sec
+    """
+    module_name, class_name, config_name = VECTOR_ENVS[name]
+    env_cls = getattr(importlib.import_module(module_name), class_name)
+    args = load_config(config_name)
+    env = env_cls(n_envs, **args.env_args)
+    env.get_env_info()
+    env.reset()
+    rng = np.random.RandomState(seed)
+
+    def run_steps():
+        for _ in range(n_steps):
+            env.get_state()
+            avail_actions = env.get_avail_actions()
+            env.get_obs()
+            # 選択可能な行動から一様にサンプリング
+            actions = (rng.rand(*avail_actions.shape) * avail_actions).argmax(axis=-1)
+            env.step(actions)
+
+    times = time_calls(run_steps, repeats)
+    env.close()
+    return {"env/{}_x{}/steps_per_sec".format(name, n_envs): n_envs * n_steps / median(times)}
+
+
+def bench_scenarios(repeats, n_maps=16):
+    """
+    ランダムなマップ（random_museum）1枚を用意するのにかかる時間 [ms]
+        - build: 生成（通れるかの確認を含む）+ コンパイル
+        - disk: コンパイル済みの .npz の読み込み（別のプロセスや次の実行）
+        - memory: プロセス内のLRUから取得（エピソードごとのリセット）
+    """
+    from envs.diamond import scenarios
+    from envs.scenario import Scenario, compile_scenario
+
+    seeds = range(n_maps)
+    results = {}
+    times = time_calls(lambda: [compile_scenario(scenarios.random_museum(seed=s)) for s in seeds], repeats)
+    results["scenario/build_ms"] = median(times) / n_maps * 1000
+
+    specs = [scenarios.random_museum(seed=s) for s in seeds]
+    with tempfile.TemporaryDirectory() as cache_dir:
+        paths = [os.path.join(cache_dir, "{}.npz".format(s)) for s in seeds]
+        for spec, path in zip(specs, paths):
+            compile_scenario(spec).save(path)
+        times = time_calls(lambda: [Scenario.load(path) for path in paths], repeats)
+        results["scenario/disk_ms"] = median(times) / n_maps * 1000
+
+    times = time_calls(lambda: [scenarios.get_scenario("random_museum", seed=s) for s in seeds], repeats)
+    results["scenario/memory_ms"] = median(times) / n_maps * 1000
+    return results
+
+
+def run(quick=False, names=None):
+    n_steps = 500 if quick else 5000
+    repeats = 3 if quick else 5
+
+    results = {}
+    for name in names or ENVS:
+        try:
+            results.update(bench_env(name, n_steps, repeats, **ENV_OVERRIDES.get(name, {})))
+        except Exception as e:
+            # gymなどのオプション依存が入っていない・動かない環境はスキップ
+            print("Skipping {}: {!r}".format(name, e))
+
+    if names is None or "diamond" in names:
+        # エピソードごとにランダムなマップに切り替える場合（マップはキャッシュから）
+        results.update(bench_env("diamond", n_steps, repeats, tag="diamond_scenario_pool", scenario_pool=16))
+        results.update(bench_scenarios(repeats))
+
+    for name in VECTOR_ENVS:
+        if names is not None and name not in names:
+            continue
+        for n_envs in (1024,) if quick else (64, 1024, 4096):
+            results.update(bench_vector_env(name, n_envs, n_steps // 10, repeats))
+    return results
@@ -0,0 +1,383 @@
+"""
+学習ループの各部分のスループットを計測する
+- EpisodeRunner.run の episodes/sec
+- ReplayBuffer.insert_episode_batch / sample のレイテンシ
+- QLearner.train の1バッチあたりの時間（バッチサイズ × 系列長）
+- 固定長の区間（chunk_length + burn_in）でのサンプリング + 学習1回の時間（エピソード長ごと）
+- 隠れ状態をバッファに記録する場合（store_hidden）の追加メモリと、burn-in を省いて減る学習時間
+- n_seeds 個のシードをまとめて学習する場合（n_seeds > 1）の学習1回の時間（1シードと比較）
+- n-step / TD(λ) の目標値の計算時間（QLearner.train 全体と比較）
+- 行動選択（epsilon_greedy / vector_epsilon_greedy）の並列環境数ごとの1ステップあたりの時間
+- エージェントネットワークの1ステップの forward（fp32 / int8 の動的量子化）の並列環境数ごとの時間と、
+  greedy な行動の一致率
+"""
+import logging
+from types import SimpleNamespace as SN
+
+import torch as th
+
+from common import load_config, median, seed_everything, time_calls
+from components.action_selectors import REGISTRY as action_REGISTRY
+from components.episode_buffer import EpisodeBatch, ReplayBuffer, cat_batches
+from controllers.basic_controller import BasicMAC
+from controllers.quantized_actor import greedy_agreement, make_quantized_actor
+from learners.q_learner import QLearner
+from run import build_scheme
+from runners.episode_runner import EpisodeRunner
+from utils.logging import Logger
+from utils.rl_utils import build_n_step_targets, build_td_lambda_targets
+
+# EpisodeRunnerが使う環境の設定
+RUNNER_ENV = "crossroads"
+
+
+def _setup(env=RUNNER_ENV, **overrides):
+    """
+    run_sequentialと同じ手順で Runner / MAC を用意する
+    """
+    args = load_config(env, **overrides)
+    logger = Logger(logging.getLogger("benchmarks"))
+    runner = EpisodeRunner(args=args, logger=logger)
+
+    env_info = runner.get_env_info()
+    args.n_agents = env_info["n_agents"]
+    args.n_actions = env_info["n_actions"]
+    args.state_shape = env_info["state_shape"]
+
+    scheme, groups, preprocess = build_scheme(env_info, args)
+    # preprocess適用後のスキーマ（actions_onehotを含む）
+    full_scheme = EpisodeBatch(scheme, groups, 1, 1, preprocess=preprocess).scheme
+    mac = BasicMAC(full_scheme, groups, args)
+    runner.setup(scheme=scheme, groups=groups, preprocess=preprocess, mac=mac)
+    return SN(
+        args=args,
+        logger=logger,
+        runner=runner,
+        env_info=env_info,
+        scheme=scheme,
+        full_scheme=full_scheme,
+        groups=groups,
+        preprocess=preprocess,
+        mac=mac,
+    )
+
+
+def random_batch(ctx, batch_size, episode_length):
+    """
+    全タイムステップが埋まったランダムなEpisodeBatchを作る
+    """
+    env_info = ctx.env_info
+    n_agents, n_actions = env_info["n_agents"], env_info["n_actions"]
+    batch = EpisodeBatch(
+        ctx.scheme, ctx.groups, batch_size, episode_length + 1, preprocess=ctx.preprocess
+    )
+    shape = (batch_size, episode_length + 1)
+    batch.update(
+        {
+            "state": th.rand(*shape, env_info["state_shape"]),
+            "obs": th.rand(*shape, n_agents, env_info["obs_shape"]),
+            "avail_actions": th.ones(*shape, n_agents, n_actions, dtype=th.int),
+            "actions": th.randint(n_actions, (*shape, n_agents, 1)),
+            "reward": th.randn(*shape, 1),
+            "terminated": th.zeros(*shape, 1, dtype=th.uint8),
+        }
+    )
+    return batch
+
+
+def bench_runner(n_episodes, repeats):
+    seed_everything(0)
+    runner = _setup().runner
+    state = {"episode": 0}
+    steps = []
+
+    def run_episodes():
+        t_env = runner.t_env
+        for _ in range(n_episodes):
+            runner.run(episode=state["episode"], test_mode=False)
+            state["episode"] += 1
+        steps.append(runner.t_env - t_env)
+
+    times = time_calls(run_episodes, repeats)
+    runner.close_env()
+    # 最初の1回はウォームアップ
+    steps = steps[1:]
+    return {
+        "runner/{}/episodes_per_sec".format(RUNNER_ENV): n_episodes / median(times),
+        "runner/{}/steps_per_sec".format(RUNNER_ENV): median(
+            [s / t for s, t in zip(steps, times)]
+        ),
+    }
+
+
+def bench_buffer(batch_sizes, repeats):
+    seed_everything(0)
+    ctx = _setup()
+    ctx.runner.close_env()
+    args = ctx.args
+
+    episode_limit = ctx.env_info["episode_limit"]
+    buffer = ReplayBuffer(
+        ctx.scheme, ctx.groups, args.buffer_size, episode_limit + 1, preprocess=ctx.preprocess
+    )
+    episode = random_batch(ctx, 1, episode_limit)
+
+    results = {}
+    insert_times = time_calls(
+        lambda: buffer.insert_episode_batch(episode), repeats=max(args.buffer_size // 10, repeats)
+    )
+    results["buffer/insert_ms"] = 1000 * median(insert_times)
+
+    # バッファを一周させて満杯にしておく
+    while buffer.episodes_in_buffer < buffer.buffer_size:
+        buffer.insert_episode_batch(episode)
+
+    for batch_size in batch_sizes:
+        # run_sequentialと同じ（サンプリング + 切り詰め + デバイス転送）
+        def sample():
+            episode_sample = buffer.sample(batch_size)
+            episode_sample = episode_sample[:, : episode_sample.max_t_filled()]
+            episode_sample.to(args.device)
+
+        times = time_calls(sample, repeats)
+        results["buffer/sample_bs{}_ms".format(batch_size)] = 1000 * median(times)
+    return results
+
+
+def bench_learner(batch_sizes, seq_lengths, repeats):
+    results = {}
+    for seq_length in seq_lengths:
+        seed_everything(0)
+        ctx = _setup()
+        ctx.runner.close_env()
+        learner = QLearner(ctx.mac, ctx.full_scheme, ctx.logger, ctx.args)
+
+        for batch_size in batch_sizes:
+            batch = random_batch(ctx, batch_size, seq_length)
+            times = time_calls(lambda: learner.train(batch, t_env=0, episode_num=0), repeats)
+            key = "learner/bs{}_T{}_ms".format(batch_size, seq_length)
+            results[key] = 1000 * median(times)
+    return results
+
+
+def bench_chunks(batch_size, episode_lengths, repeats, chunk_length=20, burn_in=10):
+    """
+    ReplayBuffer.sample_chunks と、その区間での QLearner.train の時間
+    エピソード長を変えても区間の長さは一定なので、学習の時間はほぼ変わらないはず
+    """
+    results = {}
+    for episode_length in episode_lengths:
+        seed_everything(0)
+        ctx = _setup(chunk_length=chunk_length, burn_in=burn_in)
+        ctx.runner.close_env()
+        learner = QLearner(ctx.mac, ctx.full_scheme, ctx.logger, ctx.args)
+
+        buffer = ReplayBuffer(
+            ctx.scheme, ctx.groups, 4 * batch_size, episode_length + 1, preprocess=ctx.preprocess
+        )
+        buffer.insert_episode_batch(random_batch(ctx, buffer.buffer_size, episode_length))
+
+        def sample():
+            return buffer.sample_chunks(batch_size, chunk_length, burn_in)
+
+        times = time_calls(sample, repeats)
+        key = "chunks/bs{}_T{}_L{}+{}".format(batch_size, episode_length, burn_in, chunk_length)
+        results[key + "_sample_ms"] = 1000 * median(times)
+
+        batch = sample()
+        times = time_calls(lambda: learner.train(batch, t_env=0, episode_num=0), max(repeats // 20, 3))
+        results[key + "_train_ms"] = 1000 * median(times)
+    return results
+
+
+def bench_stored_hidden(batch_size, episode_length, repeats, chunk_length=20, burn_ins=(10, 20, 40)):
+    """
+    store_hidden のメモリ（1ステップあたりのバイト数、buffer_size エピソード分のMB）と、
+    記録した隠れ状態から始めて burn-in なしで学習する場合 / 0から始めて burn-in する場合の学習1回の時間
+    """
+    results = {}
+    for store_hidden in (False, True):
+        ctx = _setup(store_hidden=store_hidden)
+        ctx.runner.close_env()
+        buffer = ReplayBuffer(
+            ctx.scheme, ctx.groups, 1, episode_length + 1, preprocess=ctx.preprocess
+        )
+        row_bytes = buffer.data.storage.shape[-1]
+        results["hidden/row_bytes_{}".format("stored" if store_hidden else "default")] = row_bytes
+        results["hidden/buffer{}_MB_{}".format(ctx.args.buffer_size, "stored" if store_hidden else "default")] = (
+            row_bytes * ctx.args.buffer_size * (episode_length + 1) / 2**20
+        )
+
+    for burn_in in (0,) + tuple(burn_ins):
+        seed_everything(0)
+        # burn_in = 0 は記録した隠れ状態から始める場合
+        ctx = _setup(chunk_length=chunk_length, burn_in=burn_in, store_hidden=burn_in == 0)
+        ctx.runner.close_env()
+        learner = QLearner(ctx.mac, ctx.full_scheme, ctx.logger, ctx.args)
+        buffer = ReplayBuffer(
+            ctx.scheme, ctx.groups, 4 * batch_size, episode_length + 1, preprocess=ctx.preprocess
+        )
+        buffer.insert_episode_batch(random_batch(ctx, buffer.buffer_size, episode_length))
+        batch = buffer.sample_chunks(batch_size, chunk_length, burn_in)
+        times = time_calls(lambda: learner.train(batch, t_env=0, episode_num=0), repeats)
+        key = "hidden/train_stored_ms" if burn_in == 0 else "hidden/train_burn_in{}_ms".format(burn_in)
+        results[key] = 1000 * median(times)
+    return results
+
+
+def bench_multi_seed(batch_size, seq_length, n_seeds_list, repeats):
+    """
+    n_seeds 個のシードを積んだ QLearner.train 1回（各シード batch_size エピソード）の時間
+    n_seeds = 1 の時間の n_seeds 倍より十分小さければ、まとめて学習する意味がある
+    """
+    results = {}
+    for n_seeds in n_seeds_list:
+        seed_everything(0)
+        ctx = _setup(n_seeds=n_seeds)
+        ctx.runner.close_env()
+        learner = QLearner(ctx.mac, ctx.full_scheme, ctx.logger, ctx.args)
+        batch = cat_batches([random_batch(ctx, batch_size, seq_length) for _ in range(n_seeds)])
+        times = time_calls(lambda: learner.train(batch, t_env=0, episode_num=0), repeats)
+        results["multi_seed/K{}_bs{}_T{}_ms".format(n_seeds, batch_size, seq_length)] = 1000 * median(times)
+    return results
+
+
+def bench_targets(batch_size, seq_lengths, repeats, n_step=5, td_lambda=0.8):
+    """
+    目標値の計算だけの時間と、その目標値を使った QLearner.train 全体の時間
+    """
+    results = {}
+    for seq_length in seq_lengths:
+        seed_everything(0)
+        shape = (batch_size, seq_length, 1)
+        rewards = th.randn(*shape)
+        terminated = th.zeros(*shape)
+        terminated[:, -1] = 1
+        mask = th.ones(*shape)
+        target_qs = th.randn(*shape)
+
+        times = time_calls(
+            lambda: build_n_step_targets(rewards, terminated, mask, target_qs, 0.99, n_step), repeats
+        )
+        results["targets/nstep{}_bs{}_T{}_ms".format(n_step, batch_size, seq_length)] = 1000 * median(times)
+        times = time_calls(
+            lambda: build_td_lambda_targets(rewards, terminated, mask, target_qs, 0.99, td_lambda), repeats
+        )
+        results["targets/lambda_bs{}_T{}_ms".format(batch_size, seq_length)] = 1000 * median(times)
+
+        # 同じバッチでの学習1回分（1-step の bench_learner と比較する）
+        ctx = _setup(td_lambda=td_lambda)
+        ctx.runner.close_env()
+        learner = QLearner(ctx.mac, ctx.full_scheme, ctx.logger, ctx.args)
+        batch = random_batch(ctx, batch_size, seq_length)
+        times = time_calls(lambda: learner.train(batch, t_env=0, episode_num=0), max(repeats // 20, 3))
+        results["learner/lambda_bs{}_T{}_ms".format(batch_size, seq_length)] = 1000 * median(times)
+    return results
+
+
+def bench_action_selector(n_envs_list, repeats, n_agents=2, n_actions=8):
+    """
+    n_envs 個の環境の全エージェントについて1ステップ分の行動を選ぶ時間
+    """
+    results = {}
+    args = load_config(RUNNER_ENV)
+    for name in ("epsilon_greedy", "vector_epsilon_greedy"):
+        for n_envs in n_envs_list:
+            seed_everything(0)
+            selector = action_REGISTRY[name](args)
+            q_values = th.randn(n_envs, n_agents, n_actions)
+            avail_actions = (th.rand(n_envs, n_agents, n_actions) < 0.7).int()
+            avail_actions[..., 0] = 1
+            state = {"t_env": 0}
+
+            def select():
+                state["t_env"] += 1
+                selector.select_action(q_values, avail_actions, state["t_env"])
+
+            times = time_calls(select, repeats)
+            results["selector/{}_N{}_ms".format(name, n_envs)] = 1000 * median(times)
+    return results
+
+
+def bench_quantized_actor(n_envs_list, repeats):
+    """
+    n_envs 個の環境の全エージェントについてのエージェントネットワークの1ステップの forward の時間
+    （学習中の fp32 のネットワークと、int8 に動的量子化したロールアウト用のコピー）
+    """
+    seed_everything(0)
+    ctx = _setup(use_cuda=False)
+    ctx.runner.close_env()
+    mac = ctx.mac
+    actor = make_quantized_actor(mac)
+    results = {
+        "actor/greedy_agreement": greedy_agreement(mac, actor, random_batch(ctx, 32, 100)),
+    }
+    n_agents = ctx.env_info["n_agents"]
+    input_shape = mac.agent.fc1.in_features
+    for n_envs in n_envs_list:
+        inputs = th.rand(n_envs * n_agents, input_shape)
+        hidden_states = mac.agent.init_hidden().expand(n_envs * n_agents, -1)
+        for name, agent in (("fp32", mac.agent), ("int8", actor.agent)):
+
+            def forward():
+                with th.no_grad():
+                    agent(inputs, hidden_states)
+
+            times = time_calls(forward, repeats)
+            results["actor/{}_N{}_ms".format(name, n_envs)] = 1000 * median(times)
+    return results
+
+
+def run(quick=False):
+    results = {}
+    results.update(bench_runner(n_episodes=5 if quick else 20, repeats=3 if quick else 5))
+    results.update(bench_buffer(batch_sizes=(32,) if quick else (8, 32, 128), repeats=20 if quick else 100))
+    results.update(
+        bench_learner(
+            batch_sizes=(32,) if quick else (8, 32, 128),
+            seq_lengths=(25,) if quick else (25, 100, 200),
+            repeats=3 if quick else 5,
+        )
+    )
+    results.update(
+        bench_chunks(
+            batch_size=32,
+            episode_lengths=(25,) if quick else (25, 100, 200),
+            repeats=20 if quick else 100,
+        )
+    )
+    results.update(
+        bench_stored_hidden(
+            batch_size=32,
+            episode_length=100,
+            repeats=3 if quick else 10,
+        )
+    )
+    results.update(
+        bench_multi_seed(
+            batch_size=32,
+            seq_length=100,
+            n_seeds_list=(1, 4) if quick else (1, 2, 4, 8),
+            repeats=3 if quick else 10,
+        )
+    )
+    results.update(
+        bench_targets(
+            batch_size=32,
+            seq_lengths=(25,) if quick else (25, 100, 200),
+            repeats=20 if quick else 100,
+        )
+    )
+    results.update(
+        bench_action_selector(
+            n_envs_list=(1, 1024) if quick else (1, 64, 1024, 8192),
+            repeats=100 if quick else 1000,
+        )
+    )
+    results.update(
+        bench_quantized_actor(
+            n_envs_list=(1, 1024) if quick else (1, 64, 1024, 8192),
+            repeats=100 if quick else 1000,
+        )
+    )
+    return results
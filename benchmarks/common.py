@@ -0,0 +1,68 @@
+"""
+ベンチマーク共通の設定読み込み・計測ユーティリティ
+"""
+import os
+import random
+import sys
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import yaml
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC = os.path.join(ROOT, "src")
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
+
+# ディスプレイのないマシンでもpygameを初期化できるように
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import torch as th  # noqa: E402
+
+
+def load_config(env, algo="qmix", **overrides) -> SimpleNamespace:
+    """
+    main.pyと同じ順番（default -> 環境 -> アルゴリズム）でYAMLを読み込んで
+    run.pyと同じ形のargsを作る
+    """
+    config_dir = os.path.join(SRC, "config")
+    with open(os.path.join(config_dir, "default.yaml"), "r", encoding="utf-8") as f:
+        config = yaml.safe_load(f)
+    for subfolder, name in (("environments", env), ("algorithms", algo)):
+        with open(os.path.join(config_dir, subfolder, "{}.yaml".format(name)), "r") as f:
+            config.update(yaml.safe_load(f))
+
+    config.update(overrides)
+    # ベンチマークはCPUのみで比較する
+    config["use_cuda"] = False
+    config["env_args"]["seed"] = config.get("seed", 0)
+
+    args = SimpleNamespace(**config)
+    args.device = "cpu"
+    args.unique_token = "benchmark"
+    return args
+
+
+def seed_everything(seed):
+    random.seed(seed)
+    np.random.seed(seed)
+    th.manual_seed(seed)
+
+
+def time_calls(fn, repeats, warmup=1) -> list:
+    """
+    fnをrepeats回呼び出して、それぞれの所要時間[s]を返す
+    """
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def median(values):
+    return float(np.median(values))
@@ -0,0 +1,145 @@
+"""
+ベンチマークを実行して結果をJSONの履歴に追記し、前回の結果と比較する
+
+使い方（リポジトリのルートで実行）:
+    python benchmarks/run_benchmarks.py
+    python benchmarks/run_benchmarks.py --suites envs --quick
+
+指標名が "_per_sec" で終わるものは大きいほど、"_ms" で終わるものは小さいほど良い
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+
+import numpy as np
+
+from common import ROOT, th
+
+import bench_envs
+import bench_training
+
+SUITES = {
+    "envs": bench_envs.run,
+    "training": bench_training.run,
+}
+
+DEFAULT_HISTORY = os.path.join(ROOT, "benchmarks", "results", "history.json")
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _load_history(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def _save_history(path, history):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(history, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _is_comparable(a, b):
+    """
+    同じマシン・同じ条件で取った結果同士だけを比較する
+    """
+    keys = ("host", "threads", "quick")
+    return all(a.get(k) == b.get(k) for k in keys)
+
+
+def _direction(key):
+    """
+    指標が小さいほど良いなら -1、大きいほど良いなら 1、どちらか分からなければ 0（悪化を判定しない）
+
+    時間（_ms）とメモリ（bytes・MB）は小さいほど良く、スループット（_per_sec）と一致率（agreement）は大きいほど良い
+    """
+    tokens = key.rsplit("/", 1)[-1].split("_")
+    if {"ms", "bytes", "MB"} & set(tokens):
+        return -1
+    if key.endswith("_per_sec") or key.endswith("agreement"):
+        return 1
+    return 0
+
+
+def compare(previous, current, threshold):
+    """
+    前回の結果と比較して、threshold以上悪化した指標をREGRESSIONとして表示する
+    """
+    regressions = []
+    print("{:<40}{:>14}{:>14}{:>10}".format("metric", "previous", "current", "change"))
+    for key, value in sorted(current["results"].items()):
+        prev = previous["results"].get(key) if previous else None
+        if prev is None:
+            print("{:<40}{:>14}{:>14.3f}".format(key, "-", value))
+            continue
+
+        change = (value - prev) / prev
+        # 小さいほど良い指標は増えたら悪化、大きいほど良い指標は減ったら悪化
+        worse = _direction(key) * change < -threshold
+        mark = "  REGRESSION" if worse else ""
+        print("{:<40}{:>14.3f}{:>14.3f}{:>9.1f}%{}".format(key, prev, value, 100 * change, mark))
+        if worse:
+            regressions.append(key)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--suites", default=",".join(SUITES), help="Comma separated suites to run")
+    parser.add_argument("--quick", action="store_true", help="Fewer steps and sizes (for smoke runs)")
+    parser.add_argument("--threads", type=int, default=1, help="torch.set_num_threads for stable timings")
+    parser.add_argument("--history", default=DEFAULT_HISTORY, help="JSON file the results are appended to")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Relative change reported as a regression")
+    parser.add_argument("--no-save", action="store_true", help="Don't append this run to the history")
+    args = parser.parse_args()
+
+    # 環境は画像などをリポジトリのルートからの相対パスで読み込む
+    os.chdir(ROOT)
+    th.set_num_threads(args.threads)
+
+    results = {}
+    for suite in args.suites.split(","):
+        print("Running {} benchmarks...".format(suite))
+        results.update(SUITES[suite](quick=args.quick))
+
+    record = {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "host": platform.node(),
+        "python": platform.python_version(),
+        "torch": th.__version__,
+        "numpy": np.__version__,
+        "threads": args.threads,
+        "quick": args.quick,
+        "results": results,
+    }
+
+    history = _load_history(args.history)
+    previous = next((r for r in reversed(history) if _is_comparable(r, record)), None)
+    regressions = compare(previous, record, args.threshold)
+
+    if not args.no_save:
+        history.append(record)
+        _save_history(args.history, history)
+        print("Saved results to {}".format(args.history))
+
+    if regressions:
+        print("{} metric(s) regressed by more than {:.0f}%".format(len(regressions), 100 * args.threshold))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+テストエピソードを別プロセスで実行した場合（async_evaluation: True）と、
+学習ループの中で実行した場合に、同じ重み・同じ乱数で同じ test_* の統計が記録されるかを確認する
+（評価プロセスが学習用の統計（epsilon など）や、前のスナップショットのエピソードを混ぜて記録しないこと）
+
+リポジトリのルートで実行:
+    python src/async_evaluator_test.py
+"""
+import logging
+import os
+import random
+import sys
+import time
+from types import SimpleNamespace as SN
+
+import numpy as np
+import torch as th
+import yaml
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from components.episode_buffer import EpisodeBatch  # noqa: E402
+from controllers.basic_controller import BasicMAC  # noqa: E402
+from run import build_scheme  # noqa: E402
+from runners.async_evaluator import AsyncEvaluator, _StatsRecorder, evaluate_snapshot  # noqa: E402
+from runners.episode_runner import EpisodeRunner  # noqa: E402
+from utils.checkpoint import snapshot  # noqa: E402
+from utils.logging import Logger  # noqa: E402
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config")
+
+
+def load_args(**overrides):
+    config = {}
+    for path in ("default.yaml", "environments/crossroads.yaml", "algorithms/qmix.yaml"):
+        with open(os.path.join(CONFIG_PATH, path), "r", encoding="utf-8") as f:
+            config.update(yaml.safe_load(f))
+    config.update(overrides)
+    args = SN(**config)
+    args.device = "cpu"
+    return args
+
+
+def seed_all(seed):
+    random.seed(seed)
+    np.random.seed(seed)
+    th.manual_seed(seed)
+
+
+def build(args, logger):
+    runner = EpisodeRunner(args=args, logger=logger)
+    env_info = runner.get_env_info()
+    args.n_agents = env_info["n_agents"]
+    args.n_actions = env_info["n_actions"]
+    args.state_shape = env_info["state_shape"]
+    scheme, groups, preprocess = build_scheme(env_info, args)
+    mac_scheme = EpisodeBatch(scheme, groups, 1, 1, preprocess=preprocess).scheme
+    mac = BasicMAC(mac_scheme, groups, args)
+    runner.setup(scheme=scheme, groups=groups, preprocess=preprocess, mac=mac)
+    return runner, mac, (scheme, groups, preprocess, mac_scheme)
+
+
+def test_records(records):
+    # episode は学習側の記録だけを使う（AsyncEvaluator._log と同じ）
+    return [(key, value, t) for key, value, t, _ in records if key != "episode"]
+
+
+def check_inline_equivalence(n_snapshots=3, n_train_episodes=4):
+    args = load_args(runner_log_interval=100)
+    inline_recorder = _StatsRecorder()
+    runner, mac, _ = build(args, inline_recorder)
+    eval_recorder = _StatsRecorder()
+    eval_runner, eval_mac, _ = build(load_args(runner_log_interval=100), eval_recorder)
+    n_test_runs = max(1, args.test_nepisode // runner.batch_size)
+
+    episode = 0
+    for k in range(n_snapshots):
+        seed_all(k)
+        for _ in range(n_train_episodes):
+            runner.run(episode=episode, test_mode=False)
+            episode += 1
+        for p in mac.agent.parameters():
+            p.data.normal_()
+        agent_state = snapshot(mac.agent.state_dict())
+
+        # 学習ループの中でのテスト（run_sequential と同じ）
+        seed_all(100 + k)
+        inline_recorder.records = []
+        for i in range(n_test_runs):
+            runner.run(episode=episode, test_mode=True, print_log=i == 0)
+        expected = test_records(inline_recorder.records)
+
+        # 評価プロセスでのテスト
+        seed_all(100 + k)
+        eval_recorder.records = []
+        evaluate_snapshot(eval_runner, eval_mac, runner.t_env, episode, agent_state, n_test_runs)
+        actual = test_records(eval_recorder.records)
+
+        assert all(key.startswith("test_") for key, _, _ in actual), actual
+        assert actual == expected, (actual, expected)
+    runner.close_env()
+    eval_runner.close_env()
+    print("async evaluation ok: {} snapshots logged the same test series as inline".format(n_snapshots))
+
+
+def check_evaluator_process(t_envs=(30, 60)):
+    """
+    AsyncEvaluator の評価プロセスを通しても、スナップショットごとに test_* が1回ずつだけ記録される
+    """
+    args = load_args(runner_log_interval=100)
+    runner, mac, (scheme, groups, preprocess, mac_scheme) = build(args, _StatsRecorder())
+    runner.close_env()
+    evaluator = AsyncEvaluator(args, EpisodeRunner, scheme, groups, preprocess, mac_scheme)
+    logger = Logger(logging.getLogger("async_evaluator_test"))
+    for t_env in t_envs:
+        evaluator.submit(t_env, 0, mac)
+        # 置き換えられないように、1つずつ評価が終わるのを待つ
+        while "test_total_reward" not in logger.stats or logger.stats["test_total_reward"][-1][0] != t_env:
+            assert evaluator.process.is_alive(), "evaluator process died"
+            evaluator.log_results(logger)
+            time.sleep(0.1)
+    evaluator.close(logger)
+
+    assert "epsilon" not in logger.stats, list(logger.stats["epsilon"])
+    for key, series in logger.stats.items():
+        assert key.startswith("test_"), key
+        assert [t for t, _ in series] == list(t_envs), (key, list(series))
+    print("async evaluator process ok: {} snapshots".format(len(t_envs)))
+
+
+def check_latest_snapshot_wins(n_snapshots=20):
+    """
+    評価が追いつかないほど続けてスナップショットを送っても、最後に送ったものは必ず評価される
+    """
+    args = load_args(runner_log_interval=100)
+    runner, mac, (scheme, groups, preprocess, mac_scheme) = build(args, _StatsRecorder())
+    runner.close_env()
+    evaluator = AsyncEvaluator(args, EpisodeRunner, scheme, groups, preprocess, mac_scheme)
+    logger = Logger(logging.getLogger("async_evaluator_test"))
+    t_envs = [10 * (i + 1) for i in range(n_snapshots)]
+    for t_env in t_envs:
+        evaluator.submit(t_env, 0, mac)
+    evaluator.close(logger)
+
+    evaluated = [t for t, _ in logger.stats["test_total_reward"]]
+    assert evaluated[-1] == t_envs[-1], evaluated
+    assert len(evaluated) + evaluator.n_replaced == n_snapshots, (evaluated, evaluator.n_replaced)
+    print("latest snapshot ok: evaluated {} of {} snapshots".format(len(evaluated), n_snapshots))
+
+
+if __name__ == "__main__":
+    check_inline_equivalence()
+    check_evaluator_process()
+    check_latest_snapshot_wins()
@@ -67,3 +67,86 @@ class EpsilonGreedyActionSelector():
 
 
 REGISTRY["epsilon_greedy"] = EpsilonGreedyActionSelector
+
+
+class VectorEpsilonGreedyActionSelector():
+    """
+    多数の環境を並列に動かす時用のepsilon-greedy
+
+    - 環境（バッチの各行）ごとに異なるepsilonを使える（Ape-X方式）
+      epsilon_i = epsilon ** (1 + epsilon_apex_alpha * i / (N - 1))
+      epsilon はスケジュールの値で、epsilon_apex_alpha = 0 なら全環境で同じ
+    - 選択可能な行動からの一様サンプリングは、一様乱数 u から k = floor(u * 選択可能な行動数) を求め、
+      選択可能な行動の累積和が k を超える最初の行動を選ぶ（Categorical を作らない）
+    - 乱数は random_block_size 個ずつまとめて生成しておき、1ステップあたり 2 × バッチ × エージェント数 個だけ使う
+    - スケジュールは t_env が変わった時だけ計算する
+    """
+
+    def __init__(self, args):
+        self.args = args
+
+        anneal_time = args.t_max * args.epsilon_anneal_proportion
+
+        self.schedule = DecayThenFlatSchedule(args.epsilon_start, args.epsilon_finish, anneal_time,
+                                              decay="linear")
+        self.epsilon = self.schedule.eval(0)
+        self.apex_alpha = getattr(args, "epsilon_apex_alpha", 0)
+        self.block_size = getattr(args, "random_block_size", 65536)
+
+        self._t_env = 0
+        self._exponents = None
+        self._random = None
+        self._random_index = 0
+
+    def epsilons(self, batch_size, device):
+        """
+        環境ごとのepsilon [batch_size, 1]
+        """
+        if self._exponents is None or self._exponents.shape[0] != batch_size \
+                or self._exponents.device != th.device(device):
+            if batch_size > 1:
+                i = th.arange(batch_size, dtype=th.float32, device=device)
+                exponents = 1 + self.apex_alpha * i / (batch_size - 1)
+            else:
+                exponents = th.ones(1, device=device)
+            self._exponents = exponents.unsqueeze(1)
+        return self.epsilon ** self._exponents
+
+    def _draw(self, n, device):
+        """
+        事前に生成しておいた一様乱数から n 個取り出す（足りなくなったら次のブロックを生成）
+        """
+        if self._random is None or self._random_index + n > self._random.numel() \
+                or self._random.device != th.device(device):
+            self._random = th.rand(max(self.block_size, n), device=device)
+            self._random_index = 0
+        out = self._random[self._random_index:self._random_index + n]
+        self._random_index += n
+        return out
+
+    def select_action(self, agent_inputs, avail_actions, t_env, test_mode=False):
+
+        # Assuming agent_inputs is a batch of Q-Values for each agent bav
+        if t_env != self._t_env:
+            self.epsilon = self.schedule.eval(t_env)
+            self._t_env = t_env
+
+        greedy_actions = agent_inputs.masked_fill(avail_actions == 0, -float("inf")).argmax(dim=2)
+        if test_mode:
+            # Greedy action selection only
+            return greedy_actions
+
+        batch_size, n_agents, _ = agent_inputs.shape
+        random_numbers = self._draw(2 * batch_size * n_agents, agent_inputs.device).view(
+            2, batch_size, n_agents)
+
+        # 選択可能な行動の中から一様に選ぶ
+        n_avail = avail_actions.sum(dim=2)
+        k = th.minimum((random_numbers[1] * n_avail).long(), n_avail - 1)
+        random_actions = (avail_actions.cumsum(dim=2) > k.unsqueeze(2)).int().argmax(dim=2)
+
+        pick_random = random_numbers[0] < self.epsilons(batch_size, agent_inputs.device)
+        return th.where(pick_random, random_actions, greedy_actions)
+
+
+REGISTRY["vector_epsilon_greedy"] = VectorEpsilonGreedyActionSelector
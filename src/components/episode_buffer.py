@@ -1,3 +1,4 @@
+import threading
 from typing import List
 import torch as th
 import numpy as np
@@ -5,6 +6,21 @@ from types import SimpleNamespace as SN
 
 from components.transforms import Transform
 
+# フィールドの先頭位置をこのバイト数の倍数に揃える（int64などの型付きビューを作るため）
+_ALIGN = 8
+
+
+def _field_views(storage: th.Tensor, layout: dict) -> dict:
+    """
+    1行（1タイムステップ）分の全フィールドを詰めたバイト列 storage [..., row_bytes] から、
+    フィールドごとの型付きビュー [..., *shape] を作る（コピーはしない）
+    """
+    lead = storage.shape[:-1]
+    return {
+        k: storage[..., offset:offset + nbytes].view(dtype).view(*lead, *shape)
+        for k, (offset, nbytes, dtype, shape) in layout.items()
+    }
+
 
 class EpisodeBatch:
     def __init__(
@@ -28,9 +44,7 @@ class EpisodeBatch:
             self.data = data
         else:
             # 名前空間
-            self.data = SN()
-            self.data.transition_data = {}
-            self.data.episode_data = {}
+            self.data = self._new_data_sn()
             self._setup_data(
                 self.scheme, self.groups, batch_size, max_seq_length, self.preprocess
             )
@@ -77,6 +91,7 @@ class EpisodeBatch:
 
         # "group"で指定されているエージェントごとに存在するデータ（行動、観測など）は
         # schemeで指定されているShape × エージェント数 になる
+        transition_fields = {}
         for field_key, field_info in scheme.items():
             assert "vshape" in field_info, "Scheme must define vshape for {}".format(
                 field_key
@@ -107,14 +122,42 @@ class EpisodeBatch:
                     (batch_size, *shape), dtype=dtype, device=self.device
                 )
             else:
-                # ゼロ埋めのテンソルを生成
+                transition_fields[field_key] = (tuple(shape), dtype)
+
+        self._allocate_transition_data(transition_fields, batch_size, max_seq_length)
+
+    def _allocate_transition_data(self, fields: dict, batch_size, max_seq_length):
+        """
+        全フィールドを1つのゼロ埋めのバイト列 storage [batch_size, max_seq_length, row_bytes] にまとめ、
+        transition_data にはそのフィールドごとのビューを入れる
+        挿入・サンプリング・デバイス転送は storage に対する1回の操作で済む
+
+        既にフィールドがある場合（extend）は、新しいフィールドを後ろに追加して詰め直す
+        """
+        if self.data.storage is None and self.data.transition_data:
+            # キーを選んで作ったバッチ（storageを持たない）にはフィールドごとに追加する
+            for field_key, (shape, dtype) in fields.items():
                 self.data.transition_data[field_key] = th.zeros(
-                    (batch_size, max_seq_length, *shape),
-                    dtype=dtype,
-                    device=self.device,
+                    (batch_size, max_seq_length, *shape), dtype=dtype, device=self.device
                 )
-                # print("{}のひな形を追加 shape: {}".format(
-                #     field_key, self.data.transition_data[field_key].shape))
+            return
+
+        layout = dict(self.data.layout)
+        row_bytes = sum(nbytes for _, nbytes, _, _ in layout.values())
+        for field_key, (shape, dtype) in fields.items():
+            nbytes = int(np.prod(shape)) * th.empty((), dtype=dtype).element_size()
+            layout[field_key] = (row_bytes, nbytes, dtype, shape)
+            row_bytes += -(-nbytes // _ALIGN) * _ALIGN
+
+        storage = th.zeros(
+            (batch_size, max_seq_length, row_bytes), dtype=th.uint8, device=self.device
+        )
+        if self.data.storage is not None:
+            storage[..., : self.data.storage.shape[-1]] = self.data.storage
+
+        self.data.storage = storage
+        self.data.layout = layout
+        self.data.transition_data = _field_views(storage, layout)
 
     def extend(self, scheme, groups=None):
         self._setup_data(
@@ -122,15 +165,56 @@ class EpisodeBatch:
             self.groups if groups is None else groups,
             self.batch_size,
             self.max_seq_length,
+            None,
         )
 
-    def to(self, device):
-        for k, v in self.data.transition_data.items():
-            self.data.transition_data[k] = v.to(device)
-        for k, v in self.data.episode_data.items():
-            self.data.episode_data[k] = v.to(device)
+    def to(self, device, non_blocking=False):
+        self._apply(lambda v: v.to(device, non_blocking=non_blocking))
         self.device = device
 
+    def pin_memory(self):
+        """
+        CPU上のバッチをピン留めしたメモリに移す（GPUへの非同期転送用）
+        """
+        self._apply(lambda v: v.pin_memory())
+
+    def record_stream(self, stream):
+        """
+        別のCUDAストリームで転送したバッチを stream で使う際に、メモリが早く再利用されないようにする
+        """
+        if self.data.storage is not None:
+            self.data.storage.record_stream(stream)
+        else:
+            for v in self.data.transition_data.values():
+                v.record_stream(stream)
+        for v in self.data.episode_data.values():
+            v.record_stream(stream)
+
+    def _apply(self, fn):
+        if self.data.storage is not None:
+            # 全フィールドをまとめて処理
+            self.data.storage = fn(self.data.storage)
+            self.data.transition_data = _field_views(self.data.storage, self.data.layout)
+        else:
+            for k, v in self.data.transition_data.items():
+                self.data.transition_data[k] = fn(v)
+        for k, v in self.data.episode_data.items():
+            self.data.episode_data[k] = fn(v)
+
+    def zero_(self, max_t=None):
+        """
+        先頭 max_t タイムステップ（None なら全体）と episode_data をゼロに戻す（バッチを使い回す用）
+        それより後ろのタイムステップは書き込まれていない（ゼロのまま）ことを前提にする
+        """
+        ts = slice(None, max_t)
+        if self.data.storage is not None:
+            self.data.storage[:, ts].zero_()
+        else:
+            for v in self.data.transition_data.values():
+                v[:, ts].zero_()
+        for v in self.data.episode_data.values():
+            v.zero_()
+
     def update(self, data: dict, bs=slice(None), ts=slice(None), mark_filled=True):
         """
         バッチにデータを追加
@@ -239,8 +323,15 @@ class EpisodeBatch:
         else:
             item = self._parse_slices(item)
             new_data = self._new_data_sn()
-            for k, v in self.data.transition_data.items():
-                new_data.transition_data[k] = v[item]
+            if self.data.storage is not None:
+                # 全フィールドをまとめて切り出す（エピソードのリストで指定した場合も1回のgather）
+                # 行のバイト数は _ALIGN の倍数なので、int64 として要素数を減らしてコピーする
+                new_data.storage = self.data.storage.view(th.int64)[item].view(th.uint8)
+                new_data.layout = self.data.layout
+                new_data.transition_data = _field_views(new_data.storage, new_data.layout)
+            else:
+                for k, v in self.data.transition_data.items():
+                    new_data.transition_data[k] = v[item]
             for k, v in self.data.episode_data.items():
                 new_data.episode_data[k] = v[item[0]]
 
@@ -268,6 +359,9 @@ class EpisodeBatch:
         new_data = SN()
         new_data.transition_data = {}
         new_data.episode_data = {}
+        # transition_data の全フィールドをまとめたバイト列とその配置（キーを選んだバッチでは None）
+        new_data.storage = None
+        new_data.layout = {}
         return new_data
 
     def _parse_slices(self, items):
@@ -295,7 +389,7 @@ class EpisodeBatch:
             else:
                 # Leave slices and lists as is
                 parsed.append(item)
-        return parsed
+        return tuple(parsed)
 
     def max_t_filled(self):
         return th.sum(self.data.transition_data["filled"], 1).max(0)[0]
@@ -330,19 +424,32 @@ class ReplayBuffer(EpisodeBatch):
         # 現在記憶しているエピソード数
         self.buffer_index = 0
         self.episodes_in_buffer = 0
+        # BatchPrefetcher のスレッドがサンプリングしている間は挿入を待たせる
+        self.lock = threading.RLock()
 
     def insert_episode_batch(self, ep_batch: EpisodeBatch):
         """
         1つのエピソードバッチをリプレイバッファに保存
         """
+        with self.lock:
+            self._insert_episode_batch(ep_batch)
+
+    def _insert_episode_batch(self, ep_batch: EpisodeBatch):
         if self.buffer_index + ep_batch.batch_size <= self.buffer_size:
             # まだバッファが満杯でなければ
-            self.update(
-                ep_batch.data.transition_data,
-                slice(self.buffer_index, self.buffer_index + ep_batch.batch_size),
-                slice(0, ep_batch.max_seq_length),
-                mark_filled=False,
-            )
+            if ep_batch.data.storage is not None and ep_batch.data.layout == self.data.layout:
+                # 配置が同じなら全フィールドを1回でコピー
+                self.data.storage.view(th.int64)[
+                    self.buffer_index:self.buffer_index + ep_batch.batch_size,
+                    :ep_batch.max_seq_length,
+                ] = ep_batch.data.storage.view(th.int64)
+            else:
+                self.update(
+                    ep_batch.data.transition_data,
+                    slice(self.buffer_index, self.buffer_index + ep_batch.batch_size),
+                    slice(0, ep_batch.max_seq_length),
+                    mark_filled=False,
+                )
             self.update(
                 ep_batch.data.episode_data,
                 slice(self.buffer_index, self.buffer_index + ep_batch.batch_size),
@@ -361,8 +468,8 @@ class ReplayBuffer(EpisodeBatch):
             buffer_left = self.buffer_size - self.buffer_index
 
             # 分割してバッファに保存
-            self.insert_episode_batch(ep_batch[0:buffer_left, :])
-            self.insert_episode_batch(ep_batch[buffer_left:, :])
+            self._insert_episode_batch(ep_batch[0:buffer_left, :])
+            self._insert_episode_batch(ep_batch[buffer_left:, :])
 
     def can_sample(self, batch_size):
         """
@@ -386,6 +493,92 @@ class ReplayBuffer(EpisodeBatch):
             )
             return self[ep_ids]
 
+    def sample_chunks(self, batch_size, chunk_length, burn_in=0, rng=np.random):
+        """
+        エピソード全体ではなく、エピソードの途中から切り出した固定長の区間をサンプリング（R2D2）
+
+        各区間は burn_in + chunk_length + 1 ステップで、
+        - 先頭の burn_in ステップは隠れ状態を温めるためだけに使う部分
+        - 続く chunk_length ステップが学習に使う遷移（最後の +1 は目標値の次状態）
+        学習に使う部分の開始位置は、区間がエピソードからはみ出ない範囲で一様に選ぶ
+        エピソードの開始より前・バッファの最後より後の部分は 0 で埋まる（filled も 0）
+        """
+        assert self.can_sample(batch_size)
+        assert self.data.storage is not None
+        ep_ids = rng.choice(self.episodes_in_buffer, batch_size, replace=False)
+
+        # 各エピソードの遷移数（最後に埋まっているステップは次状態だけ）
+        n_transitions = self["filled"][ep_ids].sum(1).view(-1).cpu().numpy() - 1
+        starts = rng.randint(0, np.maximum(n_transitions - chunk_length, 0) + 1)
+
+        # 切り出すタイムステップ [batch_size, burn_in + chunk_length + 1]
+        length = burn_in + chunk_length + 1
+        t = th.as_tensor(starts - burn_in, device=self.device)[:, None] + th.arange(
+            length, device=self.device
+        )
+        valid = (t >= 0) & (t < self.max_seq_length)
+
+        # 全フィールドをまとめて1回のgatherで切り出し、範囲外のステップを0にする
+        new_data = self._new_data_sn()
+        rows = th.as_tensor(ep_ids, device=self.device)[:, None]
+        storage = self.data.storage.view(th.int64)[rows, t.clamp(0, self.max_seq_length - 1)]
+        storage.masked_fill_(~valid[..., None], 0)
+        new_data.storage = storage.view(th.uint8)
+        new_data.layout = self.data.layout
+        new_data.transition_data = _field_views(new_data.storage, new_data.layout)
+        for k, v in self.data.episode_data.items():
+            new_data.episode_data[k] = v[ep_ids]
+
+        return EpisodeBatch(
+            self.scheme,
+            self.groups,
+            batch_size,
+            length,
+            data=new_data,
+            device=self.device,
+        )
+
+    def memory_report(self) -> str:
+        """
+        フィールドごとの1ステップあたりのバイト数と、バッファ全体（buffer_size × max_seq_length）での使用量
+        """
+        n_steps = self.buffer_size * self.max_seq_length
+        row_bytes = self.data.storage.shape[-1]
+        lines = [
+            "  {:<16} {:>6} B/step {:>10.1f} MB ({:.1f}%)".format(
+                k, nbytes, nbytes * n_steps / 2**20, 100 * nbytes / row_bytes
+            )
+            for k, (_, nbytes, _, _) in self.data.layout.items()
+        ]
+        lines.append(
+            "  {:<16} {:>6} B/step {:>10.1f} MB (including alignment)".format(
+                "total", row_bytes, row_bytes * n_steps / 2**20
+            )
+        )
+        return "\n".join(lines)
+
+    def state_dict(self) -> dict:
+        """
+        チェックポイント用に、溜まっているエピソードの部分だけを返す
+        """
+        n = self.episodes_in_buffer
+        return {
+            "transition_data": {k: v[:n] for k, v in self.data.transition_data.items()},
+            "episode_data": {k: v[:n] for k, v in self.data.episode_data.items()},
+            "buffer_index": self.buffer_index,
+            "episodes_in_buffer": self.episodes_in_buffer,
+        }
+
+    def load_state_dict(self, state: dict):
+        n = state["episodes_in_buffer"]
+        assert n <= self.buffer_size, "Checkpoint has more episodes than buffer_size"
+        for k, v in state["transition_data"].items():
+            self.data.transition_data[k][:n] = v.to(self.device)
+        for k, v in state["episode_data"].items():
+            self.data.episode_data[k][:n] = v.to(self.device)
+        self.buffer_index = state["buffer_index"]
+        self.episodes_in_buffer = n
+
     def __repr__(self):
         return "ReplayBuffer. {}/{} episodes. Keys:{} Groups:{}".format(
             self.episodes_in_buffer,
@@ -393,3 +586,70 @@ class ReplayBuffer(EpisodeBatch):
             self.scheme.keys(),
             self.groups.keys(),
         )
+
+
+def cat_batches(batches: List[EpisodeBatch]) -> EpisodeBatch:
+    """
+    同じスキーム・同じ長さのバッチをバッチの次元で連結する（全フィールドをまとめて1回のコピー）
+    """
+    first = batches[0]
+    data = first._new_data_sn()
+    data.storage = th.cat([batch.data.storage for batch in batches])
+    data.layout = first.data.layout
+    data.transition_data = _field_views(data.storage, data.layout)
+    for k in first.data.episode_data:
+        data.episode_data[k] = th.cat([batch.data.episode_data[k] for batch in batches])
+    return EpisodeBatch(
+        first.scheme,
+        first.groups,
+        sum(batch.batch_size for batch in batches),
+        first.max_seq_length,
+        data=data,
+        device=first.device,
+    )
+
+
+class MultiSeedReplayBuffer:
+    """
+    n_seeds 個の独立した ReplayBuffer（複数シードの同時学習用）
+
+    Runnerのバッチは先頭から n_seeds 等分した部分がそれぞれのシードのエピソードで、
+    それぞれのシードのバッファに保存される。
+    sample / sample_chunks はシードごとに batch_size 個ずつサンプリングし、シードの順に連結したものを返す
+    """
+
+    def __init__(self, n_seeds, *args, **kwargs):
+        self.n_seeds = n_seeds
+        self.buffers = [ReplayBuffer(*args, **kwargs) for _ in range(n_seeds)]
+        self.scheme = self.buffers[0].scheme
+
+    @property
+    def episodes_in_buffer(self):
+        # シードあたりのエピソード数
+        return self.buffers[0].episodes_in_buffer
+
+    def insert_episode_batch(self, ep_batch: EpisodeBatch):
+        n = ep_batch.batch_size // self.n_seeds
+        for k, buffer in enumerate(self.buffers):
+            buffer.insert_episode_batch(ep_batch[k * n:(k + 1) * n])
+
+    def can_sample(self, batch_size):
+        return all(buffer.can_sample(batch_size) for buffer in self.buffers)
+
+    def sample(self, batch_size):
+        return cat_batches([buffer.sample(batch_size) for buffer in self.buffers])
+
+    def sample_chunks(self, batch_size, chunk_length, burn_in=0, rng=np.random):
+        return cat_batches(
+            [buffer.sample_chunks(batch_size, chunk_length, burn_in, rng) for buffer in self.buffers]
+        )
+
+    def memory_report(self) -> str:
+        return "{} buffers of\n{}".format(self.n_seeds, self.buffers[0].memory_report())
+
+    def state_dict(self) -> dict:
+        return {"buffers": [buffer.state_dict() for buffer in self.buffers]}
+
+    def load_state_dict(self, state: dict):
+        for buffer, buffer_state in zip(self.buffers, state["buffers"]):
+            buffer.load_state_dict(buffer_state)
@@ -0,0 +1,108 @@
+import queue
+import threading
+import numpy as np
+import torch as th
+
+from components.episode_buffer import EpisodeBatch, ReplayBuffer
+
+
+class BatchPrefetcher(threading.Thread):
+    """
+    学習に使うバッチをバックグラウンドで用意しておくスレッド
+
+    ReplayBuffer からのサンプリング、埋まっているタイムステップまでの切り詰め、
+    （GPUを使う場合は）ピン留めしたメモリへの配置と別ストリームでの非同期転送までを行い、
+    最大 n_batches 個をキューに溜めておく。学習ループは get() で取り出すだけでよい
+
+    - サンプリング中のバッファへの挿入は ReplayBuffer.lock で排他する。
+      取り出したバッチはバッファのコピーなので、その後の挿入の影響を受けない
+    - キューに溜まっている分だけ、バッチは少し前のバッファの状態からサンプリングされたものになる
+    - CPUのみの場合はピン留め・転送をせず、コピーしたバッチをそのまま渡す
+    - chunk_length > 0 なら ReplayBuffer.sample_chunks と同じ固定長の区間を用意する
+    """
+
+    def __init__(
+        self, buffer: ReplayBuffer, batch_size, device, n_batches, seed=None,
+        chunk_length=0, burn_in=0,
+    ):
+        super(BatchPrefetcher, self).__init__(name="BatchPrefetcher", daemon=True)
+        self.buffer = buffer
+        self.batch_size = batch_size
+        self.device = th.device(device)
+        self.queue = queue.Queue(maxsize=n_batches)
+        self.rng = np.random.RandomState(seed)
+        self.chunk_length = chunk_length
+        self.burn_in = burn_in
+        self._stop_event = threading.Event()
+
+        # 転送先がGPUでバッファがCPUにある場合だけピン留め & 非同期転送する
+        self.transfer = self.device.type == "cuda" and th.device(buffer.device) != self.device
+        self.stream = th.cuda.Stream(self.device) if self.transfer else None
+
+    def _sample(self) -> EpisodeBatch:
+        buffer = self.buffer
+        with buffer.lock:
+            if self.chunk_length > 0:
+                return buffer.sample_chunks(
+                    self.batch_size, self.chunk_length, self.burn_in, rng=self.rng
+                )
+            ep_ids = self.rng.choice(buffer.episodes_in_buffer, self.batch_size, replace=False)
+            # 埋まっているタイムステップまでだけを取り出す（全フィールドをまとめて1回のgather）
+            max_ep_t = int(buffer["filled"][ep_ids].sum(1).max())
+            return buffer[ep_ids, :max_ep_t]
+
+    def run(self):
+        try:
+            while not self._stop_event.is_set():
+                batch = self._sample()
+                event = None
+                if self.transfer:
+                    batch.pin_memory()
+                    with th.cuda.stream(self.stream):
+                        batch.to(self.device, non_blocking=True)
+                        event = th.cuda.Event()
+                        event.record(self.stream)
+                self._put((batch, event))
+        except Exception as e:
+            # 学習ループが get() で待ち続けないように、例外をキューで渡してから終了する
+            self._put((e, None))
+
+    def _put(self, item):
+        while not self._stop_event.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                break
+            except queue.Full:
+                continue
+
+    def get(self) -> EpisodeBatch:
+        """
+        用意できているバッチを1つ取り出す（最初の呼び出しでスレッドを開始する）
+        スレッドで起きた例外はここで送出する
+        """
+        if self.ident is None:
+            assert self.buffer.can_sample(self.batch_size)
+            self.start()
+        elif not self.is_alive() and self.queue.empty():
+            raise RuntimeError("BatchPrefetcher has stopped")
+
+        batch, event = self.queue.get()
+        if isinstance(batch, Exception):
+            raise batch
+        if event is not None:
+            # 転送が終わるまで学習側のストリームを待たせ、転送先のメモリが早く解放されないようにする
+            stream = th.cuda.current_stream(self.device)
+            stream.wait_event(event)
+            batch.record_stream(stream)
+        return batch
+
+    def close(self):
+        self._stop_event.set()
+        if self.is_alive():
+            # put で待っている場合に備えてキューを空ける
+            while True:
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    break
+            self.join()
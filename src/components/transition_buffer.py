@@ -0,0 +1,69 @@
+import numpy as np
+import torch as th
+
+
+class TransitionBuffer:
+    """
+    1ステップ分の遷移 (s, a, r, s_prime, done) を溜めるリングバッファ（diamond_minimal_* 用）
+
+    各要素は最初に put() された遷移の形で [buffer_limit, ...] の float32 配列として確保し、
+    以降は書き込み位置に上書きしていく（いっぱいになったら古いものから上書き）。
+    サンプリングはインデックスの配列で一度に取り出し、torch.from_numpy でそのままテンソルにする
+
+    インデックスは古い順（0 が最も古い遷移）で、collections.deque に append した場合と同じ
+    """
+
+    def __init__(self, buffer_limit, rng=np.random):
+        self.buffer_limit = buffer_limit
+        self.rng = rng
+        self.fields = None
+        self.n_stored = 0
+        # 次に書き込む位置
+        self.pos = 0
+        # chunk_size ごとの区間内のオフセット [1, chunk_size]
+        self._chunk_offsets = {}
+
+    def put(self, transition):
+        if self.fields is None:
+            self.fields = [
+                np.zeros((self.buffer_limit,) + np.shape(value), dtype=np.float32)
+                for value in transition
+            ]
+        assert len(transition) == len(self.fields), "Transition has {} fields, expected {}".format(
+            len(transition), len(self.fields)
+        )
+        for field, value in zip(self.fields, transition):
+            field[self.pos] = value
+        self.pos = (self.pos + 1) % self.buffer_limit
+        self.n_stored = min(self.n_stored + 1, self.buffer_limit)
+
+    def _physical(self, idx):
+        # 古い順のインデックス -> 配列上の位置
+        oldest = self.pos if self.n_stored == self.buffer_limit else 0
+        return (oldest + idx) % self.buffer_limit
+
+    def _gather(self, idx):
+        return tuple(th.from_numpy(field[idx]) for field in self.fields)
+
+    def sample(self, n):
+        """
+        重複なしに n 個の遷移を選ぶ（random.sample と同じ）
+        戻り値: 各要素 [n, ...]
+        """
+        assert n <= self.n_stored, "Cannot sample {} transitions from {}".format(n, self.n_stored)
+        idx = self.rng.choice(self.n_stored, n, replace=False)
+        return self._gather(self._physical(idx))
+
+    def sample_chunk(self, batch_size, chunk_size):
+        """
+        連続した chunk_size ステップの区間を batch_size 個選ぶ（開始位置は重複あり）
+        戻り値: 各要素 [batch_size, chunk_size, ...]
+        """
+        start_idx = self.rng.randint(0, self.n_stored - chunk_size, batch_size)
+        offsets = self._chunk_offsets.get(chunk_size)
+        if offsets is None:
+            offsets = self._chunk_offsets[chunk_size] = np.arange(chunk_size)[None, :]
+        return self._gather(self._physical(start_idx[:, None] + offsets))
+
+    def size(self):
+        return self.n_stored
@@ -1,6 +1,7 @@
 from __future__ import annotations
 from modules.agents.rnn_agent import RNNAgent
-from components.action_selectors import EpsilonGreedyActionSelector
+from modules.agents.multi_seed_rnn_agent import MultiSeedRNNAgent
+from components.action_selectors import REGISTRY as action_REGISTRY
 import torch as th
 
 
@@ -26,8 +27,10 @@ class BasicMAC:
 
         self.agent_output_type = args.agent_output_type
 
-        # 行動選択アルゴリズムはepsilon-greedy
-        self.action_selector = EpsilonGreedyActionSelector(args)
+        # 行動選択アルゴリズム（epsilon-greedyなど）
+        self.action_selector = action_REGISTRY[getattr(args, "action_selector", "epsilon_greedy")](
+            args
+        )
 
         self.hidden_states = None
 
@@ -112,8 +115,11 @@ class BasicMAC:
         """
         エージェントネットワークを生成する
         """
-        self.agent = RNNAgent(input_shape, self.args)
-        pass
+        if getattr(self.args, "n_seeds", 1) > 1:
+            # n_seeds 個の独立したエージェントネットワーク（バッチはシードごとに等分される）
+            self.agent = MultiSeedRNNAgent(input_shape, self.args)
+        else:
+            self.agent = RNNAgent(input_shape, self.args)
 
     def _build_inputs(self, batch, t):
         # Assumes homogenous agents with flat observations.
@@ -1,4 +1,4 @@
-from components.action_selectors import EpsilonGreedyActionSelector
+from components.action_selectors import REGISTRY as action_REGISTRY
 from modules.agents.rnn_ns_agent import RNNNSAgent
 import torch as th
 
@@ -13,8 +13,10 @@ class NonSharedMAC:
         self._build_agents(input_shape)
         self.agent_output_type = args.agent_output_type
 
-        # 行動選択アルゴリズムはepsilon-greedy
-        self.action_selector = EpsilonGreedyActionSelector(args)
+        # 行動選択アルゴリズム（epsilon-greedyなど）
+        self.action_selector = action_REGISTRY[getattr(args, "action_selector", "epsilon_greedy")](
+            args
+        )
 
         self.hidden_states = None
 
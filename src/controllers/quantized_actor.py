@@ -0,0 +1,53 @@
+import copy
+
+import torch as th
+
+from components.episode_buffer import EpisodeBatch
+from modules.agents.quantized_agent import QuantizedAgent
+
+
+def make_quantized_actor(mac):
+    """
+    mac（BasicMAC / NonSharedMAC）のエージェントを int8 に動的量子化したロールアウト用のコピーを作る
+
+    行動選択アルゴリズム（epsilon の減衰）は mac と共有し、隠れ状態は別に持つ
+    学習で mac の重みが変わったら refresh_actor() で反映する
+    """
+    actor = copy.copy(mac)
+    actor.agent = QuantizedAgent(mac.agent)
+    actor.hidden_states = None
+    return actor
+
+
+def refresh_actor(actor, mac):
+    actor.agent.refresh(mac.agent)
+
+
+def greedy_agreement(mac, actor, batch: EpisodeBatch) -> float:
+    """
+    batch のエピソードを mac（fp32）と actor（int8）でそれぞれ先頭から入力した時に、
+    選択可能な行動のうち Q値（または logits）が最大の行動が一致する割合
+    （埋まっているタイムステップの全エージェントについて）
+
+    隠れ状態はそれぞれのネットワーク自身の出力を引き継ぐので、量子化の誤差の蓄積も含まれる
+    """
+    mac.init_hidden(batch.batch_size)
+    actor.init_hidden(batch.batch_size)
+    filled = batch["filled"][:, :, 0].bool()
+    n_agree = 0
+    n_total = 0
+    with th.no_grad():
+        for t in range(batch.max_seq_length):
+            inputs = mac._build_inputs(batch, t)
+            q, mac.hidden_states = mac.agent(inputs, mac.hidden_states)
+            q_actor, actor.hidden_states = actor.agent(inputs.cpu(), actor.hidden_states)
+
+            avail_actions = batch["avail_actions"][:, t].reshape(q.shape).cpu()
+            q = q.cpu().masked_fill(avail_actions == 0, -float("inf"))
+            q_actor = q_actor.masked_fill(avail_actions == 0, -float("inf"))
+
+            agree = (q.argmax(dim=-1) == q_actor.argmax(dim=-1)).view(batch.batch_size, -1)
+            mask = filled[:, t].cpu()
+            n_agree += int(agree[mask].sum())
+            n_total += int(mask.sum()) * agree.size(1)
+    return n_agree / max(n_total, 1)
@@ -1,48 +1,15 @@
-import collections
-import random
-
 import gym
 import numpy as np
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
 import torch.optim as optim
+from components.transition_buffer import TransitionBuffer
 from envs.diamond.diamond_gym import DiamondGymEnv
 
 USE_WANDB = False  # if enabled, logs data on wandb server
 
 
-class ReplayBuffer:
-    def __init__(self, buffer_limit):
-        self.buffer = collections.deque(maxlen=buffer_limit)
-
-    def put(self, transition):
-        self.buffer.append(transition)
-
-    def sample(self, n):
-        mini_batch = random.sample(self.buffer, n)
-        s_lst, a_lst, r_lst, s_prime_lst, done_mask_lst = [], [], [], [], []
-
-        for transition in mini_batch:
-            s, a, r, s_prime, done = transition
-            s_lst.append(s)
-            a_lst.append(a)
-            r_lst.append(r)
-            s_prime_lst.append(s_prime)
-            done_mask_lst.append((np.ones(len(done)) - done).tolist())
-
-        return (
-            torch.tensor(s_lst, dtype=torch.float),
-            torch.tensor(a_lst, dtype=torch.float),
-            torch.tensor(r_lst, dtype=torch.float),
-            torch.tensor(s_prime_lst, dtype=torch.float),
-            torch.tensor(done_mask_lst, dtype=torch.float),
-        )
-
-    def size(self):
-        return len(self.buffer)
-
-
 class QNet(nn.Module):
     def __init__(self, observation_space, action_space):
         super(QNet, self).__init__()
@@ -91,7 +58,8 @@ class QNet(nn.Module):
 
 def train(q, q_target, memory, optimizer, gamma, batch_size, update_iter=10):
     for _ in range(update_iter):
-        s, a, r, s_prime, done_mask = memory.sample(batch_size)
+        s, a, r, s_prime, done = memory.sample(batch_size)
+        done_mask = 1 - done
 
         q_out = q(s)
         q_a = q_out.gather(2, a.unsqueeze(-1).long()).squeeze(-1)
@@ -165,7 +133,7 @@ def main(
     #     test_env = Monitor(test_env, directory='recordings/idqn/{}'.format(env_name),
     #                        video_callable=lambda episode_id: episode_id % 50 == 0)
 
-    memory = ReplayBuffer(buffer_limit)
+    memory = TransitionBuffer(buffer_limit)
 
     q = QNet(env.observation_space, env.action_space)
     q_target = QNet(env.observation_space, env.action_space)
@@ -1,5 +1,3 @@
-import collections
-
 # import gym
 import numpy as np
 import torch
@@ -7,52 +5,12 @@ import torch.nn as nn
 import torch.nn.functional as F
 import torch.optim as optim
 
+from components.transition_buffer import TransitionBuffer
 from envs.diamond.diamond_gym import DiamondGymEnv
 
 USE_WANDB = False  # if enabled, logs data on wandb server
 
 
-class ReplayBuffer:
-    def __init__(self, buffer_limit):
-        self.buffer = collections.deque(maxlen=buffer_limit)
-
-    def put(self, transition):
-        self.buffer.append(transition)
-
-    def sample_chunk(self, batch_size, chunk_size):
-        start_idx = np.random.randint(0, len(self.buffer) - chunk_size, batch_size)
-        s_lst, a_lst, r_lst, s_prime_lst, done_lst = [], [], [], [], []
-
-        for idx in start_idx:
-            for chunk_step in range(idx, idx + chunk_size):
-                s, a, r, s_prime, done = self.buffer[chunk_step]
-                s_lst.append(s)
-                a_lst.append(a)
-                r_lst.append(r)
-                s_prime_lst.append(s_prime)
-                done_lst.append(done)
-
-        n_agents, obs_size = len(s_lst[0]), len(s_lst[0][0])
-        return (
-            torch.tensor(s_lst, dtype=torch.float).view(
-                batch_size, chunk_size, n_agents, obs_size
-            ),
-            torch.tensor(a_lst, dtype=torch.float).view(
-                batch_size, chunk_size, n_agents
-            ),
-            torch.tensor(r_lst, dtype=torch.float).view(
-                batch_size, chunk_size, n_agents
-            ),
-            torch.tensor(s_prime_lst, dtype=torch.float).view(
-                batch_size, chunk_size, n_agents, obs_size
-            ),
-            torch.tensor(done_lst, dtype=torch.float).view(batch_size, chunk_size, 1),
-        )
-
-    def size(self):
-        return len(self.buffer)
-
-
 class MixNet(nn.Module):
     def __init__(self, observation_space, hidden_dim=32, hx_size=64, recurrent=False):
         super(MixNet, self).__init__()
@@ -309,7 +267,7 @@ def main(
         reward_failure=-10,
         test_mode=True,
     )
-    memory = ReplayBuffer(buffer_limit)
+    memory = TransitionBuffer(buffer_limit)
 
     print("use reccurent: ", recurrent)
 
@@ -1,11 +1,8 @@
 from enum import Enum
-import math
-import random
 import numpy as np
-import pygame
-from typing import List, Tuple
+from typing import Tuple
 
-from envs.crossroads.utils import line_intersect
+from envs.physics import PhysicsCore, laser_directions
 
 
 class Direction(Enum):
@@ -15,6 +12,15 @@ class Direction(Enum):
     RIGHT = 3
 
 
+# 各方向に1だけ動いた時の移動量 (x, y)
+MOVES = {
+    Direction.UP: np.array([0.0, -1.0]),
+    Direction.DOWN: np.array([0.0, 1.0]),
+    Direction.LEFT: np.array([-1.0, 0.0]),
+    Direction.RIGHT: np.array([1.0, 0.0]),
+}
+
+
 class Agent:
     def __init__(self):
         # 動けるか
@@ -29,14 +35,16 @@ class Agent:
         raise NotImplementedError
 
 
-class RobotAgent(Agent, pygame.sprite.Sprite):
+class RobotAgent(Agent):
     """
     ロボットエージェント (RA)
     周りをLiDARで観測しながら移動する
+    位置などの状態は物理コア (envs.physics.PhysicsCore) が持つ
     """
 
     def __init__(
         self,
+        physics: PhysicsCore,
         color: Tuple[int, int, int],
         size: int,
         velocity: float,
@@ -44,11 +52,9 @@ class RobotAgent(Agent, pygame.sprite.Sprite):
         lidar_angle: float,
         lidar_interval: float,
     ):
-        super(Agent, self).__init__()
-        super(pygame.sprite.Sprite, self).__init__()
-        self.image = pygame.Surface([size, size], pygame.SRCALPHA)
-        self.rect = self.image.get_rect()
-        pygame.draw.circle(self.image, color, (size // 2, size // 2), size // 2)
+        self.physics = physics
+        self.body = physics.add_body(size, size)
+        self.color = color
 
         self.movable = True
         self.sendable = False
@@ -58,79 +64,34 @@ class RobotAgent(Agent, pygame.sprite.Sprite):
         self.LIDAR_ANGLE = lidar_angle
         self.LIDAR_INTERVAL = lidar_interval
 
-        self.pos = pygame.math.Vector2(0, 0)
-        self.vel = pygame.math.Vector2(0, 0)
-        # self.acc = pygame.math.Vector2(0, 0)
+        self.laser_directions = laser_directions(lidar_angle, lidar_interval)
+
+    @property
+    def pos(self) -> np.ndarray:
+        return self.physics.pos[self.body]
+
+    @property
+    def vel(self) -> np.ndarray:
+        return self.physics.vel[self.body]
+
+    @property
+    def rect(self) -> np.ndarray:
+        return self.physics.rects[self.body]
 
     def move(self, direction: Direction):
-        self.vel = pygame.math.Vector2(0, 0)
-
-        if direction == Direction.LEFT:
-            self.vel.x = -self.VEL
-        if direction == Direction.RIGHT:
-            self.vel.x = self.VEL
-        if direction == Direction.UP:
-            self.vel.y = -self.VEL
-        if direction == Direction.DOWN:
-            self.vel.y = self.VEL
-
-        # self.acc += self.vel * self.FRIC
-        # self.vel += self.acc
-
-        # if self.vel.length() > self.MAX_SPEED:
-        #     self.vel.scale_to_length(self.MAX_SPEED)
-
-        # x = v0t + 1/2at^2
-        # self.pos += self.vel + 0.5 * self.acc
-
-        self.pos += self.vel
-
-        self.rect.center = self.pos
-
-    def __create_lasers(self) -> np.ndarray:
-        lasers = []
-        for angle in range(0, -(self.LIDAR_ANGLE - 1), -self.LIDAR_INTERVAL):
-            laser = (
-                (self.pos.x, self.pos.y),
-                (
-                    self.pos.x + self.LIDAR_RANGE * math.cos(math.radians(angle)),
-                    self.pos.y + self.LIDAR_RANGE * math.sin(math.radians(angle)),
-                ),
-            )
-            lasers.append(laser)
-        return np.array(lasers)
-
-    def laser_scan(self, obstacle_lines: List) -> np.ndarray:
+        self.physics.translate(self.body, MOVES[direction] * self.VEL)
+
+    def reset(self, pos):
+        self.physics.place(self.body, pos)
+
+    def laser_scan(self) -> np.ndarray:
         """
         ライダーのレーザーを飛ばした際の障害物との交点を求める
         """
-        intersections = []
-        lasers = self.__create_lasers()
-
-        for laser in lasers:
-            min_intersection = laser[1]
-            min_distance = self.LIDAR_RANGE
-            for obstacle in obstacle_lines:
-                intersection = line_intersect(
-                    laser[0], laser[1], obstacle[0], obstacle[1]
-                )
-                if intersection is not None:
-                    distance = math.sqrt(
-                        (intersection[0] - laser[0][0]) ** 2
-                        + (intersection[1] - laser[0][1]) ** 2
-                    )
-                    if distance < min_distance:
-                        min_distance = distance
-                        min_intersection = intersection
-
-            intersections.append(min_intersection)
-        return np.array(intersections)
-
-    def reset(self, pos):
-        self.pos = pygame.math.Vector2(pos)
-        self.vel = pygame.math.Vector2(0, 0)
-        self.acc = pygame.math.Vector2(0, 0)
-        self.rect.center = self.pos
+        points, _ = self.physics.ray_cast(
+            self.body, self.laser_directions, self.LIDAR_RANGE
+        )
+        return points
 
 
 class SensorAgent(Agent):
@@ -0,0 +1,291 @@
+import torch as th
+import torch.nn.functional as F
+from typing import Dict, Tuple
+
+from envs.physics_torch import rect_from_center, rects_collide, ray_cast
+from envs.crossroads import scenarios
+from envs.crossroads.world import TwoCrossroadsWorld
+
+
+class TorchCrossroadsEnv:
+    """
+    CrossroadsEnv を n_envs 個まとめて torch のテンソル上で動かすバッチ環境
+
+    VectorCrossroadsEnv と同じ計算を torch で行う。状態・観測・行動がすべて
+    同じデバイス上のテンソルなので、方策の計算と合わせてホストとの変換なしで
+    ロールアウトできる（runners.fused_runner.FusedRunner を参照）
+
+    状態は辞書型のテンソル群で、純粋関数の transition() / observe() で更新・観測する
+        - pos: [n_envs, 2] RAの位置
+        - steps: [n_envs] エピソード内のステップ数
+        - active: [n_envs] エピソードが続いているか
+        - true_goal: [n_envs] 正解のゴール
+        - prev_true_goal: [n_envs] 前のエピソードの正解のゴール
+        - channel: [n_envs] メッセージ（None は -1）
+    """
+
+    def __init__(
+        self,
+        n_envs: int,
+        episode_limit: int,
+        agent_velocity: float,
+        channel_size: int,
+        lidar_angle: float,
+        lidar_interval: float,
+        reward_success: float,
+        reward_failure: float,
+        reward_step: float,
+        n_goals: int,
+        seed=None,
+        debug: bool = False,
+        enable_render: bool = False,
+        test_mode: bool = False,
+        auto_reset: bool = True,
+        scenario=None,
+        scenario_pool: int = 0,
+        scenario_cache_dir: str = None,
+        device="cpu",
+        dtype=th.float32,
+    ):
+        self.n_envs = n_envs
+        self.episode_limit = episode_limit
+        self.debug = debug
+        self.n_goals = n_goals
+        self.lidar_angle = lidar_angle
+        self.lidar_interval = lidar_interval
+        self.reward_success = reward_success
+        self.reward_failure = reward_failure
+        self.reward_step = reward_step
+        self.agent_velocity = agent_velocity
+        self.channel_size = channel_size
+        self.auto_reset = auto_reset
+        self.test_mode = test_mode
+        self.device = device
+        self.dtype = dtype
+
+        # マップの形状は1つの世界から取り出して全環境で共有する
+        assert scenario_pool == 0, "All environments share one map (scenario_pool is not supported)"
+        if scenario is not None:
+            scenario = scenarios.get_scenario(scenario, cache_dir=scenario_cache_dir)
+        world = TwoCrossroadsWorld(
+            agent_velocity, channel_size, lidar_angle, lidar_interval, scenario
+        )
+        physics = world.physics
+
+        def tensor(x, dtype=dtype):
+            return th.as_tensor(x, dtype=dtype, device=device)
+
+        self.WIDTH = world.WIDTH
+        self.HEIGHT = world.HEIGHT
+        self.lidar_range = world.lidar_range
+        self.agent_start = tensor(world.AGENT_POS)
+        self.agent_size = tensor(physics.size[world.r_agent.body], th.long)
+        self.segments = tensor(physics.segments)
+        self.wall_rects = tensor(physics.wall_rects, th.long)
+        self.goal_rects = tensor(physics.areas[world.goals], th.long)
+        self.goal_centers = tensor(world.goal_centers)
+        self.laser_directions = tensor(world.r_agent.laser_directions)
+        self.scale = tensor([self.WIDTH, self.HEIGHT])
+
+        self.n_agents = len(world.agents)
+        self.n_lasers = world.get_num_lasers()
+        self.get_obs_size()
+        self.get_total_actions()
+
+        # RAの行動ごとの移動量: 左・右・上・下
+        self.action_moves = tensor(
+            [[-1.0, 0.0], [1.0, 0.0], [0.0, -1.0], [0.0, 1.0]]
+        ) * agent_velocity
+        # RAは移動、SAはメッセージ送信のみ選択可能
+        self.avail_actions = tensor(
+            [
+                [1] * 4 + [0] * self.channel_size,
+                [0] * 4 + [1] * self.channel_size,
+            ],
+            th.int,
+        ).expand(n_envs, -1, -1)
+
+        # 前のエピソードの正解のゴール（CrossroadsEnv と同じく0から始める）
+        self.prev_true_goal = th.zeros(n_envs, dtype=th.long, device=device)
+        self.state = None
+
+    def get_env_info(self) -> dict:
+        """
+        環境の情報を取得する（1環境あたり）
+        """
+        return {
+            "state_shape": self.get_state_size(),
+            "obs_shape": self.get_obs_size(),
+            "n_actions": self.get_total_actions(),
+            "n_agents": self.n_agents,
+            "episode_limit": self.episode_limit,
+            "n_envs": self.n_envs,
+        }
+
+    def get_obs_size(self):
+        # どちらがゴールか[2] + ゴール1相対座標[2] + ゴール2相対座標[2] + LiDAR[] + メッセージ[]
+        self.obs_size = 2 + 4 + self.n_lasers + self.channel_size
+        return self.obs_size
+
+    def get_state_size(self):
+        # どちらがゴールか[2] + ゴール相対座標[2] +　LiDAR[] メッセージ[]
+        return 2 + 2 + self.n_lasers + self.channel_size
+
+    def get_total_actions(self):
+        # 上下左右移動[4] + メッセージ送信[channel_size]
+        self.n_actions = 4 + self.channel_size
+        return self.n_actions
+
+    # ---------------- 純粋関数 ----------------
+
+    def initial_state(self, prev_true_goal: th.Tensor) -> Dict[str, th.Tensor]:
+        """
+        正解のゴールは環境ごとに前のエピソードと入れ替える
+        """
+        n = self.n_envs
+        true_goal = 1 - prev_true_goal
+        return {
+            "pos": self.agent_start.expand(n, -1).clone(),
+            "steps": th.zeros(n, dtype=th.long, device=self.device),
+            "active": th.ones(n, dtype=th.bool, device=self.device),
+            "true_goal": true_goal,
+            "prev_true_goal": true_goal,
+            "channel": th.full((n,), -1, dtype=th.long, device=self.device),
+        }
+
+    def reset_where(self, state, mask: th.Tensor) -> Dict[str, th.Tensor]:
+        """
+        mask が True の環境だけ初期状態に戻した状態を返す
+        """
+        initial = self.initial_state(state["prev_true_goal"])
+        return {
+            k: th.where(mask.view(-1, *([1] * (v.dim() - 1))), initial[k], v)
+            for k, v in state.items()
+        }
+
+    def transition(self, state, actions: th.Tensor):
+        """
+        全環境の行動を実行した後の状態を返す
+        エピソードが終わっている環境（active = False）は何も変わらない
+        actions: [n_envs, n_agents]（RA, SAの順）
+
+        戻り値:
+            - state: 次の状態
+            - reward: [n_envs]（終わっている環境は0）
+            - terminated: [n_envs] このステップでエピソードが終わったか
+            - info: is_success, timeout（いずれも [n_envs]）
+        """
+        active = state["active"]
+        ra_actions, sa_actions = actions[:, 0], actions[:, 1]
+        true_goal = state["true_goal"]
+
+        pos = th.where(active[:, None], state["pos"] + self.action_moves[ra_actions], state["pos"])
+        channel = th.where(active, sa_actions - 4, state["channel"])
+        steps = state["steps"] + active.long()
+
+        # 終了判定（正解のゴールを先に判定する）
+        rects = rect_from_center(pos, self.agent_size)
+        in_goals = rects_collide(rects[:, None, :], self.goal_rects)  # [n_envs, n_goals]
+        goal_reached = active & in_goals.gather(1, true_goal[:, None])[:, 0]
+        collided = (
+            active
+            & ~goal_reached
+            & (
+                rects_collide(rects[:, None, :], self.wall_rects).any(dim=-1)
+                | in_goals.gather(1, (1 - true_goal)[:, None])[:, 0]
+            )
+        )
+        timeout = active & ~goal_reached & ~collided & (steps >= self.episode_limit)
+        terminated = goal_reached | collided | timeout
+
+        # 報酬
+        reward = th.where(
+            goal_reached,
+            th.full(pos.shape[:1], self.reward_success, dtype=self.dtype, device=self.device),
+            th.where(
+                collided,
+                th.full(pos.shape[:1], self.reward_failure, dtype=self.dtype, device=self.device),
+                th.full(pos.shape[:1], self.reward_step, dtype=self.dtype, device=self.device),
+            ),
+        )
+        reward = reward * active.to(self.dtype)
+
+        next_state = {
+            "pos": pos,
+            "steps": steps,
+            "active": active & ~terminated,
+            "true_goal": true_goal,
+            "prev_true_goal": state["prev_true_goal"],
+            "channel": channel,
+        }
+        info = {"is_success": goal_reached, "timeout": timeout}
+        if self.auto_reset:
+            next_state = self.reset_where(next_state, terminated)
+        return next_state, reward, terminated, info
+
+    def _one_hot(self, values: th.Tensor, length: int) -> th.Tensor:
+        """
+        values が -1 (None) の環境は全て0になる
+        """
+        return F.one_hot(values.clamp(min=0), length).to(self.dtype) * (values >= 0).to(
+            self.dtype
+        )[:, None]
+
+    def observe(self, state) -> Tuple[th.Tensor, th.Tensor, th.Tensor]:
+        """
+        観測 [n_envs, n_agents, obs_size]、グローバル状態 [n_envs, state_size]、
+        選択可能な行動 [n_envs, n_agents, n_actions] をまとめて返す
+        """
+        pos = state["pos"]
+        n = pos.shape[0]
+        points, _ = ray_cast(pos, self.laser_directions, self.lidar_range, self.segments)
+        laser_distances = (
+            th.sqrt(th.sum((points - pos[:, None, :]) ** 2, dim=-1)) / self.lidar_range
+        )
+        goal_positions = (self.goal_centers[None] - pos[:, None, :]) / self.scale
+        true_goal = self._one_hot(state["true_goal"], 2)
+        message = self._one_hot(state["channel"], self.channel_size)
+
+        zeros = th.zeros(n, 2, dtype=self.dtype, device=self.device)
+        # RA: ゴール1, 2の相対座標 + LiDAR + メッセージ
+        ra_obs = th.cat((zeros, goal_positions.reshape(n, -1), laser_distances, message), dim=-1)
+        # SA: どちらが正解のゴールか（それ以外は0）
+        sa_obs = th.cat(
+            (true_goal, th.zeros(n, self.obs_size - 2, dtype=self.dtype, device=self.device)),
+            dim=-1,
+        )
+        obs = th.stack((ra_obs, sa_obs), dim=1)
+
+        goal_pos = goal_positions.gather(
+            1, state["true_goal"][:, None, None].expand(-1, 1, 2)
+        )[:, 0]
+        env_state = th.cat((true_goal, goal_pos, laser_distances, message), dim=-1)
+        return obs, env_state, self.avail_actions
+
+    # ---------------- VectorCrossroadsEnv と同じインターフェース ----------------
+
+    def reset(self, episode=None, test_mode=False, print_log=False):
+        self.test_mode = test_mode
+        prev_true_goal = self.prev_true_goal if self.state is None else self.state["prev_true_goal"]
+        self.state = self.initial_state(prev_true_goal)
+        obs, env_state, _ = self.observe(self.state)
+        return obs, env_state
+
+    def step(self, actions: th.Tensor):
+        self.state, reward, terminated, info = self.transition(self.state, actions)
+        return reward, terminated, info
+
+    def get_obs(self) -> th.Tensor:
+        return self.observe(self.state)[0]
+
+    def get_state(self) -> th.Tensor:
+        return self.observe(self.state)[1]
+
+    def get_avail_actions(self) -> th.Tensor:
+        return self.avail_actions
+
+    def render(self, mode="human"):
+        raise NotImplementedError("Use CrossroadsEnv to render a single environment")
+
+    def close(self):
+        return
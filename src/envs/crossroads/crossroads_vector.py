@@ -0,0 +1,288 @@
+import numpy as np
+from typing import Tuple
+
+from envs.physics import rect_from_center, rects_collide, ray_cast
+from envs.crossroads import scenarios
+from envs.crossroads.world import TwoCrossroadsWorld
+
+
+# RAの行動ごとの移動量 (x, y): 左・右・上・下
+ACTION_MOVES = np.array(
+    [
+        [-1.0, 0.0],
+        [1.0, 0.0],
+        [0.0, -1.0],
+        [0.0, 1.0],
+    ]
+)
+
+
+class VectorCrossroadsEnv:
+    """
+    CrossroadsEnv を n_envs 個まとめて動かすベクトル化環境
+
+    各環境の状態（RAの位置・正解のゴール・メッセージなど）は先頭の次元が n_envs の
+    NumPy配列で持ち、行動・衝突判定・ゴール判定・報酬・LiDARを全環境まとめて計算する。
+    エピソードが終了した環境は step() の中で自動的にリセットされる。
+
+    get_obs / get_state / get_avail_actions は
+    [n_envs, n_agents, obs_size], [n_envs, state_size], [n_envs, n_agents, n_actions]
+    の配列を返す（EpisodeBatch.update にそのまま渡せる）
+
+    NOTE: CrossroadsEnv.get_state は直前の get_obs で計算したLiDARを使い回すが、
+    こちらは常に現在の位置のLiDARを使う
+    """
+
+    def __init__(
+        self,
+        n_envs: int,
+        episode_limit: int,
+        agent_velocity: float,
+        channel_size: int,
+        lidar_angle: float,
+        lidar_interval: float,
+        reward_success: float,
+        reward_failure: float,
+        reward_step: float,
+        n_goals: int,
+        seed=None,
+        debug: bool = False,
+        enable_render: bool = False,
+        test_mode: bool = False,
+        auto_reset: bool = True,
+        scenario=None,
+        scenario_pool: int = 0,
+        scenario_cache_dir: str = None,
+    ):
+        self.n_envs = n_envs
+        self.episode_limit = episode_limit
+        self.debug = debug
+        self.n_goals = n_goals
+        self.lidar_angle = lidar_angle
+        self.lidar_interval = lidar_interval
+        self.reward_success = reward_success
+        self.reward_failure = reward_failure
+        self.reward_step = reward_step
+        self.agent_velocity = agent_velocity
+        self.channel_size = channel_size
+        self.auto_reset = auto_reset
+        self.test_mode = test_mode
+
+        # マップの形状は1つの世界から取り出して全環境で共有する
+        assert scenario_pool == 0, "All environments share one map (scenario_pool is not supported)"
+        if scenario is not None:
+            scenario = scenarios.get_scenario(scenario, cache_dir=scenario_cache_dir)
+        world = TwoCrossroadsWorld(
+            agent_velocity, channel_size, lidar_angle, lidar_interval, scenario
+        )
+        physics = world.physics
+        self.WIDTH = world.WIDTH
+        self.HEIGHT = world.HEIGHT
+        self.lidar_range = world.lidar_range
+        self.agent_start = np.array(world.AGENT_POS, dtype=np.float64)
+        self.agent_size = physics.size[world.r_agent.body]
+        self.segments = physics.segments
+        self.wall_rects = physics.wall_rects
+        self.goal_rects = physics.areas[world.goals]
+        self.goal_centers = world.goal_centers
+        self.laser_directions = world.r_agent.laser_directions
+        self.scale = np.array([self.WIDTH, self.HEIGHT], dtype=np.float64)
+
+        self.n_agents = len(world.agents)
+        self.n_lasers = world.get_num_lasers()
+        self.get_obs_size()
+        self.get_total_actions()
+
+        # 各環境の状態
+        self.agent_pos = np.zeros((n_envs, 2))
+        self.true_goal = np.zeros(n_envs, dtype=np.int64)
+        self.prev_true_goal = np.zeros(n_envs, dtype=np.int64)
+        # メッセージ（None は -1 で表す）
+        self.channel = np.full(n_envs, -1, dtype=np.int64)
+        self.episode_steps = np.zeros(n_envs, dtype=np.int64)
+
+        self._episode_count = 0
+        self._total_steps = 0
+        self.success_count = 0
+        self.timeout_count = 0
+
+        # LiDARの結果はステップ内で使い回す
+        self._laser_distances = None
+
+    def get_env_info(self) -> dict:
+        """
+        環境の情報を取得する（1環境あたり）
+        """
+        return {
+            "state_shape": self.get_state_size(),
+            "obs_shape": self.get_obs_size(),
+            "n_actions": self.get_total_actions(),
+            "n_agents": self.n_agents,
+            "episode_limit": self.episode_limit,
+            "n_envs": self.n_envs,
+        }
+
+    def get_obs_size(self):
+        # どちらがゴールか[2] + ゴール1相対座標[2] + ゴール2相対座標[2] + LiDAR[] + メッセージ[]
+        self.obs_size = 2 + 4 + self.n_lasers + self.channel_size
+        return self.obs_size
+
+    def get_state_size(self):
+        # どちらがゴールか[2] + ゴール相対座標[2] +　LiDAR[] メッセージ[]
+        return 2 + 2 + self.n_lasers + self.channel_size
+
+    def get_total_actions(self):
+        # 上下左右移動[4] + メッセージ送信[channel_size]
+        self.n_actions = 4 + self.channel_size
+        return self.n_actions
+
+    def reset(self, episode=None, test_mode=False, print_log=False, mask=None):
+        """
+        環境をリセットする
+        mask（[n_envs] のbool配列）を渡すとその環境だけリセットする
+
+        戻り値:
+            - observations: [n_envs, n_agents, obs_size]
+            - states: [n_envs, state_size]
+        """
+        if mask is None:
+            mask = np.ones(self.n_envs, dtype=bool)
+            self.test_mode = test_mode
+
+        self.agent_pos[mask] = self.agent_start
+        # CrossroadsEnv と同じく正解のゴールは環境ごとに交互に入れ替える
+        self.true_goal[mask] = 1 - self.prev_true_goal[mask]
+        self.prev_true_goal[mask] = self.true_goal[mask]
+        self.channel[mask] = -1
+        self.episode_steps[mask] = 0
+        self._episode_count += int(mask.sum())
+        self._laser_distances = None
+
+        return self.get_obs(), self.get_state()
+
+    def step(self, actions) -> Tuple[np.ndarray, np.ndarray, dict]:
+        """
+        全環境の行動を実行して1ステップ進める
+        actions: [n_envs, n_agents]（RA, SAの順）
+
+        戻り値:
+            - reward: [n_envs]
+            - terminated: [n_envs]
+            - info: is_success, timeout（いずれも [n_envs]）
+        """
+        actions = np.asarray(actions).reshape(self.n_envs, self.n_agents)
+        ra_actions, sa_actions = actions[:, 0], actions[:, 1]
+        assert (ra_actions <= 3).all(), "Invalid action for Robot Agent"
+        assert (
+            (sa_actions >= 4) & (sa_actions <= 4 + self.channel_size)
+        ).all(), "Invalid action for Message Agent"
+
+        # RAの移動とSAのメッセージ送信
+        self.agent_pos += ACTION_MOVES[ra_actions] * self.agent_velocity
+        self.channel[:] = sa_actions - 4
+        self._laser_distances = None
+
+        self.episode_steps += 1
+        if not self.test_mode:
+            self._total_steps += self.n_envs
+
+        # 終了判定（正解のゴールを先に判定する）
+        env_index = np.arange(self.n_envs)
+        rects = rect_from_center(self.agent_pos, self.agent_size)
+        in_goals = rects_collide(rects[:, None, :], self.goal_rects[None])  # [n_envs, n_goals]
+        goal_reached = in_goals[env_index, self.true_goal]
+        collided = ~goal_reached & (
+            rects_collide(rects[:, None, :], self.wall_rects[None]).any(axis=-1)
+            | in_goals[env_index, 1 - self.true_goal]
+        )
+        timeout = ~goal_reached & ~collided & (self.episode_steps >= self.episode_limit)
+        terminated = goal_reached | collided | timeout
+
+        self.success_count += int(goal_reached.sum())
+        self.timeout_count += int(timeout.sum())
+
+        # 報酬
+        reward = np.where(
+            goal_reached,
+            self.reward_success,
+            np.where(collided, self.reward_failure, self.reward_step),
+        ).astype(np.float64)
+
+        info = {
+            "is_success": goal_reached,
+            "timeout": timeout,
+        }
+
+        if self.auto_reset and terminated.any():
+            self.reset(mask=terminated)
+
+        return reward, terminated, info
+
+    def laser_scan(self) -> np.ndarray:
+        """
+        全環境のLiDAR [n_envs, n_lasers]（正規化済み）
+        """
+        if self._laser_distances is None:
+            points, _ = ray_cast(
+                self.agent_pos, self.laser_directions, self.lidar_range, self.segments
+            )
+            distances = np.sqrt(np.sum((points - self.agent_pos[:, None, :]) ** 2, axis=-1))
+            self._laser_distances = distances / self.lidar_range
+        return self._laser_distances
+
+    def _one_hot(self, values, length) -> np.ndarray:
+        """
+        values が -1 (None) の環境は全て0になる
+        """
+        one_hot = np.zeros((len(values), length))
+        valid = values >= 0
+        one_hot[valid, values[valid]] = 1
+        return one_hot
+
+    def get_obs(self) -> np.ndarray:
+        """
+        全環境・全エージェントの観測 [n_envs, n_agents, obs_size]
+        観測できない所は0で埋める
+        """
+        obs = np.zeros((self.n_envs, self.n_agents, self.obs_size))
+
+        # RA: ゴール1, 2の相対座標 + LiDAR + メッセージ
+        goal_positions = (self.goal_centers[None] - self.agent_pos[:, None, :]) / self.scale
+        obs[:, 0, 2:6] = goal_positions.reshape(self.n_envs, -1)
+        obs[:, 0, 6 : 6 + self.n_lasers] = self.laser_scan()
+        obs[:, 0, 6 + self.n_lasers :] = self._one_hot(self.channel, self.channel_size)
+
+        # SA: どちらが正解のゴールか
+        obs[:, 1, 0:2] = self._one_hot(self.true_goal, 2)
+
+        return obs.astype(np.float32)
+
+    def get_state(self) -> np.ndarray:
+        """
+        全環境のグローバル状態 [n_envs, state_size]
+        """
+        true_goal = self._one_hot(self.true_goal, 2)
+        goal_pos = (self.goal_centers[self.true_goal] - self.agent_pos) / self.scale
+        message = self._one_hot(self.channel, self.channel_size)
+
+        state = np.concatenate((true_goal, goal_pos, self.laser_scan(), message), axis=-1)
+        return state.astype(np.float32)
+
+    def get_avail_actions(self) -> np.ndarray:
+        """
+        全環境・全エージェントの選択可能な行動のマスク [n_envs, n_agents, n_actions]
+        RAは移動、SAはメッセージ送信のみ選択可能
+        """
+        avail_mask = np.array(
+            [
+                [1] * 4 + [0] * self.channel_size,
+                [0] * 4 + [1] * self.channel_size,
+            ]
+        )
+        return np.broadcast_to(avail_mask, (self.n_envs, self.n_agents, self.n_actions)).copy()
+
+    def render(self, mode="human"):
+        raise NotImplementedError("Use CrossroadsEnv to render a single environment")
+
+    def close(self):
+        return
@@ -0,0 +1,99 @@
+"""
+TwoCrossroadsWorld のマップ（シナリオ）
+
+どの関数も envs.scenario の形式のシナリオの辞書を返す
+    - spawns[0]: Robot Agentの初期位置
+    - areas: ゴール（左から順に。正解はエピソードごとに入れ替わる）
+"""
+import numpy as np
+
+from envs.scenario import compile_scenario, resolve_scenario
+
+
+def two_crossroads(road_width=500, road_height=150, goal_offset=40, goal_size=50, border_width=2) -> dict:
+    """
+    横長の道の左右の端にゴールがあり、中央から出発するマップ（TwoCrossroadsWorld の既定）
+    """
+    return {
+        "name": "two_crossroads",
+        "width": road_width,
+        "height": road_height,
+        "border_width": border_width,
+        "areas": [
+            [goal_offset + goal_size // 2, road_height // 2, goal_size],
+            [road_width - goal_offset - goal_size // 2, road_height // 2, goal_size],
+        ],
+        "spawns": [[road_width // 2, road_height // 2]],
+    }
+
+
+def random_crossroads(
+    seed=0,
+    road_width=500,
+    road_height=150,
+    goal_size=50,
+    max_goal_offset=120,
+    max_obstacles=2,
+    obstacle_size=40,
+    agent_size=30,
+    border_width=2,
+    max_tries=100,
+) -> dict:
+    """
+    道の大きさは既定のマップと同じで、ゴールの位置と道の途中の障害物を seed から決めたマップ
+    どちらのゴールにも通れないマップは作り直す
+    """
+    rng = np.random.RandomState(seed)
+    spawn = [road_width // 2, road_height // 2]
+    # 障害物は出発地点とゴールの間に置く
+    margin = agent_size + obstacle_size // 2
+
+    for _ in range(max_tries):
+        offsets = rng.randint(border_width + agent_size // 2, max_goal_offset + 1, size=2)
+        goal_ys = rng.randint(goal_size // 2, road_height - goal_size // 2, size=2)
+        goals = [
+            [int(offsets[0]) + goal_size // 2, int(goal_ys[0]), goal_size],
+            [road_width - int(offsets[1]) - goal_size // 2, int(goal_ys[1]), goal_size],
+        ]
+        walls = []
+        for _ in range(rng.randint(0, max_obstacles + 1)):
+            side = rng.randint(0, 2)
+            if side == 0:
+                low, high = goals[0][0] + goal_size // 2 + agent_size, spawn[0] - margin - obstacle_size
+            else:
+                low, high = spawn[0] + margin, goals[1][0] - goal_size // 2 - agent_size - obstacle_size
+            if high <= low:
+                continue
+            x = int(rng.randint(low, high))
+            y = int(rng.randint(0, road_height - obstacle_size))
+            walls.append([x, y, obstacle_size, obstacle_size])
+        spec = {
+            "name": "random_crossroads",
+            "width": road_width,
+            "height": road_height,
+            "border_width": border_width,
+            "walls": walls,
+            "areas": goals,
+            "spawns": [spawn],
+        }
+        scenario = compile_scenario(spec)
+        if all(scenario.connected(spawn, goal[:2], clearance=agent_size / 2) for goal in goals):
+            return spec
+    raise RuntimeError("Could not generate a solvable crossroads map (seed={})".format(seed))
+
+
+SCENARIOS = {
+    "two_crossroads": two_crossroads,
+    "random_crossroads": random_crossroads,
+}
+
+
+def get_scenario(scenario=None, seed=None, cache_dir=None, **kwargs):
+    """
+    名前・パス・辞書からコンパイル済みのシナリオを取得する（None は既定のマップ）
+    """
+    if scenario is None:
+        scenario = "two_crossroads"
+    if seed is not None:
+        kwargs["seed"] = seed
+    return resolve_scenario(scenario, SCENARIOS, cache_dir=cache_dir, **kwargs)
@@ -4,14 +4,20 @@ import pygame
 import random
 from typing import List, Tuple
 
-from envs.crossroads.objects import Goal, Room, Wall, Border, Guard, Orientation
+from envs.physics import PhysicsCore
+from envs.scenario import Scenario
+from envs.crossroads import scenarios
+from envs.crossroads.objects import Goal, Room, Wall, Border, Body, Orientation
 from envs.crossroads.agents import RobotAgent, SensorAgent, Agent
 from envs.crossroads.utils import one_hot_encode
+from utils.profiler import profiler
 
 
 class World:
     def __init__(self):
         self.channel = None
+        self.physics: PhysicsCore = None
+        # 以下は描画用のスプライト（draw()の初回に作る）
         self.players: pygame.sprite.Group = None
         self.maps: pygame.sprite.Group = None
         self.walls: List[Wall] = None
@@ -54,6 +60,7 @@ class TwoCrossroadsWorld(World):
         channel_size: int,
         lidar_angle: float,
         lidar_interval: float,
+        scenario: Scenario = None,
     ):
 
         self.agent_velocity = agent_velocity
@@ -62,13 +69,25 @@ class TwoCrossroadsWorld(World):
         self.lidar_angle = lidar_angle
         self.lidar_interval = lidar_interval
 
-        self.WIDTH = self.ROAD_WIDTH
-        self.HEIGHT = self.ROAD_HEIGHT
+        # マップ（シナリオ）は省略するとクラス定数から作る既定のもの
+        if scenario is None:
+            scenario = scenarios.get_scenario(
+                "two_crossroads",
+                road_width=self.ROAD_WIDTH,
+                road_height=self.ROAD_HEIGHT,
+                goal_offset=self.GOAL_OFFSET,
+                goal_size=self.GOAL_SIZE,
+                border_width=self.BORDER_WIDTH,
+            )
+        self.WIDTH = scenario.width
+        self.HEIGHT = scenario.height
 
         self.lidar_range = math.sqrt(self.WIDTH**2 + self.HEIGHT**2)
 
+        self.physics = PhysicsCore()
 
         self.r_agent = RobotAgent(
+            self.physics,
             self.AGENT_COLOR,
             self.AGENT_SIZE,
             self.agent_velocity,
@@ -79,66 +98,63 @@ class TwoCrossroadsWorld(World):
         self.s_agent = SensorAgent()
         self.agents: List[Agent] = [self.r_agent, self.s_agent]
 
-        self.AGENT_POS = (
-            self.WIDTH // 2,
-            self.HEIGHT // 2,
-        )
-
         self.channel = None
 
         self.true_goal = 0
         self.prev_true_goal = 0
 
-        self.players = pygame.sprite.Group(self.r_agent)
+        self.laser_points = []
 
-        self.__create_map()
+        # 描画用のスプライトは draw() で初めて作る（ディスプレイなしでも動くように）
+        self.players = None
+        self.maps = None
+        self.borders = None
 
-    def __create_map(self):
-        self.room = Room(self.WIDTH, self.HEIGHT, self.FLOOR_COLOR)
-        self.goal1 = Goal(
-            self.GOAL_OFFSET + self.GOAL_SIZE // 2,
-            self.HEIGHT // 2,
-            self.GOAL_SIZE,
-            self.GOAL_FALSE_COLOR,
-        )
-        self.goal2 = Goal(
-            self.WIDTH - self.GOAL_OFFSET - self.GOAL_SIZE // 2,
-            self.HEIGHT // 2,
-            self.GOAL_SIZE,
-            self.GOAL_FALSE_COLOR,
-        )
-        self.goals = [self.goal1, self.goal2]
+        self.load_scenario(scenario)
 
-        self.maps = pygame.sprite.Group(self.room, self.goal1, self.goal2)
+    def load_scenario(self, scenario: Scenario):
+        """
+        マップの形状（壁の線分・ゴールの領域・初期位置）をシナリオから物理コアに登録する
+        エピソードごとにマップを変える場合は reset() の前に呼ぶ（外周の大きさは変えないこと）
+        """
+        if getattr(self, "scenario", None) is scenario:
+            return
+        self.scenario = scenario
+        self.physics.load_scenario(scenario)
+        # ゴールの中心座標 [n_goals, 2]
+        self.goal_centers = scenario.area_centers.copy()
+        self.goals = list(range(len(self.goal_centers)))
+        self.AGENT_POS = tuple(scenario.spawns[0])
+
+        self.border_specs = [
+            (start, length, Orientation.HORIZONTAL if horizontal else Orientation.VERTICAL)
+            for start, length, horizontal in scenario.border_specs()
+        ]
+        self.wall_specs = [tuple(box) for box in scenario.wall_boxes.tolist()]
+
+        # 描画用のスプライトは次の draw() で作り直す
+        self.players = None
+
+    def __create_view(self):
+        """
+        描画用のスプライトを作る
+        """
+        self.room = Room(self.WIDTH, self.HEIGHT, self.FLOOR_COLOR)
+        self.goal_sprites = [
+            Goal(*center.astype(int), int(size), self.GOAL_FALSE_COLOR)
+            for center, size in zip(self.goal_centers, self.scenario.area_sizes)
+        ]
+        self.maps = pygame.sprite.Group(self.room, *self.goal_sprites)
+        for wall_x, wall_y, wall_width, wall_height in self.wall_specs:
+            self.maps.add(Wall(wall_x, wall_y, wall_width, wall_height, self.WALL_COLOR))
         self.borders = pygame.sprite.Group(
-            Border(
-                (0, 0),
-                self.WIDTH,
-                Orientation.HORIZONTAL,
-                self.BORDER_WIDTH,
-                self.BORDER_COLOR,
-            ),
-            Border(
-                (self.WIDTH, 0),
-                self.HEIGHT,
-                Orientation.VERTICAL,
-                self.BORDER_WIDTH,
-                self.BORDER_COLOR,
-            ),
-            Border(
-                (0, self.HEIGHT),
-                self.WIDTH,
-                Orientation.HORIZONTAL,
-                self.BORDER_WIDTH,
-                self.BORDER_COLOR,
-            ),
-            Border(
-                (0, 0),
-                self.HEIGHT,
-                Orientation.VERTICAL,
-                self.BORDER_WIDTH,
-                self.BORDER_COLOR,
-            ),
+            *[
+                Border(start, length, orientation, self.BORDER_WIDTH, self.BORDER_COLOR)
+                for start, length, orientation in self.border_specs
+            ]
+        )
+        self.players = pygame.sprite.Group(
+            Body(self.physics, self.r_agent.body, self.AGENT_COLOR, circle=True)
         )
 
     def reset(self):
@@ -147,16 +163,13 @@ class TwoCrossroadsWorld(World):
         self.s_agent.reset()
         self.true_goal = random.randint(0, 1)
 
+        # 正解のゴールは交互に入れ替える
         if self.prev_true_goal == 1:
             self.true_goal = 0
             self.prev_true_goal = 0
-            self.goal1.change_color(self.GOAL_TRUE_COLOR)
-            self.goal2.change_color(self.GOAL_FALSE_COLOR)
         else:
             self.true_goal = 1
             self.prev_true_goal = 1
-            self.goal1.change_color(self.GOAL_FALSE_COLOR)
-            self.goal2.change_color(self.GOAL_TRUE_COLOR)
 
     def step(self):
         return
@@ -168,101 +181,74 @@ class TwoCrossroadsWorld(World):
         return self.channel
 
     def draw(self, screen):
+        if self.players is None:
+            self.__create_view()
+        for i, goal in enumerate(self.goal_sprites):
+            goal.change_color(
+                self.GOAL_TRUE_COLOR if i == self.true_goal else self.GOAL_FALSE_COLOR
+            )
+        for player in self.players:
+            player.sync()
+
         self.maps.draw(screen)
         self.borders.draw(screen)
         self.__draw_lasers(screen)
         self.players.draw(screen)
 
     def check_goal(self):
-        if self.true_goal == 0:
-            return self.r_agent.rect.colliderect(self.goal1.rect)
-        else:
-            return self.r_agent.rect.colliderect(self.goal2.rect)
+        return self.physics.in_area(self.r_agent.body, self.goals[self.true_goal])
 
     def check_collision(self):
-        if pygame.sprite.spritecollideany(self.r_agent, self.borders) is not None:
+        if self.physics.hits_wall(self.r_agent.body):
             return True
-            
-        if self.true_goal == 0:
-            return self.r_agent.rect.colliderect(self.goal2.rect)
-        else:
-            return self.r_agent.rect.colliderect(self.goal1.rect)
+
+        # 正解でない方のゴールに入ったら失敗
+        return self.physics.in_area(self.r_agent.body, self.goals[1 - self.true_goal])
 
     def __draw_lasers(self, screen):
         for intersection in self.laser_points:
             pygame.draw.line(screen, self.LASER_COLOR, self.r_agent.pos, intersection)
             pygame.draw.circle(screen, self.AGENT_COLOR, intersection, 2.5)
 
-    def __get_obstacle_lines(self) -> List:
-        """
-        レーザーとの交点を計算するために、すべての障害物の線分を取得する
-        """
-        lines = []
-        for border in self.borders:
-            lines.append((border.start, border.end))
-        return lines
-
     def get_num_lasers(self) -> int:
         return self.lidar_angle // self.lidar_interval
 
     def laser_scan(self) -> np.ndarray:
-        self.laser_points = self.r_agent.laser_scan(self.__get_obstacle_lines())
-        self.laser_distances = np.array([
-            math.sqrt(
-                (point[0] - self.r_agent.pos.x) ** 2
-                + (point[1] - self.r_agent.pos.y) ** 2
-            )
-            for point in self.laser_points
-        ]) / self.lidar_range
+        with profiler.timer("laser_scan"):
+            self.laser_points = self.r_agent.laser_scan()
+        self.laser_distances = np.sqrt(
+            np.sum((self.laser_points - self.r_agent.pos) ** 2, axis=-1)
+        ) / self.lidar_range
         return self.laser_distances
 
-    def get_relative_goal_position(self, goal: Goal):
-        return np.array(
-            [
-                (goal.rect.centerx - self.r_agent.pos.x) / self.WIDTH,
-                (goal.rect.centery - self.r_agent.pos.y) / self.HEIGHT,
-            ]
+    def get_relative_goal_position(self, goal: int):
+        return (self.goal_centers[goal] - self.r_agent.pos) / np.array(
+            [self.WIDTH, self.HEIGHT]
         )
 
     def get_relative_goals_positions(self):
-
-        positions = []
-        for goal in self.goals:
-            positions.append(
-                self.get_relative_goal_position(goal)
-            )
-
-        return np.concatenate(positions)
+        positions = (self.goal_centers - self.r_agent.pos) / np.array(
+            [self.WIDTH, self.HEIGHT]
+        )
+        return positions.reshape(-1)
 
     def get_relative_true_goal_position(self):
-        if self.true_goal == 0:
-            return self.get_relative_goal_position(self.goal1)
-        else:
-            return self.get_relative_goal_position(self.goal2)
-
+        return self.get_relative_goal_position(self.true_goal)
 
     def get_normalized_agent_position(self):
-        return np.array([self.r_agent.pos.x / self.WIDTH])
+        return np.array([self.r_agent.pos[0] / self.WIDTH])
 
     def get_normalized_goal_position(self):
-        if self.true_goal == 0:
-            goal_x = self.goal1.rect.center[0]
-        else:
-            goal_x = self.goal2.rect.center[0]
+        goal_x = self.goal_centers[self.true_goal][0]
 
         return np.array([goal_x / self.WIDTH])
 
     def get_distance_from_goal(self):
-        if self.true_goal == 0:
-            goal_x = self.goal1.rect.center[0]
-            goal_y = self.goal1.rect.center[1]
-        else:
-            goal_x = self.goal2.rect.center[0]
-            goal_y = self.goal2.rect.center[1]
+        goal_x, goal_y = self.goal_centers[self.true_goal]
 
         return math.sqrt(
-            (goal_x - self.r_agent.pos.x) ** 2
-            + (goal_y - self.r_agent.pos.y) ** 2
+            (goal_x - self.r_agent.pos[0]) ** 2
+            + (goal_y - self.r_agent.pos[1]) ** 2
         ) / self.lidar_range
 
 
@@ -7,6 +7,7 @@ import datetime
 from typing import List, Tuple
 from envs.diamond.utils import one_hot_encode
 
+from envs.diamond import scenarios
 from envs.diamond.world import MuseumWorld
 from envs.diamond.agents import Direction
 
@@ -66,10 +67,10 @@ class DiamondEnv:
         debug: bool = False,
         enable_render: bool = False,
         test_mode: bool = False,
+        scenario=None,
+        scenario_pool: int = 0,
+        scenario_cache_dir: str = None,
     ):
-        # os.environ["SDL_VIDEODRIVER"] = "dummy"
-        pygame.init()
-        pygame.display.set_caption("Diamond Env")
         np.set_printoptions(precision=2, suppress=True)
 
         self.episode_limit = episode_limit
@@ -83,12 +84,27 @@ class DiamondEnv:
         self.lidar_interval = lidar_interval
         self.enable_render = enable_render
 
+        # マップ: scenario（scenarios.py の名前・パス・辞書。None は既定のマップ）
+        # scenario_pool > 0 ならエピソードごとに seed が 0〜scenario_pool-1 のマップから選ぶ
+        # コンパイル済みのマップはキャッシュされる（scenario_cache_dir を指定するとディスクにも）
+        self.scenario = scenario
+        self.scenario_pool = scenario_pool
+        self.scenario_cache_dir = scenario_cache_dir
+        if scenario_pool > 0:
+            self.scenario = scenario or "random_museum"
+            initial_scenario = self.__get_scenario(seed=0)
+        elif scenario is not None:
+            initial_scenario = self.__get_scenario()
+        else:
+            initial_scenario = None
+
         self.world = MuseumWorld(
             self.agent_velocity,
             self.guard_velocity,
             self.channel_size,
             self.lidar_angle,
             self.lidar_interval,
+            initial_scenario,
         )
         self.n_agents = len(self.world.agents())
 
@@ -97,10 +113,6 @@ class DiamondEnv:
         self.window = None
         self.WINDOW_WIDTH = self.world.WIDTH + self.SA_INFO_WIDTH + 2 * self.OFFSET
         self.WINDOW_HEIGHT = self.world.HEIGHT + self.INFO_HEIGHT + self.OFFSET
-        self.map_screen = pygame.Surface((self.world.WIDTH, self.world.HEIGHT))
-        self.info_screen = pygame.Surface((self.WINDOW_WIDTH, self.INFO_HEIGHT))
-        self.sa_screen = pygame.Surface((self.SA_INFO_WIDTH, self.world.HEIGHT))
-        self.clock = pygame.time.Clock()
 
         self._episode_count = 0
         self._episode_steps = 0
@@ -117,6 +129,25 @@ class DiamondEnv:
 
         self.now_str = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
 
+        self.test_mode = test_mode
+
+    def __get_scenario(self, seed=None):
+        return scenarios.get_scenario(self.scenario, seed=seed, cache_dir=self.scenario_cache_dir)
+
+    def __setup_render(self):
+        """
+        描画に必要なpygameの初期化を行う
+        学習時は描画しないので、初めて render() が呼ばれた時だけ行う
+        """
+        pygame.init()
+        pygame.display.set_caption("Diamond Env")
+
+        self.window = pygame.display.set_mode((self.WINDOW_WIDTH, self.WINDOW_HEIGHT))
+        self.map_screen = pygame.Surface((self.world.WIDTH, self.world.HEIGHT))
+        self.info_screen = pygame.Surface((self.WINDOW_WIDTH, self.INFO_HEIGHT))
+        self.sa_screen = pygame.Surface((self.SA_INFO_WIDTH, self.world.HEIGHT))
+        self.clock = pygame.time.Clock()
+
         self.font1 = pygame.font.SysFont(self.FONT_NAME, 45)
         self.font2 = pygame.font.SysFont(self.FONT_NAME, 30)
         self.font3 = pygame.font.SysFont(self.FONT_NAME, 24)
@@ -124,8 +155,6 @@ class DiamondEnv:
         self.font5 = pygame.font.SysFont(self.FONT_NAME, 16)
         self.font6 = pygame.font.SysFont(self.FONT_NAME, 14)
 
-        self.test_mode = test_mode
-
     def get_env_info(self) -> dict:
         """
         環境の情報を取得する
@@ -272,6 +301,8 @@ class DiamondEnv:
             - observations: 観測値
             - states: グローバル状態
         """
+        if self.scenario_pool > 0:
+            self.world.load_scenario(self.__get_scenario(seed=random.randrange(self.scenario_pool)))
         self.world.reset(random_direction=True)
 
         self._episode_steps = 0
@@ -457,11 +488,9 @@ class DiamondEnv:
         """
         環境を描画する
         """
-        self.clock.tick(self.FPS)
         if self.window is None:
-            self.window = pygame.display.set_mode(
-                (self.WINDOW_WIDTH, self.WINDOW_HEIGHT)
-            )
+            self.__setup_render()
+        self.clock.tick(self.FPS)
         self.__draw()
         pygame.event.pump()
         pygame.display.flip()
@@ -589,4 +618,6 @@ class DiamondEnv:
         """
         環境を閉じる
         """
-        pygame.quit()
+        if self.window is not None:
+            pygame.quit()
+            self.window = None
@@ -0,0 +1,260 @@
+import torch as th
+from typing import Dict, Tuple
+
+from envs.physics_torch import rect_from_center, rects_collide, ray_cast
+from envs.diamond import scenarios
+from envs.diamond.world import MuseumWorld
+
+
+class TorchDiamondEnv:
+    """
+    DiamondEnv を n_envs 個まとめて torch のテンソル上で動かすバッチ環境
+
+    VectorDiamondEnv と同じ計算を torch で行う。状態・観測・行動がすべて
+    同じデバイス上のテンソルなので、方策の計算と合わせてホストとの変換なしで
+    ロールアウトできる（runners.fused_runner.FusedRunner を参照）
+
+    状態は辞書型のテンソル群で、純粋関数の transition() / observe() で更新・観測する
+    （torch.compile で1ステップを1つのグラフにできるように）
+        - pos: [n_envs, 2] RAの位置
+        - mileage: [n_envs] 総走行距離
+        - steps: [n_envs] エピソード内のステップ数
+        - active: [n_envs] エピソードが続いているか
+        - guard_path: [n_envs] 警備員の巡回方向
+        - channel: [n_envs] メッセージ（None は -1）
+    """
+
+    def __init__(
+        self,
+        n_envs: int,
+        episode_limit: int,
+        agent_velocity: float,
+        guard_velocity: float,
+        channel_size: int,
+        lidar_angle: float,
+        lidar_interval: float,
+        reward_success: float,
+        reward_failure: float,
+        seed=None,
+        debug: bool = False,
+        enable_render: bool = False,
+        test_mode: bool = False,
+        auto_reset: bool = True,
+        scenario=None,
+        scenario_pool: int = 0,
+        scenario_cache_dir: str = None,
+        device="cpu",
+        dtype=th.float32,
+    ):
+        self.n_envs = n_envs
+        self.episode_limit = episode_limit
+        self.debug = debug
+        self.reward_success = reward_success
+        self.reward_failure = reward_failure
+        self.agent_velocity = agent_velocity
+        self.guard_velocity = guard_velocity
+        self.channel_size = channel_size
+        self.lidar_angle = lidar_angle
+        self.lidar_interval = lidar_interval
+        self.auto_reset = auto_reset
+        self.test_mode = test_mode
+        self.device = device
+        self.dtype = dtype
+
+        self.generator = th.Generator(device=device)
+        if seed is not None:
+            self.generator.manual_seed(seed)
+
+        # マップの形状は1つの世界から取り出して全環境で共有する
+        assert scenario_pool == 0, "All environments share one map (scenario_pool is not supported)"
+        if scenario is not None:
+            scenario = scenarios.get_scenario(scenario, cache_dir=scenario_cache_dir)
+        world = MuseumWorld(
+            agent_velocity, guard_velocity, channel_size, lidar_angle, lidar_interval, scenario
+        )
+        physics = world.physics
+
+        def tensor(x, dtype=dtype):
+            return th.as_tensor(x, dtype=dtype, device=device)
+
+        self.WIDTH = world.WIDTH
+        self.HEIGHT = world.HEIGHT
+        self.lidar_range = world.lidar_range
+        self.agent_start = tensor(world.AGENT_POS)
+        self.agent_size = tensor(physics.size[world.r_agent.body], th.long)
+        self.segments = tensor(physics.segments)
+        self.wall_rects = tensor(physics.wall_rects, th.long)
+        self.goal_rect = tensor(physics.areas[world.goal], th.long)
+        self.goal_center = tensor(world.goal_center)
+        self.laser_directions = tensor(world.r_agent.laser_directions)
+        self.scale = tensor([self.WIDTH, self.HEIGHT])
+
+        self.n_agents = len(world.agents())
+        self.n_lasers = world.get_num_lasers()
+        self.get_obs_size()
+        self.get_total_actions()
+
+        # 行動ごとの移動量: 何もしない・左・右・上・下
+        self.action_moves = tensor(
+            [[0.0, 0.0], [-1.0, 0.0], [1.0, 0.0], [0.0, -1.0], [0.0, 1.0]]
+        ) * agent_velocity
+        # RAは移動する行動のみ選択可能
+        self.avail_actions = tensor(
+            [[0] + [1] * 4 + [0] * self.channel_size], th.int
+        ).expand(n_envs, -1, -1)
+
+        self.state = None
+
+    def get_env_info(self) -> dict:
+        """
+        環境の情報を取得する（1環境あたり）
+        """
+        return {
+            "state_shape": self.get_state_size(),
+            "obs_shape": self.get_obs_size(),
+            "n_actions": self.get_total_actions(),
+            "n_agents": self.n_agents,
+            "episode_limit": self.episode_limit,
+            "n_envs": self.n_envs,
+        }
+
+    def get_obs_size(self):
+        # ゴール相対座標 + レーザー
+        self.obs_size = self.n_lasers + 2
+        return self.obs_size
+
+    def get_state_size(self):
+        return self.get_obs_size()
+
+    def get_total_actions(self):
+        # 何もしない + 上下左右 + メッセージ送信
+        self.n_actions = 4 + self.channel_size + 1
+        return self.n_actions
+
+    # ---------------- 純粋関数 ----------------
+
+    def initial_state(self) -> Dict[str, th.Tensor]:
+        n = self.n_envs
+        return {
+            "pos": self.agent_start.expand(n, -1).clone(),
+            "mileage": th.zeros(n, dtype=self.dtype, device=self.device),
+            "steps": th.zeros(n, dtype=th.long, device=self.device),
+            "active": th.ones(n, dtype=th.bool, device=self.device),
+            "guard_path": th.randint(
+                0, 2, (n,), generator=self.generator, device=self.device
+            ),
+            "channel": th.full((n,), -1, dtype=th.long, device=self.device),
+        }
+
+    def reset_where(self, state, mask: th.Tensor) -> Dict[str, th.Tensor]:
+        """
+        mask が True の環境だけ初期状態に戻した状態を返す
+        """
+        initial = self.initial_state()
+        return {
+            k: th.where(mask.view(-1, *([1] * (v.dim() - 1))), initial[k], v)
+            for k, v in state.items()
+        }
+
+    def transition(self, state, actions: th.Tensor):
+        """
+        全環境の行動を実行した後の状態を返す
+        エピソードが終わっている環境（active = False）は何も変わらない
+        actions: [n_envs, n_agents]
+
+        戻り値:
+            - state: 次の状態
+            - reward: [n_envs]（終わっている環境は0）
+            - terminated: [n_envs] このステップでエピソードが終わったか
+            - info: is_success, timeout, mileage（いずれも [n_envs]）
+        """
+        active = state["active"]
+        ra_actions = actions[:, 0]
+
+        moving = active & (ra_actions != 0)
+        pos = th.where(active[:, None], state["pos"] + self.action_moves[ra_actions], state["pos"])
+        mileage = state["mileage"] + moving.to(self.dtype) * self.agent_velocity
+        steps = state["steps"] + active.long()
+
+        # 終了判定
+        rects = rect_from_center(pos, self.agent_size)
+        collided = active & rects_collide(rects[:, None, :], self.wall_rects).any(dim=-1)
+        goal_reached = active & ~collided & rects_collide(rects, self.goal_rect)
+        timeout = active & ~collided & ~goal_reached & (steps >= self.episode_limit)
+        terminated = collided | goal_reached | timeout
+
+        # 報酬
+        goal_distance = self.distance_from_goal(pos)
+        reward = th.where(
+            goal_reached,
+            th.full_like(goal_distance, self.reward_success),
+            th.where(collided | timeout, self.reward_failure - goal_distance, -goal_distance),
+        )
+        reward = reward * active.to(self.dtype)
+
+        next_state = {
+            "pos": pos,
+            "mileage": mileage,
+            "steps": steps,
+            "active": active & ~terminated,
+            "guard_path": state["guard_path"],
+            "channel": th.where(active, th.zeros_like(state["channel"]), state["channel"]),
+        }
+        info = {"is_success": goal_reached, "timeout": timeout, "mileage": mileage}
+        if self.auto_reset:
+            next_state = self.reset_where(next_state, terminated)
+        return next_state, reward, terminated, info
+
+    def distance_from_goal(self, pos: th.Tensor) -> th.Tensor:
+        """
+        エージェントとゴール間の正規化された距離 [n_envs]
+        """
+        return (
+            th.sqrt(
+                (pos[:, 0] - self.goal_center[0]) ** 2 + (pos[:, 1] - self.goal_center[1]) ** 2
+            )
+            / self.lidar_range
+        )
+
+    def observe(self, state) -> Tuple[th.Tensor, th.Tensor, th.Tensor]:
+        """
+        観測 [n_envs, n_agents, obs_size]、グローバル状態 [n_envs, state_size]、
+        選択可能な行動 [n_envs, n_agents, n_actions] をまとめて返す
+        """
+        pos = state["pos"]
+        points, _ = ray_cast(pos, self.laser_directions, self.lidar_range, self.segments)
+        laser_distances = (
+            th.sqrt(th.sum((points - pos[:, None, :]) ** 2, dim=-1)) / self.lidar_range
+        )
+        relative_goal_position = (self.goal_center - pos) / self.scale
+
+        env_state = th.cat((relative_goal_position, laser_distances), dim=-1)
+        obs = env_state[:, None, :]
+        return obs, env_state, self.avail_actions
+
+    # ---------------- VectorDiamondEnv と同じインターフェース ----------------
+
+    def reset(self, episode=None, test_mode=False, print_log=False):
+        self.test_mode = test_mode
+        self.state = self.initial_state()
+        obs, env_state, _ = self.observe(self.state)
+        return obs, env_state
+
+    def step(self, actions: th.Tensor):
+        self.state, reward, terminated, info = self.transition(self.state, actions)
+        return reward, terminated, info
+
+    def get_obs(self) -> th.Tensor:
+        return self.observe(self.state)[0]
+
+    def get_state(self) -> th.Tensor:
+        return self.observe(self.state)[1]
+
+    def get_avail_actions(self) -> th.Tensor:
+        return self.avail_actions
+
+    def render(self, mode="human"):
+        raise NotImplementedError("Use DiamondEnv to render a single environment")
+
+    def close(self):
+        return
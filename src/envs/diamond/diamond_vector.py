@@ -0,0 +1,279 @@
+import numpy as np
+from typing import Tuple
+
+from envs.physics import rect_from_center, rects_collide, ray_cast
+from envs.diamond.objects import Orientation
+from envs.diamond import scenarios
+from envs.diamond.world import MuseumWorld
+
+
+# 行動ごとの移動量 (x, y): 何もしない・左・右・上・下
+ACTION_MOVES = np.array(
+    [
+        [0.0, 0.0],
+        [-1.0, 0.0],
+        [1.0, 0.0],
+        [0.0, -1.0],
+        [0.0, 1.0],
+    ]
+)
+
+
+class VectorDiamondEnv:
+    """
+    DiamondEnv を n_envs 個まとめて動かすベクトル化環境
+
+    各環境の状態（エージェント・警備員の位置など）は先頭の次元が n_envs の
+    NumPy配列で持ち、行動・衝突判定・ゴール判定・報酬・LiDARを全環境まとめて計算する。
+    エピソードが終了した環境は step() の中で自動的にリセットされる。
+
+    get_obs / get_state / get_avail_actions は
+    [n_envs, n_agents, obs_size], [n_envs, state_size], [n_envs, n_agents, n_actions]
+    の配列を返す（EpisodeBatch.update にそのまま渡せる）
+
+    マップの形状は MuseumWorld の物理コアから取得するので、DiamondEnv と同じになる
+    """
+
+    def __init__(
+        self,
+        n_envs: int,
+        episode_limit: int,
+        agent_velocity: float,
+        guard_velocity: float,
+        channel_size: int,
+        lidar_angle: float,
+        lidar_interval: float,
+        reward_success: float,
+        reward_failure: float,
+        seed=None,
+        debug: bool = False,
+        enable_render: bool = False,
+        test_mode: bool = False,
+        auto_reset: bool = True,
+        scenario=None,
+        scenario_pool: int = 0,
+        scenario_cache_dir: str = None,
+    ):
+        self.n_envs = n_envs
+        self.episode_limit = episode_limit
+        self.debug = debug
+        self.reward_success = reward_success
+        self.reward_failure = reward_failure
+        self.agent_velocity = agent_velocity
+        self.guard_velocity = guard_velocity
+        self.channel_size = channel_size
+        self.lidar_angle = lidar_angle
+        self.lidar_interval = lidar_interval
+        self.auto_reset = auto_reset
+        self.test_mode = test_mode
+
+        self.rng = np.random.RandomState(seed)
+
+        # マップの形状は1つの世界から取り出して全環境で共有する
+        assert scenario_pool == 0, "All environments share one map (scenario_pool is not supported)"
+        if scenario is not None:
+            scenario = scenarios.get_scenario(scenario, cache_dir=scenario_cache_dir)
+        world = MuseumWorld(
+            agent_velocity, guard_velocity, channel_size, lidar_angle, lidar_interval, scenario
+        )
+        physics = world.physics
+        self.WIDTH = world.WIDTH
+        self.HEIGHT = world.HEIGHT
+        self.lidar_range = world.lidar_range
+        self.agent_start = np.array(world.AGENT_POS, dtype=np.float64)
+        self.guard_start = np.array(world.guard_start, dtype=np.float64)
+        self.agent_size = physics.size[world.r_agent.body]
+        self.segments = physics.segments
+        self.wall_rects = physics.wall_rects
+        self.goal_rect = physics.areas[world.goal]
+        self.goal_center = world.goal_center
+        self.laser_directions = world.r_agent.laser_directions
+        self.scale = np.array([self.WIDTH, self.HEIGHT], dtype=np.float64)
+
+        self.n_agents = len(world.agents())
+        self.n_lasers = world.get_num_lasers()
+        self.get_obs_size()
+        self.get_total_actions()
+
+        # 各環境の状態
+        self.agent_pos = np.zeros((n_envs, 2))
+        self.guard_pos = np.zeros((n_envs, 2))
+        self.guard_path = np.zeros(n_envs, dtype=np.int64)
+        # メッセージ（None は -1 で表す）
+        self.channel = np.full(n_envs, -1, dtype=np.int64)
+        self.mileage = np.zeros(n_envs)
+        self.episode_steps = np.zeros(n_envs, dtype=np.int64)
+
+        self._episode_count = 0
+        self._total_steps = 0
+        self.success_count = 0
+        self.timeout_count = 0
+
+        # LiDARの結果はステップ内で使い回す
+        self._laser_distances = None
+
+    def get_env_info(self) -> dict:
+        """
+        環境の情報を取得する（1環境あたり）
+        """
+        return {
+            "state_shape": self.get_state_size(),
+            "obs_shape": self.get_obs_size(),
+            "n_actions": self.get_total_actions(),
+            "n_agents": self.n_agents,
+            "episode_limit": self.episode_limit,
+            "n_envs": self.n_envs,
+        }
+
+    def get_obs_size(self):
+        # ゴール相対座標 + レーザー
+        self.obs_size = self.n_lasers + 2
+        return self.obs_size
+
+    def get_state_size(self):
+        return self.get_obs_size()
+
+    def get_total_actions(self):
+        # 何もしない + 上下左右 + メッセージ送信
+        self.n_actions = 4 + self.channel_size + 1
+        return self.n_actions
+
+    def reset(self, episode=None, test_mode=False, print_log=False, mask=None):
+        """
+        環境をリセットする
+        mask（[n_envs] のbool配列）を渡すとその環境だけリセットする
+
+        戻り値:
+            - observations: [n_envs, n_agents, obs_size]
+            - states: [n_envs, state_size]
+        """
+        if mask is None:
+            mask = np.ones(self.n_envs, dtype=bool)
+            self.test_mode = test_mode
+        n_reset = int(mask.sum())
+
+        self.agent_pos[mask] = self.agent_start
+        self.guard_pos[mask] = self.guard_start
+        # DiamondEnv と同じく警備員の巡回方向はランダム
+        self.guard_path[mask] = np.where(
+            self.rng.randint(0, 2, size=n_reset) == 0,
+            Orientation.HORIZONTAL.value,
+            Orientation.VERTICAL.value,
+        )
+        self.channel[mask] = -1
+        self.mileage[mask] = 0
+        self.episode_steps[mask] = 0
+        self._episode_count += n_reset
+        self._laser_distances = None
+
+        return self.get_obs(), self.get_state()
+
+    def step(self, actions) -> Tuple[np.ndarray, np.ndarray, dict]:
+        """
+        全環境の行動を実行して1ステップ進める
+        actions: [n_envs, n_agents]
+
+        戻り値:
+            - reward: [n_envs]
+            - terminated: [n_envs]
+            - info: is_success, timeout, mileage（いずれも [n_envs]）
+        """
+        actions = np.asarray(actions).reshape(self.n_envs, self.n_agents)
+        ra_actions = actions[:, 0]
+        assert (ra_actions <= 4).all(), "Invalid action for Robot Agent"
+
+        # 警備員の移動（DiamondEnvと同じく今は動かない）
+        self.channel[:] = 0
+
+        # エージェントの移動
+        moving = ra_actions != 0
+        self.agent_pos += ACTION_MOVES[ra_actions] * self.agent_velocity
+        self.mileage[moving] += self.agent_velocity
+        self._laser_distances = None
+
+        self.episode_steps += 1
+        if not self.test_mode:
+            self._total_steps += self.n_envs
+
+        # 終了判定
+        rects = rect_from_center(self.agent_pos, self.agent_size)
+        collided = rects_collide(rects[:, None, :], self.wall_rects[None]).any(axis=-1)
+        goal_reached = ~collided & rects_collide(rects, self.goal_rect)
+        timeout = ~collided & ~goal_reached & (self.episode_steps >= self.episode_limit)
+        terminated = collided | goal_reached | timeout
+
+        self.success_count += int(goal_reached.sum())
+        self.timeout_count += int(timeout.sum())
+
+        # 報酬
+        goal_distance = self.get_normalized_distance_from_goal()
+        reward = np.where(
+            goal_reached,
+            self.reward_success,
+            np.where(collided | timeout, self.reward_failure - goal_distance, -goal_distance),
+        )
+
+        info = {
+            "is_success": goal_reached,
+            "timeout": timeout,
+            "mileage": self.mileage.copy(),
+        }
+
+        if self.auto_reset and terminated.any():
+            self.reset(mask=terminated)
+
+        return reward, terminated, info
+
+    def get_normalized_distance_from_goal(self) -> np.ndarray:
+        """
+        エージェントとゴール間の正規化された距離 [n_envs]
+        """
+        return (
+            np.sqrt(
+                (self.agent_pos[:, 0] - self.goal_center[0]) ** 2
+                + (self.agent_pos[:, 1] - self.goal_center[1]) ** 2
+            )
+            / self.lidar_range
+        )
+
+    def laser_scan(self) -> np.ndarray:
+        """
+        全環境のLiDAR [n_envs, n_lasers]（正規化済み）
+        """
+        if self._laser_distances is None:
+            points, _ = ray_cast(
+                self.agent_pos, self.laser_directions, self.lidar_range, self.segments
+            )
+            distances = np.sqrt(np.sum((points - self.agent_pos[:, None, :]) ** 2, axis=-1))
+            self._laser_distances = distances / self.lidar_range
+        return self._laser_distances
+
+    def get_obs(self) -> np.ndarray:
+        """
+        全環境・全エージェントの観測 [n_envs, n_agents, obs_size]
+        """
+        relative_goal_position = (self.goal_center - self.agent_pos) / self.scale
+        obs = np.concatenate((relative_goal_position, self.laser_scan()), axis=-1)
+        return obs[:, None, :].astype(np.float32)
+
+    def get_state(self) -> np.ndarray:
+        """
+        全環境のグローバル状態 [n_envs, state_size]
+        """
+        relative_goal_position = (self.goal_center - self.agent_pos) / self.scale
+        state = np.concatenate((relative_goal_position, self.laser_scan()), axis=-1)
+        return state.astype(np.float32)
+
+    def get_avail_actions(self) -> np.ndarray:
+        """
+        全環境・全エージェントの選択可能な行動のマスク [n_envs, n_agents, n_actions]
+        RAは移動する行動のみ選択可能
+        """
+        avail_mask = np.array([0] + [1] * 4 + [0] * self.channel_size)
+        return np.broadcast_to(avail_mask, (self.n_envs, self.n_agents, self.n_actions)).copy()
+
+    def render(self, mode="human"):
+        raise NotImplementedError("Use DiamondEnv to render a single environment")
+
+    def close(self):
+        return
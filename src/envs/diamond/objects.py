@@ -1,4 +1,5 @@
 from typing import Tuple
+import numpy as np
 import pygame
 import random
 from enum import Enum
@@ -91,32 +92,52 @@ class Border(pygame.sprite.Sprite):
         self.rect.center = (center_x, center_y)
 
 
-class Guard(pygame.sprite.Sprite):
+class Body(pygame.sprite.Sprite):
+    """
+    物理コアの物体を描画するためのスプライト（描画専用）
+    draw() の前に sync() で物理コアの矩形を反映する
+    """
+
+    def __init__(self, physics, body: int, color, circle: bool, border_radius: int = 0):
+        super().__init__()
+        self.physics = physics
+        self.body = body
+
+        width, height = (int(v) for v in physics.size[body])
+        self.image = pygame.Surface([width, height], pygame.SRCALPHA)
+        if circle:
+            pygame.draw.circle(self.image, color, (width // 2, height // 2), width // 2)
+        else:
+            pygame.draw.rect(self.image, color, [0, 0, width, height], 0, border_radius)
+        self.rect = self.image.get_rect()
+
+    def sync(self):
+        self.rect = pygame.Rect(*(int(v) for v in self.physics.rects[self.body]))
+
+
+class Guard:
     def __init__(
         self,
+        physics,
         color: Tuple[int, int, int],
         size: int,
         velocity: float,
     ):
-        super().__init__()
-        self.image = pygame.Surface([size, size], pygame.SRCALPHA)
-        self.rect = self.image.get_rect()
-        pygame.draw.circle(self.image, color, (size // 2, size // 2), size // 2)
+        self.physics = physics
+        self.body = physics.add_body(size, size)
+        self.color = color
 
         self.VEL = velocity
 
-        self.pos = pygame.math.Vector2(0, 0)
-        self.vel = pygame.math.Vector2(0, 0)
-        self.acc = pygame.math.Vector2(0, 0)
+    @property
+    def pos(self) -> np.ndarray:
+        return self.physics.pos[self.body]
 
     def patrol(self):
         pass
 
     def reset(self, pos, random_direction=None):
-        self.pos = pygame.math.Vector2(pos)
-        self.vel = pygame.math.Vector2(0, 0)
-        self.acc = pygame.math.Vector2(0, 0)
-        self.rect.center = self.pos
+        self.physics.place(self.body, pos)
 
         if random_direction:
             rand = random.randint(0, 1)
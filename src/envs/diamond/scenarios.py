@@ -0,0 +1,114 @@
+"""
+MuseumWorld のマップ（シナリオ）
+
+どの関数も envs.scenario の形式のシナリオの辞書を返す
+    - spawns[0]: Robot Agentの初期位置
+    - areas[0]: ゴール（ダイアモンド）
+    - guard_paths[Orientation.value]: 警備員の巡回経路（水平・垂直。始点が警備員の初期位置）
+"""
+import numpy as np
+
+from envs.scenario import compile_scenario, resolve_scenario
+
+
+def museum(
+    corridor_width=70,
+    wall_width=170,
+    wall_height=40,
+    wall_gap=40,
+    num_walls=0,
+    goal_size=50,
+    guard_size=50,
+    border_width=2,
+) -> dict:
+    """
+    左右の通路の間に横長の壁が num_walls 個並び、一番上にゴールがあるマップ（MuseumWorld の既定）
+    """
+    width = 2 * corridor_width + wall_width
+    height = num_walls * wall_height + (num_walls - 1) * wall_gap + 2 * wall_gap + goal_size
+
+    walls = [
+        [corridor_width, height - wall_height - i * (wall_height + wall_gap), wall_width, wall_height]
+        for i in range(num_walls)
+    ]
+    guard_start = [corridor_width // 2, height - guard_size // 2]
+    return {
+        "name": "museum",
+        "width": width,
+        "height": height,
+        "border_width": border_width,
+        "walls": walls,
+        "areas": [[width // 2, wall_gap + goal_size // 2, goal_size]],
+        "spawns": [[width - corridor_width // 2, height - wall_height // 2]],
+        "guard_paths": [
+            [guard_start, [width - corridor_width // 2, guard_start[1]]],
+            [guard_start, [guard_start[0], wall_gap + guard_size // 2]],
+        ],
+    }
+
+
+def random_museum(
+    seed=0,
+    width=310,
+    height=250,
+    min_walls=1,
+    max_walls=3,
+    min_gap=50,
+    goal_size=50,
+    agent_size=15,
+    guard_size=50,
+    border_width=2,
+    max_tries=100,
+) -> dict:
+    """
+    外周の大きさは固定で、中の壁の数・位置・大きさを seed から決めたマップ
+    エージェントがゴールまで通れないマップは作り直す
+    """
+    rng = np.random.RandomState(seed)
+    goal = [width // 2, min_gap // 2 + goal_size // 2, goal_size]
+    spawn = [width - 2 * agent_size, height - 2 * agent_size]
+    guard_start = [guard_size // 2 + border_width, height - guard_size // 2 - border_width]
+    top = goal_size + min_gap
+
+    for _ in range(max_tries):
+        walls = []
+        for _ in range(rng.randint(min_walls, max_walls + 1)):
+            wall_width = int(rng.randint(width // 4, width - min_gap))
+            wall_height = int(rng.randint(10, 50))
+            x = int(rng.randint(0, width - wall_width + 1))
+            y = int(rng.randint(top, height - wall_height - 2 * agent_size))
+            walls.append([x, y, wall_width, wall_height])
+        spec = {
+            "name": "random_museum",
+            "width": width,
+            "height": height,
+            "border_width": border_width,
+            "walls": walls,
+            "areas": [goal],
+            "spawns": [spawn],
+            "guard_paths": [
+                [guard_start, [width - guard_size // 2 - border_width, guard_start[1]]],
+                [guard_start, [guard_start[0], top - guard_size // 2]],
+            ],
+        }
+        scenario = compile_scenario(spec)
+        if scenario.connected(spawn, goal[:2], clearance=agent_size / 2):
+            return spec
+    raise RuntimeError("Could not generate a solvable museum map (seed={})".format(seed))
+
+
+SCENARIOS = {
+    "museum": museum,
+    "random_museum": random_museum,
+}
+
+
+def get_scenario(scenario=None, seed=None, cache_dir=None, **kwargs):
+    """
+    名前・パス・辞書からコンパイル済みのシナリオを取得する（None は既定のマップ）
+    """
+    if scenario is None:
+        scenario = "museum"
+    if seed is not None:
+        kwargs["seed"] = seed
+    return resolve_scenario(scenario, SCENARIOS, cache_dir=cache_dir, **kwargs)
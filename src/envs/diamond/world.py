@@ -3,14 +3,20 @@ import numpy as np
 import pygame
 from typing import List, Tuple
 
-from envs.diamond.objects import Goal, Room, Wall, Border, Guard, Orientation
+from envs.physics import PhysicsCore
+from envs.scenario import Scenario
+from envs.diamond import scenarios
+from envs.diamond.objects import Goal, Room, Wall, Border, Body, Guard, Orientation
 from envs.diamond.agents import RobotAgent, SensorAgent, Agent
 from envs.diamond.utils import one_hot_encode
+from utils.profiler import profiler
 
 
 class World:
     def __init__(self):
         self.channel = None
+        self.physics: PhysicsCore = None
+        # 以下は描画用のスプライト（draw()の初回に作る）
         self.players: pygame.sprite.Group = None
         self.maps: pygame.sprite.Group = None
         self.walls: List[Wall] = None
@@ -59,6 +65,7 @@ class MuseumWorld(World):
         channel_size: int,
         lidar_angle: float,
         lidar_interval: float,
+        scenario: Scenario = None,
     ):
 
         self.agent_velocity = agent_velocity
@@ -67,17 +74,28 @@ class MuseumWorld(World):
         self.lidar_angle = lidar_angle
         self.lidar_interval = lidar_interval
 
-        self.WIDTH = 2 * self.CORRIDOR_WIDTH + self.WALL_WIDTH
-        self.HEIGHT = (
-            self.NUM_WALLS * self.WALL_HEIGHT
-            + (self.NUM_WALLS - 1) * self.WALL_GAP
-            + 2 * self.WALL_GAP
-            + self.GOAL_SIZE
-        )
+        # マップ（シナリオ）は省略するとクラス定数から作る既定のもの
+        if scenario is None:
+            scenario = scenarios.get_scenario(
+                "museum",
+                corridor_width=self.CORRIDOR_WIDTH,
+                wall_width=self.WALL_WIDTH,
+                wall_height=self.WALL_HEIGHT,
+                wall_gap=self.WALL_GAP,
+                num_walls=self.NUM_WALLS,
+                goal_size=self.GOAL_SIZE,
+                guard_size=self.GUARD_SIZE,
+                border_width=self.BORDER_WIDTH,
+            )
+        self.WIDTH = scenario.width
+        self.HEIGHT = scenario.height
 
         self.lidar_range = math.sqrt(self.WIDTH**2 + self.HEIGHT**2)
 
+        self.physics = PhysicsCore()
+
         self.r_agent = RobotAgent(
+            self.physics,
             self.AGENT_COLOR,
             self.AGENT_SIZE,
             self.agent_velocity,
@@ -87,110 +105,73 @@ class MuseumWorld(World):
         )
         self.s_agent = SensorAgent()
 
-        self.AGENT_POS = (
-            self.WIDTH - self.CORRIDOR_WIDTH // 2,
-            self.HEIGHT - self.WALL_HEIGHT // 2,
-        )
-
         self.channel = None
 
         self.guard = Guard(
+            self.physics,
             self.GUARD_COLOR,
             self.GUARD_SIZE,
             self.guard_velocity,
         )
-        self.players = pygame.sprite.Group(self.r_agent, self.guard)
 
         self.scan_points = []
+        self.laser_points = []
+
+        # 描画用のスプライトは draw() で初めて作る（ディスプレイなしでも動くように）
+        self.players = None
+        self.maps = None
+        self.borders = None
+
+        self.load_scenario(scenario)
+
+    def load_scenario(self, scenario: Scenario):
+        """
+        マップの形状（壁の線分・ゴールの領域・初期位置）をシナリオから物理コアに登録する
+        エピソードごとにマップを変える場合は reset() の前に呼ぶ（外周の大きさは変えないこと）
+        """
+        if getattr(self, "scenario", None) is scenario:
+            return
+        self.scenario = scenario
+        self.physics.load_scenario(scenario)
+        self.goal = 0
+        self.goal_center = scenario.area_centers[self.goal].copy()
+        self.AGENT_POS = tuple(scenario.spawns[0])
+        # 巡回経路は Orientation の順（水平・垂直）
+        self.guard_paths = [scenario.guard_path(i) for i in range(len(scenario.guard_paths))]
+        self.guard_start = self.guard_paths[0][0]
+
+        self.border_specs = [
+            (start, length, Orientation.HORIZONTAL if horizontal else Orientation.VERTICAL)
+            for start, length, horizontal in scenario.border_specs()
+        ]
+        self.wall_specs = [tuple(box) for box in scenario.wall_boxes.tolist()]
 
-        self.__create_map()
+        # 描画用のスプライトは次の draw() で作り直す
+        self.players = None
 
-    def __create_map(self):
+    def __create_view(self):
+        """
+        描画用のスプライトを作る
+        """
         self.room = Room(self.WIDTH, self.HEIGHT, self.FLOOR_COLOR)
-        self.goal = Goal(
-            self.WIDTH // 2,
-            self.WALL_GAP + self.GOAL_SIZE // 2,
-            self.GOAL_SIZE,
-            self.GOAL_COLOR,
-        )
-        self.maps = pygame.sprite.Group(self.room, self.goal)
+        goal_size = int(self.scenario.area_sizes[self.goal])
+        goal_sprite = Goal(*self.goal_center.astype(int), goal_size, self.GOAL_COLOR)
+        self.maps = pygame.sprite.Group(self.room, goal_sprite)
+        for wall_x, wall_y, wall_width, wall_height in self.wall_specs:
+            self.maps.add(Wall(wall_x, wall_y, wall_width, wall_height, self.WALL_COLOR))
         self.borders = pygame.sprite.Group(
-            Border(
-                (0, 0),
-                self.WIDTH,
-                Orientation.HORIZONTAL,
-                self.BORDER_WIDTH,
-                self.BORDER_COLOR,
-            ),
-            Border(
-                (self.WIDTH, 0),
-                self.HEIGHT,
-                Orientation.VERTICAL,
-                self.BORDER_WIDTH,
-                self.BORDER_COLOR,
-            ),
-            Border(
-                (0, self.HEIGHT),
-                self.WIDTH,
-                Orientation.HORIZONTAL,
-                self.BORDER_WIDTH,
-                self.BORDER_COLOR,
-            ),
-            Border(
-                (0, 0),
-                self.HEIGHT,
-                Orientation.VERTICAL,
-                self.BORDER_WIDTH,
-                self.BORDER_COLOR,
-            ),
+            *[
+                Border(start, length, orientation, self.BORDER_WIDTH, self.BORDER_COLOR)
+                for start, length, orientation in self.border_specs
+            ]
+        )
+        self.players = pygame.sprite.Group(
+            Body(self.physics, self.r_agent.body, self.AGENT_COLOR, circle=False, border_radius=3),
+            Body(self.physics, self.guard.body, self.GUARD_COLOR, circle=True),
         )
 
-        for i in range(self.NUM_WALLS):
-            wall_x = self.CORRIDOR_WIDTH
-            wall_y = (
-                self.HEIGHT - self.WALL_HEIGHT - i * (self.WALL_HEIGHT + self.WALL_GAP)
-            )
-            self.maps.add(
-                Wall(
-                    wall_x,
-                    wall_y,
-                    self.WALL_WIDTH,
-                    self.WALL_HEIGHT,
-                    self.WALL_COLOR,
-                )
-            )
-            self.borders.add(
-                Border(
-                    (wall_x, wall_y),
-                    self.WALL_WIDTH,
-                    Orientation.HORIZONTAL,
-                    self.BORDER_WIDTH,
-                    self.BORDER_COLOR,
-                ),
-                Border(
-                    (wall_x + self.WALL_WIDTH, wall_y),
-                    self.WALL_HEIGHT,
-                    Orientation.VERTICAL,
-                    self.BORDER_WIDTH,
-                    self.BORDER_COLOR,
-                ),
-                Border(
-                    (wall_x, wall_y + self.WALL_HEIGHT),
-                    self.WALL_WIDTH,
-                    Orientation.HORIZONTAL,
-                    self.BORDER_WIDTH,
-                    self.BORDER_COLOR,
-                ),
-                Border(
-                    (wall_x, wall_y),
-                    self.WALL_HEIGHT,
-                    Orientation.VERTICAL,
-                    self.BORDER_WIDTH,
-                    self.BORDER_COLOR,
-                ),
-            )
         img = pygame.image.load("src/envs/diamond/diamond.png")
-        self.diamond_img = pygame.transform.scale(img, (self.GOAL_SIZE, self.GOAL_SIZE))
+        self.diamond_img = pygame.transform.scale(img, (goal_size, goal_size))
 
     def agents(self) -> List[Agent]:
         return [self.r_agent]
@@ -200,10 +181,7 @@ class MuseumWorld(World):
         self.r_agent.reset(self.AGENT_POS)
         self.s_agent.reset()
 
-        self.guard.reset(
-            (self.CORRIDOR_WIDTH // 2, self.HEIGHT - self.GUARD_SIZE // 2),
-            random_direction=random_direction,
-        )
+        self.guard.reset(self.guard_start, random_direction=random_direction)
 
     def step(self):
         self.channel = 0
@@ -216,13 +194,16 @@ class MuseumWorld(World):
         return self.channel
 
     def draw(self, screen):
+        if self.players is None:
+            self.__create_view()
+        for player in self.players:
+            player.sync()
+
         self.maps.draw(screen)
         self.borders.draw(screen)
         self.__draw_lasers(screen)
         self.players.draw(screen)
-        screen.blit(
-            self.diamond_img, (self.WIDTH // 2 - self.GOAL_SIZE // 2, self.WALL_GAP)
-        )
+        screen.blit(self.diamond_img, tuple(self.physics.areas[self.goal][:2]))
 
     def __draw_lasers(self, screen):
         for intersection in self.laser_points:
@@ -230,50 +211,33 @@ class MuseumWorld(World):
             pygame.draw.circle(screen, self.LASER_POINT_COLOR, intersection, 2.5)
 
     def check_collision(self):
-        return pygame.sprite.spritecollideany(self.r_agent, self.borders)
+        return self.physics.hits_wall(self.r_agent.body)
 
     def check_goal(self):
-        return pygame.sprite.collide_rect(self.r_agent, self.goal)
-
-    def __get_obstacle_lines(self) -> List:
-        """
-        レーザーとの交点を計算するために、すべての障害物の線分を取得する
-        """
-        lines = []
-        for border in self.borders:
-            lines.append((border.start, border.end))
-        return lines
+        return self.physics.in_area(self.r_agent.body, self.goal)
 
     def get_num_lasers(self) -> int:
         return self.lidar_angle // self.lidar_interval
 
     def laser_scan(self) -> np.ndarray:
-        self.laser_points = self.r_agent.laser_scan(self.__get_obstacle_lines())
-        laser_distances = [
-            math.sqrt(
-                (point[0] - self.r_agent.pos.x) ** 2
-                + (point[1] - self.r_agent.pos.y) ** 2
-            )
-            for point in self.laser_points
-        ]
+        with profiler.timer("laser_scan"):
+            self.laser_points = self.r_agent.laser_scan()
+        laser_distances = np.sqrt(
+            np.sum((self.laser_points - self.r_agent.pos) ** 2, axis=-1)
+        )
         # 正規化
-        return np.array(laser_distances) / self.lidar_range
+        return laser_distances / self.lidar_range
 
     def get_relative_normalized_goal_position(self) -> np.ndarray:
-        return np.array(
-            [
-                (self.goal.rect.centerx - self.r_agent.pos.x) / self.WIDTH,
-                (self.goal.rect.centery - self.r_agent.pos.y) / self.HEIGHT,
-            ]
-        )
+        return (self.goal_center - self.r_agent.pos) / np.array([self.WIDTH, self.HEIGHT])
 
     def get_distance_from_goal(self):
         """
         エージェントとゴール間の距離
         """
         return math.sqrt(
-            (self.r_agent.pos.x - self.goal.rect.center[0]) ** 2
-            + (self.r_agent.pos.y - self.goal.rect.center[1]) ** 2
+            (self.r_agent.pos[0] - self.goal_center[0]) ** 2
+            + (self.r_agent.pos[1] - self.goal_center[1]) ** 2
         )
 
     def get_normalized_distance_from_goal(self) -> float:
@@ -284,11 +248,11 @@ class MuseumWorld(World):
 
     def get_normalized_agent_position(self):
         return np.array(
-            [self.r_agent.pos.x / self.WIDTH, self.r_agent.pos.y / self.HEIGHT]
+            [self.r_agent.pos[0] / self.WIDTH, self.r_agent.pos[1] / self.HEIGHT]
         )
 
     def get_normalized_guard_position(self):
-        return np.array([self.guard.pos.x / self.WIDTH, self.guard.pos.y / self.HEIGHT])
+        return np.array([self.guard.pos[0] / self.WIDTH, self.guard.pos[1] / self.HEIGHT])
 
     def get_mileage(self):
         return self.r_agent.mileage
@@ -0,0 +1,309 @@
+from multiprocessing import Pipe, Process
+
+import gym
+import numpy as np
+
+from envs.physics import laser_directions, ray_cast, rect_from_center, rects_collide
+
+
+# 行動ごとの加速度の向き (x, y): 左・右・上・下（Agent.move / RobotAgent.move と同じ）
+ACTION_ACCS = np.array(
+    [
+        [-1.0, 0.0],
+        [1.0, 0.0],
+        [0.0, -1.0],
+        [0.0, 1.0],
+    ]
+)
+
+
+class CorridorWorldBatch:
+    """
+    SimpleWorld / CommunicationWorld（2つの部屋を2本の廊下でつないだマップ）の動きを
+    n_envs 個まとめて計算する
+
+    エージェント・NPCの位置とNPCの巡回経路を先頭の次元が n_envs のNumPy配列で持ち、
+    移動・衝突判定・ゴール判定・LiDARを全環境まとめて計算する（pygameのスプライトは使わない）
+    壁とゴールは world_cls のクラス属性のスプライトから取り出すので、元の世界と同じ形状になる
+    """
+
+    def __init__(self, world_cls, n_envs: int, rng: np.random.RandomState):
+        self.n_envs = n_envs
+        self.rng = rng
+
+        self.WIDTH = world_cls.WIDTH
+        self.HEIGHT = world_cls.HEIGHT
+        self.acc = world_cls.ACC
+        self.npc_velocity = world_cls.NPC_VEL
+        self.lidar_range = world_cls.LIDAR_RANGE
+        self.agent_start = np.array(world_cls.AGENT_POS, dtype=np.float64)
+        self.npc_start = np.array(world_cls.NPC_POS, dtype=np.float64)
+        self.agent_size = np.array([world_cls.AGENT_SIZE, world_cls.AGENT_SIZE])
+        self.npc_size = np.array([world_cls.NPC_SIZE, world_cls.NPC_SIZE])
+        self.scale = np.array([self.WIDTH, self.HEIGHT], dtype=np.float64)
+
+        # NPC.auto_move に渡される曲がり角と終点
+        self.npc_corner1 = world_cls.ROOM_SIZE // 2
+        self.npc_goal1 = world_cls.HEIGHT - world_cls.ROOM_SIZE // 2
+        self.npc_corner2 = world_cls.HEIGHT - world_cls.ROOM_SIZE // 2
+        self.npc_goal2 = world_cls.ROOM_SIZE // 2
+
+        self.segments = np.array([wall.start + wall.end for wall in world_cls.walls], dtype=np.float64)
+        self.wall_rects = np.array([tuple(wall.rect) for wall in world_cls.walls], dtype=np.int64)
+        self.goal_rect = np.array(tuple(world_cls.goal.rect), dtype=np.int64)
+        self.goal_center = np.array(world_cls.goal.rect.center, dtype=np.float64)
+        self.laser_directions = laser_directions(world_cls.LIDAR_ANGLE, world_cls.LIDAR_INTERVAL)
+        self.n_lasers = len(self.laser_directions)
+
+        # 各環境の状態
+        self.agent_pos = np.zeros((n_envs, 2))
+        self.npc_pos = np.zeros((n_envs, 2))
+        # NPCの巡回経路（False: 先に左へ進む HORIZONTAL, True: 先に下へ進む VERTICAL）
+        self.npc_vertical = np.zeros(n_envs, dtype=bool)
+
+    def reset(self, mask):
+        """
+        mask（[n_envs] のbool配列）の環境を初期状態に戻す
+        NPCの巡回経路は reset(random_direction=True) と同じくランダムに選ぶ
+        """
+        self.agent_pos[mask] = self.agent_start
+        self.npc_pos[mask] = self.npc_start
+        self.npc_vertical[mask] = self.rng.randint(0, 2, size=int(np.count_nonzero(mask))) == 1
+
+    def step(self, moves):
+        """
+        moves: [n_envs] 各環境のエージェントの行動（0: 左, 1: 右, 2: 上, 3: 下）
+        """
+        self.agent_pos += self.acc * ACTION_ACCS[moves]
+
+        x, y = self.npc_pos[:, 0], self.npc_pos[:, 1]
+        horizontal = ~self.npc_vertical
+        move_horizontal_x = horizontal & (x > self.npc_corner1)
+        move_horizontal_y = horizontal & ~move_horizontal_x & (y < self.npc_goal1)
+        move_vertical_y = self.npc_vertical & (y < self.npc_corner2)
+        move_vertical_x = self.npc_vertical & ~move_vertical_y & (x > self.npc_goal2)
+        x -= self.npc_velocity * (move_horizontal_x | move_vertical_x)
+        y += self.npc_velocity * (move_horizontal_y | move_vertical_y)
+
+    def agent_rects(self) -> np.ndarray:
+        return rect_from_center(self.agent_pos, self.agent_size)
+
+    def npc_rects(self) -> np.ndarray:
+        return rect_from_center(self.npc_pos, self.npc_size)
+
+    def check_collision(self) -> np.ndarray:
+        agent_rects = self.agent_rects()
+        hits_wall = rects_collide(agent_rects[:, None, :], self.wall_rects).any(axis=1)
+        return hits_wall | rects_collide(agent_rects, self.npc_rects())
+
+    def check_goal(self) -> np.ndarray:
+        return rects_collide(self.agent_rects(), self.goal_rect)
+
+    def laser_scan(self) -> np.ndarray:
+        """
+        全環境のLiDARの距離 [n_envs, n_lasers]（障害物は壁とNPCの矩形の4辺）
+        """
+        left, top, width, height = np.moveaxis(self.npc_rects().astype(np.float64), -1, 0)
+        right, bottom = left + width, top + height
+        # World.get_obstacle_lines と同じ順番の4辺 [n_envs, 4, 4]
+        npc_segments = np.stack(
+            (
+                np.stack((left, top, right, top), axis=-1),
+                np.stack((left, top, left, bottom), axis=-1),
+                np.stack((right, top, right, bottom), axis=-1),
+                np.stack((left, bottom, right, bottom), axis=-1),
+            ),
+            axis=1,
+        )
+        wall_segments = np.broadcast_to(self.segments, (self.n_envs,) + self.segments.shape)
+        segments = np.concatenate((wall_segments, npc_segments), axis=1)
+        _, distances = ray_cast(self.agent_pos, self.laser_directions, self.lidar_range, segments)
+        return distances
+
+    def get_relative_normalized_goal_position(self) -> np.ndarray:
+        return (self.goal_center - self.agent_pos) / self.scale
+
+    def get_normalized_distance_from_goal(self) -> np.ndarray:
+        return np.sqrt(np.sum((self.agent_pos - self.goal_center) ** 2, axis=-1)) / self.lidar_range
+
+
+class CorridorVectorEnv(gym.vector.VectorEnv):
+    """
+    CorridorWorldBatch を使う gym の VectorEnv の共通部分（SingleAgentEnv / MultiAgentEnv 用）
+
+    報酬と終了判定は元の環境と同じ:
+        - 衝突: REWARD_FAILURE - ゴールまでの正規化された距離（terminated）
+        - ゴール: REWARD_SUCCESS（terminated）
+        - それ以外: -ゴールまでの正規化された距離（max_episode_steps で truncated）
+
+    gym の VectorEnv と同じく、終了した環境は step() の中で自動的にリセットされ、
+    リセット前の観測は infos["final_observation"] に入る
+    """
+
+    def __init__(
+        self,
+        world_cls,
+        n_envs: int,
+        observation_space: gym.Space,
+        action_space: gym.Space,
+        max_episode_steps: int,
+        reward_success: float,
+        reward_failure: float,
+        seed=None,
+    ):
+        super().__init__(n_envs, observation_space, action_space)
+        self.max_episode_steps = max_episode_steps
+        self.reward_success = reward_success
+        self.reward_failure = reward_failure
+
+        self.rng = np.random.RandomState(seed)
+        self.world = CorridorWorldBatch(world_cls, n_envs, self.rng)
+        self.episode_steps = np.zeros(n_envs, dtype=np.int64)
+
+        self._actions = None
+        self._episode_count = 0
+        self.success_count = 0
+
+    def reset_async(self, seed=None, options=None):
+        if seed is not None:
+            self.rng.seed(seed)
+
+    def reset_wait(self, seed=None, options=None):
+        self._reset(np.ones(self.num_envs, dtype=bool))
+        return self._get_obs(), {}
+
+    def step_async(self, actions):
+        self._actions = np.asarray(actions)
+
+    def step_wait(self):
+        self._apply_actions(self._actions)
+        self.episode_steps += 1
+
+        failed = self.world.check_collision()
+        goal_reached = ~failed & self.world.check_goal()
+        terminated = failed | goal_reached
+        truncated = ~terminated & (self.episode_steps >= self.max_episode_steps)
+        self.success_count += int(goal_reached.sum())
+
+        reward = -self.world.get_normalized_distance_from_goal()
+        reward[failed] += self.reward_failure
+        reward[goal_reached] = self.reward_success
+
+        obs = self._get_obs()
+        done = terminated | truncated
+        final_observation = np.full(self.num_envs, None, dtype=object)
+        if done.any():
+            for i in np.flatnonzero(done):
+                final_observation[i] = tuple(o[i] for o in obs) if isinstance(obs, tuple) else obs[i]
+            self._reset(done)
+            obs = self._get_obs()
+
+        infos = {
+            "is_success": goal_reached,
+            "_is_success": done,
+            "final_observation": final_observation,
+            "_final_observation": done,
+        }
+        return obs, reward, terminated, truncated, infos
+
+    def _reset(self, mask):
+        self.world.reset(mask)
+        self.episode_steps[mask] = 0
+        self._episode_count += int(mask.sum())
+
+    def _apply_actions(self, actions):
+        raise NotImplementedError
+
+    def _get_obs(self):
+        raise NotImplementedError
+
+
+def _shard_worker(pipe, env_cls, n_envs, seed, env_kwargs):
+    env = env_cls(n_envs, seed=seed, **env_kwargs)
+    pipe.send((env.single_observation_space, env.single_action_space))
+    try:
+        while True:
+            command, data = pipe.recv()
+            if command == "reset":
+                pipe.send(env.reset(**data))
+            elif command == "step":
+                pipe.send(env.step(data))
+            elif command == "close":
+                break
+    finally:
+        env.close()
+        pipe.close()
+
+
+def _concatenate(parts):
+    if isinstance(parts[0], tuple):
+        return tuple(np.concatenate(part) for part in zip(*parts))
+    return np.concatenate(parts)
+
+
+class AsyncShardedVectorEnv(gym.vector.VectorEnv):
+    """
+    env_cls（CorridorVectorEnv などのベクトル化環境）を n_workers 個のサブプロセスに分けて動かす
+
+    n_envs 個の環境をほぼ同じ数ずつ各プロセスに割り当て、各プロセスは自分の環境を
+    NumPyでまとめて計算する（gym の AsyncVectorEnv のように1環境1プロセスにはしない）
+    結果は環境の番号順に連結して返す。seed を指定するとプロセス i は seed + i を使う
+    """
+
+    def __init__(self, env_cls, n_envs: int, n_workers: int, seed=None, **env_kwargs):
+        assert 0 < n_workers <= n_envs, "n_workers must be between 1 and n_envs"
+        shard_sizes = [len(shard) for shard in np.array_split(np.arange(n_envs), n_workers)]
+        self.splits = np.cumsum(shard_sizes)[:-1]
+
+        self.pipes = []
+        self.processes = []
+        for i, shard_size in enumerate(shard_sizes):
+            pipe, worker_pipe = Pipe()
+            process = Process(
+                target=_shard_worker,
+                args=(worker_pipe, env_cls, shard_size, None if seed is None else seed + i, env_kwargs),
+                name="VectorEnvShard-{}".format(i),
+                daemon=True,
+            )
+            process.start()
+            worker_pipe.close()
+            self.pipes.append(pipe)
+            self.processes.append(process)
+
+        observation_space, action_space = [pipe.recv() for pipe in self.pipes][0]
+        super().__init__(n_envs, observation_space, action_space)
+
+    def reset_async(self, seed=None, options=None):
+        for i, pipe in enumerate(self.pipes):
+            pipe.send(("reset", {"seed": None if seed is None else seed + i, "options": options}))
+
+    def reset_wait(self, seed=None, options=None):
+        results = [pipe.recv() for pipe in self.pipes]
+        obs, infos = zip(*results)
+        return _concatenate(obs), self._concatenate_infos(infos)
+
+    def step_async(self, actions):
+        for pipe, shard_actions in zip(self.pipes, np.split(np.asarray(actions), self.splits)):
+            pipe.send(("step", shard_actions))
+
+    def step_wait(self):
+        results = [pipe.recv() for pipe in self.pipes]
+        obs, rewards, terminated, truncated, infos = zip(*results)
+        return (
+            _concatenate(obs),
+            np.concatenate(rewards),
+            np.concatenate(terminated),
+            np.concatenate(truncated),
+            self._concatenate_infos(infos),
+        )
+
+    def _concatenate_infos(self, infos):
+        return {key: np.concatenate([info[key] for info in infos]) for key in infos[0]}
+
+    def close_extras(self, **kwargs):
+        for pipe in self.pipes:
+            pipe.send(("close", None))
+        for process in self.processes:
+            process.join()
+        for pipe in self.pipes:
+            pipe.close()
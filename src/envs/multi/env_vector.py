@@ -0,0 +1,74 @@
+import numpy as np
+from gym import spaces
+
+from envs.gym_vector import AsyncShardedVectorEnv, CorridorVectorEnv
+from envs.multi.env import MultiAgentEnv
+from envs.multi.world import CommunicationWorld
+
+
+class VectorMultiAgentEnv(CorridorVectorEnv):
+    """
+    MultiAgentEnv を n_envs 個まとめて動かす gym の VectorEnv
+
+    CommunicationWorld の動き・衝突判定・LiDARを全環境まとめてNumPyで計算する（pygameの描画はしない）
+
+    行動: [n_envs, 2]（Robot Agent の移動・Sensor Agent が送るメッセージ）
+    観測: 各エージェントの観測を float32 にしたもののタプル
+        - Robot Agent: [n_envs, 2 + n_lasers + CHANNEL_SIZE + 1]
+            ゴールの相対座標・LiDARの距離・メッセージ（One-Hot、エピソードの最初は全て0）
+        - Sensor Agent: [n_envs, 4] Robot Agent と NPC の絶対座標
+    報酬は全エージェントで共通の値 [n_envs]
+    """
+
+    def __init__(self, n_envs: int, seed=None):
+        n_lasers = CommunicationWorld.LIDAR_ANGLE // CommunicationWorld.LIDAR_INTERVAL
+        self.n_messages = CommunicationWorld.CHANNEL_SIZE + 1
+        super().__init__(
+            CommunicationWorld,
+            n_envs,
+            observation_space=spaces.Tuple(
+                (
+                    spaces.Box(low=-1, high=1, shape=(2 + n_lasers + self.n_messages,), dtype=np.float32),
+                    spaces.Box(low=-1, high=1, shape=(4,), dtype=np.float32),
+                )
+            ),
+            action_space=spaces.MultiDiscrete([4, self.n_messages]),
+            max_episode_steps=MultiAgentEnv.MAX_EPISODE_STEPS,
+            reward_success=MultiAgentEnv.REWARD_SUCCESS,
+            reward_failure=MultiAgentEnv.REWARD_FAILURE,
+            seed=seed,
+        )
+        self.n_agents = 2
+        # メッセージ（None は -1 で表す）
+        self.channel = np.full(n_envs, -1, dtype=np.int64)
+
+    def _reset(self, mask):
+        super()._reset(mask)
+        self.channel[mask] = -1
+
+    def _apply_actions(self, actions):
+        actions = actions.reshape(self.num_envs, self.n_agents)
+        self.world.step(actions[:, 0])
+        self.channel = actions[:, 1].astype(np.int64)
+
+    def _get_obs(self):
+        world = self.world
+        laser_distances = world.laser_scan() / world.lidar_range
+        message = np.zeros((self.num_envs, self.n_messages))
+        sent = self.channel >= 0
+        message[sent, self.channel[sent]] = 1
+        ra_obs = np.concatenate(
+            (world.get_relative_normalized_goal_position(), laser_distances, message), axis=-1
+        )
+        sa_obs = np.concatenate((world.agent_pos / world.scale, world.npc_pos / world.scale), axis=-1)
+        return ra_obs.astype(np.float32), sa_obs.astype(np.float32)
+
+
+def make_vector_env(n_envs: int, n_workers: int = 0, seed=None):
+    """
+    n_workers が0なら同じプロセスで n_envs 個の環境をまとめて動かす VectorMultiAgentEnv、
+    1以上なら n_workers 個のサブプロセスに分けて動かす AsyncShardedVectorEnv を作る
+    """
+    if n_workers == 0:
+        return VectorMultiAgentEnv(n_envs, seed=seed)
+    return AsyncShardedVectorEnv(VectorMultiAgentEnv, n_envs, n_workers, seed=seed)
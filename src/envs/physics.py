@@ -0,0 +1,176 @@
+import math
+import numpy as np
+
+# 矩形は [left, top, width, height] の整数配列、線分は [x0, y0, x1, y1] で表す
+
+
+def round_half_away(x):
+    """
+    pygame.Rect と同じく0から遠い方へ四捨五入する
+    """
+    return np.sign(x) * np.floor(np.abs(x) + 0.5)
+
+
+def rect_from_center(center, size) -> np.ndarray:
+    """
+    pygame.Rect.center に座標を代入した時と同じ整数の矩形を返す
+    center: [..., 2], size: [2]
+    """
+    center = np.asarray(center, dtype=np.float64)
+    size = np.asarray(size, dtype=np.int64)
+    left_top = round_half_away(center).astype(np.int64) - size // 2
+    size = np.broadcast_to(size, left_top.shape)
+    return np.concatenate((left_top, size), axis=-1)
+
+
+def rects_collide(rects_a, rects_b) -> np.ndarray:
+    """
+    pygame.Rect.colliderect と同じ判定（辺が接しているだけなら衝突しない）
+    rects_a と rects_b はブロードキャストされる
+    """
+    return (
+        (rects_a[..., 0] < rects_b[..., 0] + rects_b[..., 2])
+        & (rects_a[..., 1] < rects_b[..., 1] + rects_b[..., 3])
+        & (rects_a[..., 0] + rects_a[..., 2] > rects_b[..., 0])
+        & (rects_a[..., 1] + rects_a[..., 3] > rects_b[..., 1])
+    )
+
+
+def laser_directions(lidar_angle, lidar_interval) -> np.ndarray:
+    """
+    レーザーの向きの単位ベクトル [n_lasers, 2]
+    角度は 0度 から時計回りに lidar_interval ずつ
+    """
+    angles = np.radians(np.arange(0, -(lidar_angle - 1), -lidar_interval, dtype=np.float64))
+    return np.stack((np.cos(angles), np.sin(angles)), axis=-1)
+
+
+def ray_cast(origins, directions, max_range, segments):
+    """
+    レーザーと障害物の線分の交点のうち、最も近いものをまとめて求める
+    （utils.line_intersect をすべてのレーザー × 線分について一度に計算したもの）
+
+    origins: [..., 2], directions: [L, 2], segments: [M, 4]（環境ごとに違う場合は [..., M, 4]）
+    戻り値:
+        - points: [..., L, 2] 交点（当たらなければレーザーの終点）
+        - distances: [..., L] 交点までの距離
+    """
+    origins = np.asarray(origins, dtype=np.float64)
+    p0 = origins[..., None, None, :]  # [..., 1, 1, 2]
+    p1 = p0 + max_range * directions[:, None, :]  # [..., L, 1, 2]
+    q0 = segments[..., None, :, 0:2]  # [..., 1, M, 2]
+    q1 = segments[..., None, :, 2:4]
+
+    r = p1 - p0
+    qd = q1 - q0
+    dq = q0 - p0  # [..., 1, M, 2]
+
+    det = r[..., 0] * qd[..., 1] - r[..., 1] * qd[..., 0]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = (dq[..., 0] * qd[..., 1] - dq[..., 1] * qd[..., 0]) / det
+        u = (dq[..., 0] * r[..., 1] - dq[..., 1] * r[..., 0]) / det
+    hit = (det != 0) & (t >= 0) & (t <= 1) & (u >= 0) & (u <= 1)
+    # 平行な線分（det == 0）では t が nan になるので0にしておく
+    t = np.where(hit, t, 0.0)
+
+    intersections = p0 + t[..., None] * r  # [..., L, M, 2]
+    distances = np.sqrt(np.sum((intersections - p0) ** 2, axis=-1))
+    # レーザーの長さより近い交点だけが有効
+    distances = np.where(hit & (distances < max_range), distances, math.inf)
+
+    nearest = np.argmin(distances, axis=-1)  # [..., L]
+    min_distances = np.take_along_axis(distances, nearest[..., None], axis=-1)[..., 0]
+    min_points = np.take_along_axis(intersections, nearest[..., None, None], axis=-2)[..., 0, :]
+
+    missed = np.isinf(min_distances)
+    points = np.where(missed[..., None], p1[..., 0, :], min_points)
+    distances = np.where(missed, max_range, min_distances)
+    return points, distances
+
+
+class PhysicsCore:
+    """
+    pygameに依存しない2Dシミュレーションの状態
+
+    - 動く物体（エージェント・警備員）の位置・速度・当たり判定の矩形
+    - 壁（線分とその当たり判定の矩形）
+    - ゴールなどの領域（矩形）
+
+    をすべてNumPy配列で保持する。pygameのスプライトは描画時にここから同期するだけ
+    """
+
+    def __init__(self):
+        self.pos = np.zeros((0, 2), dtype=np.float64)
+        self.vel = np.zeros((0, 2), dtype=np.float64)
+        self.size = np.zeros((0, 2), dtype=np.int64)
+        self.rects = np.zeros((0, 4), dtype=np.int64)
+
+        self.segments = np.zeros((0, 4), dtype=np.float64)
+        self.wall_widths = np.zeros(0, dtype=np.int64)
+        self.wall_rects = np.zeros((0, 4), dtype=np.int64)
+
+        self.areas = np.zeros((0, 4), dtype=np.int64)
+
+    # ---------------- 生成 ----------------
+
+    def add_body(self, width, height) -> int:
+        self.pos = np.append(self.pos, np.zeros((1, 2)), axis=0)
+        self.vel = np.append(self.vel, np.zeros((1, 2)), axis=0)
+        self.size = np.append(self.size, [[width, height]], axis=0)
+        self.rects = np.append(self.rects, [[0, 0, width, height]], axis=0)
+        return len(self.pos) - 1
+
+    def add_wall(self, start, end, width) -> int:
+        """
+        水平または垂直な壁を追加する（objects.Border と同じ当たり判定の矩形を作る）
+        """
+        (x0, y0), (x1, y1) = start, end
+        if y0 == y1:
+            # 水平
+            length = x1 - x0
+            rect = rect_from_center((x0 + length / 2, y0), (length, width))
+        else:
+            # 垂直
+            length = y1 - y0
+            rect = rect_from_center((x0, y0 + length / 2), (width, length))
+        self.segments = np.append(self.segments, [[x0, y0, x1, y1]], axis=0)
+        self.wall_widths = np.append(self.wall_widths, width)
+        self.wall_rects = np.append(self.wall_rects, [rect], axis=0)
+        return len(self.segments) - 1
+
+    def add_area(self, center, size) -> int:
+        self.areas = np.append(self.areas, [rect_from_center(center, (size, size))], axis=0)
+        return len(self.areas) - 1
+
+    def load_scenario(self, scenario):
+        """
+        壁と領域をコンパイル済みのシナリオ（envs.scenario.Scenario）のもので置き換える
+        領域の番号はシナリオの areas の順番になる
+        """
+        self.segments = scenario.segments.copy()
+        self.wall_widths = scenario.wall_widths.copy()
+        self.wall_rects = scenario.wall_rects.copy()
+        self.areas = scenario.areas.copy()
+
+    # ---------------- 更新 ----------------
+
+    def place(self, body, pos):
+        self.pos[body] = pos
+        self.vel[body] = 0
+        self.rects[body] = rect_from_center(self.pos[body], self.size[body])
+
+    def translate(self, body, vel):
+        self.vel[body] = vel
+        self.pos[body] += self.vel[body]
+        self.rects[body] = rect_from_center(self.pos[body], self.size[body])
+
+    # ---------------- 判定 ----------------
+
+    def hits_wall(self, body) -> bool:
+        return bool(rects_collide(self.rects[body], self.wall_rects).any())
+
+    def in_area(self, body, area) -> bool:
+        return bool(rects_collide(self.rects[body], self.areas[area]))
+
+    def ray_cast(self, body, directions, max_range):
+        return ray_cast(self.pos[body], directions, max_range, self.segments)
@@ -0,0 +1,70 @@
+import torch as th
+
+# envs.physics の関数をtorchで書いたもの
+# 状態をGPU上のテンソルのまま扱うバッチ環境（diamond_torch, crossroads_torch）で使う
+# どの関数もホストとの同期やデータ依存の形状を持たないので torch.compile できる
+
+
+def round_half_away(x: th.Tensor) -> th.Tensor:
+    """
+    pygame.Rect と同じく0から遠い方へ四捨五入する
+    """
+    return th.sign(x) * th.floor(th.abs(x) + 0.5)
+
+
+def rect_from_center(center: th.Tensor, size: th.Tensor) -> th.Tensor:
+    """
+    pygame.Rect.center に座標を代入した時と同じ整数の矩形 [..., 4]
+    """
+    left_top = round_half_away(center).long() - size // 2
+    return th.cat((left_top, size.expand_as(left_top)), dim=-1)
+
+
+def rects_collide(rects_a: th.Tensor, rects_b: th.Tensor) -> th.Tensor:
+    """
+    pygame.Rect.colliderect と同じ判定（ブロードキャストされる）
+    """
+    return (
+        (rects_a[..., 0] < rects_b[..., 0] + rects_b[..., 2])
+        & (rects_a[..., 1] < rects_b[..., 1] + rects_b[..., 3])
+        & (rects_a[..., 0] + rects_a[..., 2] > rects_b[..., 0])
+        & (rects_a[..., 1] + rects_a[..., 3] > rects_b[..., 1])
+    )
+
+
+def ray_cast(origins: th.Tensor, directions: th.Tensor, max_range: float, segments: th.Tensor):
+    """
+    envs.physics.ray_cast と同じ
+    origins: [..., 2], directions: [L, 2], segments: [M, 4]
+    戻り値: 交点 [..., L, 2] と距離 [..., L]
+    """
+    p0 = origins[..., None, None, :]
+    p1 = p0 + max_range * directions[:, None, :]
+    q0 = segments[:, 0:2]
+    q1 = segments[:, 2:4]
+
+    r = p1 - p0
+    qd = q1 - q0
+    dq = q0 - p0
+
+    det = r[..., 0] * qd[..., 1] - r[..., 1] * qd[..., 0]
+    t = (dq[..., 0] * qd[..., 1] - dq[..., 1] * qd[..., 0]) / det
+    u = (dq[..., 0] * r[..., 1] - dq[..., 1] * r[..., 0]) / det
+    hit = (det != 0) & (t >= 0) & (t <= 1) & (u >= 0) & (u <= 1)
+    # 平行な線分（det == 0）では t が nan になるので0にしておく
+    t = th.where(hit, t, th.zeros_like(t))
+
+    intersections = p0 + t[..., None] * r
+    distances = th.sqrt(th.sum((intersections - p0) ** 2, dim=-1))
+    distances = th.where(
+        hit & (distances < max_range), distances, th.full_like(distances, float("inf"))
+    )
+
+    min_distances, nearest = distances.min(dim=-1)
+    index = nearest[..., None, None].expand(*nearest.shape, 1, 2)
+    min_points = th.gather(intersections.expand(*distances.shape, 2), -2, index)[..., 0, :]
+
+    missed = th.isinf(min_distances)
+    points = th.where(missed[..., None], p1[..., 0, :].expand_as(min_points), min_points)
+    distances = th.where(missed, th.full_like(min_distances, max_range), min_distances)
+    return points, distances
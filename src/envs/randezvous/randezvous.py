@@ -7,6 +7,7 @@ import datetime
 from typing import List, Tuple
 from envs.diamond.utils import one_hot_encode
 
+from envs.randezvous import scenarios
 from envs.randezvous.world import RandezvousWorld
 from envs.randezvous.agents import Direction
 
@@ -45,6 +46,8 @@ class RandezvousEnv:
         debug: bool = False,
         enable_render: bool = False,
         test_mode: bool = False,
+        scenario=None,
+        scenario_cache_dir: str = None,
     ):
         # os.environ["SDL_VIDEODRIVER"] = "dummy"
         pygame.init()
@@ -62,12 +65,17 @@ class RandezvousEnv:
         self.lidar_interval = lidar_interval
         self.enable_render = enable_render
 
+        # マップ: scenario（scenarios.py の名前・パス・辞書。None は既定のマップ）
+        if scenario is not None:
+            scenario = scenarios.get_scenario(scenario, cache_dir=scenario_cache_dir)
+
         self.world = RandezvousWorld(
             self.agent_velocity,
             self.guard_velocity,
             self.channel_size,
             self.lidar_angle,
             self.lidar_interval,
+            scenario,
         )
         self.n_agents = len(self.world.agents)
 
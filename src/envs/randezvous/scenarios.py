@@ -0,0 +1,104 @@
+"""
+RandezvousWorld のマップ（シナリオ）
+
+どの関数も envs.scenario の形式のシナリオの辞書を返す
+    - spawns: 各エージェントの初期位置（エージェントの順番）
+    - areas[0]: 2体で集まるゴール
+"""
+import numpy as np
+
+from envs.scenario import compile_scenario, resolve_scenario
+
+
+def randezvous(
+    corridor_width=70,
+    wall_width=170,
+    wall_height=45,
+    wall_gap=50,
+    num_walls=1,
+    goal_size=50,
+    border_width=2,
+) -> dict:
+    """
+    左右の通路の下端から出発し、横長の壁を回り込んで上のゴールに集まるマップ（RandezvousWorld の既定）
+    """
+    width = 2 * corridor_width + wall_width
+    height = num_walls * wall_height + (num_walls - 1) * wall_gap + 2 * wall_gap + goal_size
+
+    walls = [
+        [corridor_width, height - wall_height - i * (wall_height + wall_gap), wall_width, wall_height]
+        for i in range(num_walls)
+    ]
+    return {
+        "name": "randezvous",
+        "width": width,
+        "height": height,
+        "border_width": border_width,
+        "walls": walls,
+        "areas": [[width // 2, wall_gap + goal_size // 2, goal_size]],
+        "spawns": [
+            [width - corridor_width // 2, height - wall_height // 2],
+            [corridor_width // 2, height - wall_height // 2],
+        ],
+    }
+
+
+def random_randezvous(
+    seed=0,
+    width=310,
+    height=190,
+    max_walls=2,
+    min_gap=50,
+    goal_size=50,
+    agent_size=15,
+    border_width=2,
+    max_tries=100,
+) -> dict:
+    """
+    外周の大きさと初期位置は固定で、ゴールの横位置と中の壁を seed から決めたマップ
+    どちらかのエージェントがゴールまで通れないマップは作り直す
+    """
+    rng = np.random.RandomState(seed)
+    spawns = [[width - 2 * agent_size, height - 2 * agent_size], [2 * agent_size, height - 2 * agent_size]]
+    top = goal_size + min_gap
+
+    for _ in range(max_tries):
+        goal_x = rng.randint(goal_size // 2 + border_width, width - goal_size // 2 - border_width)
+        goal = [int(goal_x), min_gap // 2 + goal_size // 2, goal_size]
+        walls = []
+        for _ in range(rng.randint(0, max_walls + 1)):
+            wall_width = int(rng.randint(width // 4, width - 2 * min_gap))
+            wall_height = int(rng.randint(10, 50))
+            x = int(rng.randint(min_gap, width - wall_width - min_gap + 1))
+            y = int(rng.randint(top, height - wall_height - 2 * agent_size))
+            walls.append([x, y, wall_width, wall_height])
+        spec = {
+            "name": "random_randezvous",
+            "width": width,
+            "height": height,
+            "border_width": border_width,
+            "walls": walls,
+            "areas": [goal],
+            "spawns": spawns,
+        }
+        scenario = compile_scenario(spec)
+        if all(scenario.connected(spawn, goal[:2], clearance=agent_size / 2) for spawn in spawns):
+            return spec
+    raise RuntimeError("Could not generate a solvable randezvous map (seed={})".format(seed))
+
+
+SCENARIOS = {
+    "randezvous": randezvous,
+    "random_randezvous": random_randezvous,
+}
+
+
+def get_scenario(scenario=None, seed=None, cache_dir=None, **kwargs):
+    """
+    名前・パス・辞書からコンパイル済みのシナリオを取得する（None は既定のマップ）
+    """
+    if scenario is None:
+        scenario = "randezvous"
+    if seed is not None:
+        kwargs["seed"] = seed
+    return resolve_scenario(scenario, SCENARIOS, cache_dir=cache_dir, **kwargs)
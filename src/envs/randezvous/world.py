@@ -3,9 +3,12 @@ import numpy as np
 import pygame
 from typing import List, Tuple
 
+from envs.scenario import Scenario
+from envs.randezvous import scenarios
 from envs.randezvous.objects import Goal, Room, Wall, Border, Guard, Orientation
 from envs.randezvous.agents import RobotAgent, SensorAgent, Agent
 from envs.randezvous.utils import one_hot_encode
+from utils.profiler import profiler
 
 
 class World:
@@ -55,6 +58,7 @@ class RandezvousWorld(World):
         channel_size: int,
         lidar_angle: float,
         lidar_interval: float,
+        scenario: Scenario = None,
     ):
 
         self.agent_velocity = agent_velocity
@@ -63,13 +67,21 @@ class RandezvousWorld(World):
         self.lidar_angle = lidar_angle
         self.lidar_interval = lidar_interval
 
-        self.WIDTH = 2 * self.CORRIDOR_WIDTH + self.WALL_WIDTH
-        self.HEIGHT = (
-            self.NUM_WALLS * self.WALL_HEIGHT
-            + (self.NUM_WALLS - 1) * self.WALL_GAP
-            + 2 * self.WALL_GAP
-            + self.GOAL_SIZE
-        )
+        # マップ（シナリオ）は省略するとクラス定数から作る既定のもの
+        if scenario is None:
+            scenario = scenarios.get_scenario(
+                "randezvous",
+                corridor_width=self.CORRIDOR_WIDTH,
+                wall_width=self.WALL_WIDTH,
+                wall_height=self.WALL_HEIGHT,
+                wall_gap=self.WALL_GAP,
+                num_walls=self.NUM_WALLS,
+                goal_size=self.GOAL_SIZE,
+                border_width=self.BORDER_WIDTH,
+            )
+        self.scenario = scenario
+        self.WIDTH = scenario.width
+        self.HEIGHT = scenario.height
 
         self.lidar_range = math.sqrt(self.WIDTH**2 + self.HEIGHT**2)
 
@@ -92,13 +104,7 @@ class RandezvousWorld(World):
         )
         self.agents = [agent1, agent2]
 
-        self.initial_positions = [
-            (
-                self.WIDTH - self.CORRIDOR_WIDTH // 2,
-                self.HEIGHT - self.WALL_HEIGHT // 2,
-            ),
-            (self.CORRIDOR_WIDTH // 2, self.HEIGHT - self.WALL_HEIGHT // 2),
-        ]
+        self.initial_positions = [tuple(spawn) for spawn in scenario.spawns.tolist()]
 
         # self.AGENT1_POS = (
         #     self.WIDTH - self.CORRIDOR_WIDTH // 2,
@@ -119,91 +125,29 @@ class RandezvousWorld(World):
         self.__create_map()
 
     def __create_map(self):
+        """
+        シナリオの壁・ゴールからスプライトを作る
+        """
         self.room = Room(self.WIDTH, self.HEIGHT, self.FLOOR_COLOR)
-        self.goal = Goal(
-            self.WIDTH // 2,
-            self.WALL_GAP + self.GOAL_SIZE // 2,
-            self.GOAL_SIZE,
-            self.GOAL_COLOR,
-        )
+        goal_x, goal_y = (int(v) for v in self.scenario.area_centers[0])
+        self.goal = Goal(goal_x, goal_y, int(self.scenario.area_sizes[0]), self.GOAL_COLOR)
         self.maps = pygame.sprite.Group(self.room, self.goal)
+        for wall_x, wall_y, wall_width, wall_height in self.scenario.wall_boxes.tolist():
+            self.maps.add(Wall(wall_x, wall_y, wall_width, wall_height, self.WALL_COLOR))
         self.borders = pygame.sprite.Group(
-            Border(
-                (0, 0),
-                self.WIDTH,
-                Orientation.HORIZONTAL,
-                self.BORDER_WIDTH,
-                self.BORDER_COLOR,
-            ),
-            Border(
-                (self.WIDTH, 0),
-                self.HEIGHT,
-                Orientation.VERTICAL,
-                self.BORDER_WIDTH,
-                self.BORDER_COLOR,
-            ),
-            Border(
-                (0, self.HEIGHT),
-                self.WIDTH,
-                Orientation.HORIZONTAL,
-                self.BORDER_WIDTH,
-                self.BORDER_COLOR,
-            ),
-            Border(
-                (0, 0),
-                self.HEIGHT,
-                Orientation.VERTICAL,
-                self.BORDER_WIDTH,
-                self.BORDER_COLOR,
-            ),
-        )
-
-        for i in range(self.NUM_WALLS):
-            wall_x = self.CORRIDOR_WIDTH
-            wall_y = (
-                self.HEIGHT - self.WALL_HEIGHT - i * (self.WALL_HEIGHT + self.WALL_GAP)
-            )
-            self.maps.add(
-                Wall(
-                    wall_x,
-                    wall_y,
-                    self.WALL_WIDTH,
-                    self.WALL_HEIGHT,
-                    self.WALL_COLOR,
-                )
-            )
-            self.borders.add(
+            *[
                 Border(
-                    (wall_x, wall_y),
-                    self.WALL_WIDTH,
-                    Orientation.HORIZONTAL,
+                    start,
+                    length,
+                    Orientation.HORIZONTAL if horizontal else Orientation.VERTICAL,
                     self.BORDER_WIDTH,
                     self.BORDER_COLOR,
-                ),
-                Border(
-                    (wall_x + self.WALL_WIDTH, wall_y),
-                    self.WALL_HEIGHT,
-                    Orientation.VERTICAL,
-                    self.BORDER_WIDTH,
-                    self.BORDER_COLOR,
-                ),
-                Border(
-                    (wall_x, wall_y + self.WALL_HEIGHT),
-                    self.WALL_WIDTH,
-                    Orientation.HORIZONTAL,
-                    self.BORDER_WIDTH,
-                    self.BORDER_COLOR,
-                ),
-                Border(
-                    (wall_x, wall_y),
-                    self.WALL_HEIGHT,
-                    Orientation.VERTICAL,
-                    self.BORDER_WIDTH,
-                    self.BORDER_COLOR,
-                ),
-            )
+                )
+                for start, length, horizontal in self.scenario.border_specs()
+            ]
+        )
         img = pygame.image.load("src/envs/diamond/diamond.png")
-        self.diamond_img = pygame.transform.scale(img, (self.GOAL_SIZE, self.GOAL_SIZE))
+        self.diamond_img = pygame.transform.scale(img, self.goal.rect.size)
 
     def reset(self, random_direction=False):
         self.channel = None
@@ -231,9 +175,7 @@ class RandezvousWorld(World):
         self.borders.draw(screen)
         self.__draw_lasers(screen)
         self.players.draw(screen)
-        screen.blit(
-            self.diamond_img, (self.WIDTH // 2 - self.GOAL_SIZE // 2, self.WALL_GAP)
-        )
+        screen.blit(self.diamond_img, self.goal.rect.topleft)
 
     def __draw_lasers(self, screen):
         for agent in self.agents:
@@ -266,7 +208,8 @@ class RandezvousWorld(World):
 
     def laser_scan(self, agent: RobotAgent) -> np.ndarray:
         obstacle_lines = self.__get_obstacle_lines()
-        laser_points = agent.laser_scan(obstacle_lines)
+        with profiler.timer("laser_scan"):
+            laser_points = agent.laser_scan(obstacle_lines)
         laser_distances = [
             math.sqrt((point[0] - agent.pos.x) ** 2 + (point[1] - agent.pos.y) ** 2)
             for point in laser_points
@@ -0,0 +1,398 @@
+"""
+マップ（シナリオ）のコンパイラ
+
+シナリオは次のような辞書（YAMLにもそのまま書ける）で宣言的に表す:
+
+    name: museum
+    width: 310               # マップの大きさ
+    height: 90
+    border_width: 2          # 壁の当たり判定の太さ
+    boundary: true           # 外周の壁を作るか
+    walls: [[x, y, w, h]]    # 中が詰まった矩形の壁（4辺の線分になる）
+    segments: [[x0, y0, x1, y1]]  # 追加の壁（水平または垂直な線分）
+    areas: [[cx, cy, size]]  # ゴールなどの正方形の領域（中心と一辺の長さ）
+    spawns: [[x, y]]         # エージェントの初期位置
+    guard_paths: [[[x, y], ...]]  # 警備員の巡回経路（通過点の列）
+    cell_size: 5             # 衝突判定用の占有グリッドの1マスの大きさ
+
+compile_scenario() はこれを PhysicsCore と同じ形の配列（線分・当たり判定の矩形・領域）と
+占有グリッドにまとめた Scenario を返す。Scenario は .npz に保存でき、
+load_scenario() はシナリオのハッシュをキーにしてプロセス内のLRUとディスクにキャッシュするので、
+毎エピソード別のマップを使う場合でもマップの構築は最初の1回だけで済む
+"""
+import hashlib
+import inspect
+import json
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+import numpy as np
+import yaml
+
+from envs.physics import rect_from_center, rects_collide
+
+# 配列の形式を変えたら上げる（古いキャッシュを使わないように）
+COMPILER_VERSION = 1
+
+DEFAULT_CELL_SIZE = 5
+
+
+class Scenario:
+    """
+    コンパイル済みのマップ（すべて読み取り専用のNumPy配列）
+
+        - segments: [M, 4] 壁の線分 [x0, y0, x1, y1]（外周 → walls の4辺 → segments の順）
+        - wall_widths: [M] 壁の太さ
+        - wall_rects: [M, 4] 壁の当たり判定の矩形 [left, top, width, height]
+        - wall_boxes: [K, 4] 中が詰まった矩形の壁（描画用）
+        - areas: [A, 4] 領域の矩形, area_centers: [A, 2], area_sizes: [A]
+        - spawns: [S, 2] 初期位置
+        - guard_paths: [P, L, 2] 巡回経路（L は最長の経路に合わせて末尾を埋める）, guard_path_lengths: [P]
+        - occupancy: [H / cell_size, W / cell_size] 壁があるマスが True
+    """
+
+    FIELDS = (
+        "size",
+        "border_width",
+        "cell_size",
+        "segments",
+        "wall_widths",
+        "wall_rects",
+        "wall_boxes",
+        "areas",
+        "area_centers",
+        "area_sizes",
+        "spawns",
+        "guard_paths",
+        "guard_path_lengths",
+        "occupancy",
+        "spec",
+    )
+
+    def __init__(self, arrays: dict, key: str = None):
+        for name in self.FIELDS:
+            value = np.asarray(arrays[name])
+            value.flags.writeable = False
+            setattr(self, name, value)
+        self.key = key
+
+    @property
+    def width(self) -> int:
+        return int(self.size[0])
+
+    @property
+    def height(self) -> int:
+        return int(self.size[1])
+
+    @property
+    def name(self) -> str:
+        return json.loads(str(self.spec)).get("name", "")
+
+    def border_specs(self):
+        """
+        壁を (始点, 長さ, 水平か) のリストで返す（objects.Border の引数と同じ）
+        """
+        specs = []
+        for x0, y0, x1, y1 in self.segments.astype(np.int64).tolist():
+            if y0 == y1:
+                specs.append(((x0, y0), x1 - x0, True))
+            else:
+                specs.append(((x0, y0), y1 - y0, False))
+        return specs
+
+    def guard_path(self, index: int) -> np.ndarray:
+        return self.guard_paths[index, : self.guard_path_lengths[index]]
+
+    def cells(self, points) -> np.ndarray:
+        """
+        座標 [..., 2] が入っている占有グリッドのマス [..., 2]（行, 列）
+        """
+        points = np.asarray(points, dtype=np.float64)
+        cols = np.clip(points[..., 0] // self.cell_size, 0, self.occupancy.shape[1] - 1)
+        rows = np.clip(points[..., 1] // self.cell_size, 0, self.occupancy.shape[0] - 1)
+        return np.stack((rows, cols), axis=-1).astype(np.int64)
+
+    def is_free(self, points, clearance: float = 0) -> np.ndarray:
+        """
+        座標 [..., 2] の周り clearance 以内に壁がないか
+        """
+        cells = self.cells(points)
+        occupancy = self._inflate(clearance)
+        return ~occupancy[cells[..., 0], cells[..., 1]]
+
+    def connected(self, start, goal, clearance: float = 0) -> bool:
+        """
+        start から goal まで壁から clearance 以上離れたまま移動できるか
+        占有グリッド上で上下左右に塗りつぶして調べる
+        """
+        free = ~self._inflate(clearance)
+        (r0, c0), (r1, c1) = self.cells(start), self.cells(goal)
+        if not (free[r0, c0] and free[r1, c1]):
+            return False
+        reached = np.zeros_like(free)
+        reached[r0, c0] = True
+        while True:
+            grown = reached.copy()
+            grown[1:] |= reached[:-1]
+            grown[:-1] |= reached[1:]
+            grown[:, 1:] |= reached[:, :-1]
+            grown[:, :-1] |= reached[:, 1:]
+            grown &= free
+            if grown[r1, c1]:
+                return True
+            if (grown == reached).all():
+                return False
+            reached = grown
+
+    def _inflate(self, clearance: float) -> np.ndarray:
+        """
+        壁のマスを clearance だけ（マス単位に切り上げて）太らせた占有グリッド
+        """
+        radius = int(np.ceil(clearance / self.cell_size))
+        occupancy = self.occupancy.copy()
+        for _ in range(radius):
+            grown = occupancy.copy()
+            grown[1:] |= occupancy[:-1]
+            grown[:-1] |= occupancy[1:]
+            grown[:, 1:] |= occupancy[:, :-1]
+            grown[:, :-1] |= occupancy[:, 1:]
+            occupancy = grown
+        return occupancy
+
+    def save(self, path: str):
+        """
+        .npz に保存する（一時ファイルに書いてから置き換えるので、読み込み中のプロセスが壊れたファイルを見ない）
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = "{}.{}.tmp.npz".format(path[: -len(".npz")], os.getpid())
+        np.savez(tmp_path, **{name: getattr(self, name) for name in self.FIELDS})
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, key: str = None) -> "Scenario":
+        with np.load(path, allow_pickle=False) as bundle:
+            return cls({name: bundle[name] for name in cls.FIELDS}, key=key)
+
+
+def _box_segments(boxes: np.ndarray) -> np.ndarray:
+    """
+    矩形 [K, 4] の4辺（上・右・下・左）の線分 [4K, 4]
+    """
+    x, y, w, h = boxes.T
+    return np.stack(
+        (
+            np.stack((x, y, x + w, y), axis=-1),
+            np.stack((x + w, y, x + w, y + h), axis=-1),
+            np.stack((x, y + h, x + w, y + h), axis=-1),
+            np.stack((x, y, x, y + h), axis=-1),
+        ),
+        axis=1,
+    ).reshape(-1, 4)
+
+
+def _segment_rects(segments: np.ndarray, border_width: int) -> np.ndarray:
+    """
+    線分 [M, 4] の当たり判定の矩形（PhysicsCore.add_wall と同じ）
+    """
+    x0, y0, x1, y1 = segments.T
+    horizontal = (y0 == y1)[:, None]
+    length = np.where(horizontal[:, 0], x1 - x0, y1 - y0)
+    centers = np.where(
+        horizontal,
+        np.stack((x0 + length / 2, y0), axis=-1),
+        np.stack((x0, y0 + length / 2), axis=-1),
+    )
+    sizes = np.where(
+        horizontal,
+        np.stack((length, np.full_like(length, border_width)), axis=-1),
+        np.stack((np.full_like(length, border_width), length), axis=-1),
+    ).astype(np.int64)
+    return rect_from_center(centers, sizes).reshape(-1, 4)
+
+
+def compile_scenario(spec: dict) -> Scenario:
+    """
+    シナリオの辞書をコンパイルする
+    """
+    width, height = int(spec["width"]), int(spec["height"])
+    border_width = int(spec.get("border_width", 2))
+    cell_size = int(spec.get("cell_size", DEFAULT_CELL_SIZE))
+
+    segments = []
+    if spec.get("boundary", True):
+        segments.append(
+            [[0, 0, width, 0], [width, 0, width, height], [0, height, width, height], [0, 0, 0, height]]
+        )
+    wall_boxes = np.array(spec.get("walls", []), dtype=np.int64).reshape(-1, 4)
+    segments.append(_box_segments(wall_boxes))
+    segments.append(spec.get("segments", []))
+    segments = np.concatenate(
+        [np.asarray(s, dtype=np.float64).reshape(-1, 4) for s in segments]
+    )
+    x0, y0, x1, y1 = segments.T
+    if not (((y0 == y1) & (x0 <= x1)) | ((x0 == x1) & (y0 <= y1))).all():
+        raise ValueError("Walls must be horizontal or vertical segments from left/top to right/bottom")
+    wall_rects = _segment_rects(segments, border_width)
+
+    areas = np.array(spec.get("areas", []), dtype=np.int64).reshape(-1, 3)
+    area_centers = areas[:, :2].astype(np.float64)
+    area_sizes = areas[:, 2]
+    area_rects = rect_from_center(area_centers, np.stack((area_sizes, area_sizes), axis=-1))
+
+    spawns = np.array(spec.get("spawns", []), dtype=np.float64).reshape(-1, 2)
+
+    paths = [np.asarray(path, dtype=np.float64).reshape(-1, 2) for path in spec.get("guard_paths", [])]
+    guard_path_lengths = np.array([len(path) for path in paths], dtype=np.int64)
+    guard_paths = np.zeros((len(paths), guard_path_lengths.max(initial=0), 2))
+    for i, path in enumerate(paths):
+        # 経路の最後の点で埋める
+        guard_paths[i] = path[-1]
+        guard_paths[i, : len(path)] = path
+
+    # 占有グリッド: 壁の当たり判定の矩形か中の詰まった壁に重なるマス
+    rows, cols = -(-height // cell_size), -(-width // cell_size)
+    grid_y, grid_x = np.meshgrid(np.arange(rows), np.arange(cols), indexing="ij")
+    cells = np.stack(
+        (grid_x * cell_size, grid_y * cell_size, np.full_like(grid_x, cell_size), np.full_like(grid_y, cell_size)),
+        axis=-1,
+    ).reshape(-1, 1, 4)
+    obstacles = np.concatenate((wall_rects, wall_boxes))
+    occupancy = rects_collide(cells, obstacles[None]).any(axis=-1).reshape(rows, cols)
+
+    return Scenario(
+        {
+            "size": np.array([width, height], dtype=np.int64),
+            "border_width": np.array(border_width),
+            "cell_size": np.array(cell_size),
+            "segments": segments,
+            "wall_widths": np.full(len(segments), border_width, dtype=np.int64),
+            "wall_rects": wall_rects,
+            "wall_boxes": wall_boxes,
+            "areas": area_rects.reshape(-1, 4),
+            "area_centers": area_centers,
+            "area_sizes": area_sizes,
+            "spawns": spawns,
+            "guard_paths": guard_paths,
+            "guard_path_lengths": guard_path_lengths,
+            "occupancy": occupancy,
+            "spec": np.array(json.dumps(spec, sort_keys=True)),
+        },
+        key=scenario_key(spec),
+    )
+
+
+def scenario_key(spec: dict) -> str:
+    """
+    シナリオの辞書のハッシュ（キャッシュのキー）
+    """
+    text = json.dumps([COMPILER_VERSION, spec], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+@lru_cache(maxsize=None)
+def _generator_hash(make) -> str:
+    """
+    シナリオを作る関数のハッシュ（関数やそれが使う補助関数を書き換えたら、ディスクに残っている古いマップを使わないように）
+    関数が定義されているモジュール全体のソースから作る（ソースが読めなければ関数のバイトコードと引数の既定値）
+    """
+    try:
+        text = inspect.getsource(inspect.getmodule(make))
+    except (OSError, TypeError):
+        text = repr((make.__code__.co_code, make.__code__.co_consts, make.__defaults__, make.__kwdefaults__))
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+class ScenarioCache:
+    """
+    コンパイル済みのシナリオのキャッシュ
+
+    1. プロセス内のLRU（最近使った maxsize 個）
+    2. cache_dir の .npz（別のプロセス・次回の実行と共有される）
+    3. どちらにもなければコンパイルして両方に入れる
+    """
+
+    def __init__(self, maxsize: int = 64):
+        self.maxsize = maxsize
+        self._scenarios = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def get(self, spec: dict, cache_dir: str = None) -> Scenario:
+        return self.get_or_build(scenario_key(spec), lambda: spec, spec.get("name", "scenario"), cache_dir)
+
+    def get_or_build(self, key: str, make_spec, name: str, cache_dir: str = None) -> Scenario:
+        """
+        key のシナリオを返す。どちらのキャッシュにもなければ make_spec() で辞書を作ってコンパイルする
+        （ランダムに生成するマップは生成自体もキャッシュで省けるように、生成の引数から key を作る）
+        """
+        with self._lock:
+            scenario = self._scenarios.get(key)
+            if scenario is not None:
+                self._scenarios.move_to_end(key)
+                self.hits += 1
+                return scenario
+
+        path = None
+        if cache_dir is not None:
+            path = os.path.join(cache_dir, "{}_{}.npz".format(name, key))
+        if path is not None and os.path.exists(path):
+            scenario = Scenario.load(path, key=key)
+            self.disk_hits += 1
+        else:
+            scenario = compile_scenario(make_spec())
+            scenario.key = key
+            self.misses += 1
+            if path is not None:
+                scenario.save(path)
+
+        with self._lock:
+            self._scenarios[key] = scenario
+            while len(self._scenarios) > self.maxsize:
+                self._scenarios.popitem(last=False)
+        return scenario
+
+    def clear(self):
+        with self._lock:
+            self._scenarios.clear()
+
+
+_cache = ScenarioCache()
+
+
+def load_scenario(scenario, cache_dir: str = None) -> Scenario:
+    """
+    シナリオを読み込む
+    scenario は辞書・.yaml のパス・.npz のパス（コンパイル済み）・Scenario のいずれか
+    """
+    if isinstance(scenario, Scenario):
+        return scenario
+    if isinstance(scenario, str):
+        if scenario.endswith(".npz"):
+            return Scenario.load(scenario)
+        with open(scenario, "r", encoding="utf-8") as f:
+            scenario = yaml.safe_load(f)
+    return _cache.get(scenario, cache_dir)
+
+
+def resolve_scenario(scenario, registry: dict, cache_dir: str = None, **kwargs) -> Scenario:
+    """
+    環境の引数 scenario（registry の名前・パス・辞書）を Scenario にする
+    名前の場合は registry の関数に kwargs（seed など、関数が受け取るものだけ）を渡してシナリオを作る
+    """
+    if isinstance(scenario, str) and scenario in registry:
+        make = registry[scenario]
+        params = inspect.signature(make).parameters
+        kwargs = {k: v for k, v in kwargs.items() if k in params}
+        key = scenario_key(
+            {
+                "generator": "{}.{}".format(make.__module__, make.__name__),
+                "source": _generator_hash(make),
+                "kwargs": kwargs,
+            }
+        )
+        return _cache.get_or_build(key, lambda: make(**kwargs), scenario, cache_dir)
+    return load_scenario(scenario, cache_dir)
@@ -0,0 +1,52 @@
+import numpy as np
+from gym import spaces
+
+from envs.gym_vector import AsyncShardedVectorEnv, CorridorVectorEnv
+from envs.single.gym_env import SingleAgentEnv
+from envs.single.world import SimpleWorld
+
+
+class VectorSingleAgentEnv(CorridorVectorEnv):
+    """
+    SingleAgentEnv を n_envs 個まとめて動かす gym の VectorEnv
+
+    SimpleWorld の動き・衝突判定・LiDARを全環境まとめてNumPyで計算する（pygameの描画はしない）
+    観測は SingleAgentEnv と同じ [ゴールの相対座標 (x, y), LiDARの距離 (d1, ..., dn)] を
+    float32 にしたもの [n_envs, n_lasers + 2]
+
+    NOTE: SingleAgentEnv は1つ前のステップ数でタイムアウトを判定するので、
+    MAX_EPISODE_STEPS + 1 ステップ目で打ち切られる（truncated）
+    """
+
+    def __init__(self, n_envs: int, seed=None):
+        n_lasers = SimpleWorld.LIDAR_ANGLE // SimpleWorld.LIDAR_INTERVAL
+        super().__init__(
+            SimpleWorld,
+            n_envs,
+            observation_space=spaces.Box(low=-1, high=1, shape=(n_lasers + 2,), dtype=np.float32),
+            action_space=spaces.Discrete(4),
+            max_episode_steps=SingleAgentEnv.MAX_EPISODE_STEPS + 1,
+            reward_success=SingleAgentEnv.REWARD_SUCCESS,
+            reward_failure=SingleAgentEnv.REWARD_FAILURE,
+            seed=seed,
+        )
+
+    def _apply_actions(self, actions):
+        self.world.step(actions.reshape(self.num_envs))
+
+    def _get_obs(self) -> np.ndarray:
+        laser_distances = self.world.laser_scan() / self.world.lidar_range
+        obs = np.concatenate(
+            (self.world.get_relative_normalized_goal_position(), laser_distances), axis=-1
+        )
+        return obs.astype(np.float32)
+
+
+def make_vector_env(n_envs: int, n_workers: int = 0, seed=None):
+    """
+    n_workers が0なら同じプロセスで n_envs 個の環境をまとめて動かす VectorSingleAgentEnv、
+    1以上なら n_workers 個のサブプロセスに分けて動かす AsyncShardedVectorEnv を作る
+    """
+    if n_workers == 0:
+        return VectorSingleAgentEnv(n_envs, seed=seed)
+    return AsyncShardedVectorEnv(VectorSingleAgentEnv, n_envs, n_workers, seed=seed)
@@ -3,6 +3,7 @@ import logging
 
 import gym
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 # from gym import spaces
 from gym.utils import seeding
 
@@ -55,9 +56,22 @@ class Checkers(gym.Env):
         self.agent_reward = {0: {'lemon': -10, 'apple': 10},
                              1: {'lemon': -1, 'apple': 1}}
 
+        # 各マスの位置の正規化座標 [rows, cols, 2]（観測の先頭2つ）
+        self._coords = np.array(
+            [[[round(r / self._grid_shape[0], 2), round(c / (self._grid_shape[1] - 1), 2)]
+              for c in range(self._grid_shape[1])]
+             for r in range(self._grid_shape[0])]
+        )
+
         self.agent_prev_pos = None
         self._base_grid = None
-        self._full_obs = None
+        self._base_img = None
+        # 盤面: 周りを1マス EMPTY で埋めた整数のグリッド（ITEM_IDS）。_grid はその内側のビュー
+        self._padded_grid = None
+        self._grid = None
+        self._windows = None
+        # 観測はグリッドが変わるまで使い回す（get_state と get_obs で共有）
+        self._obs = None
         self._agent_dones = None
         self.viewer = None
         self._food_count = None
@@ -104,6 +118,7 @@ class Checkers(gym.Env):
         assert len(agents_action) == self.n_agents
         # タイムステップを進める
         self._step_count += 1
+        self._obs = None
 
         if self.debug:
             logging.debug("Actions".center(60, "-"))
@@ -121,14 +136,13 @@ class Checkers(gym.Env):
 
             # 前回と位置が変わっていたら
             if self.agent_pos[agent_i] != self.agent_prev_pos[agent_i]:
-                for food in ['lemon', 'apple']:
-                    # 移動先に果物があるかを調べる
-                    if PRE_IDS[food] in self._full_obs[self.agent_pos[agent_i][0]][self.agent_pos[agent_i][1]]:
-                        # 果物をGETしたことによる報酬を獲得
-                        rewards[agent_i] += self.agent_reward[agent_i][food]
-                        # 果物の残数を更新
-                        self._food_count[food] -= 1
-                        break
+                # 移動先に果物があるかを調べる
+                food = FOOD_NAMES.get(int(self._grid[self.agent_pos[agent_i][0], self.agent_pos[agent_i][1]]))
+                if food is not None:
+                    # 果物をGETしたことによる報酬を獲得
+                    rewards[agent_i] += self.agent_reward[agent_i][food]
+                    # 果物の残数を更新
+                    self._food_count[food] -= 1
                 # エージェントの移動をグリッドに反映
                 self.__update_agent_view(agent_i)
 
@@ -257,90 +271,74 @@ class Checkers(gym.Env):
             self._grid_shape[0], self._grid_shape[1], cell_size=CELL_SIZE, fill='white')
         for row in range(self._grid_shape[0]):
             for col in range(self._grid_shape[1]):
-                if PRE_IDS['wall'] in self._full_obs[row][col]:
+                item = self._grid[row, col]
+                if item == ITEM_IDS['wall']:
                     fill_cell(self._base_img, (row, col),
                               cell_size=CELL_SIZE, fill=WALL_COLOR, margin=0.05)
-                elif PRE_IDS['lemon'] in self._full_obs[row][col]:
+                elif item == ITEM_IDS['lemon']:
                     fill_cell(self._base_img, (row, col),
                               cell_size=CELL_SIZE, fill=LEMON_COLOR, margin=0.05)
-                elif PRE_IDS['apple'] in self._full_obs[row][col]:
+                elif item == ITEM_IDS['apple']:
                     fill_cell(self._base_img, (row, col),
                               cell_size=CELL_SIZE, fill=APPLE_COLOR, margin=0.05)
 
     def __create_grid(self):
-        """create grid and fill in lemon and apple locations. This grid doesn't fill agents location"""
-        _grid = []
-        for row in range(self._grid_shape[0]):
-            if row % 2 == 0:
-                _grid.append([PRE_IDS['apple'] if (c % 2 == 0) else PRE_IDS['lemon']
-                              for c in range(self._grid_shape[1] - 2)] + [PRE_IDS['empty'], PRE_IDS['empty']])
-            else:
-                _grid.append([PRE_IDS['apple'] if (c % 2 != 0) else PRE_IDS['lemon']
-                              for c in range(self._grid_shape[1] - 2)] + [PRE_IDS['empty'], PRE_IDS['empty']])
-
-        return _grid
+        """
+        create grid and fill in lemon and apple locations. This grid doesn't fill agents location
+        周りを1マス EMPTY で埋めた [rows + 2, cols + 2] の整数のグリッドを返す
+        """
+        rows, cols = self._grid_shape
+        padded = np.full((rows + 2, cols + 2), ITEM_IDS['empty'], dtype=np.int64)
+        r, c = np.meshgrid(np.arange(rows), np.arange(cols - 2), indexing='ij')
+        # 偶数行は偶数列、奇数行は奇数列がリンゴ（市松模様）
+        padded[1:-1, 1:-1][:, :cols - 2] = np.where(
+            (r + c) % 2 == 0, ITEM_IDS['apple'], ITEM_IDS['lemon'])
+        return padded
 
     def __init_full_obs(self):
         self.agent_pos = copy.copy(self.init_agent_pos)
         self.agent_prev_pos = copy.copy(self.init_agent_pos)
-        self._full_obs = self.__create_grid()
+        self._padded_grid = self.__create_grid()
+        self._grid = self._padded_grid[1:-1, 1:-1]
+        # _windows[r, c] はグリッドの (r, c) を中心とする 3x3 マスのビュー（パディングのおかげで端でも同じ形）
+        self._windows = sliding_window_view(self._padded_grid, (3, 3))
+        self._obs = None
         for agent_i in range(self.n_agents):
             self.__update_agent_view(agent_i)
-        self.__draw_base_img()
+        # 描画用の画像は render() で初めて作る
+        self._base_img = None
+
+    def __compute_obs(self):
+        """
+        全エージェントの観測 [n_agents, obs_size]
+        各エージェントの周り 3x3 マスのアイテムのOne-Hotを、パディングしたグリッドの窓から一度に取り出す
+        """
+        if self._obs is not None:
+            return self._obs
+        pos = np.array([self.agent_pos[agent_i] for agent_i in range(self.n_agents)])
+        neighbours = ITEM_ONE_HOT[self._windows[pos[:, 0], pos[:, 1]]]  # [n_agents, 3, 3, 5]
+
+        features = [self._coords[pos[:, 0], pos[:, 1]], neighbours.reshape(self.n_agents, -1)]
+        # adding time
+        if self._add_clock:
+            features.append(np.full((self.n_agents, 1), self._step_count / self._max_steps))
+        self._obs = np.concatenate(features, axis=1)
+        return self._obs
 
     def get_obs(self):
         """
-        全てのエージェントの観測を1つのリストで返す
+        全てのエージェントの観測を [n_agents, obs_size] の配列で返す
         NOTE: 分散実行時はエージェントは自分自身の観測のみ用いるようにする
         """
-        _obs = []
-        for agent_i in range(self.n_agents):
-            pos = self.agent_pos[agent_i]
-
-            # add coordinates
-            _agent_i_obs = [round(pos[0] / self._grid_shape[0], 2),
-                            round(pos[1] / (self._grid_shape[1] - 1), 2)]
-
-            # add 3 x3 mask around the agent current location and share neighbours
-            # ( in practice: this information may not be so critical since the map never changes)
-            _agent_i_neighbour = np.zeros((3, 3, 5))
-            for r in range(pos[0] - 1, pos[0] + 2):
-                for c in range(pos[1] - 1, pos[1] + 2):
-                    if self.is_valid((r, c)):
-                        item = [0, 0, 0, 0, 0]
-                        if PRE_IDS['lemon'] in self._full_obs[r][c]:
-                            item[ITEM_ONE_HOT_INDEX['lemon']] = 1
-                        elif PRE_IDS['apple'] in self._full_obs[r][c]:
-                            item[ITEM_ONE_HOT_INDEX['apple']] = 1
-                        elif PRE_IDS['agent'] in self._full_obs[r][c]:
-                            item[ITEM_ONE_HOT_INDEX[self._full_obs[r][c]]] = 1
-                        elif PRE_IDS['wall'] in self._full_obs[r][c]:
-                            item[ITEM_ONE_HOT_INDEX['wall']] = 1
-                        _agent_i_neighbour[r -
-                                           (pos[0] - 1)][c - (pos[1] - 1)] = item
-            _agent_i_obs += _agent_i_neighbour.flatten().tolist()
-
-            # adding time
-            if self._add_clock:
-                _agent_i_obs += [self._step_count / self._max_steps]
-            _obs.append(_agent_i_obs)
-
-            if self.debug:
+        _obs = self.__compute_obs()
+
+        if self.debug:
+            for agent_i in range(self.n_agents):
                 logging.debug("Obs Agent: {}".format(agent_i).center(60, "-"))
-                # logging.debug(
-                #     "Avail. actions {}".format(
-                #         self.get_avail_agent_actions(agent_id)
-                #     )
-                # )
-                # logging.debug("Move feats {}".format(move_feats))
-                # logging.debug("Enemy feats {}".format(enemy_feats))
-                # logging.debug("Ally feats {}".format(ally_feats))
-                # logging.debug("Own feats {}".format(own_feats))
-                logging.debug(_obs)
+                logging.debug(_obs[agent_i])
 
         if self.full_observable:
-            _obs = np.array(_obs).flatten().tolist()
-            _obs = [_obs for _ in range(self.n_agents)]
+            _obs = np.tile(_obs.reshape(1, -1), (self.n_agents, 1))
         return _obs
 
     def get_state(self):
@@ -348,10 +346,8 @@ class Checkers(gym.Env):
         グローバル状態を返す
         NOTE: この関数は分散実行時は用いないこと
         """
-        # 各エージェントの観測を結合したものをグローバル状態とする
-        obs_concat = np.concatenate(self.get_obs(), axis=0).astype(
-            np.float32
-        )
+        # 各エージェントの観測を結合したものをグローバル状態とする（get_obs と同じ計算を使い回す）
+        obs_concat = self.get_obs().reshape(-1).astype(np.float32)
         return obs_concat
 
         # if self.obs_instead_of_state:
@@ -385,7 +381,7 @@ class Checkers(gym.Env):
         return (0 <= pos[0] < self._grid_shape[0]) and (0 <= pos[1] < self._grid_shape[1])
 
     def _has_no_agent(self, pos):
-        return self.is_valid(pos) and (PRE_IDS['agent'] not in self._full_obs[pos[0]][pos[1]])
+        return self.is_valid(pos) and (self._grid[pos[0], pos[1]] not in AGENT_IDS)
 
     def __update_agent_pos(self, agent_i, move):
 
@@ -408,12 +404,12 @@ class Checkers(gym.Env):
             self.agent_pos[agent_i] = next_pos
 
     def __update_agent_view(self, agent_i):
-        self._full_obs[self.agent_prev_pos[agent_i][0]
-                       ][self.agent_prev_pos[agent_i][1]] = PRE_IDS['empty']
-        self._full_obs[self.agent_pos[agent_i][0]][self.agent_pos[agent_i]
-                                                   [1]] = PRE_IDS['agent'] + str(agent_i + 1)
+        self._grid[self.agent_prev_pos[agent_i][0], self.agent_prev_pos[agent_i][1]] = ITEM_IDS['empty']
+        self._grid[self.agent_pos[agent_i][0], self.agent_pos[agent_i][1]] = AGENT_IDS[agent_i]
 
     def render(self, mode='human'):
+        if self._base_img is None:
+            self.__draw_base_img()
         for agent_i in range(self.n_agents):
             fill_cell(
                 self._base_img, self.agent_pos[agent_i], cell_size=CELL_SIZE, fill='white', margin=0.05)
@@ -466,14 +462,17 @@ OBSERVATION_MEANING = {
     -1: 'wall'
 }
 
-# each pre-id should be unique and single char
-PRE_IDS = {
-    'agent': 'A',
-    'wall': 'W',
-    'empty': '0',
-    'lemon': 'Y',  # yellow color
-    'apple': 'R',  # red color
+# 盤面のマスの値
+ITEM_IDS = {
+    'empty': 0,
+    'lemon': 1,  # yellow color
+    'apple': 2,  # red color
+    'A1': 3,
+    'A2': 4,
+    'wall': 5,
 }
+AGENT_IDS = (ITEM_IDS['A1'], ITEM_IDS['A2'])
+FOOD_NAMES = {ITEM_IDS['lemon']: 'lemon', ITEM_IDS['apple']: 'apple'}
 
 AGENT_COLORS = {
     0: 'red',
@@ -486,6 +485,11 @@ ITEM_ONE_HOT_INDEX = {
     'A2': 3,
     'wall': 4,
 }
+# マスの値 -> 観測のOne-Hot [len(ITEM_IDS), 5]（空きマスとグリッドの外は全て0）
+ITEM_ONE_HOT = np.zeros((len(ITEM_IDS), len(ITEM_ONE_HOT_INDEX)))
+for _name, _index in ITEM_ONE_HOT_INDEX.items():
+    ITEM_ONE_HOT[ITEM_IDS[_name], _index] = 1
+
 WALL_COLOR = 'black'
 LEMON_COLOR = 'yellow'
 APPLE_COLOR = 'green'
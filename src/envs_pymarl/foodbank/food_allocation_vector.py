@@ -0,0 +1,266 @@
+import fnmatch
+from typing import Tuple
+
+import numpy as np
+
+from envs_pymarl.foodbank.food_situations import food_params
+
+
+def match_situations(situation_name) -> list:
+    """
+    situation_name（名前・ワイルドカード "2a2f_*"・それらのリスト）に当てはまる状況の名前を
+    food_params に書かれた順番で返す
+    """
+    patterns = [situation_name] if isinstance(situation_name, str) else list(situation_name)
+    names = []
+    for pattern in patterns:
+        matched = [name for name in food_params if fnmatch.fnmatchcase(name, pattern)]
+        if not matched:
+            raise KeyError("No food situation matches '{}'".format(pattern))
+        names += [name for name in matched if name not in names]
+    return names
+
+
+class VectorFoodAllocationEnv:
+    """
+    FoodAllocationEnv を n_envs 個まとめて動かすベクトル化環境
+
+    バンクの在庫 [n_envs, n_foods]・エージェントの在庫と要求 [n_envs, n_agents, n_foods] を
+    NumPy配列で持ち、食品の獲得・終了判定・満足度・報酬を全環境まとめて計算する。
+    エピソードが終了した環境は step() の中で自動的にリセットされる。
+
+    situation_name にワイルドカードやリストを渡すと、当てはまる状況（エージェント数と食品数が
+    同じもの）を環境の番号順に交互に割り当てる（環境 i は situation_names[i % 状況の数]）
+
+    get_obs / get_state / get_avail_actions は
+    [n_envs, n_agents, obs_size], [n_envs, state_size], [n_envs, n_agents, n_actions]
+    の配列を返す（EpisodeBatch.update にそのまま渡せる）
+
+    NOTE: full_observable の場合 get_obs_size は全エージェント分の観測のサイズを返す。
+    グローバル状態は full_observable に関わらず各エージェントの部分観測を結合したもの
+    """
+
+    def __init__(
+        self,
+        n_envs: int,
+        full_observable: bool,
+        episode_limit: int,
+        debug: bool,
+        situation_name,
+        reward_mean_weight: float,
+        reward_std_weight: float,
+        reward_complete_bonus: float,
+        reward_step_cost: float,
+        seed=None,
+        test_mode: bool = False,
+        auto_reset: bool = True,
+    ):
+        self.n_envs = n_envs
+        self.full_observable = full_observable
+        self.episode_limit = episode_limit
+        self.debug = debug
+        self.reward_step_cost = reward_step_cost
+        self.reward_mean_weight = reward_mean_weight
+        self.reward_std_weight = reward_std_weight
+        self.reward_complete_bonus = reward_complete_bonus
+        self.auto_reset = auto_reset
+        self.test_mode = test_mode
+
+        # 状況ごとの在庫と要求（形が同じものだけまとめられる）
+        self.situation_names = match_situations(situation_name)
+        params = [food_params[name] for name in self.situation_names]
+        self.n_agents = params[0]["n_agents"]
+        self.n_foods = params[0]["n_foods"]
+        for name, param in zip(self.situation_names, params):
+            if (param["n_agents"], param["n_foods"]) != (self.n_agents, self.n_foods):
+                raise ValueError(
+                    "Situation '{}' has {} agents and {} foods, expected {} and {}".format(
+                        name, param["n_agents"], param["n_foods"], self.n_agents, self.n_foods
+                    )
+                )
+        situation_stock = np.array([param["initial_stock"] for param in params])
+        situation_requests = np.array([param["requests"] for param in params])
+
+        # 各環境の状況
+        self.situation = np.arange(n_envs) % len(params)
+        self.initial_stock = situation_stock[self.situation]
+        self.requests = situation_requests[self.situation]
+
+        self.n_actions = self.n_foods + 1
+
+        # 各環境の状態
+        self.bank_stock = self.initial_stock.copy()
+        self.agents_stock = np.zeros((n_envs, self.n_agents, self.n_foods))
+        self.episode_steps = np.zeros(n_envs, dtype=np.int64)
+
+        self._episode_count = 0
+        self._total_steps = 0
+        self.completed_count = 0
+        self.timeouts = 0
+
+    def get_env_info(self) -> dict:
+        """
+        環境の情報を取得する（1環境あたり）
+        """
+        return {
+            "state_shape": self.get_state_size(),
+            "obs_shape": self.get_obs_size(),
+            "n_actions": self.get_total_actions(),
+            "n_agents": self.n_agents,
+            "episode_limit": self.episode_limit,
+            "n_envs": self.n_envs,
+        }
+
+    def get_obs_size(self):
+        # 各食品の残量[n_foods] + 自身の各食品の満足度[n_foods]（full_observable なら全エージェント分）
+        obs_size = 2 * self.n_foods
+        if self.full_observable:
+            obs_size *= self.n_agents
+        return obs_size
+
+    def get_state_size(self):
+        return 2 * self.n_foods * self.n_agents
+
+    def get_total_actions(self):
+        # 各食品を取る[n_foods] + No-op[1]
+        return self.n_actions
+
+    def reset(self, episode=None, test_mode=False, print_log=False, mask=None):
+        """
+        環境をリセットする
+        mask（[n_envs] のbool配列）を渡すとその環境だけリセットする
+
+        戻り値:
+            - observations: [n_envs, n_agents, obs_size]
+            - states: [n_envs, state_size]
+        """
+        if mask is None:
+            mask = np.ones(self.n_envs, dtype=bool)
+            self.test_mode = test_mode
+
+        self.bank_stock[mask] = self.initial_stock[mask]
+        self.agents_stock[mask] = 0
+        self.episode_steps[mask] = 0
+        self._episode_count += int(mask.sum())
+
+        return self.get_obs(), self.get_state()
+
+    def step(self, actions) -> Tuple[np.ndarray, np.ndarray, dict]:
+        """
+        全環境の行動を実行して1ステップ進める
+        actions: [n_envs, n_agents]（最後の行動は No-op）
+
+        戻り値:
+            - reward: [n_envs]
+            - terminated: [n_envs]
+            - info: completed, timeout, satisfaction [n_envs, n_agents],
+                    satisfaction_mean, satisfaction_std, leftover, situation（いずれも [n_envs]）
+              満足度と残り個数は終了した環境の値だけが意味を持つ
+        """
+        actions = np.asarray(actions).reshape(self.n_envs, self.n_agents)
+
+        # 各エージェントが選んだ食品 [n_envs, n_agents, n_foods]（No-op は全て0）
+        chosen = actions[..., None] == np.arange(self.n_foods)
+        # FoodAllocationEnv と同じくエージェントの番号順に取っていくので、
+        # 同じ食品を選んだ自分より前のエージェントの数が在庫より少なければ取れる
+        rank = np.cumsum(chosen, axis=1) - chosen
+        taken = chosen & (rank < self.bank_stock[:, None, :])
+        self.agents_stock += taken
+        self.bank_stock -= taken.sum(axis=1)
+
+        self.episode_steps += 1
+        if not self.test_mode:
+            self._total_steps += self.n_envs
+
+        # 終了判定（タイムアウトを先に判定する）
+        timeout = self.episode_steps >= self.episode_limit
+        gap = self.requests - self.agents_stock
+        # 全てのエージェントの要求が満たされた or 要求のある食品の在庫がもうどれもない
+        required_count = gap.sum(axis=1)
+        completed = ~timeout & (
+            (gap <= 0).all(axis=(1, 2))
+            | ((required_count <= 0) | (self.bank_stock == 0)).all(axis=1)
+        )
+        terminated = completed | timeout
+        self.completed_count += int(completed.sum())
+        self.timeouts += int(timeout.sum())
+
+        # 報酬（満足度による報酬はエピソード終了時のみ）
+        satisfaction = self.get_satisfaction()
+        satisfaction_mean = satisfaction.mean(axis=1)
+        satisfaction_std = satisfaction.std(axis=1)
+        reward_satisfaction = (
+            self.reward_mean_weight * satisfaction_mean
+            - self.reward_std_weight * satisfaction_std
+        )
+        reward = self.reward_step_cost + np.where(terminated, reward_satisfaction, 0.0)
+        reward = reward + np.where(completed, self.reward_complete_bonus, 0.0)
+
+        info = {
+            "completed": completed,
+            "timeout": timeout,
+            "satisfaction": satisfaction,
+            "satisfaction_mean": satisfaction_mean,
+            "satisfaction_std": satisfaction_std,
+            "leftover": self.bank_stock.sum(axis=1),
+            "situation": self.situation,
+        }
+
+        if self.auto_reset and terminated.any():
+            self.reset(mask=terminated)
+
+        return reward, terminated, info
+
+    def get_satisfaction(self) -> np.ndarray:
+        """
+        全環境の各エージェントの満足度 [n_envs, n_agents]
+        各食品の満足度（獲得した個数 / 要求個数、最大1）の平均
+        """
+        # 要求個数が0の食品は FoodAllocationEnv と同じく nan になる
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rates = self.agents_stock / self.requests
+        rates[rates > 1.0] = 1.0
+        return rates.mean(axis=2)
+
+    def get_obs(self) -> np.ndarray:
+        """
+        全環境・全エージェントの観測 [n_envs, n_agents, obs_size]
+        - 各食品の残量 (0.0~1.0)
+        - 自身の各食品の満足度 (0.0~1.0)
+        """
+        obs = self._partial_obs()
+        if self.full_observable:
+            obs = np.broadcast_to(
+                obs.reshape(self.n_envs, 1, -1), (self.n_envs, self.n_agents, self.get_obs_size())
+            )
+        return obs.astype(np.float32)
+
+    def get_state(self) -> np.ndarray:
+        """
+        全環境のグローバル状態 [n_envs, state_size]（各エージェントの観測を結合したもの）
+        """
+        return self._partial_obs().reshape(self.n_envs, -1).astype(np.float32)
+
+    def _partial_obs(self) -> np.ndarray:
+        remaining = self.bank_stock / self.initial_stock
+        with np.errstate(divide="ignore", invalid="ignore"):
+            satisfaction = self.agents_stock / self.requests
+        remaining = np.broadcast_to(remaining[:, None, :], satisfaction.shape)
+        return np.concatenate((remaining, satisfaction), axis=-1)
+
+    def get_avail_actions(self) -> np.ndarray:
+        """
+        全環境・全エージェントの選択可能な行動のマスク [n_envs, n_agents, n_actions]
+        在庫があり、要求個数に達していない食品と No-op が選択可能
+        """
+        avail_actions = np.ones((self.n_envs, self.n_agents, self.n_actions))
+        avail_actions[..., : self.n_foods] = (self.bank_stock[:, None, :] > 0) & (
+            self.agents_stock < self.requests
+        )
+        return avail_actions
+
+    def render(self, mode="human"):
+        raise NotImplementedError("FoodAllocationEnv has no renderer")
+
+    def close(self):
+        return
@@ -0,0 +1,497 @@
+"""Stand-ins for the StarCraft II game used by StarCraft2Env.
+
+They implement the part of the pysc2 controller interface the environment
+uses (game_info, observe, actions, step, debug) and return plain Python
+objects with the same attribute layout as the protobuf responses, so the
+Python side of StarCraft2Env (step, update_units, get_obs, reward_battle,
+...) and the PettingZoo / RLlib adapters can be run, benchmarked and tested
+without the game binary:
+
+    env = StarCraft2Env(map_name="27m_vs_30m", stand_in="synthetic")
+
+- SyntheticController: a small battle simulation of the map's units (the
+  enemies attack the nearest ally, idle allies attack enemies in range).
+- RecordingController: wraps a controller and records its responses.
+- ReplayController: plays back a recording, ignoring the actions.
+
+The simulation is not meant to match the game's dynamics.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import copy
+import pickle
+from types import SimpleNamespace
+
+import numpy as np
+
+from smac.env.starcraft2.maps import get_map_params
+
+# Unit kinds: default SC2 unit type id (used for the enemies), health,
+# shield, attack range, damage, cooldown (game loops), speed (per game loop)
+UNIT_KINDS = {
+    "marine": (48, 45, 0, 5, 6, 14, 0.14),
+    "marauder": (51, 125, 0, 6, 10, 21, 0.14),
+    "medivac": (54, 150, 0, 4, 0, 0, 0.16),
+    "stalker": (74, 80, 80, 6, 13, 27, 0.18),
+    "zealot": (73, 100, 50, 1, 16, 17, 0.14),
+    "colossus": (4, 200, 150, 7, 20, 24, 0.14),
+    "hydralisk": (107, 90, 0, 5, 12, 13, 0.14),
+    "zergling": (105, 35, 0, 1, 5, 10, 0.18),
+    "baneling": (9, 30, 0, 1, 16, 1, 0.16),
+}
+
+# Ally unit kinds of each map type, in the order of their (map specific)
+# unit type ids as assumed by StarCraft2Env._init_ally_unit_types
+ALLY_KINDS = {
+    "marines": ["marine"],
+    "stalkers_and_zealots": ["stalker", "zealot"],
+    "colossi_stalkers_zealots": ["colossus", "stalker", "zealot"],
+    "MMM": ["marauder", "marine", "medivac"],
+    "zealots": ["zealot"],
+    "hydralisks": ["hydralisk"],
+    "stalkers": ["stalker"],
+    "colossus": ["colossus"],
+    "bane": ["baneling", "zergling"],
+}
+
+# Enemy unit kind when the enemy race differs from the allies'
+RACE_KINDS = {"T": ["marine"], "P": ["zealot"], "Z": ["zergling"]}
+
+# The first unit type id of the map specific ally unit types
+ALLY_TYPE_BASE = 1970
+
+# Medivac heal per game loop and energy cost per healed point
+HEAL_RATE = 0.56
+HEAL_ENERGY = 1 / 3
+
+# Distance between the fronts of the allies and the enemies at the start
+SPAWN_GAP = 10
+
+# Ability ids (see starcraft2.actions)
+STOP, MOVE, ATTACK, HEAL = 4, 16, 23, 386
+
+IDLE, MOVING, ATTACKING, HEALING = 0, 1, 2, 3
+
+
+class Unit(object):
+    """A unit in the layout of s2clientprotocol.raw_pb2.Unit."""
+
+    __slots__ = (
+        "tag",
+        "owner",
+        "unit_type",
+        "pos",
+        "health",
+        "health_max",
+        "shield",
+        "shield_max",
+        "energy",
+        "weapon_cooldown",
+    )
+
+    def __init__(self, **kwargs):
+        for name in self.__slots__:
+            setattr(self, name, kwargs[name])
+
+
+def make_stand_in(stand_in, map_name, seed=None):
+    """Returns the stand-in controller for StarCraft2Env(stand_in=...):
+    "synthetic", the path to a recording, or a controller object.
+    """
+    if stand_in == "synthetic":
+        return SyntheticController(map_name, seed=seed)
+    if isinstance(stand_in, str):
+        return ReplayController.load(stand_in)
+    return stand_in
+
+
+def make_game_info(size, pathing_grid, terrain_height):
+    """Returns a ResponseGameInfo-like object for a square map.
+    pathing_grid / terrain_height are indexed [x, y] like in StarCraft2Env.
+    """
+    # StarCraft2Env unpacks the 1-bit pathing grid row by row and transposes
+    # it, and flips and transposes the terrain height
+    pathing_data = np.packbits(np.asarray(pathing_grid, dtype=bool).T, axis=1)
+    height_data = np.flip(np.asarray(terrain_height), 1).T
+    point = SimpleNamespace
+    return SimpleNamespace(
+        start_raw=SimpleNamespace(
+            playable_area=SimpleNamespace(
+                p0=point(x=0, y=0), p1=point(x=size, y=size)
+            ),
+            map_size=point(x=size, y=size),
+            pathing_grid=SimpleNamespace(
+                bits_per_pixel=1, data=pathing_data.tobytes()
+            ),
+            terrain_height=SimpleNamespace(
+                data=np.round(height_data * 255).astype(np.uint8).tobytes()
+            ),
+        )
+    )
+
+
+class StandInController(object):
+    """Base class of the stand-ins. It plays both the role of the SC2
+    process (StarCraft2Env._sc2_proc) and of its controller.
+    """
+
+    @property
+    def controller(self):
+        return self
+
+    def create_game(self, request):
+        return None
+
+    def join_game(self, request):
+        return None
+
+    def save_replay(self):
+        raise NotImplementedError("Stand-in games cannot save replays")
+
+    def close(self):
+        return None
+
+
+class SyntheticController(StandInController):
+    """Simulates a battle between the units of a SMAC map on an open square
+    map. The allies spawn on the left and the enemies on the right, out of
+    sight of each other. When all units are dead the next wave is spawned
+    (like the trigger in the SMAC maps that restarts the episode).
+
+    ally_kinds / enemy_kinds are lists of UNIT_KINDS names (one per unit).
+    By default the kinds of the map type are assigned round-robin.
+    """
+
+    def __init__(
+        self,
+        map_name,
+        seed=None,
+        map_size=32,
+        ally_kinds=None,
+        enemy_kinds=None,
+    ):
+        map_params = get_map_params(map_name)
+        self.map_size = map_size
+        self._rng = np.random.RandomState(seed)
+
+        kinds = ALLY_KINDS[map_params["map_type"]]
+        if ally_kinds is None:
+            ally_kinds = [
+                kinds[i % len(kinds)] for i in range(map_params["n_agents"])
+            ]
+        if enemy_kinds is None:
+            if map_params["a_race"] != map_params["b_race"]:
+                kinds = RACE_KINDS[map_params["b_race"]]
+            enemy_kinds = [
+                kinds[i % len(kinds)] for i in range(map_params["n_enemies"])
+            ]
+        self.ally_kinds = list(ally_kinds)
+        self.enemy_kinds = list(enemy_kinds)
+
+        # Ally unit types are map specific ids, enemies use the default ones
+        ally_types = {
+            kind: ALLY_TYPE_BASE + i
+            for i, kind in enumerate(ALLY_KINDS[map_params["map_type"]])
+        }
+        kinds = self.ally_kinds + self.enemy_kinds
+        self.n_units = len(kinds)
+        self.owner = np.array(
+            [1] * len(self.ally_kinds) + [2] * len(self.enemy_kinds)
+        )
+        self.unit_type = np.array(
+            [ally_types.get(kind, UNIT_KINDS[kind][0]) for kind in ally_kinds]
+            + [UNIT_KINDS[kind][0] for kind in self.enemy_kinds]
+        )
+        stats = np.array([UNIT_KINDS[kind][1:] for kind in kinds], dtype=float)
+        (
+            self.health_max,
+            self.shield_max,
+            self.attack_range,
+            self.damage,
+            self.max_cooldown,
+            self.speed,
+        ) = stats.T
+        self.is_medivac = np.array([kind == "medivac" for kind in kinds])
+        self.is_baneling = np.array([kind == "baneling" for kind in kinds])
+        self.energy_max = np.where(self.is_medivac, 200.0, 0.0)
+
+        # Open map surrounded by a wall of 1 cell
+        grid = np.ones((map_size, map_size), dtype=bool)
+        grid[[0, -1], :] = grid[:, [0, -1]] = False
+        self._game_info = make_game_info(
+            map_size, grid, np.full((map_size, map_size), 0.5)
+        )
+
+        self.game_loop = 0
+        self._next_tag = 1
+        self._spawn()
+
+    def _spawn(self):
+        """Spawns a new wave of units in two blocks facing each other."""
+        n = self.n_units
+        self.tag = np.arange(self._next_tag, self._next_tag + n)
+        self._next_tag += n
+
+        # The fronts of the two blocks are out of sight of each other
+        pos = np.zeros((n, 2))
+        center = self.map_size / 2
+        for owner, side in ((1, -1), (2, 1)):
+            idx = np.flatnonzero(self.owner == owner)
+            width = int(np.ceil(np.sqrt(len(idx))))
+            rows = np.arange(len(idx)) // width
+            cols = np.arange(len(idx)) % width
+            pos[idx, 0] = center + side * (SPAWN_GAP / 2 + rows)
+            pos[idx, 1] = center + cols - cols.mean()
+        pos += self._rng.uniform(-0.2, 0.2, size=pos.shape)
+        self.pos = pos
+
+        self.health = self.health_max.copy()
+        self.shield = self.shield_max.copy()
+        self.energy = self.energy_max.copy()
+        self.cooldown = np.zeros(n)
+        self.alive = np.ones(n, dtype=bool)
+        self.order = np.full(n, IDLE)
+        self.order_pos = np.zeros((n, 2))
+        self.order_target = np.zeros(n, dtype=np.int64)
+
+    def game_info(self):
+        return self._game_info
+
+    def observe(self):
+        """Returns a ResponseObservation-like object of the alive units."""
+        point = SimpleNamespace
+        units = [
+            Unit(
+                tag=int(self.tag[i]),
+                owner=int(self.owner[i]),
+                unit_type=int(self.unit_type[i]),
+                pos=point(x=float(self.pos[i, 0]), y=float(self.pos[i, 1])),
+                health=float(self.health[i]),
+                health_max=float(self.health_max[i]),
+                shield=float(self.shield[i]),
+                shield_max=float(self.shield_max[i]),
+                energy=float(self.energy[i]),
+                weapon_cooldown=float(self.cooldown[i]),
+            )
+            for i in np.flatnonzero(self.alive)
+        ]
+        return SimpleNamespace(
+            observation=SimpleNamespace(
+                game_loop=self.game_loop,
+                raw_data=SimpleNamespace(units=units),
+            ),
+            player_result=[],
+        )
+
+    def actions(self, request):
+        """Applies the raw unit commands of a RequestAction."""
+        index = {int(tag): i for i, tag in enumerate(self.tag)}
+        for action in request.actions:
+            cmd = action.action_raw.unit_command
+            for tag in cmd.unit_tags:
+                i = index.get(int(tag))
+                if i is None or not self.alive[i]:
+                    continue
+                if cmd.ability_id == MOVE:
+                    self.order[i] = MOVING
+                    target = cmd.target_world_space_pos
+                    self.order_pos[i] = (target.x, target.y)
+                elif cmd.ability_id in (ATTACK, HEAL):
+                    target = index.get(int(getattr(cmd, "target_unit_tag", 0)))
+                    if target is None:
+                        continue
+                    if cmd.ability_id == ATTACK:
+                        self.order[i] = ATTACKING
+                    else:
+                        self.order[i] = HEALING
+                    self.order_target[i] = target
+                else:
+                    self.order[i] = IDLE
+
+    def debug(self, commands):
+        """Handles DebugKillUnit commands."""
+        tags = set()
+        for command in commands:
+            kill_unit = getattr(command, "kill_unit", None)
+            if kill_unit is not None:
+                tags.update(int(tag) for tag in kill_unit.tag)
+        killed = np.isin(self.tag, list(tags))
+        self.health[killed] = 0
+        self.alive[killed] = False
+
+    def step(self, count=1):
+        """Advances the game by count game loops (in a single update)."""
+        if not self.alive.any():
+            self._spawn()
+        self.game_loop += count
+        self._update_orders()
+
+        dist = np.hypot(
+            self.pos[:, None, 0] - self.pos[None, :, 0],
+            self.pos[:, None, 1] - self.pos[None, :, 1],
+        )
+        for i in np.flatnonzero(self.alive):
+            if not self.alive[i]:  # killed in this update
+                continue
+            if self.order[i] == MOVING:
+                if self._move_towards(i, self.order_pos[i], 0.0, count):
+                    self.order[i] = IDLE
+            elif self.order[i] in (ATTACKING, HEALING):
+                target = self.order_target[i]
+                reach = self.attack_range[i] + 0.5
+                if dist[i, target] > reach:
+                    self._move_towards(i, self.pos[target], reach, count)
+                elif self.order[i] == HEALING:
+                    self._heal(i, target, count)
+                elif self.cooldown[i] <= 0:
+                    self._attack(i, target)
+
+        self.cooldown = np.maximum(self.cooldown - count, 0)
+
+    def _update_orders(self):
+        """Drops orders on dead targets, makes the enemies attack the nearest
+        ally and the idle allies attack the nearest enemy in range.
+        """
+        targets = self.order_target
+        attacking = np.isin(self.order, (ATTACKING, HEALING))
+        self.order[attacking & ~self.alive[targets]] = IDLE
+        healing = self.order == HEALING
+        full = self.health[targets] >= self.health_max[targets]
+        self.order[healing & full] = IDLE
+
+        dist = np.hypot(
+            self.pos[:, None, 0] - self.pos[None, :, 0],
+            self.pos[:, None, 1] - self.pos[None, :, 1],
+        )
+        hostile = self.owner[:, None] != self.owner[None, :]
+        dist = np.where(hostile & self.alive[None, :], dist, np.inf)
+        nearest = dist.argmin(axis=1)
+        has_target = np.isfinite(dist.min(axis=1))
+
+        enemy = (self.owner == 2) & self.alive & has_target & ~self.is_medivac
+        ally = (
+            (self.owner == 1)
+            & self.alive
+            & (self.order == IDLE)
+            & ~self.is_medivac
+            & (dist[np.arange(self.n_units), nearest] <= self.attack_range)
+        )
+        acquire = enemy | ally
+        self.order[acquire] = ATTACKING
+        self.order_target[acquire] = nearest[acquire]
+
+    def _move_towards(self, i, target, stop_distance, count):
+        """Moves unit i towards target. Returns whether it has arrived."""
+        delta = target - self.pos[i]
+        distance = np.hypot(*delta) - stop_distance
+        step = self.speed[i] * count
+        if distance <= step:
+            norm = max(np.hypot(*delta), 1e-8)
+            self.pos[i] += delta * max(distance, 0) / norm
+            arrived = True
+        else:
+            self.pos[i] += delta * step / np.hypot(*delta)
+            arrived = False
+        self.pos[i] = np.clip(self.pos[i], 1, self.map_size - 1)
+        return arrived
+
+    def _attack(self, i, target):
+        damage = self.damage[i]
+        absorbed = min(self.shield[target], damage)
+        self.shield[target] -= absorbed
+        self.health[target] = max(self.health[target] - (damage - absorbed), 0)
+        if self.health[target] == 0:
+            self.alive[target] = False
+        self.cooldown[i] = self.max_cooldown[i]
+        if self.is_baneling[i]:
+            self.health[i] = 0
+            self.alive[i] = False
+
+    def _heal(self, i, target, count):
+        missing = self.health_max[target] - self.health[target]
+        amount = min(HEAL_RATE * count, missing, self.energy[i] / HEAL_ENERGY)
+        self.health[target] += amount
+        self.energy[i] -= amount * HEAL_ENERGY
+
+
+class RecordingController(object):
+    """Wraps a controller and records the game info and every observation,
+    e.g. to replay them later with ReplayController. Pass it as the stand-in
+    (StarCraft2Env(stand_in=RecordingController(SyntheticController(...))))
+    or wrap the controller of the real game after the first reset
+    (env._controller = RecordingController(env._controller)).
+    """
+
+    def __init__(self, controller):
+        self._controller = controller
+        self.recorded_game_info = copy.deepcopy(controller.game_info())
+        self.observations = []
+
+    @property
+    def controller(self):
+        return self
+
+    def game_info(self):
+        return self._controller.game_info()
+
+    def observe(self):
+        obs = self._controller.observe()
+        self.observations.append(copy.deepcopy(obs))
+        return obs
+
+    def __getattr__(self, name):
+        # everything else (actions, step, debug, close, ...) is passed on
+        if name == "_controller":
+            raise AttributeError(name)
+        return getattr(self._controller, name)
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            pickle.dump(
+                {
+                    "game_info": self.recorded_game_info,
+                    "observations": self.observations,
+                },
+                f,
+            )
+
+
+class ReplayController(StandInController):
+    """Plays back recorded observations in order (starting over after the
+    last one). Actions, game steps and debug commands are only counted.
+    """
+
+    def __init__(self, game_info, observations):
+        assert len(observations) > 0, "Nothing to replay"
+        self._game_info = game_info
+        self.observations = observations
+        self.n_observed = 0
+        self.n_actions = 0
+        self.game_loop = 0
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            recording = pickle.load(f)
+        return cls(recording["game_info"], recording["observations"])
+
+    def game_info(self):
+        return self._game_info
+
+    def observe(self):
+        obs = self.observations[self.n_observed % len(self.observations)]
+        self.n_observed += 1
+        # StarCraft2Env modifies the units of the previous observation
+        return copy.deepcopy(obs)
+
+    def actions(self, request):
+        self.n_actions += len(request.actions)
+
+    def debug(self, commands):
+        return None
+
+    def step(self, count=1):
+        self.game_loop += count
@@ -4,11 +4,11 @@ from __future__ import print_function
 
 from smac.env.multiagentenv import MultiAgentEnv
 from smac.env.starcraft2.maps import get_map_params
+from smac.env.starcraft2.stand_in import make_stand_in
 
 import atexit
 from warnings import warn
 from operator import attrgetter
-from copy import deepcopy
 import numpy as np
 import enum
 import math
@@ -96,6 +96,7 @@ class StarCraft2Env(MultiAgentEnv):
         heuristic_ai=False,
         heuristic_rest=False,
         debug=False,
+        stand_in=None,
     ):
         """
         Create a StarCraftC2Env environment.
@@ -192,6 +193,11 @@ class StarCraft2Env(MultiAgentEnv):
         debug: bool, optional
             Log messages about observations, state, actions and rewards for
             debugging purposes (default is False).
+        stand_in: str or object, optional
+            Run against a stand-in of the game instead of launching
+            StarCraft II (default is None): "synthetic" for a simulated
+            battle of the map's units, the path of a recording to replay, or
+            a controller object (see smac.env.starcraft2.stand_in).
         """
         # Map arguments
         self.map_name = map_name
@@ -238,6 +244,7 @@ class StarCraft2Env(MultiAgentEnv):
         self.window_size = (window_size_x, window_size_y)
         self.replay_dir = replay_dir
         self.replay_prefix = replay_prefix
+        self.stand_in = stand_in
 
         # Actions
         self.n_actions_no_attack = 6
@@ -291,9 +298,42 @@ class StarCraft2Env(MultiAgentEnv):
         self.last_stats = None
         self.death_tracker_ally = np.zeros(self.n_agents)
         self.death_tracker_enemy = np.zeros(self.n_enemies)
-        self.previous_ally_units = None
-        self.previous_enemy_units = None
+        self.previous_unit_health = None
         self.last_action = np.zeros((self.n_agents, self.n_actions))
+
+        # Unit table (allies first, then enemies), rebuilt once per step
+        # from self.agents / self.enemies by _update_unit_table()
+        self.n_units = self.n_agents + self.n_enemies
+        self.unit_pos = np.zeros((self.n_units, 2))
+        self.unit_health = np.zeros(self.n_units)
+        self.unit_health_max = np.ones(self.n_units)
+        self.unit_shield = np.zeros(self.n_units)
+        self.unit_shield_max = np.ones(self.n_units)
+        self.unit_cooldown = np.zeros(self.n_units)
+        self.unit_alive = np.zeros(self.n_units, dtype=bool)
+        self.unit_is_medivac = np.zeros(self.n_units, dtype=bool)
+        self.unit_type_one_hot = np.zeros((self.n_units, self.unit_type_bits))
+        # Distances from each agent to every unit (n_agents, n_units)
+        self.unit_dist = np.zeros((self.n_agents, self.n_units))
+        self._avail_actions = None
+        self._obs_array = None
+        # Indices of the other agents in the ally features of each agent
+        self._other_agents = np.array(
+            [
+                [al_id for al_id in range(self.n_agents) if al_id != agent_id]
+                for agent_id in range(self.n_agents)
+            ],
+            dtype=np.int64,
+        ).reshape(self.n_agents, self.n_agents - 1)
+        self._sight_range = np.array(
+            [self.unit_sight_range(i) for i in range(self.n_agents)],
+            dtype=np.float64,
+        )
+        self._shoot_range = np.array(
+            [self.unit_shoot_range(i) for i in range(self.n_agents)],
+            dtype=np.float64,
+        )
+
         self._min_unit_type = 0
         self.marine_id = self.marauder_id = self.medivac_id = 0
         self.hydralisk_id = self.zergling_id = self.baneling_id = 0
@@ -315,37 +355,14 @@ class StarCraft2Env(MultiAgentEnv):
 
     def _launch(self):
         """Launch the StarCraft II game."""
-        self._run_config = run_configs.get(version=self.game_version)
-        _map = maps.get(self.map_name)
-
-        # Setting up the interface
-        interface_options = sc_pb.InterfaceOptions(raw=True, score=False)
-        self._sc2_proc = self._run_config.start(
-            window_size=self.window_size, want_rgb=False
-        )
-        self._controller = self._sc2_proc.controller
-
-        # Request to create the game
-        create = sc_pb.RequestCreateGame(
-            local_map=sc_pb.LocalMap(
-                map_path=_map.path,
-                map_data=self._run_config.map_data(_map.path),
-            ),
-            realtime=False,
-            random_seed=self._seed,
-        )
-        create.player_setup.add(type=sc_pb.Participant)
-        create.player_setup.add(
-            type=sc_pb.Computer,
-            race=races[self._bot_race],
-            difficulty=difficulties[self.difficulty],
-        )
-        self._controller.create_game(create)
-
-        join = sc_pb.RequestJoinGame(
-            race=races[self._agent_race], options=interface_options
-        )
-        self._controller.join_game(join)
+        if self.stand_in is not None:
+            # The stand-in creates the game of the map by itself
+            self._sc2_proc = make_stand_in(
+                self.stand_in, self.map_name, self._seed
+            )
+            self._controller = self._sc2_proc.controller
+        else:
+            self._launch_game()
 
         game_info = self._controller.game_info()
         map_info = game_info.start_raw
@@ -366,7 +383,7 @@ class StarCraft2Env(MultiAgentEnv):
                         [(b >> i) & 1 for b in row for i in range(7, -1, -1)]
                         for row in vals
                     ],
-                    dtype=np.bool,
+                    dtype=bool,
                 )
             )
         else:
@@ -374,7 +391,7 @@ class StarCraft2Env(MultiAgentEnv):
                 np.flip(
                     np.transpose(
                         np.array(
-                            list(map_info.pathing_grid.data), dtype=np.bool
+                            list(map_info.pathing_grid.data), dtype=bool
                         ).reshape(self.map_x, self.map_y)
                     ),
                     axis=1,
@@ -393,6 +410,40 @@ class StarCraft2Env(MultiAgentEnv):
             / 255
         )
 
+    def _launch_game(self):
+        """Start the StarCraft II process and create and join the game."""
+        self._run_config = run_configs.get(version=self.game_version)
+        _map = maps.get(self.map_name)
+
+        # Setting up the interface
+        interface_options = sc_pb.InterfaceOptions(raw=True, score=False)
+        self._sc2_proc = self._run_config.start(
+            window_size=self.window_size, want_rgb=False
+        )
+        self._controller = self._sc2_proc.controller
+
+        # Request to create the game
+        create = sc_pb.RequestCreateGame(
+            local_map=sc_pb.LocalMap(
+                map_path=_map.path,
+                map_data=self._run_config.map_data(_map.path),
+            ),
+            realtime=False,
+            random_seed=self._seed,
+        )
+        create.player_setup.add(type=sc_pb.Participant)
+        create.player_setup.add(
+            type=sc_pb.Computer,
+            race=races[self._bot_race],
+            difficulty=difficulties[self.difficulty],
+        )
+        self._controller.create_game(create)
+
+        join = sc_pb.RequestJoinGame(
+            race=races[self._agent_race], options=interface_options
+        )
+        self._controller.join_game(join)
+
     def reset(self):
         """Reset the environment. Required after each full episode.
         Returns initial observations and states.
@@ -407,8 +458,7 @@ class StarCraft2Env(MultiAgentEnv):
         # Information kept for counting the reward
         self.death_tracker_ally = np.zeros(self.n_agents)
         self.death_tracker_enemy = np.zeros(self.n_enemies)
-        self.previous_ally_units = None
-        self.previous_enemy_units = None
+        self.previous_unit_health = None
         self.win_counted = False
         self.defeat_counted = False
 
@@ -494,16 +544,9 @@ class StarCraft2Env(MultiAgentEnv):
         info = {"battle_won": False}
 
         # count units that are still alive
-        dead_allies, dead_enemies = 0, 0
-        for _al_id, al_unit in self.agents.items():
-            if al_unit.health == 0:
-                dead_allies += 1
-        for _e_id, e_unit in self.enemies.items():
-            if e_unit.health == 0:
-                dead_enemies += 1
-
-        info["dead_allies"] = dead_allies
-        info["dead_enemies"] = dead_enemies
+        dead = self.unit_health == 0
+        info["dead_allies"] = int(dead[: self.n_agents].sum())
+        info["dead_enemies"] = int(dead[self.n_agents :].sum())
 
         if game_end_code is not None:
             # Battle is over
@@ -781,52 +824,43 @@ class StarCraft2Env(MultiAgentEnv):
         if self.reward_sparse:
             return 0
 
-        reward = 0
-        delta_deaths = 0
-        delta_ally = 0
-        delta_enemy = 0
-
         neg_scale = self.reward_negative_scale
+        n_agents = self.n_agents
 
-        # update deaths
-        for al_id, al_unit in self.agents.items():
-            if not self.death_tracker_ally[al_id]:
-                # did not die so far
-                prev_health = (
-                    self.previous_ally_units[al_id].health
-                    + self.previous_ally_units[al_id].shield
-                )
-                if al_unit.health == 0:
-                    # just died
-                    self.death_tracker_ally[al_id] = 1
-                    if not self.reward_only_positive:
-                        delta_deaths -= self.reward_death_value * neg_scale
-                    delta_ally += prev_health * neg_scale
-                else:
-                    # still alive
-                    delta_ally += neg_scale * (
-                        prev_health - al_unit.health - al_unit.shield
-                    )
+        # units that did not die so far
+        tracked = np.concatenate(
+            (self.death_tracker_ally == 0, self.death_tracker_enemy == 0)
+        )
+        just_died = tracked & (self.unit_health == 0)
+        # hit/shield points lost in this step (everything left if just died)
+        prev_health = self.previous_unit_health
+        delta = np.where(
+            just_died,
+            prev_health,
+            prev_health - self.unit_health - self.unit_shield,
+        )
+        delta = np.where(tracked, delta, 0.0)
 
-        for e_id, e_unit in self.enemies.items():
-            if not self.death_tracker_enemy[e_id]:
-                prev_health = (
-                    self.previous_enemy_units[e_id].health
-                    + self.previous_enemy_units[e_id].shield
-                )
-                if e_unit.health == 0:
-                    self.death_tracker_enemy[e_id] = 1
-                    delta_deaths += self.reward_death_value
-                    delta_enemy += prev_health
-                else:
-                    delta_enemy += prev_health - e_unit.health - e_unit.shield
+        # update deaths
+        self.death_tracker_ally[just_died[:n_agents]] = 1
+        self.death_tracker_enemy[just_died[n_agents:]] = 1
+
+        delta_deaths = self.reward_death_value * just_died[n_agents:].sum()
+        if not self.reward_only_positive:
+            delta_deaths -= (
+                self.reward_death_value
+                * neg_scale
+                * just_died[:n_agents].sum()
+            )
+        delta_ally = neg_scale * delta[:n_agents].sum()
+        delta_enemy = delta[n_agents:].sum()
 
         if self.reward_only_positive:
             reward = abs(delta_enemy + delta_deaths)  # shield regeneration
         else:
             reward = delta_enemy + delta_deaths - delta_ally
 
-        return reward
+        return float(reward)
 
     def get_total_actions(self):
         """Returns the total number of actions an agent could ever take."""
@@ -971,156 +1005,33 @@ class StarCraft2Env(MultiAgentEnv):
         NOTE: Agents should have access only to their local observations
         during decentralised execution.
         """
-        unit = self.get_unit_by_id(agent_id)
-
-        move_feats_dim = self.get_obs_move_feats_size()
-        enemy_feats_dim = self.get_obs_enemy_feats_size()
-        ally_feats_dim = self.get_obs_ally_feats_size()
-        own_feats_dim = self.get_obs_own_feats_size()
-
-        move_feats = np.zeros(move_feats_dim, dtype=np.float32)
-        enemy_feats = np.zeros(enemy_feats_dim, dtype=np.float32)
-        ally_feats = np.zeros(ally_feats_dim, dtype=np.float32)
-        own_feats = np.zeros(own_feats_dim, dtype=np.float32)
-
-        if unit.health > 0:  # otherwise dead, return all zeros
-            x = unit.pos.x
-            y = unit.pos.y
-            sight_range = self.unit_sight_range(agent_id)
-
-            # Movement features
-            avail_actions = self.get_avail_agent_actions(agent_id)
-            for m in range(self.n_actions_move):
-                move_feats[m] = avail_actions[m + 2]
-
-            ind = self.n_actions_move
-
-            if self.obs_pathing_grid:
-                move_feats[
-                    ind : ind + self.n_obs_pathing  # noqa
-                ] = self.get_surrounding_pathing(unit)
-                ind += self.n_obs_pathing
-
-            if self.obs_terrain_height:
-                move_feats[ind:] = self.get_surrounding_height(unit)
-
-            # Enemy features
-            for e_id, e_unit in self.enemies.items():
-                e_x = e_unit.pos.x
-                e_y = e_unit.pos.y
-                dist = self.distance(x, y, e_x, e_y)
-
-                if (
-                    dist < sight_range and e_unit.health > 0
-                ):  # visible and alive
-                    # Sight range > shoot range
-                    enemy_feats[e_id, 0] = avail_actions[
-                        self.n_actions_no_attack + e_id
-                    ]  # available
-                    enemy_feats[e_id, 1] = dist / sight_range  # distance
-                    enemy_feats[e_id, 2] = (
-                        e_x - x
-                    ) / sight_range  # relative X
-                    enemy_feats[e_id, 3] = (
-                        e_y - y
-                    ) / sight_range  # relative Y
-
-                    ind = 4
-                    if self.obs_all_health:
-                        enemy_feats[e_id, ind] = (
-                            e_unit.health / e_unit.health_max
-                        )  # health
-                        ind += 1
-                        if self.shield_bits_enemy > 0:
-                            max_shield = self.unit_max_shield(e_unit)
-                            enemy_feats[e_id, ind] = (
-                                e_unit.shield / max_shield
-                            )  # shield
-                            ind += 1
-
-                    if self.unit_type_bits > 0:
-                        type_id = self.get_unit_type_id(e_unit, False)
-                        enemy_feats[e_id, ind + type_id] = 1  # unit type
-
-            # Ally features
-            al_ids = [
-                al_id for al_id in range(self.n_agents) if al_id != agent_id
-            ]
-            for i, al_id in enumerate(al_ids):
-
-                al_unit = self.get_unit_by_id(al_id)
-                al_x = al_unit.pos.x
-                al_y = al_unit.pos.y
-                dist = self.distance(x, y, al_x, al_y)
-
-                if (
-                    dist < sight_range and al_unit.health > 0
-                ):  # visible and alive
-                    ally_feats[i, 0] = 1  # visible
-                    ally_feats[i, 1] = dist / sight_range  # distance
-                    ally_feats[i, 2] = (al_x - x) / sight_range  # relative X
-                    ally_feats[i, 3] = (al_y - y) / sight_range  # relative Y
-
-                    ind = 4
-                    if self.obs_all_health:
-                        ally_feats[i, ind] = (
-                            al_unit.health / al_unit.health_max
-                        )  # health
-                        ind += 1
-                        if self.shield_bits_ally > 0:
-                            max_shield = self.unit_max_shield(al_unit)
-                            ally_feats[i, ind] = (
-                                al_unit.shield / max_shield
-                            )  # shield
-                            ind += 1
-
-                    if self.unit_type_bits > 0:
-                        type_id = self.get_unit_type_id(al_unit, True)
-                        ally_feats[i, ind + type_id] = 1
-                        ind += self.unit_type_bits
-
-                    if self.obs_last_action:
-                        ally_feats[i, ind:] = self.last_action[al_id]
-
-            # Own features
-            ind = 0
-            if self.obs_own_health:
-                own_feats[ind] = unit.health / unit.health_max
-                ind += 1
-                if self.shield_bits_ally > 0:
-                    max_shield = self.unit_max_shield(unit)
-                    own_feats[ind] = unit.shield / max_shield
-                    ind += 1
-
-            if self.unit_type_bits > 0:
-                type_id = self.get_unit_type_id(unit, True)
-                own_feats[ind + type_id] = 1
-
-        agent_obs = np.concatenate(
-            (
-                move_feats.flatten(),
-                enemy_feats.flatten(),
-                ally_feats.flatten(),
-                own_feats.flatten(),
-            )
-        )
-
-        if self.obs_timestep_number:
-            agent_obs = np.append(
-                agent_obs, self._episode_steps / self.episode_limit
-            )
+        agent_obs = self._get_obs_array()[agent_id].copy()
 
         if self.debug:
+            move_feats_dim = self.get_obs_move_feats_size()
+            n_enemies, nf_en = self.get_obs_enemy_feats_size()
+            n_allies, nf_al = self.get_obs_ally_feats_size()
+            ind_enemy = move_feats_dim
+            ind_ally = ind_enemy + n_enemies * nf_en
+            ind_own = ind_ally + n_allies * nf_al
             logging.debug("Obs Agent: {}".format(agent_id).center(60, "-"))
             logging.debug(
                 "Avail. actions {}".format(
                     self.get_avail_agent_actions(agent_id)
                 )
             )
-            logging.debug("Move feats {}".format(move_feats))
-            logging.debug("Enemy feats {}".format(enemy_feats))
-            logging.debug("Ally feats {}".format(ally_feats))
-            logging.debug("Own feats {}".format(own_feats))
+            logging.debug("Move feats {}".format(agent_obs[:ind_enemy]))
+            logging.debug(
+                "Enemy feats {}".format(
+                    agent_obs[ind_enemy:ind_ally].reshape(n_enemies, nf_en)
+                )
+            )
+            logging.debug(
+                "Ally feats {}".format(
+                    agent_obs[ind_ally:ind_own].reshape(n_allies, nf_al)
+                )
+            )
+            logging.debug("Own feats {}".format(agent_obs[ind_own:]))
 
         return agent_obs
 
@@ -1129,9 +1040,159 @@ class StarCraft2Env(MultiAgentEnv):
         NOTE: Agents should have access only to their local observations
         during decentralised execution.
         """
-        agents_obs = [self.get_obs_agent(i) for i in range(self.n_agents)]
+        if self.debug:
+            return [self.get_obs_agent(i) for i in range(self.n_agents)]
+        return list(self._get_obs_array().copy())
+
+    def _get_obs_array(self):
+        """Returns the observations of all agents as a single array of shape
+        (n_agents, obs_size), computed from the unit table at once and cached
+        until the next call of _update_unit_table().
+        """
+        if self._obs_array is not None:
+            return self._obs_array
+
+        n_agents = self.n_agents
+        pos = self.unit_pos
+        alive = self.unit_alive[:n_agents]
+        sight_range = self._sight_range[:, None]
+        avail_actions = self._get_avail_array()
+
+        # Movement features
+        move_feats = [avail_actions[:, 2 : 2 + self.n_actions_move]]
+        if self.obs_pathing_grid:
+            move_feats.append(self._get_surrounding_values(False))
+        if self.obs_terrain_height:
+            move_feats.append(self._get_surrounding_values(True))
+        move_feats = np.concatenate(move_feats, axis=1)
+
+        # Features of every unit as seen from every agent
+        # (n_agents, n_units): visible and alive
+        visible = (
+            alive[:, None]
+            & self.unit_alive[None, :]
+            & (self.unit_dist < sight_range)
+        )
+        rel_pos = (pos[None, :, :] - pos[:n_agents, None, :]) / sight_range[
+            ..., None
+        ]
+        base_feats = [self.unit_dist[..., None] / sight_range[..., None]]
+        base_feats.append(rel_pos)
+        health_feats = self.unit_health / self.unit_health_max
+        shield_feats = self.unit_shield / self.unit_shield_max
+
+        # Enemy features
+        enemy = slice(n_agents, self.n_units)
+        enemy_feats = [
+            avail_actions[
+                :, self.n_actions_no_attack : self.n_actions_no_attack
+                + self.n_enemies,
+                None,
+            ]
+        ]
+        enemy_feats += [feats[:, enemy] for feats in base_feats]
+        unit_feats = []
+        if self.obs_all_health:
+            unit_feats.append(health_feats[:, None])
+            if self.shield_bits_enemy > 0:
+                unit_feats.append(shield_feats[:, None])
+        if self.unit_type_bits > 0:
+            unit_feats.append(self.unit_type_one_hot)
+        enemy_feats += [
+            np.broadcast_to(feats[enemy], (n_agents,) + feats[enemy].shape)
+            for feats in unit_feats
+        ]
+        enemy_feats = np.concatenate(enemy_feats, axis=2)
+        enemy_feats = np.where(visible[:, enemy, None], enemy_feats, 0.0)
+
+        # Ally features (every agent except itself)
+        ally_feats = [visible[:, :n_agents, None].astype(np.float64)]
+        ally_feats += [feats[:, :n_agents] for feats in base_feats]
+        unit_feats = []
+        if self.obs_all_health:
+            unit_feats.append(health_feats[:, None])
+            if self.shield_bits_ally > 0:
+                unit_feats.append(shield_feats[:, None])
+        if self.unit_type_bits > 0:
+            unit_feats.append(self.unit_type_one_hot)
+        if self.obs_last_action:
+            unit_feats.append(self.last_action)
+        ally_feats += [
+            np.broadcast_to(
+                feats[None, :n_agents], (n_agents,) + feats[:n_agents].shape
+            )
+            for feats in unit_feats
+        ]
+        ally_feats = np.concatenate(ally_feats, axis=2)
+        ally_feats = np.take_along_axis(
+            ally_feats, self._other_agents[..., None], axis=1
+        )
+        ally_visible = np.take_along_axis(
+            visible[:, :n_agents], self._other_agents, axis=1
+        )
+        ally_feats = np.where(ally_visible[..., None], ally_feats, 0.0)
+
+        # Own features
+        own_feats = np.zeros((n_agents, self.get_obs_own_feats_size()))
+        ind = 0
+        if self.obs_own_health:
+            own_feats[:, ind] = health_feats[:n_agents]
+            ind += 1
+            if self.shield_bits_ally > 0:
+                own_feats[:, ind] = shield_feats[:n_agents]
+                ind += 1
+        if self.unit_type_bits > 0:
+            own_feats[:, ind : ind + self.unit_type_bits] = (
+                self.unit_type_one_hot[:n_agents]
+            )
+
+        agents_obs = np.concatenate(
+            (
+                move_feats,
+                enemy_feats.reshape(n_agents, -1),
+                ally_feats.reshape(n_agents, -1),
+                own_feats,
+            ),
+            axis=1,
+        ).astype(np.float32)
+        # dead agents observe all zeros
+        agents_obs[~alive] = 0
+
+        if self.obs_timestep_number:
+            timestep = np.full(
+                (n_agents, 1), self._episode_steps / self.episode_limit
+            )
+            agents_obs = np.concatenate((agents_obs, timestep), axis=1)
+
+        self._obs_array = agents_obs
         return agents_obs
 
+    def _get_surrounding_values(self, height):
+        """Returns pathing (or terrain height) values of the grid surrounding
+        every agent, (n_agents, 8) (or (n_agents, 9) including the agent's
+        own cell), in the order of get_surrounding_points().
+        """
+        ma = self._move_amount
+        offsets = [(0, 2), (0, -2), (2, 0), (-2, 0)]
+        offsets += [(1, 1), (-1, -1), (1, -1), (-1, 1)]
+        if height:
+            offsets.append((0, 0))
+        grid = self.terrain_height if height else self.pathing_grid
+        cells = np.trunc(self.unit_pos[: self.n_agents]).astype(np.int64)
+        points = cells[:, None, :] + np.array(offsets) * ma
+        return self._lookup_grid(grid, points, 1)
+
+    def _lookup_grid(self, grid, points, outside):
+        """Looks up grid[x, y] for an array of integer points (..., 2),
+        returning outside for the points out of the map bounds.
+        """
+        x, y = points[..., 0], points[..., 1]
+        in_bounds = (0 <= x) & (x < self.map_x) & (0 <= y) & (y < self.map_y)
+        values = grid[
+            np.clip(x, 0, self.map_x - 1), np.clip(y, 0, self.map_y - 1)
+        ]
+        return np.where(in_bounds, values, outside)
+
     def get_state(self):
         """Returns the global state.
         NOTE: This functon should not be used during decentralised execution.
@@ -1180,73 +1241,35 @@ class StarCraft2Env(MultiAgentEnv):
         NOTE: This function should not be used during decentralised execution.
         """
 
-        # number of features equals the number of attribute names
-        nf_al = self.get_ally_num_attributes()
-        nf_en = self.get_enemy_num_attributes()
-
-        ally_state = np.zeros((self.n_agents, nf_al))
-        enemy_state = np.zeros((self.n_enemies, nf_en))
-
-        center_x = self.map_x / 2
-        center_y = self.map_y / 2
-
-        for al_id, al_unit in self.agents.items():
-            if al_unit.health > 0:
-                x = al_unit.pos.x
-                y = al_unit.pos.y
-                max_cd = self.unit_max_cooldown(al_unit)
-
-                ally_state[al_id, 0] = (
-                    al_unit.health / al_unit.health_max
-                )  # health
-                if (
-                    self.map_type == "MMM"
-                    and al_unit.unit_type == self.medivac_id
-                ):
-                    ally_state[al_id, 1] = al_unit.energy / max_cd  # energy
-                else:
-                    ally_state[al_id, 1] = (
-                        al_unit.weapon_cooldown / max_cd
-                    )  # cooldown
-                ally_state[al_id, 2] = (
-                    x - center_x
-                ) / self.max_distance_x  # relative X
-                ally_state[al_id, 3] = (
-                    y - center_y
-                ) / self.max_distance_y  # relative Y
-
-                if self.shield_bits_ally > 0:
-                    max_shield = self.unit_max_shield(al_unit)
-                    ally_state[al_id, 4] = (
-                        al_unit.shield / max_shield
-                    )  # shield
-
-                if self.unit_type_bits > 0:
-                    type_id = self.get_unit_type_id(al_unit, True)
-                    ally_state[al_id, type_id - self.unit_type_bits] = 1
-
-        for e_id, e_unit in self.enemies.items():
-            if e_unit.health > 0:
-                x = e_unit.pos.x
-                y = e_unit.pos.y
-
-                enemy_state[e_id, 0] = (
-                    e_unit.health / e_unit.health_max
-                )  # health
-                enemy_state[e_id, 1] = (
-                    x - center_x
-                ) / self.max_distance_x  # relative X
-                enemy_state[e_id, 2] = (
-                    y - center_y
-                ) / self.max_distance_y  # relative Y
-
-                if self.shield_bits_enemy > 0:
-                    max_shield = self.unit_max_shield(e_unit)
-                    enemy_state[e_id, 3] = e_unit.shield / max_shield  # shield
-
-                if self.unit_type_bits > 0:
-                    type_id = self.get_unit_type_id(e_unit, False)
-                    enemy_state[e_id, type_id - self.unit_type_bits] = 1
+        n_agents = self.n_agents
+        center = np.array([self.map_x / 2, self.map_y / 2])
+        max_distance = np.array([self.max_distance_x, self.max_distance_y])
+        rel_pos = (self.unit_pos - center) / max_distance
+        health = self.unit_health / self.unit_health_max
+        shield = self.unit_shield / self.unit_shield_max
+
+        # health, energy/cooldown, rel_x, rel_y, shield, unit_type
+        ally_state = [
+            health[:n_agents, None],
+            self.unit_cooldown[:n_agents, None],
+            rel_pos[:n_agents],
+        ]
+        if self.shield_bits_ally > 0:
+            ally_state.append(shield[:n_agents, None])
+        ally_state.append(self.unit_type_one_hot[:n_agents])
+        ally_state = np.concatenate(ally_state, axis=1)
+        ally_state[~self.unit_alive[:n_agents]] = 0
+
+        # health, rel_x, rel_y, shield, unit_type
+        enemy_state = [
+            health[n_agents:, None],
+            rel_pos[n_agents:],
+        ]
+        if self.shield_bits_enemy > 0:
+            enemy_state.append(shield[n_agents:, None])
+        enemy_state.append(self.unit_type_one_hot[n_agents:])
+        enemy_state = np.concatenate(enemy_state, axis=1)
+        enemy_state[~self.unit_alive[n_agents:]] = 0
 
         state = {"allies": ally_state, "enemies": enemy_state}
 
@@ -1344,41 +1367,15 @@ class StarCraft2Env(MultiAgentEnv):
         (n_agents, n_agents + n_enemies) indicating which units
         are visible to each agent.
         """
-        arr = np.zeros(
-            (self.n_agents, self.n_agents + self.n_enemies),
-            dtype=np.bool,
+        n_agents = self.n_agents
+        alive = self.unit_alive
+        arr = (
+            alive[:n_agents, None]
+            & alive[None, :]
+            & (self.unit_dist < self._sight_range[:, None])
         )
-
-        for agent_id in range(self.n_agents):
-            current_agent = self.get_unit_by_id(agent_id)
-            if current_agent.health > 0:  # it agent not dead
-                x = current_agent.pos.x
-                y = current_agent.pos.y
-                sight_range = self.unit_sight_range(agent_id)
-
-                # Enemies
-                for e_id, e_unit in self.enemies.items():
-                    e_x = e_unit.pos.x
-                    e_y = e_unit.pos.y
-                    dist = self.distance(x, y, e_x, e_y)
-
-                    if dist < sight_range and e_unit.health > 0:
-                        # visible and alive
-                        arr[agent_id, self.n_agents + e_id] = 1
-
-                # The matrix for allies is filled symmetrically
-                al_ids = [
-                    al_id for al_id in range(self.n_agents) if al_id > agent_id
-                ]
-                for _, al_id in enumerate(al_ids):
-                    al_unit = self.get_unit_by_id(al_id)
-                    al_x = al_unit.pos.x
-                    al_y = al_unit.pos.y
-                    dist = self.distance(x, y, al_x, al_y)
-
-                    if dist < sight_range and al_unit.health > 0:
-                        # visible and alive
-                        arr[agent_id, al_id] = arr[al_id, agent_id] = 1
+        # an agent is not visible to itself
+        arr[np.arange(n_agents), np.arange(n_agents)] = False
 
         return arr
 
@@ -1415,56 +1412,58 @@ class StarCraft2Env(MultiAgentEnv):
 
     def get_avail_agent_actions(self, agent_id):
         """Returns the available actions for agent_id."""
-        unit = self.get_unit_by_id(agent_id)
-        if unit.health > 0:
-            # cannot choose no-op when alive
-            avail_actions = [0] * self.n_actions
-
-            # stop should be allowed
-            avail_actions[1] = 1
-
-            # see if we can move
-            if self.can_move(unit, Direction.NORTH):
-                avail_actions[2] = 1
-            if self.can_move(unit, Direction.SOUTH):
-                avail_actions[3] = 1
-            if self.can_move(unit, Direction.EAST):
-                avail_actions[4] = 1
-            if self.can_move(unit, Direction.WEST):
-                avail_actions[5] = 1
-
-            # Can attack only alive units that are alive in the shooting range
-            shoot_range = self.unit_shoot_range(agent_id)
-
-            target_items = self.enemies.items()
-            if self.map_type == "MMM" and unit.unit_type == self.medivac_id:
-                # Medivacs cannot heal themselves or other flying units
-                target_items = [
-                    (t_id, t_unit)
-                    for (t_id, t_unit) in self.agents.items()
-                    if t_unit.unit_type != self.medivac_id
-                ]
-
-            for t_id, t_unit in target_items:
-                if t_unit.health > 0:
-                    dist = self.distance(
-                        unit.pos.x, unit.pos.y, t_unit.pos.x, t_unit.pos.y
-                    )
-                    if dist <= shoot_range:
-                        avail_actions[t_id + self.n_actions_no_attack] = 1
-
-            return avail_actions
-
-        else:
-            # only no-op allowed
-            return [1] + [0] * (self.n_actions - 1)
+        return self._get_avail_array()[agent_id].tolist()
 
     def get_avail_actions(self):
         """Returns the available actions of all agents in a list."""
-        avail_actions = []
-        for agent_id in range(self.n_agents):
-            avail_agent = self.get_avail_agent_actions(agent_id)
-            avail_actions.append(avail_agent)
+        return self._get_avail_array().tolist()
+
+    def _get_avail_array(self):
+        """Returns the available actions of all agents as an array of shape
+        (n_agents, n_actions), computed from the unit table at once and
+        cached until the next call of _update_unit_table().
+        """
+        if self._avail_actions is not None:
+            return self._avail_actions
+
+        n_agents = self.n_agents
+        avail_actions = np.zeros((n_agents, self.n_actions), dtype=np.int64)
+
+        # stop should be allowed
+        avail_actions[:, 1] = 1
+
+        # see if we can move (north, south, east, west)
+        m = self._move_amount / 2
+        directions = np.array([[0, m], [0, -m], [m, 0], [-m, 0]])
+        points = np.trunc(
+            self.unit_pos[:n_agents, None, :] + directions
+        ).astype(np.int64)
+        avail_actions[:, 2:6] = self._lookup_grid(
+            self.pathing_grid, points, False
+        )
+
+        # Can attack only alive units that are alive in the shooting range
+        in_range = self.unit_alive[None, :] & (
+            self.unit_dist <= self._shoot_range[:, None]
+        )
+        attack = self.n_actions_no_attack
+        avail_actions[:, attack:] = in_range[:, n_agents:]
+        if self.map_type == "MMM":
+            # Medivacs cannot heal themselves or other flying units
+            medivac = self.unit_is_medivac[:n_agents]
+            heal = in_range[:, :n_agents] & ~medivac[None, :]
+            n_targets = min(n_agents, self.n_enemies)
+            avail_actions[medivac, attack:] = 0
+            avail_actions[medivac, attack : attack + n_targets] = heal[
+                medivac, :n_targets
+            ]
+
+        # only no-op allowed for dead agents
+        dead = ~self.unit_alive[:n_agents]
+        avail_actions[dead] = 0
+        avail_actions[dead, 0] = 1
+
+        self._avail_actions = avail_actions
         return avail_actions
 
     def close(self):
@@ -1553,6 +1552,7 @@ class StarCraft2Env(MultiAgentEnv):
             ]
 
             if all_agents_created and all_enemies_created:  # all good
+                self._update_unit_table()
                 return
 
             try:
@@ -1575,36 +1575,23 @@ class StarCraft2Env(MultiAgentEnv):
         """Update units after an environment step.
         This function assumes that self._obs is up-to-date.
         """
-        n_ally_alive = 0
-        n_enemy_alive = 0
-
         # Store previous state
-        self.previous_ally_units = deepcopy(self.agents)
-        self.previous_enemy_units = deepcopy(self.enemies)
-
-        for al_id, al_unit in self.agents.items():
-            updated = False
-            for unit in self._obs.observation.raw_data.units:
-                if al_unit.tag == unit.tag:
-                    self.agents[al_id] = unit
-                    updated = True
-                    n_ally_alive += 1
-                    break
-
-            if not updated:  # dead
-                al_unit.health = 0
-
-        for e_id, e_unit in self.enemies.items():
-            updated = False
-            for unit in self._obs.observation.raw_data.units:
-                if e_unit.tag == unit.tag:
-                    self.enemies[e_id] = unit
-                    updated = True
-                    n_enemy_alive += 1
-                    break
+        self.previous_unit_health = self.unit_health + self.unit_shield
 
-            if not updated:  # dead
-                e_unit.health = 0
+        units = {
+            unit.tag: unit for unit in self._obs.observation.raw_data.units
+        }
+        for unit_dict in (self.agents, self.enemies):
+            for u_id, u_unit in unit_dict.items():
+                unit = units.get(u_unit.tag)
+                if unit is not None:
+                    unit_dict[u_id] = unit
+                else:  # dead
+                    u_unit.health = 0
+
+        self._update_unit_table()
+        n_ally_alive = int(self.unit_alive[: self.n_agents].sum())
+        n_enemy_alive = int(self.unit_alive[self.n_agents :].sum())
 
         if (
             n_ally_alive == 0
@@ -1623,6 +1610,75 @@ class StarCraft2Env(MultiAgentEnv):
 
         return None
 
+    def _update_unit_table(self):
+        """Copy the units in self.agents and self.enemies into the unit table
+        (positions, health, shield, cooldown and unit type one-hots of the
+        allies followed by the enemies) and compute the distances from each
+        agent to every unit. Observations, the state, the visibility matrix
+        and the available actions are all computed from this table.
+        """
+        n_agents = self.n_agents
+        units = [self.agents[i] for i in range(n_agents)]
+        units += [self.enemies[i] for i in range(self.n_enemies)]
+
+        self.unit_pos = np.array(
+            [(unit.pos.x, unit.pos.y) for unit in units], dtype=np.float64
+        )
+        self.unit_health = np.array(
+            [unit.health for unit in units], dtype=np.float64
+        )
+        self.unit_health_max = np.array(
+            [unit.health_max for unit in units], dtype=np.float64
+        )
+        self.unit_shield = np.array(
+            [unit.shield for unit in units], dtype=np.float64
+        )
+        self.unit_alive = self.unit_health > 0
+        self.unit_is_medivac = np.array(
+            [
+                self.map_type == "MMM" and unit.unit_type == self.medivac_id
+                for unit in units
+            ]
+        )
+        self.unit_is_medivac[n_agents:] = False
+
+        # shields are only used for the Protoss side(s)
+        shield_bits = [self.shield_bits_ally] * n_agents
+        shield_bits += [self.shield_bits_enemy] * self.n_enemies
+        self.unit_shield_max = np.array(
+            [
+                self.unit_max_shield(unit) if bits > 0 else 1
+                for unit, bits in zip(units, shield_bits)
+            ],
+            dtype=np.float64,
+        )
+
+        # energy (Medivacs) or weapon cooldown of the allies
+        cooldown = np.zeros(self.n_units)
+        for al_id, al_unit in enumerate(units[:n_agents]):
+            if self.unit_is_medivac[al_id]:
+                cooldown[al_id] = al_unit.energy
+            else:
+                cooldown[al_id] = al_unit.weapon_cooldown
+            cooldown[al_id] /= self.unit_max_cooldown(al_unit)
+        self.unit_cooldown = cooldown
+
+        self.unit_type_one_hot = np.zeros((self.n_units, self.unit_type_bits))
+        if self.unit_type_bits > 0:
+            type_ids = [
+                self.get_unit_type_id(unit, u_id < n_agents)
+                for u_id, unit in enumerate(units)
+            ]
+            self.unit_type_one_hot[np.arange(self.n_units), type_ids] = 1
+
+        self.unit_dist = np.hypot(
+            self.unit_pos[None, :, 0] - self.unit_pos[:n_agents, None, 0],
+            self.unit_pos[None, :, 1] - self.unit_pos[:n_agents, None, 1],
+        )
+
+        self._avail_actions = None
+        self._obs_array = None
+
     def _init_ally_unit_types(self, min_unit_type):
         """Initialise ally unit types. Should be called once from the
         init_units function.
@@ -2,10 +2,13 @@ import copy
 from components.episode_buffer import EpisodeBatch
 from modules.mixers.vdn import VDNMixer
 from modules.mixers.qmix import QMixer
+from modules.mixers.multi_seed_qmix import MultiSeedQMixer
 import torch as th
 from torch.optim import RMSprop, Adam
 from controllers.basic_controller import BasicMAC
 from utils.logging import Logger
+from utils.profiler import profiler
+from utils.rl_utils import build_n_step_targets, build_td_lambda_targets
 
 
 class QLearner:
@@ -22,6 +25,9 @@ class QLearner:
 
         self.last_target_update_episode = 0
 
+        # n_seeds > 1: バッチの先頭から n_seeds 等分した部分がそれぞれのシードのデータ
+        self.n_seeds = getattr(args, "n_seeds", 1)
+
         self.mixer = None
         if args.mixer is not None:
             if args.mixer == "vdn":
@@ -29,7 +35,7 @@ class QLearner:
                 self.mixer = VDNMixer()
             elif args.mixer == "qmix":
                 pass
-                self.mixer = QMixer(args)
+                self.mixer = MultiSeedQMixer(args) if self.n_seeds > 1 else QMixer(args)
             else:
                 raise ValueError("Mixer {} not recognised.".format(args.mixer))
             self.params += list(self.mixer.parameters())
@@ -44,10 +50,35 @@ class QLearner:
 
         self.log_stats_t = -self.args.learner_log_interval - 1
 
+        # 目標値の種類（td_lambda > 0 なら TD(λ)、そうでなければ n_step ステップ）
+        self.n_step = getattr(args, "n_step", 1)
+        self.td_lambda = getattr(args, "td_lambda", 0)
+
+        # 固定長の区間で学習する場合、先頭の burn_in ステップは隠れ状態を温めるだけに使う
+        self.burn_in = getattr(args, "burn_in", 0) if getattr(args, "chunk_length", 0) > 0 else 0
+        # 区間の最初の隠れ状態を、行動時に記録したもの（store_hidden）から始める
+        self.use_stored_hidden = (
+            getattr(args, "store_hidden", False) and getattr(args, "chunk_length", 0) > 0
+        )
+
     def train(self, batch: EpisodeBatch, t_env: int, episode_num: int):
         """
         バッチを用いてネットワークを学習 (DDQN)
         """
+        # Agent Network（Main, Target）の隠れ状態を初期化
+        self.mac.init_hidden(batch.batch_size)
+        self.target_mac.init_hidden(batch.batch_size)
+        if self.use_stored_hidden:
+            # 記録した時点の古いネットワークの隠れ状態だが、0から始めるよりは近い（Targetも同じ状態から）
+            hidden_states = batch["hidden_states"][:, 0].float()
+            self.mac.hidden_states = hidden_states
+            self.target_mac.hidden_states = hidden_states
+        if self.burn_in > 0:
+            with profiler.timer("learner.burn_in"):
+                self._burn_in(batch)
+            # 以降は burn-in の後ろの部分だけを使う
+            batch = batch[:, self.burn_in:]
+
         # Get the relevant quantities
         # バッチからデータを取り出す
         rewards = batch["reward"][:, :-1]
@@ -60,14 +91,13 @@ class QLearner:
         # Calculate estimated Q-Values
         # ============ Agent Network（Main Network）のQ値の現在の値を求める ============
         mac_out = []
-        # Agent Networkの隠れ状態を初期化
-        self.mac.init_hidden(batch.batch_size)
 
         # バッチの各タイムステップごと
-        for t in range(batch.max_seq_length):
-            # Agent NetworkからのQ値の出力を求める
-            agent_outs = self.mac.forward(batch, t=t)
-            mac_out.append(agent_outs)
+        with profiler.timer("learner.forward"):
+            for t in range(batch.max_seq_length):
+                # Agent NetworkからのQ値の出力を求める
+                agent_outs = self.mac.forward(batch, t=t)
+                mac_out.append(agent_outs)
 
         # エージェントごとに時系列を連結
         # [ [t_1の全エージェント分の出力], [t_2], ... , [t_n] ] だったのが
@@ -84,10 +114,10 @@ class QLearner:
         # ============ Agent Network（Target Network）で目標値計算用のQ値を求める ============
         # 上とやることは同じ
         target_mac_out = []
-        self.target_mac.init_hidden(batch.batch_size)
-        for t in range(batch.max_seq_length):
-            target_agent_outs = self.target_mac.forward(batch, t=t)
-            target_mac_out.append(target_agent_outs)
+        with profiler.timer("learner.target_forward"):
+            for t in range(batch.max_seq_length):
+                target_agent_outs = self.target_mac.forward(batch, t=t)
+                target_mac_out.append(target_agent_outs)
 
         # We don't need the first timesteps Q-Value estimate for calculating targets
         # 目標値は次状態のQ値を用いるので最初のタイムステップは不要
@@ -142,9 +172,23 @@ class QLearner:
         # Q値の目標値を計算
         # 目標値 = 現在の報酬 + 次状態の最大Q値を割り引いたもの
         # （終端状態は報酬のみ）
-        targets = (
-            rewards + self.args.gamma * (1 - terminated) * target_max_qvals.detach()
-        )
+        with profiler.timer("learner.targets"):
+            if self.td_lambda > 0:
+                # TD(λ)
+                targets = build_td_lambda_targets(
+                    rewards, terminated, mask, target_max_qvals.detach(),
+                    self.args.gamma, self.td_lambda,
+                )
+            elif self.n_step > 1:
+                # n-step
+                targets = build_n_step_targets(
+                    rewards, terminated, mask, target_max_qvals.detach(),
+                    self.args.gamma, self.n_step,
+                )
+            else:
+                targets = (
+                    rewards + self.args.gamma * (1 - terminated) * target_max_qvals.detach()
+                )
 
         # Td-error
         # TD誤差 = 予測値(実際に選択した行動のQ値）- 目標値
@@ -158,25 +202,38 @@ class QLearner:
 
         # Normal L2 loss, take mean over actual data
         # MSE（平均二乗誤差）
-        loss = (masked_td_error**2).sum() / mask.sum()
+        if self.n_seeds > 1:
+            # シードごとのMSEの和（各シードのパラメータの勾配はそのシードのMSEだけで決まる）
+            seed_loss = (masked_td_error**2).view(self.n_seeds, -1).sum(1) / mask.reshape(
+                self.n_seeds, -1
+            ).sum(1)
+            loss = seed_loss.sum()
+        else:
+            loss = (masked_td_error**2).sum() / mask.sum()
 
         # Optimise
         # 誤差逆伝播
         self.optimiser.zero_grad()
-        loss.backward()
-        grad_norm = th.nn.utils.clip_grad_norm_(self.params, self.args.grad_norm_clip)
-        self.optimiser.step()
+        with profiler.timer("learner.backward"):
+            loss.backward()
+        with profiler.timer("learner.optimizer"):
+            if self.n_seeds > 1:
+                grad_norm = self._clip_grad_norm_per_seed()
+            else:
+                grad_norm = th.nn.utils.clip_grad_norm_(self.params, self.args.grad_norm_clip)
+            self.optimiser.step()
 
         # 定期的にAgent, Mixing両方のTarget Networkを更新
         if (
             episode_num - self.last_target_update_episode
         ) / self.args.target_update_interval >= 1.0:
-            self._update_targets()
+            with profiler.timer("learner.target_update"):
+                self._update_targets()
             self.last_target_update_episode = episode_num
 
         # 定期的にログをとる
         if t_env - self.log_stats_t >= self.args.learner_log_interval:
-            self.logger.log_stat("loss", loss.item(), t_env)
+            self.logger.log_stat("loss", loss.item() / self.n_seeds, t_env)
             self.logger.log_stat("grad_norm", grad_norm, t_env)
             mask_elems = mask.sum().item()
             self.logger.log_stat(
@@ -195,6 +252,32 @@ class QLearner:
             )
             self.log_stats_t = t_env
 
+    def _clip_grad_norm_per_seed(self):
+        """
+        clip_grad_norm_ をシードごとに行う（全パラメータの先頭の次元がシード）
+        返り値はシードごとの勾配のノルムの平均
+        """
+        grads = [p.grad for p in self.params if p.grad is not None]
+        norms = th.stack([g.reshape(self.n_seeds, -1).norm(dim=1) for g in grads]).norm(dim=0)
+        scale = (self.args.grad_norm_clip / (norms + 1e-6)).clamp(max=1.0)
+        for g in grads:
+            g.mul_(scale.view(-1, *[1] * (g.dim() - 1)))
+        return norms.mean()
+
+    def _burn_in(self, batch: EpisodeBatch):
+        """
+        区間の先頭 burn_in ステップを Main, Target の両方に入力して隠れ状態だけを更新する（勾配なし）
+        エピソードの開始より前の埋まっていないステップでは隠れ状態を0に戻すので、
+        そのような区間はエピソードの最初から init_hidden した状態で始まる
+        """
+        with th.no_grad():
+            for t in range(self.burn_in):
+                filled = batch["filled"][:, t].float()  # [B, 1]
+                for mac in (self.mac, self.target_mac):
+                    mac.forward(batch, t=t)
+                    hidden_states = mac.hidden_states.reshape(batch.batch_size, -1) * filled
+                    mac.hidden_states = hidden_states.view_as(mac.hidden_states)
+
     def _update_targets(self):
         """
         Agent, MixingのTarget Networkを更新 (DDQN)
@@ -217,6 +300,35 @@ class QLearner:
             th.save(self.mixer.state_dict(), "{}/mixer.th".format(path))
         th.save(self.optimiser.state_dict(), "{}/opt.th".format(path))
 
+    def checkpoint_state(self) -> dict:
+        """
+        チェックポイント用の状態（Target Networkと学習の進み具合を含む）
+        agent, mixer, opt は save_models と同じファイル名で保存される
+        """
+        state = {
+            "agent": self.mac.agent.state_dict(),
+            "target_agent": self.target_mac.agent.state_dict(),
+            "opt": self.optimiser.state_dict(),
+            "learner": {
+                "last_target_update_episode": self.last_target_update_episode,
+                "log_stats_t": self.log_stats_t,
+            },
+        }
+        if self.mixer is not None:
+            state["mixer"] = self.mixer.state_dict()
+            state["target_mixer"] = self.target_mixer.state_dict()
+        return state
+
+    def load_checkpoint_state(self, state: dict):
+        self.mac.agent.load_state_dict(state["agent"])
+        self.target_mac.agent.load_state_dict(state["target_agent"])
+        if self.mixer is not None:
+            self.mixer.load_state_dict(state["mixer"])
+            self.target_mixer.load_state_dict(state["target_mixer"])
+        self.optimiser.load_state_dict(state["opt"])
+        self.last_target_update_episode = state["learner"]["last_target_update_episode"]
+        self.log_stats_t = state["learner"]["log_stats_t"]
+
     def load_models(self, path):
         self.mac.load_models(path)
         # Not quite right but I don't want to save target networks
@@ -76,6 +76,22 @@ def _get_config_from_yaml(file_name, subfolder):
     return config_dict
 
 
+def _apply_overrides(config_dict, overrides):
+    """
+    コマンドラインの key=value でパラメータを上書きする（値はYAMLとして解釈）
+    env_args.seed=1 のように . で区切るとネストした辞書の値を上書きできる
+    """
+    for override in overrides:
+        key, sep, value = override.partition("=")
+        assert sep, "Override must be key=value: {}".format(override)
+        *parents, leaf = key.split(".")
+        target = config_dict
+        for parent in parents:
+            target = target.setdefault(parent, {})
+        target[leaf] = yaml.safe_load(value)
+    return config_dict
+
+
 if __name__ == "__main__":
     # Get the defaults from default.yaml
     # default.yamlからデフォルトのパラメータを読み込む
@@ -103,6 +119,14 @@ if __name__ == "__main__":
 
     # WandBを使用する際は"--wandb"をつけて実行
     parser.add_argument("--wandb", action="store_true")
+    # 中断した学習を再開する際はチェックポイントのディレクトリ（results/models/{unique_token}）を指定
+    parser.add_argument(
+        "--checkpoint_path", default="", help="Resume training from the latest checkpoint in this directory"
+    )
+    # 個別のパラメータの上書き（sweep.py もこれを使う）
+    parser.add_argument(
+        "overrides", nargs="*", help="Override config values with key=value (e.g. lr=0.001 env_args.seed=1)"
+    )
 
     # 引数を解析して取得
     args = parser.parse_args()
@@ -113,6 +137,9 @@ if __name__ == "__main__":
 
     # 最初に読み込んだdefaultにアルゴリズムと環境設定のパラメーターを結合
     config_dict = {**config_dict, **env_config, **algo_config}
+    if args.checkpoint_path:
+        config_dict["checkpoint_path"] = args.checkpoint_path
+    config_dict = _apply_overrides(config_dict, args.overrides)
 
     # print(yaml.dump(config_dict))
 
@@ -0,0 +1,43 @@
+import torch.nn as nn
+import torch.nn.functional as F
+
+from modules.agents.rnn_agent import RNNAgent
+from modules.stacked import stack_modules
+
+
+class MultiSeedRNNAgent(nn.Module):
+    """
+    n_seeds 個の独立した RNNAgent を、パラメータを積んだ1つのネットワークとしてまとめて計算する
+
+    入出力は RNNAgent と同じ形 [バッチ × エージェント数, ...] で、
+    先頭から順に n_seeds 等分した部分がそれぞれのシードのネットワークに入力される
+    パラメータ名は RNNAgent と同じなので、k 番目のシードは modules.stacked.seed_state_dict で取り出せる
+    """
+
+    def __init__(self, input_shape, args):
+        super(MultiSeedRNNAgent, self).__init__()
+        self.args = args
+        self.n_seeds = args.n_seeds
+
+        # 初期値は RNNAgent と同じ分布から、シードごとに別々に
+        agents = [RNNAgent(input_shape, args) for _ in range(self.n_seeds)]
+        self.fc1 = stack_modules([agent.fc1 for agent in agents])
+        self.rnn = stack_modules([agent.rnn for agent in agents])
+        self.fc2 = stack_modules([agent.fc2 for agent in agents])
+
+    def init_hidden(self):
+        """
+        RNNの隠れ層を0で初期化（全シード共通）
+        """
+        return self.fc1.weight.new(1, self.args.rnn_hidden_dim).zero_()
+
+    def forward(self, inputs, hidden_state):
+        x = inputs.reshape(self.n_seeds, -1, inputs.shape[-1])
+        x = F.relu(self.fc1(x))
+        h_in = hidden_state.reshape(self.n_seeds, -1, self.args.hidden_dim)
+        if self.args.use_rnn:
+            h = self.rnn(x, h_in)
+        else:
+            h = F.relu(self.rnn(x))
+        q = self.fc2(h)
+        return q.reshape(-1, q.shape[-1]), h.reshape(-1, h.shape[-1])
@@ -0,0 +1,45 @@
+import copy
+
+import torch as th
+import torch.nn as nn
+
+from modules.agents.rnn_agent import RNNAgent
+from modules.agents.rnn_ns_agent import RNNNSAgent
+
+# 動的量子化する層（RNNAgent の fc1・rnn（GRUCell または Linear）・fc2）
+QUANTIZED_MODULES = {nn.Linear, nn.GRUCell}
+
+
+class QuantizedAgent(nn.Module):
+    """
+    RNNAgent / RNNNSAgent の fc1・rnn・fc2 を int8 に動的量子化したCPU上のコピー（ロールアウト専用）
+
+    重みは int8 で持ち、入力は呼び出しごとに量子化される。学習はできないので、
+    学習側の重みが変わったら refresh() で量子化し直す
+    """
+
+    def __init__(self, agent: nn.Module):
+        super(QuantizedAgent, self).__init__()
+        assert isinstance(agent, (RNNAgent, RNNNSAgent)), "Only RNNAgent and RNNNSAgent can be quantized"
+        # 量子化した層は weight がテンソルではなくなり RNNAgent.init_hidden が使えないので、形だけ覚えておく
+        self.hidden_shape = agent.init_hidden().shape
+        self.agent = None
+        self.refresh(agent)
+
+    def refresh(self, agent: nn.Module):
+        """
+        学習側のエージェント（GPU上でもよい）の重みを量子化し直す
+        """
+        # args は共有したまま、重みだけをCPUにコピーする
+        memo = {id(agent.args): agent.args}
+        quantized = copy.deepcopy(agent, memo).cpu().eval()
+        self.agent = th.ao.quantization.quantize_dynamic(
+            quantized, QUANTIZED_MODULES, dtype=th.qint8, inplace=True
+        )
+
+    def init_hidden(self):
+        return th.zeros(self.hidden_shape)
+
+    def forward(self, inputs, hidden_state):
+        with th.no_grad():
+            return self.agent(inputs, hidden_state)
@@ -0,0 +1,50 @@
+import torch as th
+import torch.nn as nn
+import torch.nn.functional as F
+
+from modules.mixers.qmix import QMixer
+from modules.stacked import stack_modules
+
+
+class MultiSeedQMixer(nn.Module):
+    """
+    n_seeds 個の独立した QMixer を、パラメータを積んだ1つのネットワークとしてまとめて計算する
+
+    入出力は QMixer と同じ形で、バッチの先頭から順に n_seeds 等分した部分がそれぞれのシードのネットワークに入力される
+    パラメータ名は QMixer と同じなので、k 番目のシードは modules.stacked.seed_state_dict で取り出せる
+    """
+
+    def __init__(self, args):
+        super(MultiSeedQMixer, self).__init__()
+        self.args = args
+        self.n_seeds = args.n_seeds
+
+        # 初期値はシードごとに別々に
+        mixers = [QMixer(args) for _ in range(self.n_seeds)]
+        self.n_agents = mixers[0].n_agents
+        self.state_dim = mixers[0].state_dim
+        self.embed_dim = mixers[0].embed_dim
+        for name in ("hyper_w_1", "hyper_w_final", "hyper_b_1", "V"):
+            setattr(self, name, stack_modules([getattr(mixer, name) for mixer in mixers]))
+
+    def forward(self, agent_qs, states):
+        bs = agent_qs.size(0)
+        # [シード, シードごとのバッチ × 時間, ...]
+        states = states.reshape(self.n_seeds, -1, self.state_dim)
+        agent_qs = agent_qs.reshape(-1, 1, self.n_agents)
+        # First layer
+        w1 = th.abs(self.hyper_w_1(states))
+        b1 = self.hyper_b_1(states)
+        w1 = w1.view(-1, self.n_agents, self.embed_dim)
+        b1 = b1.view(-1, 1, self.embed_dim)
+        hidden = F.elu(th.bmm(agent_qs, w1) + b1)
+        # Second layer
+        w_final = th.abs(self.hyper_w_final(states))
+        w_final = w_final.view(-1, self.embed_dim, 1)
+        # State-dependent bias
+        v = self.V(states).view(-1, 1, 1)
+        # Compute final output
+        y = th.bmm(hidden, w_final) + v
+        # Reshape and return
+        q_tot = y.view(bs, -1, 1)
+        return q_tot
@@ -0,0 +1,67 @@
+import copy
+
+import torch as th
+import torch.nn as nn
+
+# 複数シード分の同じ形のネットワークを、パラメータを先頭の次元に積んだ1つのネットワークとして計算する（n_seeds > 1）
+# 入力は [n_seeds, M, in] の形で、シードごとの計算は1回の bmm にまとまる
+
+
+class StackedLinear(nn.Module):
+    """
+    n_seeds 個の nn.Linear（パラメータ名は nn.Linear と同じ）
+    入力 [n_seeds, M, in] → 出力 [n_seeds, M, out]
+    """
+
+    def __init__(self, layers: list):
+        super(StackedLinear, self).__init__()
+        self.weight = nn.Parameter(th.stack([layer.weight.detach() for layer in layers]))
+        self.bias = nn.Parameter(th.stack([layer.bias.detach() for layer in layers]))
+
+    def forward(self, x):
+        return th.baddbmm(self.bias.unsqueeze(1), x, self.weight.transpose(1, 2))
+
+
+class StackedGRUCell(nn.Module):
+    """
+    n_seeds 個の nn.GRUCell（パラメータ名・計算は nn.GRUCell と同じ）
+    """
+
+    def __init__(self, cells: list):
+        super(StackedGRUCell, self).__init__()
+        for name in ("weight_ih", "weight_hh", "bias_ih", "bias_hh"):
+            setattr(
+                self, name, nn.Parameter(th.stack([getattr(cell, name).detach() for cell in cells]))
+            )
+
+    def forward(self, x, h):
+        gi = th.baddbmm(self.bias_ih.unsqueeze(1), x, self.weight_ih.transpose(1, 2))
+        gh = th.baddbmm(self.bias_hh.unsqueeze(1), h, self.weight_hh.transpose(1, 2))
+        i_r, i_z, i_n = gi.chunk(3, dim=2)
+        h_r, h_z, h_n = gh.chunk(3, dim=2)
+        r = th.sigmoid(i_r + h_r)
+        z = th.sigmoid(i_z + h_z)
+        n = th.tanh(i_n + r * h_n)
+        return (1 - z) * n + z * h
+
+
+def stack_modules(modules: list) -> nn.Module:
+    """
+    同じ構造の nn.Linear / nn.GRUCell / nn.Sequential（とパラメータを持たない層）を積んだものに変換する
+    """
+    first = modules[0]
+    if isinstance(first, nn.Linear):
+        return StackedLinear(modules)
+    if isinstance(first, nn.GRUCell):
+        return StackedGRUCell(modules)
+    if isinstance(first, nn.Sequential):
+        return nn.Sequential(*[stack_modules(layers) for layers in zip(*modules)])
+    assert not list(first.parameters()), "Cannot stack {}".format(type(first).__name__)
+    return copy.deepcopy(first)
+
+
+def seed_state_dict(module: nn.Module, k) -> dict:
+    """
+    積んだネットワークの k 番目のシードのパラメータ（元のネットワークの load_state_dict で読み込める）
+    """
+    return {name: value[k] for name, value in module.state_dict().items()}
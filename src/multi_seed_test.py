@@ -0,0 +1,120 @@
+"""
+n_seeds 個のエージェント・Mixerを積んでまとめて学習した場合（n_seeds > 1）と、
+同じ初期値・同じデータでシードごとに別々の QLearner で学習した場合のパラメータが一致するかを確認する
+（シードごとの損失の正規化・勾配のクリッピング・Adam・Target Networkの更新を含む）
+
+リポジトリのルートで実行:
+    python src/multi_seed_test.py
+"""
+import logging
+import os
+import sys
+from types import SimpleNamespace as SN
+
+import torch as th
+import yaml
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from components.episode_buffer import EpisodeBatch, cat_batches  # noqa: E402
+from controllers.basic_controller import BasicMAC  # noqa: E402
+from envs.crossroads.crossroads import CrossroadsEnv  # noqa: E402
+from learners.q_learner import QLearner  # noqa: E402
+from modules.stacked import seed_state_dict  # noqa: E402
+from run import build_scheme  # noqa: E402
+from utils.logging import Logger  # noqa: E402
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config")
+
+
+def load_args(**overrides):
+    config = {}
+    for path in ("default.yaml", "environments/crossroads.yaml", "algorithms/qmix.yaml"):
+        with open(os.path.join(CONFIG_PATH, path), "r", encoding="utf-8") as f:
+            config.update(yaml.safe_load(f))
+    config.update(overrides)
+    args = SN(**config)
+    args.device = "cpu"
+    return args
+
+
+def random_batch(scheme, groups, preprocess, env_info, batch_size, max_t, rng):
+    """
+    エピソード長がばらばらのランダムなバッチ（最後のステップで terminated）
+    """
+    n_agents, n_actions = env_info["n_agents"], env_info["n_actions"]
+    batch = EpisodeBatch(scheme, groups, batch_size, max_t + 1, preprocess=preprocess)
+    for b in range(batch_size):
+        length = int(th.randint(max_t // 2, max_t + 1, (), generator=rng))
+        shape = (1, length + 1)
+        terminated = th.zeros(*shape, 1, dtype=th.uint8)
+        terminated[:, length - 1] = 1
+        batch.update(
+            {
+                "state": th.rand(*shape, env_info["state_shape"], generator=rng),
+                "obs": th.rand(*shape, n_agents, env_info["obs_shape"], generator=rng),
+                "avail_actions": th.ones(*shape, n_agents, n_actions, dtype=th.int),
+                "actions": th.randint(n_actions, (*shape, n_agents, 1), generator=rng),
+                "reward": th.randn(*shape, 1, generator=rng),
+                "terminated": terminated,
+            },
+            bs=slice(b, b + 1),
+            ts=slice(0, length + 1),
+        )
+    return batch
+
+
+def check_multi_seed_equivalence(n_seeds=3, batch_size=4, max_t=20, n_updates=6):
+    overrides = dict(grad_norm_clip=0.05, target_update_interval=2)
+    env = CrossroadsEnv(**load_args().env_args)
+    env_info = env.get_env_info()
+    env.close()
+
+    def build(n):
+        args = load_args(n_seeds=n, **overrides)
+        args.n_agents = env_info["n_agents"]
+        args.n_actions = env_info["n_actions"]
+        args.state_shape = env_info["state_shape"]
+        scheme, groups, preprocess = build_scheme(env_info, args)
+        full_scheme = EpisodeBatch(scheme, groups, 1, 1, preprocess=preprocess).scheme
+        mac = BasicMAC(full_scheme, groups, args)
+        learner = QLearner(mac, full_scheme, Logger(logging.getLogger("multi_seed_test")), args)
+        return learner, (scheme, groups, preprocess)
+
+    multi, batch_scheme = build(n_seeds)
+    singles = []
+    for k in range(n_seeds):
+        learner, _ = build(1)
+        learner.mac.agent.load_state_dict(seed_state_dict(multi.mac.agent, k))
+        learner.mixer.load_state_dict(seed_state_dict(multi.mixer, k))
+        learner._update_targets()
+        singles.append(learner)
+    multi._update_targets()
+
+    rng = th.Generator().manual_seed(0)
+    for update in range(n_updates):
+        batches = [
+            random_batch(*batch_scheme, env_info, batch_size, max_t, rng) for _ in range(n_seeds)
+        ]
+        multi.train(cat_batches(batches), t_env=update, episode_num=update)
+        for learner, batch in zip(singles, batches):
+            learner.train(batch, t_env=update, episode_num=update)
+
+    max_diff = 0.0
+    for k, learner in enumerate(singles):
+        for multi_module, module in (
+            (multi.mac.agent, learner.mac.agent),
+            (multi.mixer, learner.mixer),
+            (multi.target_mac.agent, learner.target_mac.agent),
+            (multi.target_mixer, learner.target_mixer),
+        ):
+            expected = module.state_dict()
+            for name, value in seed_state_dict(multi_module, k).items():
+                max_diff = max(max_diff, (value - expected[name]).abs().max().item())
+    assert max_diff < 1e-5, max_diff
+    print("multi seed ok: {} seeds, {} updates, max diff {:.2e}".format(n_seeds, n_updates, max_diff))
+
+
+if __name__ == "__main__":
+    check_multi_seed_equivalence()
@@ -3,19 +3,26 @@ import os
 import pprint
 import time
 import threading
+import numpy as np
 import torch as th
 import logging as lg
 from types import SimpleNamespace
 
 import wandb
 from utils.logging import Logger
+from utils.profiler import profiler
+from utils.checkpoint import Checkpointer, find_checkpoint, load_checkpoint
 from utils.timehelper import time_left, time_str
 from os.path import dirname, abspath
 
 from runners.episode_runner import EpisodeRunner
+from runners.fused_runner import FusedRunner
+from runners.async_evaluator import AsyncEvaluator
 from controllers.basic_controller import BasicMAC
+from controllers.quantized_actor import greedy_agreement, make_quantized_actor, refresh_actor
 from learners.q_learner import QLearner
-from components.episode_buffer import EpisodeBatch, ReplayBuffer
+from components.episode_buffer import EpisodeBatch, MultiSeedReplayBuffer, ReplayBuffer
+from components.prefetcher import BatchPrefetcher
 from components.transforms import OneHot
 
 
@@ -31,9 +38,15 @@ def run(_run, _config, _log: lg.Logger):
     # args["###"]ではなく、args.### の形でパラメータへアクセスできる
     args = SimpleNamespace(**_config)
     args.device = "cuda" if args.use_cuda else "cpu"
+    if args.torch_threads > 0:
+        # 同じマシンで複数の学習を並列に走らせる場合（sweep.py）のスレッド数の上限
+        th.set_num_threads(args.torch_threads)
 
     # setup loggers
-    logger = Logger(_log)
+    logger = Logger(_log, stats_history=args.stats_history)
+
+    # 各処理にかかった時間を計測するか
+    profiler.setup(args.profile, cuda_sync=args.use_cuda)
 
     _log.info("Experiment Parameters:")
     experiment_params = pprint.pformat(_config,
@@ -42,7 +55,8 @@ def run(_run, _config, _log: lg.Logger):
     _log.info("\n\n" + experiment_params + "\n")
 
     # configure tensorboard logger
-    unique_token = "{}__{}".format(
+    # sweep.py は起動ごとに決めた unique_token を渡す（統計ファイルを特定するため）
+    unique_token = getattr(args, "unique_token", None) or "{}__{}".format(
         args.name, datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S"))
     args.unique_token = unique_token
 
@@ -53,12 +67,27 @@ def run(_run, _config, _log: lg.Logger):
     #     logger.setup_tb(tb_exp_direc)
 
     # sacred is on by default
-    logger.setup_sacred(_run)
+    logger.setup_sacred(_run, history=args.sacred_history)
+
+    # WandBはmain.pyで有効化されている場合のみ記録
+    if wandb.run is not None and not getattr(wandb.run, "disabled", False):
+        logger.setup_wandb()
+
+    # 全ての統計をローカルファイルにも記録
+    if args.save_metrics:
+        metrics_direc = os.path.join(
+            dirname(dirname(abspath(__file__))), "results", "metrics")
+        os.makedirs(metrics_direc, exist_ok=True)
+        logger.setup_file(os.path.join(
+            metrics_direc, "{}.jsonl".format(unique_token)))
 
     # Run and train
     # 学習開始
     run_sequential(args=args, logger=logger)
 
+    # 書き出し待ちの統計をすべて書き出す
+    logger.close()
+
     # Clean up after finishing
     # 学習が終わったので、プログラムを終了させる
     print("Exiting Main")
@@ -80,7 +109,11 @@ def run_sequential(args, logger: Logger):
 
     # Init runner so we can get env info
     # 環境情報にアクセスするためのRunner
-    runner = EpisodeRunner(args=args, logger=logger)
+    if args.runner == "fused":
+        # torch上のバッチ環境と方策をまとめて動かす
+        runner = FusedRunner(args=args, logger=logger)
+    else:
+        runner = EpisodeRunner(args=args, logger=logger)
 
     # Set up schemes and groups here
     # 環境やエージェントの情報を取得
@@ -89,47 +122,37 @@ def run_sequential(args, logger: Logger):
     args.n_actions = env_info["n_actions"]
     args.state_shape = env_info["state_shape"]
 
-    # Default/Base scheme
-    # 環境やエージェントに関するスキーマを定義
-    scheme = {
-        # グローバル状態の次元数
-        "state": {"vshape": env_info["state_shape"]},
-        # 各エージェントの部分観測
-        "obs": {"vshape": env_info["obs_shape"], "group": "agents"},
-        # 行動
-        "actions": {"vshape": (1,), "group": "agents", "dtype": th.long},
-        # 選択可能な行動
-        "avail_actions": {"vshape": (env_info["n_actions"],), "group": "agents", "dtype": th.int},
-        # 報酬
-        "reward": {"vshape": (1,)},
-        "terminated": {"vshape": (1,), "dtype": th.uint8},
-    }
-    # groups: エージェント数分存在する情報（観測、行動）を管理するためのもの
-    groups = {
-        "agents": args.n_agents
-    }
-    # EpisodeBatchの初期化に使われる
-    # OneHotベクトルで表す数を設定
-    preprocess = {
-        "actions": ("actions_onehot", [OneHot(out_dim=args.n_actions)])
-    }
+    scheme, groups, preprocess = build_scheme(env_info, args)
 
     pprint.pprint("scheme: {}".format(scheme))
     pprint.pprint("groups: {}".format(groups))
     pprint.pprint("preprocess: {}".format(preprocess))
 
     # 経験再生用バッファ
-    buffer = ReplayBuffer(scheme, groups, args.buffer_size, env_info["episode_limit"] + 1,
-                          preprocess=preprocess,
-                          device="cpu" if args.buffer_cpu_only else args.device)
+    buffer_args = (scheme, groups, args.buffer_size, env_info["episode_limit"] + 1)
+    buffer_kwargs = dict(preprocess=preprocess,
+                         device="cpu" if args.buffer_cpu_only else args.device)
+    if args.n_seeds > 1:
+        # シードごとに独立したバッファ
+        buffer = MultiSeedReplayBuffer(args.n_seeds, *buffer_args, **buffer_kwargs)
+    else:
+        buffer = ReplayBuffer(*buffer_args, **buffer_kwargs)
+    logger.console_logger.info("Replay buffer memory:\n" + buffer.memory_report())
 
     # Setup multiagent controller here
     # マルチエージェントを制御するコントローラー
     mac = BasicMAC(buffer.scheme, groups, args)
 
+    # エピソードの実行には int8 に量子化したCPU上のコピーを使う（学習は mac で行う）
+    actor = None
+    if args.quantize_actor:
+        assert not args.use_cuda, "quantize_actor runs the actor on CPU (set use_cuda=False)"
+        actor = make_quantized_actor(mac)
+
     # Give runner the scheme
     # 先ほど定義したスキーマとMACをRunnerに渡して初期化
-    runner.setup(scheme=scheme, groups=groups, preprocess=preprocess, mac=mac)
+    runner.setup(scheme=scheme, groups=groups, preprocess=preprocess,
+                 mac=mac if actor is None else actor)
 
     # Learner
     # エージェントたち
@@ -140,80 +163,153 @@ def run_sequential(args, logger: Logger):
         print("Use CUDA!")
         learner.cuda()
 
-    # チェックポイントモード用
-    # if args.checkpoint_path != "":
-
-    #     timesteps = []
-    #     timestep_to_load = 0
-
-    #     if not os.path.isdir(args.checkpoint_path):
-    #         logger.console_logger.info(
-    #             "Checkpoint directiory {} doesn't exist".format(args.checkpoint_path))
-    #         return
-
-    #     # Go through all files in args.checkpoint_path
-    #     for name in os.listdir(args.checkpoint_path):
-    #         full_name = os.path.join(args.checkpoint_path, name)
-    #         # Check if they are dirs the names of which are numbers
-    #         if os.path.isdir(full_name) and name.isdigit():
-    #             timesteps.append(int(name))
-
-    #     if args.load_step == 0:
-    #         # choose the max timestep
-    #         timestep_to_load = max(timesteps)
-    #     else:
-    #         # choose the timestep closest to load_step
-    #         timestep_to_load = min(
-    #             timesteps, key=lambda x: abs(x - args.load_step))
-
-    #     model_path = os.path.join(args.checkpoint_path, str(timestep_to_load))
-
-    #     logger.console_logger.info("Loading model from {}".format(model_path))
-    #     learner.load_models(model_path)
-    #     runner.t_env = timestep_to_load
-
-    #     if args.evaluate or args.save_replay:
-    #         evaluate_sequential(args, runner)
-    #         return
-
     # start training
     # ----------------- トレーニング開始！！！ -----------------
 
     episode = 0
     last_test_T = -args.test_interval - 1
     last_log_T = 0
-    # model_save_time = 0
+    model_save_time = 0
+
+    # チェックポイントモード用
+    # 保存先のディレクトリ（再開する場合は同じディレクトリに続けて保存する）
+    checkpoint_dir = os.path.join(
+        dirname(dirname(abspath(__file__))), "results", "models", args.unique_token)
+    if args.checkpoint_path != "":
+        found = find_checkpoint(args.checkpoint_path, args.load_step)
+        if found is None:
+            logger.console_logger.info(
+                "No checkpoint found in {}".format(args.checkpoint_path))
+            return
+        timestep_to_load, model_path = found
+        logger.console_logger.info("Loading model from {}".format(model_path))
+
+        if args.evaluate:
+            learner.load_models(model_path)
+            if actor is not None:
+                refresh_actor(actor, mac)
+            runner.t_env = timestep_to_load
+            evaluate_sequential(args, runner)
+            return
+
+        # 学習の途中から再開する
+        checkpoint = load_checkpoint(model_path)
+        learner.load_checkpoint_state(checkpoint)
+        if "buffer" in checkpoint:
+            buffer.load_state_dict(checkpoint["buffer"])
+        progress = checkpoint["progress"]
+        runner.t_env = progress["t_env"]
+        episode = progress["episode"]
+        last_test_T = progress["last_test_T"]
+        last_log_T = progress["last_log_T"]
+        model_save_time = runner.t_env
+        np.random.set_state(progress["numpy_rng"])
+        th.set_rng_state(progress["torch_rng"])
+        checkpoint_dir = args.checkpoint_path
+        if actor is not None:
+            refresh_actor(actor, mac)
+        logger.console_logger.info(
+            "Resuming from t_env {} (episode {}, {} episodes in buffer)".format(
+                runner.t_env, episode, buffer.episodes_in_buffer))
+
+    checkpointer = None
+    if args.save_model:
+        checkpointer = Checkpointer(
+            checkpoint_dir, args.save_model_keep, logger.console_logger)
+        checkpointer.start()
+
+    # テストエピソードを別プロセスで実行する
+    evaluator = None
+    if args.async_evaluation:
+        evaluator = AsyncEvaluator(
+            args, type(runner), scheme, groups, preprocess, buffer.scheme)
+
+    # 学習用のバッチをバックグラウンドで用意する
+    prefetcher = None
+    if args.prefetch_batches > 0:
+        prefetcher = BatchPrefetcher(
+            buffer, args.batch_size, args.device, args.prefetch_batches,
+            seed=getattr(args, "seed", None),
+            chunk_length=args.chunk_length, burn_in=args.burn_in)
+
+    def save_checkpoint():
+        # 学習ループではCPUへのコピーだけ行い、書き込みはCheckpointerのスレッドで行う
+        state = learner.checkpoint_state()
+        state["progress"] = {
+            "t_env": runner.t_env,
+            "episode": episode,
+            "last_test_T": last_test_T,
+            "last_log_T": last_log_T,
+            "numpy_rng": np.random.get_state(),
+            "torch_rng": th.get_rng_state(),
+        }
+        if args.save_model_buffer:
+            state["buffer"] = buffer.state_dict()
+        with profiler.timer("checkpoint.snapshot"):
+            checkpointer.save(runner.t_env, state)
 
     start_time = time.time()
     last_time = start_time
+    n_updates = 0
 
     logger.console_logger.info(
         "Beginning training for {} timesteps".format(args.t_max))
 
     while runner.t_env <= args.t_max:
 
+        # 指定したエピソードを含む1イテレーションだけトレースを記録（1イテレーションで batch_size_run エピソード進む）
+        trace_iteration = episode <= args.profile_trace_episode < episode + runner.batch_size
+        if trace_iteration:
+            profiler.start_trace()
+
         # Run for a whole episode at a time
         # １つのエピソード全体を実行してバッチを取得
         episode_batch = runner.run(episode=episode, test_mode=False)
 
         # 経験再生バッファにエピソードを保存
-        buffer.insert_episode_batch(episode_batch)
+        with profiler.timer("buffer.insert"):
+            buffer.insert_episode_batch(episode_batch)
 
         # バッファに十分溜まったら
         if buffer.can_sample(args.batch_size):
             # バッチをサンプリング
-            episode_sample: EpisodeBatch = buffer.sample(args.batch_size)
-
-            # Truncate batch to only filled timesteps
-            # はみ出たタイムステップは切り捨てる
-            max_ep_t = episode_sample.max_t_filled()
-            episode_sample = episode_sample[:, :max_ep_t]
-
-            if episode_sample.device != args.device:
-                episode_sample.to(args.device)
+            with profiler.timer("buffer.sample"):
+                if prefetcher is not None:
+                    # 切り詰め・転送まで済んだバッチを取り出すだけ
+                    episode_sample: EpisodeBatch = prefetcher.get()
+                elif args.chunk_length > 0:
+                    # エピソードの途中から切り出した固定長の区間（学習の計算量がエピソード長によらない）
+                    episode_sample: EpisodeBatch = buffer.sample_chunks(
+                        args.batch_size, args.chunk_length, args.burn_in)
+                    if episode_sample.device != args.device:
+                        episode_sample.to(args.device)
+                else:
+                    episode_sample: EpisodeBatch = buffer.sample(args.batch_size)
+
+                    # Truncate batch to only filled timesteps
+                    # はみ出たタイムステップは切り捨てる
+                    max_ep_t = episode_sample.max_t_filled()
+                    episode_sample = episode_sample[:, :max_ep_t]
+
+                    if episode_sample.device != args.device:
+                        episode_sample.to(args.device)
 
             # バッチを用いてエージェントに学習させる
-            learner.train(episode_sample, runner.t_env, episode)
+            with profiler.timer("learner.train"):
+                learner.train(episode_sample, runner.t_env, episode)
+            n_updates += 1
+
+            if actor is not None and n_updates % args.quantize_actor_interval == 0:
+                with profiler.timer("actor.refresh"):
+                    refresh_actor(actor, mac)
+
+        if trace_iteration:
+            trace_path = os.path.join(
+                dirname(dirname(abspath(__file__))), "results", "profiles",
+                "{}_episode{}.json".format(args.unique_token, episode))
+            profiler.stop_trace(trace_path)
+            logger.console_logger.info(
+                "Saved trace of episode {} to {}".format(episode, trace_path))
 
         # Execute test runs once in a while
         # 定期的にテストでgreedyに実行する
@@ -230,46 +326,111 @@ def run_sequential(args, logger: Logger):
 
             last_test_T = runner.t_env
 
-            print_log = True
-            for _ in range(n_test_runs):
-                # 複数回テスト
-                # 初回のみログ
-                runner.run(episode=episode, test_mode=True,
-                           print_log=print_log)
-                print_log = False
-
-        # if args.save_model and (runner.t_env - model_save_time >= args.save_model_interval or model_save_time == 0):
-        #     model_save_time = runner.t_env
-        #     save_path = os.path.join(
-        #         args.local_results_path, "models", args.unique_token, str(runner.t_env))
-        #     # "results/models/{}".format(unique_token)
-        #     os.makedirs(save_path, exist_ok=True)
-        #     logger.console_logger.info("Saving models to {}".format(save_path))
-
-        #     # learner should handle saving/loading -- delegate actor save/load to mac,
-        #     # use appropriate filenames to do critics, optimizer states
-        #     learner.save_models(save_path)
-
-        episode += 1
+            if actor is not None and buffer.can_sample(args.batch_size):
+                # 量子化した actor と学習中の mac の greedy な行動がどれだけ一致するか
+                check_batch = buffer.sample(args.batch_size)
+                check_batch = check_batch[:, :check_batch.max_t_filled()]
+                agreement = greedy_agreement(mac, actor, check_batch)
+                logger.log_stat("actor_greedy_agreement", agreement, runner.t_env)
+                if agreement < args.quantize_actor_min_agreement:
+                    logger.console_logger.warning(
+                        "Quantized actor agrees with the fp32 agent on only {:.1%} of greedy actions".format(
+                            agreement))
+
+            if evaluator is not None:
+                # 重みのスナップショットを送るだけで、評価の完了は待たない
+                evaluator.submit(runner.t_env, episode, mac)
+            else:
+                print_log = True
+                for _ in range(n_test_runs):
+                    # 複数回テスト
+                    # 初回のみログ
+                    runner.run(episode=episode, test_mode=True,
+                               print_log=print_log)
+                    print_log = False
+
+        # 別プロセスでの評価結果が届いていれば記録
+        if evaluator is not None:
+            evaluator.log_results(logger)
+
+        episode += runner.batch_size
 
         if (runner.t_env - last_log_T) >= args.log_interval:
             logger.print_recent_stats()
             last_log_T = runner.t_env
 
+        # 次のエピソードから再開できるよう、イテレーションの最後に保存する
+        if checkpointer is not None and (
+                runner.t_env - model_save_time >= args.save_model_interval or model_save_time == 0):
+            model_save_time = runner.t_env
+            save_checkpoint()
+
     # ----------------- トレーニング終了 -----------------
+    if checkpointer is not None:
+        # 最後の状態も保存して、書き出しが終わるまで待つ
+        if model_save_time != runner.t_env:
+            save_checkpoint()
+        checkpointer.close()
+
+    if prefetcher is not None:
+        prefetcher.close()
+
+    if evaluator is not None:
+        # 送ったスナップショットの評価が終わるまで待つ
+        evaluator.close(logger)
+
     runner.close_env()
     logger.console_logger.info("Finished Training")
 
 
+
+def build_scheme(env_info: dict, args):
+    '''
+    環境情報からEpisodeBatch用のスキーマを作成する
+    '''
+    # Default/Base scheme
+    # 環境やエージェントに関するスキーマを定義
+    scheme = {
+        # グローバル状態の次元数
+        "state": {"vshape": env_info["state_shape"]},
+        # 各エージェントの部分観測
+        "obs": {"vshape": env_info["obs_shape"], "group": "agents"},
+        # 行動
+        "actions": {"vshape": (1,), "group": "agents", "dtype": th.long},
+        # 選択可能な行動
+        "avail_actions": {"vshape": (env_info["n_actions"],), "group": "agents", "dtype": th.int},
+        # 報酬
+        "reward": {"vshape": (1,)},
+        "terminated": {"vshape": (1,), "dtype": th.uint8},
+    }
+    if getattr(args, "store_hidden", False):
+        # 各ステップで行動を選ぶ前のRNNの隠れ状態（固定長の区間の学習をこの状態から始める）
+        scheme["hidden_states"] = {
+            "vshape": (args.rnn_hidden_dim,), "group": "agents",
+            "dtype": getattr(th, args.hidden_dtype),
+        }
+    # groups: エージェント数分存在する情報（観測、行動）を管理するためのもの
+    groups = {
+        "agents": env_info["n_agents"]
+    }
+    # EpisodeBatchの初期化に使われる
+    # OneHotベクトルで表す数を設定
+    preprocess = {
+        "actions": ("actions_onehot", [OneHot(out_dim=env_info["n_actions"])])
+    }
+
+    return scheme, groups, preprocess
+
+
 def evaluate_sequential(args, runner: EpisodeRunner):
     '''
     テストモードでエピソードを実行して評価する
     '''
 
-    for _ in range(args.test_nepisode):
-        runner.run(test_mode=True)
+    for episode in range(0, args.test_nepisode, runner.batch_size):
+        runner.run(episode=episode, test_mode=True)
 
-    if args.save_replay:
+    if getattr(args, "save_replay", False):
         runner.save_replay()
 
     runner.close_env()
@@ -289,6 +450,13 @@ def args_sanity_check(config, _log):
         _log.warning(
             "CUDA flag use_cuda was switched OFF automatically because no CUDA devices are available!")
 
+    if config["n_seeds"] > 1:
+        # 各シードの環境はfused runnerの batch_size_run 個の環境をシードごとに等分したもの
+        assert config["runner"] == "fused", "n_seeds > 1 needs runner: fused"
+        assert config["batch_size_run"] % config["n_seeds"] == 0, \
+            "batch_size_run must be a multiple of n_seeds"
+        assert config["prefetch_batches"] == 0, "n_seeds > 1 does not support prefetch_batches"
+
     if config["test_nepisode"] < config["batch_size_run"]:
         config["test_nepisode"] = config["batch_size_run"]
     else:
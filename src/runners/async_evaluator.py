@@ -0,0 +1,171 @@
+import queue
+from copy import copy
+from multiprocessing import Process, Queue
+
+import torch as th
+
+from controllers.basic_controller import BasicMAC
+from utils.checkpoint import snapshot
+from utils.logging import Logger
+
+
+class _StatsRecorder:
+    """
+    評価プロセスの中でRunnerが記録した統計を溜めておき、学習プロセスに送り返すためのLogger代わり
+    """
+
+    def __init__(self):
+        self.records = []
+
+    def log_stat(self, key, value, t, to_sacred=True):
+        if isinstance(value, th.Tensor):
+            value = value.item() if value.numel() == 1 else value.tolist()
+        self.records.append((key, value, t, to_sacred))
+
+
+def evaluate_snapshot(runner, mac: BasicMAC, t_env, episode, agent_state, n_test_runs):
+    """
+    重みのスナップショットで n_test_runs 回テストを実行する（test_* はちょうど test_nepisode エピソード分が t_env で1回記録される）
+    """
+    mac.agent.load_state_dict(agent_state)
+
+    # 前のスナップショットの途中の統計を持ち越さず、学習用の統計（epsilon など）も記録しないように
+    runner.test_returns.clear()
+    runner.test_stats.clear()
+    runner.t_env = t_env
+    runner.log_train_stats_t = t_env
+    for i in range(n_test_runs):
+        runner.run(episode=episode, test_mode=True, print_log=i == 0)
+
+
+def _eval_worker(args, runner_cls, scheme, groups, preprocess, mac_scheme, snapshots, results):
+    """
+    評価プロセス: 自分用の環境とMACを作り、受け取った重みでテストエピソードを実行する
+    """
+    # 学習プロセスとCPUを取り合わないように
+    th.set_num_threads(1)
+
+    recorder = _StatsRecorder()
+    runner = runner_cls(args=args, logger=recorder)
+    # 環境によっては get_env_info で行動数などが決まる
+    runner.get_env_info()
+    mac = BasicMAC(mac_scheme, groups, args)
+    runner.setup(scheme=scheme, groups=groups, preprocess=preprocess, mac=mac)
+    n_test_runs = max(1, args.test_nepisode // runner.batch_size)
+
+    stop = False
+    while not stop:
+        item = snapshots.get()
+        if item is None:
+            break
+        # 評価が追いつかずに溜まったスナップショットは最新のものだけを評価する
+        n_skipped = 0
+        while True:
+            try:
+                newer = snapshots.get_nowait()
+            except queue.Empty:
+                break
+            if newer is None:
+                stop = True
+                break
+            item = newer
+            n_skipped += 1
+
+        t_env, episode, agent_state = item
+        # 統計はスナップショットを取った時点の t_env で記録される
+        evaluate_snapshot(runner, mac, t_env, episode, agent_state, n_test_runs)
+
+        results.put((t_env, recorder.records, n_skipped))
+        recorder.records = []
+
+    runner.close_env()
+    results.put(None)
+
+
+class AsyncEvaluator:
+    """
+    テストエピソードを別プロセスで実行する
+
+    学習ループは submit() でエージェントの重みのスナップショットを送り、
+    log_results() で届いている評価結果（test_*）をLoggerに記録するだけで、評価の完了を待たない
+    評価が追いつかない場合は、溜まったスナップショットのうち最新のものだけを評価する
+
+    評価プロセスは自分用の環境とMACを持ち、CPU上で動く
+    """
+
+    def __init__(self, args, runner_cls, scheme, groups, preprocess, mac_scheme):
+        worker_args = copy(args)
+        worker_args.device = "cpu"
+        worker_args.use_cuda = False
+
+        self.snapshots = Queue()
+        self.results = Queue()
+        self.n_replaced = 0
+
+        self.process = Process(
+            target=_eval_worker,
+            args=(
+                worker_args,
+                runner_cls,
+                scheme,
+                groups,
+                preprocess,
+                mac_scheme,
+                self.snapshots,
+                self.results,
+            ),
+            name="Evaluator",
+            daemon=True,
+        )
+        self.process.start()
+
+    def submit(self, t_env, episode, mac: BasicMAC):
+        """
+        現在の重みのスナップショットを評価プロセスに送る
+        """
+        self.snapshots.put((t_env, episode, snapshot(mac.agent.state_dict())))
+
+    def log_results(self, logger: Logger):
+        """
+        届いている評価結果をすべてLoggerに記録する（ブロックしない）
+        """
+        while True:
+            try:
+                item = self.results.get_nowait()
+            except queue.Empty:
+                return
+            if item is None:
+                return
+            self._log(logger, *item)
+
+    def _log(self, logger: Logger, t_env, records, n_skipped):
+        self.n_replaced += n_skipped
+        for key, value, t, to_sacred in records:
+            # print_recent_stats が最新の学習エピソードを表示するよう、episode は学習側の記録だけにする
+            if key == "episode":
+                continue
+            logger.log_stat(key, value, t, to_sacred=to_sacred)
+        logger.console_logger.info("Evaluated snapshot of t_env {}".format(t_env))
+
+    def close(self, logger: Logger):
+        """
+        送ったスナップショットの評価が終わるのを待ち、結果を記録してから評価プロセスを終了する
+        """
+        self.snapshots.put(None)
+        while True:
+            try:
+                item = self.results.get(timeout=1)
+            except queue.Empty:
+                if not self.process.is_alive():
+                    break
+                continue
+            if item is None:
+                break
+            self._log(logger, *item)
+        self.process.join()
+        if self.n_replaced:
+            logger.console_logger.info(
+                "Evaluator skipped {} snapshots that were replaced before evaluation".format(
+                    self.n_replaced
+                )
+            )
@@ -1,7 +1,6 @@
 # from envs import REGISTRY as env_REGISTRY
 from functools import partial
 
-import wandb
 from components.episode_buffer import EpisodeBatch
 import numpy as np
 from controllers.basic_controller import BasicMAC
@@ -14,6 +13,7 @@ from envs.randezvous.randezvous import RandezvousEnv
 from envs.guess.guess import GuessEnv
 from envs.crossroads.crossroads import CrossroadsEnv
 from utils.logging import Logger
+from utils.profiler import profiler
 
 
 class EpisodeRunner:
@@ -66,6 +66,9 @@ class EpisodeRunner:
             preprocess=preprocess,
             device=self.args.device,
         )
+        # エピソードごとにバッチを作り直さず1つを使い回すか
+        self.reuse_batch = getattr(self.args, "reuse_episode_batch", True)
+        self.batch = self.new_batch() if self.reuse_batch else None
 
         # 渡されたMACを保持
         self.mac = mac
@@ -87,15 +90,28 @@ class EpisodeRunner:
         エピソードの最初に環境など諸々を初期化
         """
         # 新しいバッチを用意
-        self.batch = self.new_batch()
+        self.batch = self._next_batch()
         # 環境をリセット
         self.env.reset(episode, test_mode=test_mode, print_log=print_log)
         # タイムステップを0に
         self.t = 0
 
+    def _next_batch(self) -> EpisodeBatch:
+        """
+        次のエピソード用の空のバッチ
+        reuse_episode_batch なら前のエピソードのバッチを使い回し、書き込んだ先頭 self.t + 1 ステップだけをゼロに戻す
+        （episode_limit + 1 ステップ分のテンソルを毎回確保・ゼロ埋めしない）
+        """
+        if not self.reuse_batch:
+            return self.new_batch()
+        self.batch.zero_(self.t + 1)
+        return self.batch
+
     def run(self, episode, test_mode=False, print_log=False):
         """
         1エピソードを実行してバッチを返す
+        reuse_episode_batch: True なら返したバッチは次の run() で上書きされるので、
+        残しておく場合は ReplayBuffer に挿入する（コピーされる）
         """
 
         self.episode = episode
@@ -108,6 +124,7 @@ class EpisodeRunner:
 
         # 隠れ状態を初期化
         self.mac.init_hidden(batch_size=self.batch_size)
+        store_hidden = "hidden_states" in self.batch.scheme
 
         # ---------------- エピソード開始！！！ ----------------
 
@@ -118,9 +135,11 @@ class EpisodeRunner:
 
         while not terminated:
 
-            state = self.env.get_state()
+            with profiler.timer("env.get_state"):
+                state = self.env.get_state()
             avail_actions = self.env.get_avail_actions()
-            obs = self.env.get_obs()
+            with profiler.timer("env.get_obs"):
+                obs = self.env.get_obs()
 
             # 遷移前の情報を環境から取得
             pre_transition_data = {
@@ -131,20 +150,27 @@ class EpisodeRunner:
                 # エージェントの部分観測
                 "obs": [obs],
             }
+            if store_hidden:
+                # このステップの行動を選ぶ前の隠れ状態
+                pre_transition_data["hidden_states"] = self._hidden_states()
 
             # バッチに遷移前の情報を追加
-            self.batch.update(pre_transition_data, ts=self.t)
+            with profiler.timer("batch.update"):
+                self.batch.update(pre_transition_data, ts=self.t)
 
             # Pass the entire batch of experiences up till now to the agents
             # Receive the actions for each agent at this timestep in a batch of size 1
             # 現時点のバッチ（エピソードの最初から今までの遷移情報が含まれている）を渡して、Agent Networkから行動を決定
-            actions = self.mac.select_actions(
-                self.batch, t_ep=self.t, t_env=self.t_env, test_mode=test_mode
-            )
+            with profiler.timer("mac.select_actions"):
+                actions = self.mac.select_actions(
+                    self.batch, t_ep=self.t, t_env=self.t_env, test_mode=test_mode
+                )
 
             # 行動を出力して、環境からフィードバックを得る
             # 返り値 = 報酬，エピソードが終了したか，環境情報
-            reward, terminated, env_info = self.env.step(actions[0])
+            with profiler.timer("env.step"):
+                reward, terminated, env_info = self.env.step(actions[0])
+            profiler.count("env_steps")
 
             # if test_mode and actions[0] != 0:
             #     print("Timestep: ", timestep)
@@ -171,7 +197,8 @@ class EpisodeRunner:
             }
 
             # 遷移後の情報もバッチに追加
-            self.batch.update(post_transition_data, ts=self.t)
+            with profiler.timer("batch.update"):
+                self.batch.update(post_transition_data, ts=self.t)
 
             # タイムステップを進める
             self.t += 1
@@ -191,6 +218,8 @@ class EpisodeRunner:
             # 部分観測
             "obs": [self.env.get_obs()],
         }
+        if store_hidden:
+            last_data["hidden_states"] = self._hidden_states()
 
         # バッチに終端状態の情報を追加
         self.batch.update(last_data, ts=self.t)
@@ -241,20 +270,22 @@ class EpisodeRunner:
                 self.logger.log_stat(
                     "epsilon", self.mac.action_selector.epsilon, self.t_env
                 )
-                wandb.log(
-                    {"epsilon": self.mac.action_selector.epsilon}, step=self.t_env
-                )
             self.log_train_stats_t = self.t_env
 
         # バッチを返す
         return self.batch
 
+    def _hidden_states(self):
+        """
+        MACの現在の隠れ状態 [batch_size, n_agents, rnn_hidden_dim]（バッチに保存する用）
+        """
+        return self.mac.hidden_states.detach().reshape(self.batch_size, self.mac.n_agents, -1)
+
     def _log(self, total_reward_history: list, sum_stats: dict, prefix):
         """
         前回記録時からエピソードごとの報酬総和の平均・分散を記録
         """
         self.logger.log_stat("episode", self.episode, self.t_env)
-        wandb.log({"episode": self.episode}, step=self.t_env)
 
         # 報酬の総和の平均・分散
         total_reward_mean = np.mean(total_reward_history)
@@ -263,8 +294,6 @@ class EpisodeRunner:
             prefix + "return_std", np.std(total_reward_history), self.t_env
         )
 
-        wandb.log({prefix + "total_reward": total_reward_mean}, step=self.t_env)
-
         # 総収益の履歴をクリア
         total_reward_history.clear()
 
@@ -273,7 +302,6 @@ class EpisodeRunner:
             if key != "n_episodes":
                 stat = value / sum_stats["n_episodes"]
                 self.logger.log_stat(prefix + key + "_mean", stat, self.t_env)
-                wandb.log({prefix + key: stat}, step=self.t_env)
 
         # env_infoの履歴をクリア
         sum_stats.clear()
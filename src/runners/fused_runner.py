@@ -0,0 +1,259 @@
+import numpy as np
+import torch as th
+import torch.nn.functional as F
+
+from controllers.basic_controller import BasicMAC
+from envs.crossroads.crossroads_torch import TorchCrossroadsEnv
+from envs.diamond.diamond_torch import TorchDiamondEnv
+from runners.episode_runner import EpisodeRunner
+from utils.logging import Logger
+from utils.profiler import profiler
+
+# args.env ごとのtorch版バッチ環境
+TORCH_ENVS = {
+    "diamond": TorchDiamondEnv,
+    "crossroads": TorchCrossroadsEnv,
+}
+
+
+class FusedRunner(EpisodeRunner):
+    """
+    batch_size_run 個の環境を torch のテンソル上でまとめて動かし、
+    環境の遷移・観測とエージェントの行動選択を1つのループで行うRunner
+
+    環境の状態・観測・行動・RNNの隠れ状態はすべて args.device 上のテンソルのままで、
+    1ステップの中でホスト（NumPy / Pythonの値）との変換は行わない。
+    1ステップ分の計算（観測 → Q値 → epsilon-greedy → 遷移）は _fused_step にまとまっていて、
+    compile_rollout: True なら torch.compile で1つのグラフにする
+
+    全環境は同時にリセットされ、先に終わった環境はそのまま止まる（filled = 0 になる）。
+    全環境が終わったかどうかの確認（ホストとの同期）は fused_sync_interval ステップごとにだけ行う
+    """
+
+    def __init__(self, args, logger: Logger):
+        self.args = args
+        self.logger = logger
+        self.batch_size = self.args.batch_size_run
+
+        # 環境
+        env_cls = TORCH_ENVS[self.args.env]
+        self.env = env_cls(
+            self.batch_size,
+            **self.args.env_args,
+            auto_reset=False,
+            device=self.args.device,
+        )
+
+        self.episode = 0
+
+        # 最大タイムステップ数
+        self.episode_limit = self.env.episode_limit
+        # 現在のタイムステップ
+        self.t = 0
+        # 累計タイムステップ数
+        self.t_env = 0
+
+        # ログ用
+        self.train_returns = []
+        self.test_returns = []
+        self.train_stats = {}
+        self.test_stats = {}
+
+        # Log the first run
+        self.log_train_stats_t = -1000000
+
+        self.sync_interval = getattr(self.args, "fused_sync_interval", 10)
+
+        # n_seeds > 1: 環境は先頭から n_seeds 等分した部分がそれぞれのシードのもの
+        self.n_seeds = getattr(self.args, "n_seeds", 1)
+
+    def setup(self, scheme, groups, preprocess, mac: BasicMAC):
+        super().setup(scheme, groups, preprocess, mac)
+
+        env_info = self.get_env_info()
+        self.n_agents = env_info["n_agents"]
+        self.n_actions = env_info["n_actions"]
+        self.agent_ids = (
+            th.eye(self.n_agents, device=self.args.device)
+            .unsqueeze(0)
+            .expand(self.batch_size, -1, -1)
+        )
+
+        self._step = self._fused_step
+        if getattr(self.args, "compile_rollout", False):
+            self._step = th.compile(self._fused_step)
+
+    def _fused_step(self, env_state: dict, hidden_states, last_actions_onehot, epsilon):
+        """
+        1ステップ分: 観測 → エージェントネットワーク → epsilon-greedy → 環境の遷移
+        （BasicMAC._build_inputs と EpsilonGreedyActionSelector と同じ計算）
+        """
+        obs, state, avail_actions = self.env.observe(env_state)
+
+        inputs = [obs]
+        if self.args.obs_last_action:
+            inputs.append(last_actions_onehot)
+        if self.args.obs_agent_id:
+            inputs.append(self.agent_ids)
+        inputs = th.cat([x.reshape(self.batch_size * self.n_agents, -1) for x in inputs], dim=1)
+
+        q_values, hidden_states = self.mac.agent(inputs, hidden_states)
+        q_values = q_values.view(self.batch_size, self.n_agents, -1)
+        hidden_states = hidden_states.view(self.batch_size, self.n_agents, -1)
+
+        # 選択可能な行動の中から greedy / 一様ランダムに選ぶ
+        masked_q_values = q_values.masked_fill(avail_actions == 0, -float("inf"))
+        greedy_actions = masked_q_values.argmax(dim=-1)
+        random_actions = (th.rand_like(q_values) * avail_actions).argmax(dim=-1)
+        pick_random = th.rand_like(q_values[:, :, 0]) < epsilon
+        actions = th.where(pick_random, random_actions, greedy_actions)
+        actions_onehot = F.one_hot(actions, self.n_actions).to(q_values.dtype)
+
+        next_env_state, reward, terminated, info = self.env.transition(env_state, actions)
+        return (
+            obs,
+            state,
+            avail_actions,
+            actions,
+            actions_onehot,
+            hidden_states,
+            next_env_state,
+            reward,
+            terminated,
+            info,
+        )
+
+    def run(self, episode, test_mode=False, print_log=False):
+        """
+        batch_size_run エピソードを同時に実行してバッチを返す
+        """
+        self.episode = episode
+        self.batch = self._next_batch()
+        self.env.reset(episode, test_mode=test_mode)
+        env_state = self.env.state
+        self.t = 0
+
+        # epsilonはエピソードの最初に一度だけ決める
+        selector = self.mac.action_selector
+        selector.epsilon = 0.0 if test_mode else selector.schedule.eval(self.t_env)
+        if hasattr(selector, "epsilons"):
+            # 環境ごとのepsilon（vector_epsilon_greedy）
+            epsilon = selector.epsilons(self.batch_size, self.args.device)
+        else:
+            epsilon = th.tensor(selector.epsilon, device=self.args.device)
+
+        self.mac.init_hidden(batch_size=self.batch_size)
+        hidden_states = self.mac.hidden_states
+        last_actions_onehot = th.zeros(
+            self.batch_size, self.n_agents, self.n_actions, device=self.args.device
+        )
+
+        data = self.batch.data.transition_data
+        device = self.args.device
+        just_terminated = th.zeros(self.batch_size, dtype=th.bool, device=device)
+        total_reward = th.zeros(self.batch_size, device=device)
+        sum_info = {}
+
+        store_hidden = "hidden_states" in data
+        all_terminated = False
+        while True:
+            # 終端状態（t = episode_limit か全環境が終了した後）では行動だけ選んで遷移は捨てる
+            last_step = all_terminated or self.t >= self.episode_limit
+            active = env_state["active"]
+
+            if store_hidden:
+                # このステップの行動を選ぶ前の隠れ状態
+                data["hidden_states"][:, self.t] = hidden_states.detach().reshape(
+                    self.batch_size, self.n_agents, -1
+                )
+
+            with profiler.timer("fused.step"):
+                (
+                    obs,
+                    state,
+                    avail_actions,
+                    actions,
+                    actions_onehot,
+                    hidden_states,
+                    next_env_state,
+                    reward,
+                    terminated,
+                    info,
+                ) = self._step(env_state, hidden_states, last_actions_onehot, epsilon)
+
+            # バッチに直接書き込む（エピソードが続いている環境と、直前に終わった環境の終端状態が filled）
+            data["obs"][:, self.t] = obs
+            data["state"][:, self.t] = state
+            data["avail_actions"][:, self.t] = avail_actions
+            data["actions"][:, self.t] = actions.unsqueeze(-1)
+            data["actions_onehot"][:, self.t] = actions_onehot
+            data["filled"][:, self.t, 0] = (active | just_terminated).long()
+            if last_step:
+                break
+
+            # エピソード終了の原因が目的達成による時のみTrue（最大回数を超えて終了した場合はFalse）
+            data["reward"][:, self.t, 0] = reward
+            data["terminated"][:, self.t, 0] = (terminated & ~info["timeout"]).to(th.uint8)
+            profiler.count("env_steps", self.batch_size)
+
+            total_reward += reward
+            for k, v in info.items():
+                # 終了したステップの値だけを集計する
+                sum_info[k] = sum_info.get(k, 0) + v.to(total_reward.dtype) * terminated
+
+            env_state = next_env_state
+            last_actions_onehot = actions_onehot
+            just_terminated = terminated
+            self.t += 1
+
+            # 全環境が終わったかの確認（ホストとの同期）はsync_intervalステップごとだけ
+            if self.sync_interval and self.t % self.sync_interval == 0:
+                all_terminated = not bool(env_state["active"].any())
+
+        self.mac.hidden_states = hidden_states
+
+        # ------ ログをまとめる（ここで一度だけホストに転送する） ------
+        episode_lengths = env_state["steps"].cpu().numpy()
+        total_rewards = total_reward.cpu().numpy()
+        env_info = {k: float(v.sum().item()) for k, v in sum_info.items()}
+
+        sum_stats = self.test_stats if test_mode else self.train_stats
+        total_reward_history = self.test_returns if test_mode else self.train_returns
+        log_prefix = "test_" if test_mode else ""
+
+        sum_stats.update(
+            {
+                k: sum_stats.get(k, 0) + env_info.get(k, 0)
+                for k in set(sum_stats) | set(env_info)
+            }
+        )
+        sum_stats["n_episodes"] = self.batch_size + sum_stats.get("n_episodes", 0)
+        sum_stats["episode_length"] = int(episode_lengths.sum()) + sum_stats.get(
+            "episode_length", 0
+        )
+
+        if not test_mode:
+            self.t_env += int(episode_lengths.sum())
+
+        total_reward_history.extend(total_rewards.tolist())
+
+        if test_mode and (len(self.test_returns) == self.args.test_nepisode):
+            self._log(total_reward_history, sum_stats, log_prefix)
+        elif self.t_env - self.log_train_stats_t >= self.args.runner_log_interval:
+            self._log(total_reward_history, sum_stats, log_prefix)
+            self.logger.log_stat("epsilon", selector.epsilon, self.t_env)
+            self.log_train_stats_t = self.t_env
+
+        return self.batch
+
+    def _log(self, total_reward_history: list, sum_stats: dict, prefix):
+        if self.n_seeds > 1:
+            # 履歴は run ごとに [シード, シードごとの環境] の順に並んでいる
+            seed_returns = np.reshape(
+                total_reward_history, (-1, self.n_seeds, self.batch_size // self.n_seeds)
+            ).mean(axis=(0, 2))
+            for k, seed_return in enumerate(seed_returns):
+                self.logger.log_stat(
+                    prefix + "total_reward_seed{}".format(k), seed_return, self.t_env
+                )
+        super()._log(total_reward_history, sum_stats, prefix)
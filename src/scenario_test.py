@@ -0,0 +1,136 @@
+"""
+シナリオのコンパイラの確認
+    - 既定のシナリオから作った世界の壁・領域が、以前の __create_map（PhysicsCore.add_wall などで1本ずつ登録）と一致するか
+    - .npz に保存・読み込みしても同じになるか、ディスクとプロセス内のキャッシュが使われるか
+    - ランダムなマップがどれもゴールまで通れるか、マップを切り替えながら環境を動かせるか
+
+リポジトリのルートで実行:
+    python src/scenario_test.py
+"""
+import os
+import random
+import sys
+import tempfile
+
+import numpy as np
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from envs.crossroads import scenarios as crossroads_scenarios  # noqa: E402
+from envs.crossroads.crossroads import CrossroadsEnv  # noqa: E402
+from envs.diamond import scenarios as diamond_scenarios  # noqa: E402
+from envs.diamond.diamond import DiamondEnv  # noqa: E402
+from envs.diamond.world import MuseumWorld  # noqa: E402
+from envs.physics import PhysicsCore  # noqa: E402
+from envs.randezvous import scenarios as randezvous_scenarios  # noqa: E402
+from envs.scenario import Scenario, ScenarioCache, compile_scenario  # noqa: E402
+
+
+def legacy_museum_physics(world):
+    """
+    シナリオを使う前の MuseumWorld.__create_map と同じ手順で壁とゴールを登録した物理コア
+    """
+    physics = PhysicsCore()
+    physics.add_area((world.WIDTH // 2, world.WALL_GAP + world.GOAL_SIZE // 2), world.GOAL_SIZE)
+    walls = [
+        ((0, 0), (world.WIDTH, 0)),
+        ((world.WIDTH, 0), (world.WIDTH, world.HEIGHT)),
+        ((0, world.HEIGHT), (world.WIDTH, world.HEIGHT)),
+        ((0, 0), (0, world.HEIGHT)),
+    ]
+    for i in range(world.NUM_WALLS):
+        x = world.CORRIDOR_WIDTH
+        y = world.HEIGHT - world.WALL_HEIGHT - i * (world.WALL_HEIGHT + world.WALL_GAP)
+        w, h = world.WALL_WIDTH, world.WALL_HEIGHT
+        walls += [
+            ((x, y), (x + w, y)),
+            ((x + w, y), (x + w, y + h)),
+            ((x, y + h), (x + w, y + h)),
+            ((x, y), (x, y + h)),
+        ]
+    for start, end in walls:
+        physics.add_wall(start, end, world.BORDER_WIDTH)
+    return physics
+
+
+def check_legacy_geometry():
+    for num_walls in (0, 1, 3):
+        world_cls = type("MuseumWorld{}".format(num_walls), (MuseumWorld,), {"NUM_WALLS": num_walls})
+        world = world_cls(3, 3, 1, 360, 90)
+        expected = legacy_museum_physics(world)
+        for name in ("segments", "wall_widths", "wall_rects", "areas"):
+            actual, target = getattr(world.physics, name), getattr(expected, name)
+            assert actual.dtype == target.dtype and np.array_equal(actual, target), (num_walls, name)
+    print("legacy geometry ok")
+
+
+def check_cache():
+    spec = diamond_scenarios.museum(num_walls=2)
+    compiled = compile_scenario(spec)
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = ScenarioCache(maxsize=2)
+        first = cache.get(spec, cache_dir)
+        assert cache.misses == 1 and len(os.listdir(cache_dir)) == 1
+        assert cache.get(spec, cache_dir) is first and cache.hits == 1
+
+        # 別のプロセスに相当する新しいキャッシュはディスクから読む
+        other = ScenarioCache(maxsize=2)
+        loaded = other.get(spec, cache_dir)
+        assert other.disk_hits == 1 and other.misses == 0
+        for name in Scenario.FIELDS:
+            assert np.array_equal(getattr(loaded, name), getattr(compiled, name)), name
+
+        # LRUからあふれたものはコンパイルし直さずにディスクから読む
+        for num_walls in (3, 4):
+            cache.get(diamond_scenarios.museum(num_walls=num_walls), cache_dir)
+        cache.get(spec, cache_dir)
+        assert cache.disk_hits == 1 and cache.misses == 3
+    print("cache ok")
+
+
+def check_random_scenarios(n_seeds=20):
+    for seed in range(n_seeds):
+        scenario = diamond_scenarios.get_scenario("random_museum", seed=seed)
+        assert scenario.connected(scenario.spawns[0], scenario.area_centers[0], clearance=7.5)
+        scenario = crossroads_scenarios.get_scenario("random_crossroads", seed=seed)
+        for goal in scenario.area_centers:
+            assert scenario.connected(scenario.spawns[0], goal, clearance=15)
+        scenario = randezvous_scenarios.get_scenario("random_randezvous", seed=seed)
+        for spawn in scenario.spawns:
+            assert scenario.connected(spawn, scenario.area_centers[0], clearance=7.5)
+    print("random scenarios ok: {} seeds".format(n_seeds))
+
+
+def run_episodes(env, n_episodes, rng):
+    for episode in range(n_episodes):
+        env.reset(episode)
+        terminated = False
+        while not terminated:
+            avail = np.asarray(env.get_avail_actions())
+            actions = [rng.choice(np.flatnonzero(a)) for a in avail]
+            _, terminated, _ = env.step(actions)
+
+
+def check_scenario_pool(n_episodes=20):
+    random.seed(0)
+    rng = np.random.RandomState(0)
+    common = dict(debug=False, lidar_angle=360, lidar_interval=90, channel_size=1, scenario_pool=4)
+    env = DiamondEnv(
+        episode_limit=50, agent_velocity=3, guard_velocity=3, reward_success=100, reward_failure=-10, **common
+    )
+    env.get_env_info()
+    run_episodes(env, n_episodes, rng)
+    env = CrossroadsEnv(
+        episode_limit=50, agent_velocity=5, n_goals=2, reward_success=1, reward_failure=-1, reward_step=0, **common
+    )
+    env.get_env_info()
+    run_episodes(env, n_episodes, rng)
+    print("scenario pool ok: {} episodes".format(n_episodes))
+
+
+if __name__ == "__main__":
+    check_legacy_geometry()
+    check_cache()
+    check_random_scenarios()
+    check_scenario_pool()
@@ -0,0 +1,375 @@
+# ハイパーパラメータのスイープ（1台のマルチコアマシンで main.py を並列に実行する）
+#
+#   python src/sweep.py src/config/sweeps/crossroads_qmix.yaml
+#   python src/sweep.py src/config/sweeps/crossroads_qmix.yaml --dry_run
+#
+# 各runは main.py のサブプロセスとして、割り当てたCPUコアに固定（sched_setaffinity）し、
+# torch / OpenMP のスレッド数をコア数に制限して実行するので、コア数以上のスレッドが走ることはない
+# 各runの統計（results/metrics/*.jsonl）は results/sweeps/{sweep_name}/index.jsonl に run_id を付けて集約し、
+# 明らかに負けているrunは early_stopping の設定に従って途中で打ち切る
+
+import argparse
+import datetime
+import itertools
+import json
+import logging
+import os
+import signal
+import subprocess
+import sys
+import time
+from os.path import dirname, abspath
+
+import numpy as np
+import yaml
+
+ROOT = dirname(dirname(abspath(__file__)))
+RESULTS_PATH = os.path.join(ROOT, "results")
+MAIN_PATH = os.path.join(dirname(abspath(__file__)), "main.py")
+
+
+def _format_value(value) -> str:
+    """
+    main.py の key=value で元の値に戻るようにYAMLとして書く（1e-05 なども float として読まれる）
+    """
+    text = yaml.safe_dump(value, default_flow_style=True).strip()
+    if text.endswith("\n..."):
+        text = text[: -len("\n...")]
+    return text
+
+
+def _sample_value(values, rng: np.random.RandomState):
+    """
+    ランダムサーチで1つの値を選ぶ
+    - リスト: その中から一様に
+    - {min, max, log, int}: 区間から一様に（log: True なら対数スケールで一様、int: True なら整数に丸める）
+    """
+    if isinstance(values, list):
+        return values[rng.randint(len(values))]
+    low, high = values["min"], values["max"]
+    if values.get("log", False):
+        value = float(np.exp(rng.uniform(np.log(low), np.log(high))))
+    else:
+        value = float(rng.uniform(low, high))
+    return int(round(value)) if values.get("int", False) else value
+
+
+def expand_runs(spec: dict, rng: np.random.RandomState) -> list:
+    """
+    スイープの設定から、各runで上書きするパラメータ（{key: value}）のリストを作る
+    seeds があれば各パラメータの組をシードごとに実行する
+    """
+    parameters = spec.get("parameters", {})
+    method = spec.get("method", "grid")
+    if method == "grid":
+        for key, values in parameters.items():
+            if not isinstance(values, list):
+                raise ValueError("Grid search needs a list of values for {}".format(key))
+        keys = list(parameters)
+        combinations = [
+            dict(zip(keys, values)) for values in itertools.product(*parameters.values())
+        ]
+    elif method == "random":
+        combinations = [
+            {key: _sample_value(values, rng) for key, values in parameters.items()}
+            for _ in range(spec["n_samples"])
+        ]
+    else:
+        raise ValueError("Unknown sweep method {}".format(method))
+
+    seeds = spec.get("seeds", [None])
+    return [
+        dict(params, **({} if seed is None else {"seed": seed}))
+        for params in combinations
+        for seed in seeds
+    ]
+
+
+class SweepRun:
+    """
+    スイープ内の1つのrun（main.py のサブプロセス）の状態
+    """
+
+    def __init__(self, run_id, name, params: dict, unique_token: str):
+        self.run_id = run_id
+        self.name = name
+        self.params = params
+        # 統計ファイル results/metrics/{unique_token}.jsonl の名前（同じ名前のスイープを再実行しても前回のものと区別する）
+        self.unique_token = unique_token
+        self.status = "pending"  # pending / running / finished / failed / stopped
+        self.process = None
+        self.cores = []
+        self.log_file = None
+        self.metrics_path = None
+        self.metrics_offset = 0
+        # 早期終了の判定に使う指標の履歴 [(t_env, value)]
+        self.history = []
+        self.last_t = 0
+
+    def running_mean(self, t=None):
+        """
+        t_env <= t までの指標の平均（t が None なら全部）
+        """
+        values = [v for t_, v in self.history if t is None or t_ <= t]
+        return float(np.mean(values)) if values else None
+
+    def summary(self) -> dict:
+        return {
+            "run_id": self.run_id,
+            "name": self.name,
+            "unique_token": self.unique_token,
+            "params": self.params,
+            "status": self.status,
+            "cores": self.cores,
+            "last_t": self.last_t,
+            "metric_mean": self.running_mean(),
+            "metric_last": self.history[-1][1] if self.history else None,
+        }
+
+
+class MedianStopper:
+    """
+    Median stopping rule による早期終了
+
+    t_env >= min_t まで進んだrunについて、そこまでの指標の平均が、
+    同じ t_env まで進んでいる他のrun（min_runs 個以上）の同じ区間の平均の quantile 分位より悪ければ打ち切る
+    quantile を小さくするほど「明らかに負けている」runだけが止まる
+    """
+
+    def __init__(self, metric, mode="max", min_t=0, min_runs=3, quantile=0.5):
+        assert mode in ("max", "min")
+        self.metric = metric
+        self.mode = mode
+        self.min_t = min_t
+        self.min_runs = min_runs
+        self.quantile = quantile
+
+    def should_stop(self, run: SweepRun, runs: list) -> bool:
+        t = run.last_t
+        if t < self.min_t or not run.history:
+            return False
+        others = [
+            other.running_mean(t)
+            for other in runs
+            if other is not run and other.last_t >= t and other.history
+        ]
+        others = [v for v in others if v is not None]
+        if len(others) < self.min_runs:
+            return False
+
+        mean = run.running_mean(t)
+        if self.mode == "max":
+            return mean < np.quantile(others, self.quantile)
+        return mean > np.quantile(others, 1 - self.quantile)
+
+
+class SweepLauncher:
+    """
+    runをCPUコアの空きに合わせてサブプロセスとして起動し、統計の集約と早期終了を行う
+
+    コアは cores_per_run 個ずつの固定の枠（スロット）に分け、1つの枠で同時に1つのrunだけを実行する
+    """
+
+    def __init__(self, spec: dict, console_logger: logging.Logger, poll_interval=5.0):
+        self.spec = spec
+        self.console_logger = console_logger
+        self.poll_interval = poll_interval
+        self.sweep_name = spec["name"]
+        self.directory = os.path.join(RESULTS_PATH, "sweeps", self.sweep_name)
+
+        rng = np.random.RandomState(spec.get("sweep_seed", 0))
+        launched_at = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+        self.runs = []
+        for i, params in enumerate(expand_runs(spec, rng)):
+            name = "{}_{:03d}".format(self.sweep_name, i)
+            self.runs.append(SweepRun(i, name, params, "{}__{}".format(name, launched_at)))
+
+        # CPUコアの枠
+        resources = spec.get("resources", {})
+        cores = resources.get("cores") or sorted(os.sched_getaffinity(0))
+        self.cores_per_run = resources.get("cores_per_run", 1)
+        n_slots = len(cores) // self.cores_per_run
+        if resources.get("max_parallel", 0) > 0:
+            n_slots = min(n_slots, resources["max_parallel"])
+        if n_slots == 0:
+            raise ValueError(
+                "cores_per_run {} is larger than the {} available cores".format(
+                    self.cores_per_run, len(cores)
+                )
+            )
+        self.free_slots = [
+            cores[i * self.cores_per_run:(i + 1) * self.cores_per_run] for i in range(n_slots)
+        ]
+
+        self.stopper = None
+        if spec.get("early_stopping"):
+            self.stopper = MedianStopper(**spec["early_stopping"])
+
+    def command(self, run: SweepRun) -> list:
+        """
+        runを実行するコマンド（パラメータは main.py の key=value で上書き）
+        """
+        overrides = dict(self.spec.get("fixed", {}))
+        overrides.update(run.params)
+        overrides.update(
+            {
+                "name": run.name,
+                "unique_token": run.unique_token,
+                "save_metrics": True,
+                "torch_threads": self.cores_per_run,
+            }
+        )
+        command = [
+            sys.executable, MAIN_PATH,
+            "--algo", self.spec.get("algo", "qmix"),
+            "--env", self.spec.get("env", "crossroads"),
+        ]
+        if self.spec.get("wandb", False):
+            command.append("--wandb")
+        return command + ["{}={}".format(k, _format_value(v)) for k, v in overrides.items()]
+
+    def _start(self, run: SweepRun, cores: list):
+        threads = str(len(cores))
+        env = dict(os.environ, OMP_NUM_THREADS=threads, MKL_NUM_THREADS=threads)
+        run.cores = cores
+        run.log_file = open(os.path.join(self.directory, "logs", "{}.log".format(run.name)), "w")
+        run.process = subprocess.Popen(
+            self.command(run),
+            cwd=ROOT,
+            env=env,
+            stdout=run.log_file,
+            stderr=subprocess.STDOUT,
+            # サブプロセス（とそのスレッド）を割り当てたコアに固定する
+            preexec_fn=lambda: os.sched_setaffinity(0, cores),
+            # 評価プロセスなどの子プロセスもまとめて止められるよう、別のプロセスグループにする
+            start_new_session=True,
+        )
+        run.status = "running"
+        self.console_logger.info(
+            "Started {} on cores {}: {}".format(run.name, cores, run.params)
+        )
+
+    def _read_metrics(self, run: SweepRun, index_file):
+        """
+        runの統計ファイルに追記された行を読み、指標の履歴と index.jsonl に反映する
+        """
+        if run.metrics_path is None:
+            path = os.path.join(RESULTS_PATH, "metrics", "{}.jsonl".format(run.unique_token))
+            if not os.path.exists(path):
+                return
+            run.metrics_path = path
+
+        with open(run.metrics_path, "r", encoding="utf-8") as f:
+            f.seek(run.metrics_offset)
+            for line in f:
+                # 書きかけの行は次回に読む
+                if not line.endswith("\n"):
+                    break
+                run.metrics_offset += len(line.encode("utf-8"))
+                record = json.loads(line)
+                run.last_t = max(run.last_t, record["t_env"])
+                if self.stopper is not None and self.stopper.metric in record:
+                    run.history.append((record["t_env"], record[self.stopper.metric]))
+                index_file.write(
+                    json.dumps(dict(record, run_id=run.run_id, name=run.name)) + "\n"
+                )
+        index_file.flush()
+
+    def _stop(self, run: SweepRun):
+        """
+        runのプロセスグループ（評価プロセスなどの子プロセスを含む）を SIGKILL で止める
+        環境が pygame（SDL）を使うと SIGTERM は握りつぶされるため
+        統計ファイルの書きかけの行は _read_metrics で読み飛ばされる
+        """
+        try:
+            os.killpg(run.process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        run.process.wait()
+
+    def _finish(self, run: SweepRun, status):
+        run.status = status
+        run.log_file.close()
+        self.free_slots.append(run.cores)
+        self.console_logger.info(
+            "{} {} (t_env {}, exit code {})".format(
+                run.name, status, run.last_t, run.process.returncode
+            )
+        )
+
+    def _write_runs(self):
+        """
+        全runの状態を runs.json に書き出す（途中で見ても壊れていないよう置き換えで）
+        """
+        path = os.path.join(self.directory, "runs.json")
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump([run.summary() for run in self.runs], f, indent=2)
+        os.replace(path + ".tmp", path)
+
+    def run(self):
+        os.makedirs(os.path.join(self.directory, "logs"), exist_ok=True)
+        with open(os.path.join(self.directory, "spec.yaml"), "w", encoding="utf-8") as f:
+            yaml.safe_dump(self.spec, f)
+
+        self.console_logger.info(
+            "Sweep {}: {} runs, {} in parallel with {} cores each".format(
+                self.sweep_name, len(self.runs), len(self.free_slots), self.cores_per_run
+            )
+        )
+        pending = list(self.runs)
+        with open(os.path.join(self.directory, "index.jsonl"), "a", encoding="utf-8") as index_file:
+            try:
+                while True:
+                    while pending and self.free_slots:
+                        self._start(pending.pop(0), self.free_slots.pop(0))
+
+                    running = [run for run in self.runs if run.status == "running"]
+                    if not running and not pending:
+                        break
+                    time.sleep(self.poll_interval)
+
+                    for run in running:
+                        self._read_metrics(run, index_file)
+                        if run.process.poll() is not None:
+                            self._read_metrics(run, index_file)
+                            self._finish(run, "finished" if run.process.returncode == 0 else "failed")
+                        elif self.stopper is not None and self.stopper.should_stop(run, self.runs):
+                            self._stop(run)
+                            self._finish(run, "stopped")
+                    self._write_runs()
+            finally:
+                # 中断された場合も子プロセスを残さない
+                for run in self.runs:
+                    if run.status == "running":
+                        self._stop(run)
+                        self._finish(run, "stopped")
+                self._write_runs()
+
+        counts = {}
+        for run in self.runs:
+            counts[run.status] = counts.get(run.status, 0) + 1
+        self.console_logger.info("Sweep {} done: {}".format(self.sweep_name, counts))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("spec", help="YAML file describing the sweep (see config/sweeps)")
+    parser.add_argument(
+        "--dry_run", action="store_true", help="Print the runs and their commands without starting them"
+    )
+    parser.add_argument("--poll_interval", type=float, default=5.0)
+    args = parser.parse_args()
+
+    with open(args.spec, "r", encoding="utf-8") as f:
+        spec = yaml.safe_load(f)
+
+    logging.basicConfig(
+        level=logging.INFO, format="[%(levelname)s %(asctime)s] %(name)s %(message)s", datefmt="%H:%M:%S"
+    )
+    launcher = SweepLauncher(spec, logging.getLogger("sweep"), poll_interval=args.poll_interval)
+
+    if args.dry_run:
+        for run in launcher.runs:
+            print(run.name, " ".join(launcher.command(run)))
+    else:
+        launcher.run()
@@ -0,0 +1,129 @@
+import os
+import queue
+import shutil
+import threading
+import torch as th
+
+
+def snapshot(obj):
+    """
+    state_dict などに含まれるテンソルをCPU上にコピーする（辞書・リスト・タプルは再帰的に）
+    学習を続けてパラメータやオプティマイザの状態が書き換わっても、コピーは変わらない
+    """
+    if isinstance(obj, th.Tensor):
+        return obj.detach().to("cpu", copy=True)
+    if isinstance(obj, dict):
+        return {k: snapshot(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(snapshot(v) for v in obj)
+    return obj
+
+
+def list_checkpoints(directory):
+    """
+    directory 内の書き込みが完了したチェックポイントのタイムステップ（昇順）
+    書き込み途中の一時ディレクトリ（.tmp_*）は含まない
+    """
+    if not os.path.isdir(directory):
+        return []
+    return sorted(
+        int(name)
+        for name in os.listdir(directory)
+        if name.isdigit() and os.path.isdir(os.path.join(directory, name))
+    )
+
+
+def find_checkpoint(directory, load_step=0):
+    """
+    読み込むチェックポイントの (タイムステップ, パス) を返す（見つからなければ None）
+    load_step = 0 なら最新、それ以外は load_step に最も近いもの
+    """
+    timesteps = list_checkpoints(directory)
+    if not timesteps:
+        return None
+    if load_step == 0:
+        timestep = max(timesteps)
+    else:
+        timestep = min(timesteps, key=lambda x: abs(x - load_step))
+    return timestep, os.path.join(directory, str(timestep))
+
+
+def load_checkpoint(path):
+    """
+    チェックポイントの各ファイル（{key}.th）を読み込んで {key: 中身} を返す
+    テンソルはすべてCPU上に読み込まれる
+    """
+    return {
+        name[: -len(".th")]: th.load(
+            os.path.join(path, name), map_location="cpu", weights_only=False
+        )
+        for name in os.listdir(path)
+        if name.endswith(".th")
+    }
+
+
+class Checkpointer(threading.Thread):
+    """
+    チェックポイントをバックグラウンドで書き出すスレッド
+
+    save() は状態をCPUにコピーしてキューに入れるだけなので、学習ループはファイルの書き込みを待たない
+    各チェックポイントは {directory}/.tmp_{t_env} に書き込んでから {directory}/{t_env} にリネームするので、
+    途中で落ちても読み込めるのは書き込みが完了したものだけになる
+    keep > 0 なら最新の keep 個だけを残す
+
+    状態は {key: 中身} の辞書で、{key}.th というファイルにそれぞれ保存される
+    （agent.th, mixer.th, opt.th は QLearner.load_models でも読み込める）
+    """
+
+    def __init__(self, directory, keep, console_logger):
+        super(Checkpointer, self).__init__(name="Checkpointer", daemon=True)
+        self.directory = directory
+        self.keep = keep
+        self.console_logger = console_logger
+        self.queue = queue.Queue()
+        os.makedirs(directory, exist_ok=True)
+
+    def save(self, t_env, state: dict):
+        """
+        状態のスナップショットを取って書き出しを依頼する
+        """
+        self.queue.put((t_env, snapshot(state)))
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            try:
+                self._write(*item)
+            except Exception:
+                self.console_logger.exception(
+                    "Failed to save checkpoint of t_env {}".format(item[0])
+                )
+
+    def _write(self, t_env, state):
+        tmp_path = os.path.join(self.directory, ".tmp_{}".format(t_env))
+        path = os.path.join(self.directory, str(t_env))
+        if os.path.exists(tmp_path):
+            shutil.rmtree(tmp_path)
+        os.makedirs(tmp_path)
+
+        for key, value in state.items():
+            th.save(value, os.path.join(tmp_path, "{}.th".format(key)))
+
+        # 同じタイムステップのチェックポイントは置き換える
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.replace(tmp_path, path)
+        self.console_logger.info("Saved checkpoint to {}".format(path))
+
+        if self.keep > 0:
+            for old in list_checkpoints(self.directory)[: -self.keep]:
+                shutil.rmtree(os.path.join(self.directory, str(old)), ignore_errors=True)
+
+    def close(self):
+        """
+        キューに残っているチェックポイントをすべて書き出してからスレッドを終了
+        """
+        self.queue.put(None)
+        self.join()
@@ -1,18 +1,33 @@
-from collections import defaultdict
+from collections import defaultdict, deque
 import logging
 import numpy as np
 import torch
 
+from utils.metrics import FileSink, MetricsWriter, SacredSink, WandbSink
+from utils.profiler import profiler
+
 
 class Logger:
-    def __init__(self, console_logger):
+    def __init__(self, console_logger, stats_history=100):
         self.console_logger: logging.Logger = console_logger
 
         self.use_tb = False
         self.use_sacred = False
         self.use_hdf = False
+        self.use_wandb = False
+        self.use_file = False
+
+        # キーごとに直近 stats_history 個だけを保持するリングバッファ
+        # （print_recent_stats 用。長時間の学習でもメモリが増え続けない）
+        self.stats = defaultdict(lambda: deque(maxlen=stats_history))
+
+        # 同じ t_env の統計は1つのレコードにまとめてからシンクに渡す
+        self._record_t = None
+        self._record = {}
+        self._no_sacred_keys = set()
 
-        self.stats = defaultdict(lambda: [])
+        self._sinks = []
+        self._writer = None
 
     def setup_tb(self, directory_name):
         # Import here so it doesn't have to be installed if you don't use it
@@ -21,25 +36,61 @@ class Logger:
         self.tb_logger = log_value
         self.use_tb = True
 
-    def setup_sacred(self, sacred_run_dict):
+    def setup_sacred(self, sacred_run_dict, history=0):
         self.sacred_info = sacred_run_dict.info
+        self._sinks.append(SacredSink(self.sacred_info, self._no_sacred_keys, history))
         self.use_sacred = True
 
+    def setup_wandb(self):
+        self._sinks.append(WandbSink())
+        self.use_wandb = True
+
+    def setup_file(self, file_path):
+        self._sinks.append(FileSink(file_path))
+        self.use_file = True
+
     def log_stat(self, key, value, t, to_sacred=True):
         if isinstance(value, torch.Tensor):
-            value = value.cpu()
+            value = value.item() if value.numel() == 1 else value.cpu()
         self.stats[key].append((t, value))
 
         if self.use_tb:
             self.tb_logger(key, value, t)
 
-        if self.use_sacred and to_sacred:
-            if key in self.sacred_info:
-                self.sacred_info["{}_T".format(key)].append(t)
-                self.sacred_info[key].append(value)
-            else:
-                self.sacred_info["{}_T".format(key)] = [t]
-                self.sacred_info[key] = [value]
+        # t_env が変わったら、それまでのレコードを書き出す
+        if t != self._record_t:
+            self.flush()
+            self._record_t = t
+        self._record[key] = value
+
+        if not to_sacred:
+            self._no_sacred_keys.add(key)
+
+    def flush(self):
+        """
+        まとめたレコードをバックグラウンドの書き出しスレッドに渡す
+        """
+        if not self._record:
+            return
+        if self._sinks:
+            if self._writer is None:
+                self._writer = MetricsWriter(self._sinks, self.console_logger)
+                self._writer.start()
+            self._writer.put(self._record_t, self._record)
+        self._record = {}
+
+    def close(self):
+        """
+        残りのレコードをすべて書き出して、書き出しスレッドを終了する
+        """
+        self.flush()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        else:
+            for sink in self._sinks:
+                sink.close()
+        self._sinks.clear()
 
     def print_recent_stats(self):
         log_str = "Recent Stats | t_env: {:>10} | Episode: {:>8}\n".format(
@@ -51,11 +102,16 @@ class Logger:
             i += 1
             window = 5 if k != "epsilon" else 1
             item = "{:.4f}".format(
-                np.mean([x[1] for x in self.stats[k][-window:]]))
+                np.mean([x[1] for x in list(v)[-window:]]))
             log_str += "{:<25}{:>8}".format(k + ":", item)
             log_str += "\n" if i % 4 == 0 else "\t"
         self.console_logger.info(log_str)
 
+        # 各処理にかかった時間の集計
+        if profiler.enabled:
+            self.console_logger.info(profiler.summary())
+            profiler.reset()
+
 
 # set up a custom logger
 def get_logger():
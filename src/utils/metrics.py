@@ -0,0 +1,153 @@
+import json
+import queue
+import threading
+import numpy as np
+import torch
+
+
+def _to_builtin(value):
+    """
+    JSONやwandbに渡せるようにスカラー値をPythonの組み込み型に変換
+    """
+    if isinstance(value, torch.Tensor):
+        return value.item() if value.numel() == 1 else value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    return value
+
+
+class MetricsSink:
+    """
+    1つのt_envにまとめられた統計レコードの書き出し先
+    """
+
+    def write(self, t, record: dict):
+        raise NotImplementedError
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.flush()
+
+
+class SacredSink(MetricsSink):
+    """
+    Sacredの info にキーごとの履歴を記録する
+    history > 0 の場合は直近 history 個だけ残す
+    """
+
+    def __init__(self, sacred_info: dict, exclude: set, history=0):
+        self.info = sacred_info
+        # to_sacred=False で記録されたキー（Loggerと共有）
+        self.exclude = exclude
+        self.history = history
+
+    def write(self, t, record):
+        for key, value in record.items():
+            if key in self.exclude:
+                continue
+            if key in self.info:
+                self.info["{}_T".format(key)].append(t)
+                self.info[key].append(value)
+            else:
+                self.info["{}_T".format(key)] = [t]
+                self.info[key] = [value]
+
+            if self.history and len(self.info[key]) > 2 * self.history:
+                # 毎回詰め直さないよう、2倍まで溜まったらまとめて切り詰める
+                del self.info["{}_T".format(key)][: -self.history]
+                del self.info[key][: -self.history]
+
+
+class WandbSink(MetricsSink):
+    """
+    1レコードにつき1回だけ wandb.log を呼ぶ
+    """
+
+    def __init__(self):
+        # Import here so it doesn't have to be installed if you don't use it
+        import wandb
+
+        self.wandb = wandb
+        self.last_step = -1
+
+    def write(self, t, record):
+        record = {k: _to_builtin(v) for k, v in record.items()}
+        if t >= self.last_step:
+            self.wandb.log(record, step=t)
+            self.last_step = t
+        else:
+            # wandbのstepは単調増加でなければならないので、
+            # 過去のt_envのレコードは現在のstepにt_envを添えて記録する
+            record["t_env"] = t
+            self.wandb.log(record, step=self.last_step)
+
+
+class FileSink(MetricsSink):
+    """
+    1行1レコードのJSON Lines形式でローカルファイルに追記する
+    """
+
+    def __init__(self, path):
+        self.file = open(path, "a", encoding="utf-8")
+
+    def write(self, t, record):
+        line = {"t_env": t}
+        line.update({k: _to_builtin(v) for k, v in record.items()})
+        self.file.write(json.dumps(line) + "\n")
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class MetricsWriter(threading.Thread):
+    """
+    統計レコードをキューから取り出して各シンクに書き出すバックグラウンドスレッド
+    学習ループは put するだけでブロックしない
+    """
+
+    def __init__(self, sinks: list, console_logger):
+        super(MetricsWriter, self).__init__(name="MetricsWriter", daemon=True)
+        self.sinks = sinks
+        self.console_logger = console_logger
+        self.queue = queue.Queue()
+
+    def put(self, t, record: dict):
+        self.queue.put((t, record))
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            self._write(*item)
+
+            # 溜まっている分を書き切ってからファイルなどをflushする
+            if self.queue.empty():
+                for sink in self.sinks:
+                    sink.flush()
+
+        for sink in self.sinks:
+            sink.close()
+
+    def _write(self, t, record):
+        for sink in self.sinks:
+            try:
+                sink.write(t, record)
+            except Exception:
+                self.console_logger.exception(
+                    "Failed to write metrics to {}".format(type(sink).__name__)
+                )
+
+    def close(self):
+        """
+        キューに残っているレコードをすべて書き出してからスレッドを終了
+        """
+        self.queue.put(None)
+        self.join()
@@ -0,0 +1,142 @@
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import nullcontext
+
+import torch as th
+
+_NULL_TIMER = nullcontext()
+
+
+class _Timer:
+    """
+    with文で囲んだ区間の経過時間をProfilerに記録する
+    """
+
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        if self.profiler.cuda_sync:
+            th.cuda.synchronize()
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        if self.profiler.cuda_sync:
+            th.cuda.synchronize()
+        end = time.perf_counter_ns()
+        self.profiler._add(self.name, self.start, end)
+        return False
+
+
+class Profiler:
+    """
+    学習ループの各処理（env.step, mac.select_actions, learner.backward ...）に
+    かかった時間を名前ごとに集計する
+
+    無効時は timer() が共有の nullcontext を返すだけなので、ほぼオーバーヘッドがない
+
+    使い方:
+        with profiler.timer("env.step"):
+            env.step(actions)
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.cuda_sync = False
+        self.tracing = False
+
+        self.totals = defaultdict(int)  # ns
+        self.calls = defaultdict(int)
+        self.counters = defaultdict(int)
+        self.trace_events = []
+
+        self._enabled_before_trace = False
+        self._since = time.perf_counter_ns()
+
+    def setup(self, enabled, cuda_sync=False):
+        self.enabled = enabled
+        # GPUの非同期実行を待たないと正しい時間にならない
+        self.cuda_sync = enabled and cuda_sync
+        self.reset()
+
+    def timer(self, name):
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name)
+
+    def count(self, name, n=1):
+        if self.enabled:
+            self.counters[name] += n
+
+    def _add(self, name, start, end):
+        self.totals[name] += end - start
+        self.calls[name] += 1
+        if self.tracing:
+            self.trace_events.append(
+                {
+                    "name": name,
+                    "ph": "X",
+                    "ts": start / 1000,
+                    "dur": (end - start) / 1000,
+                    "pid": os.getpid(),
+                    "tid": threading.get_ident(),
+                }
+            )
+
+    def reset(self):
+        self.totals.clear()
+        self.calls.clear()
+        self.counters.clear()
+        self._since = time.perf_counter_ns()
+
+    def summary(self):
+        """
+        前回reset()してからの集計結果を文字列で返す
+        """
+        wall = max(1, time.perf_counter_ns() - self._since)
+        log_str = "Profile | wall: {:.2f}s\n".format(wall / 1e9)
+        for name, total in sorted(
+            self.totals.items(), key=lambda item: item[1], reverse=True
+        ):
+            calls = self.calls[name]
+            log_str += "{:<25}{:>10} calls {:>10.3f} ms/call {:>10.2f} s {:>6.1f}%\n".format(
+                name + ":", calls, total / calls / 1e6, total / 1e9, 100 * total / wall
+            )
+        for name, value in sorted(self.counters.items()):
+            log_str += "{:<25}{:>10} ({:.1f}/s)\n".format(
+                name + ":", value, value / (wall / 1e9)
+            )
+        return log_str
+
+    # ---------------- Chrome trace ----------------
+
+    def start_trace(self):
+        """
+        chrome://tracing で読めるトレースの記録を開始（無効時も一時的に有効にする）
+        """
+        self._enabled_before_trace = self.enabled
+        self.enabled = True
+        self.tracing = True
+        self.trace_events = []
+
+    def stop_trace(self, path):
+        """
+        トレースの記録を終了してJSONに保存する
+        """
+        self.tracing = False
+        self.enabled = self._enabled_before_trace
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump({"traceEvents": self.trace_events}, f)
+        self.trace_events = []
+
+
+# プロセス全体で共有するプロファイラ
+profiler = Profiler()
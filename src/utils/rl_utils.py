@@ -0,0 +1,67 @@
+import torch as th
+
+# Q学習の目標値の計算
+# どの関数も入力は QLearner.train と同じ [B, T, ...] のテンソルで、タイムステップ方向のPythonのループを持たない
+#   - rewards, terminated, mask: [B, T, 1]
+#   - target_qs: [B, T, n]（t 番目は次状態 s_{t+1} のTarget NetworkのQ値。Mixerがなければ n = エージェント数）
+# mask はエピソードが終了した後のステップが既に0になっているもの（QLearner.train の mask）
+
+
+def _next_valid(mask: th.Tensor) -> th.Tensor:
+    """
+    t + 1 番目が同じエピソードの有効なステップか [B, T, 1]
+    """
+    return th.cat((mask[:, 1:], th.zeros_like(mask[:, :1])), dim=1)
+
+
+def build_n_step_targets(rewards, terminated, mask, target_qs, gamma, n_step):
+    """
+    n-step の目標値
+    y_t = r_t + γ r_{t+1} + ... + γ^{n-1} r_{t+n-1} + γ^n max Q'(s_{t+n})
+
+    エピソードの終了（terminated）以降は報酬もブートストラップも使わず、
+    時間切れやバッチの最後で n ステップ取れない場合はそこまでの報酬 + 最後のステップのQ値にする
+
+    (k-1)-step の目標値を1ステップずらして k-step を作るのを n - 1 回繰り返す
+    """
+    not_done = 1 - terminated
+    next_valid = _next_valid(mask)
+
+    targets = rewards + gamma * not_done * target_qs
+    for _ in range(n_step - 1):
+        next_targets = th.cat((targets[:, 1:], th.zeros_like(targets[:, :1])), dim=1)
+        targets = rewards + gamma * not_done * (
+            next_valid * next_targets + (1 - next_valid) * target_qs
+        )
+    return targets
+
+
+def build_td_lambda_targets(rewards, terminated, mask, target_qs, gamma, td_lambda):
+    """
+    TD(λ) の目標値（λ-return）
+    y_t = r_t + γ [(1 - λ) max Q'(s_{t+1}) + λ y_{t+1}]
+    エピソードの最後の有効なステップでは y_t = r_t + γ (1 - terminated_t) max Q'(s_{t+1})
+
+    これは y_t = a_t + b_t y_{t+1} の形の線形漸化式で、b_t は γλ か 0（エピソードの切れ目）のどちらかなので、
+        y_t = Σ_{k >= t} (γλ)^{k-t} [t から k の間に切れ目がない] a_k
+    を [T, T] の重み行列との積として一度に計算する（計算量は O(B T^2) だが1回のbmm）
+    """
+    not_done = 1 - terminated
+    next_valid = _next_valid(mask)
+    # 次のステップに続くか（続かない所がエピソードの切れ目）
+    cont = not_done * next_valid
+
+    a = rewards + gamma * not_done * (1 - td_lambda * next_valid) * target_qs
+
+    T = rewards.shape[1]
+    steps = th.arange(T, device=rewards.device)
+    # decay[t, k] = (γλ)^{k-t}（k < t は0）
+    distance = steps[None, :] - steps[:, None]
+    decay = (gamma * td_lambda) ** distance.clamp(min=0).to(rewards.dtype) * (distance >= 0)
+
+    # t より前の切れ目の数が同じ t, k は間に切れ目がない
+    segment = th.cumsum(1 - cont, dim=1) - (1 - cont)  # [B, T, 1]
+    same_segment = segment == segment.transpose(1, 2)  # [B, T, T]
+
+    weights = decay * same_segment
+    return th.bmm(weights, a)
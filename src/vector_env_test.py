@@ -0,0 +1,303 @@
+"""
+VectorDiamondEnv / VectorCrossroadsEnv が DiamondEnv / CrossroadsEnv を
+n_envs 個並べて動かした場合と同じ結果になるかを確認する
+TorchDiamondEnv / TorchCrossroadsEnv（float64）がベクトル化環境と同じ結果になるかも確認する
+VectorFoodAllocationEnv が複数の状況の FoodAllocationEnv を並べた場合と同じ結果になるかも確認する
+gym の VectorEnv（VectorSingleAgentEnv / VectorMultiAgentEnv）が SingleAgentEnv / MultiAgentEnv と
+同じ結果になるか、サブプロセスに分けても同じ結果になるかも確認する
+
+リポジトリのルートで実行:
+    python src/vector_env_test.py
+"""
+import os
+import sys
+
+import gym
+import numpy as np
+import torch as th
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from envs.diamond.diamond import DiamondEnv  # noqa: E402
+from envs.diamond.diamond_vector import VectorDiamondEnv  # noqa: E402
+from envs.crossroads.crossroads import CrossroadsEnv  # noqa: E402
+from envs.crossroads.crossroads_vector import VectorCrossroadsEnv  # noqa: E402
+from envs.diamond.diamond_torch import TorchDiamondEnv  # noqa: E402
+from envs.crossroads.crossroads_torch import TorchCrossroadsEnv  # noqa: E402
+from envs.single.gym_env import SingleAgentEnv  # noqa: E402
+from envs.single.gym_env_vector import VectorSingleAgentEnv  # noqa: E402
+from envs.single.objects import CorridorOrientation  # noqa: E402
+from envs.multi.env import MultiAgentEnv  # noqa: E402
+from envs.multi.env_vector import VectorMultiAgentEnv  # noqa: E402
+from envs.gym_vector import AsyncShardedVectorEnv  # noqa: E402
+from envs_pymarl.foodbank.food_allocation import FoodAllocationEnv  # noqa: E402
+from envs_pymarl.foodbank.food_allocation_vector import VectorFoodAllocationEnv  # noqa: E402
+
+DIAMOND_ARGS = dict(
+    episode_limit=200,
+    agent_velocity=3,
+    guard_velocity=3,
+    channel_size=1,
+    lidar_angle=360,
+    lidar_interval=90,
+    reward_success=100,
+    reward_failure=-10,
+)
+
+CROSSROADS_ARGS = dict(
+    episode_limit=100,
+    agent_velocity=5,
+    channel_size=2,
+    lidar_angle=360,
+    lidar_interval=90,
+    reward_success=1,
+    reward_failure=-1,
+    reward_step=0,
+    n_goals=2,
+)
+
+FOODBANK_ARGS = dict(
+    full_observable=False,
+    episode_limit=20,
+    debug=False,
+    reward_mean_weight=1,
+    reward_std_weight=1,
+    reward_complete_bonus=1,
+    reward_step_cost=-0.01,
+)
+
+
+def check_equivalence(env_cls, vector_env_cls, env_args, n_envs=8, n_steps=1000, seed=0):
+    envs = [env_cls(**env_args) for _ in range(n_envs)]
+    vector_env = vector_env_cls(n_envs, seed=seed, **env_args)
+    for env in envs:
+        env.get_env_info()
+        env.reset(episode=0)
+    vector_env.get_env_info()
+    vector_env.reset()
+
+    rng = np.random.RandomState(seed)
+    n_episodes = 0
+    for _ in range(n_steps):
+        # CrossroadsEnv.get_state は直前の get_obs のLiDARを使うので先に観測を取る
+        obs = np.array([np.reshape(env.get_obs(), (env.n_agents, -1)) for env in envs])
+        state = np.array([env.get_state() for env in envs])
+        avail_actions = np.array([env.get_avail_actions() for env in envs])
+
+        assert np.array_equal(obs.astype(np.float32), vector_env.get_obs()), "obs"
+        assert np.array_equal(state.astype(np.float32), vector_env.get_state()), "state"
+        assert np.array_equal(avail_actions, vector_env.get_avail_actions()), "avail_actions"
+
+        actions = np.array(
+            [[rng.choice(np.flatnonzero(avail)) for avail in env_avail] for env_avail in avail_actions]
+        )
+        results = [env.step(list(env_actions)) for env, env_actions in zip(envs, actions)]
+        rewards, terminated, info = vector_env.step(actions)
+
+        assert np.array_equal(np.array([r[0] for r in results]), rewards), "reward"
+        assert np.array_equal(np.array([r[1] for r in results]), terminated), "terminated"
+        assert np.array_equal(
+            np.array([r[2]["is_success"] for r in results]), info["is_success"]
+        ), "is_success"
+
+        # ベクトル化環境と同じく終了した環境はすぐにリセットする
+        for env, done in zip(envs, terminated):
+            if done:
+                env.reset(episode=0)
+                n_episodes += 1
+
+    print(
+        "{}: OK ({} envs, {} steps, {} episodes)".format(
+            vector_env_cls.__name__, n_envs, n_steps, n_episodes
+        )
+    )
+
+
+def check_torch_equivalence(vector_env_cls, torch_env_cls, env_args, n_envs=64, n_steps=1000, seed=0):
+    vector_env = vector_env_cls(n_envs, seed=seed, **env_args)
+    torch_env = torch_env_cls(n_envs, seed=seed, dtype=th.float64, **env_args)
+    vector_env.reset()
+    torch_env.reset()
+
+    rng = np.random.RandomState(seed)
+    n_episodes = 0
+    for _ in range(n_steps):
+        obs, state, avail_actions = torch_env.observe(torch_env.state)
+        assert np.array_equal(vector_env.get_obs(), obs.float().numpy()), "obs"
+        assert np.array_equal(vector_env.get_state(), state.float().numpy()), "state"
+        assert np.array_equal(vector_env.get_avail_actions(), avail_actions.numpy()), "avail_actions"
+
+        avail = vector_env.get_avail_actions()
+        actions = (rng.rand(*avail.shape) * avail).argmax(axis=-1)
+        rewards, terminated, info = vector_env.step(actions)
+        torch_rewards, torch_terminated, torch_info = torch_env.step(th.from_numpy(actions))
+
+        # torch の sqrt は NumPy と最後の1ビットが異なることがあるので報酬だけは誤差を許す
+        assert np.allclose(rewards, torch_rewards.numpy(), rtol=0, atol=1e-12), "reward"
+        assert np.array_equal(terminated, torch_terminated.numpy()), "terminated"
+        assert np.array_equal(info["is_success"], torch_info["is_success"].numpy()), "is_success"
+        n_episodes += int(terminated.sum())
+
+    print(
+        "{}: OK ({} envs, {} steps, {} episodes)".format(
+            torch_env_cls.__name__, n_envs, n_steps, n_episodes
+        )
+    )
+
+
+def check_food_equivalence(situation_name, n_envs=16, n_steps=500, seed=0):
+    vector_env = VectorFoodAllocationEnv(n_envs, situation_name=situation_name, **FOODBANK_ARGS)
+    names = vector_env.situation_names
+    envs = [
+        FoodAllocationEnv(situation_name=names[i % len(names)], seed=None, **FOODBANK_ARGS)
+        for i in range(n_envs)
+    ]
+    for env in envs:
+        env.get_env_info()
+        with np.errstate(divide="ignore", invalid="ignore"):
+            env.reset(episode=0)
+    vector_env.get_env_info()
+    vector_env.reset()
+
+    rng = np.random.RandomState(seed)
+    n_episodes = 0
+    for _ in range(n_steps):
+        # 要求個数が0の食品の満足度は nan になる
+        with np.errstate(divide="ignore", invalid="ignore"):
+            obs = np.array([env.get_obs(debug=False) for env in envs])
+            state = np.array([env.get_state() for env in envs])
+        avail_actions = np.array([env.get_avail_actions() for env in envs])
+
+        assert np.array_equal(obs.astype(np.float32), vector_env.get_obs(), equal_nan=True), "obs"
+        assert np.array_equal(state, vector_env.get_state(), equal_nan=True), "state"
+        assert np.array_equal(avail_actions, vector_env.get_avail_actions()), "avail_actions"
+
+        # 在庫の取り合いが起きるように選択できない食品もときどき選ぶ
+        actions = np.array(
+            [
+                [
+                    rng.choice(np.flatnonzero(avail) if rng.rand() < 0.9 else len(avail) - 1)
+                    for avail in env_avail
+                ]
+                for env_avail in avail_actions
+            ]
+        )
+        with np.errstate(divide="ignore", invalid="ignore"):
+            results = [env.step(list(env_actions)) for env, env_actions in zip(envs, actions)]
+        rewards, terminated, info = vector_env.step(actions)
+
+        assert np.array_equal(np.array([r[0] for r in results]), rewards, equal_nan=True), "reward"
+        assert np.array_equal(np.array([r[1] for r in results]), terminated), "terminated"
+        for key in ("completed", "timeout"):
+            assert np.array_equal(np.array([r[2][key] for r in results]), info[key]), key
+        for i in np.flatnonzero(terminated):
+            for key in ("satisfaction_mean", "satisfaction_std", "leftover"):
+                assert np.array_equal(results[i][2][key], info[key][i], equal_nan=True), key
+
+        for env, done in zip(envs, terminated):
+            if done:
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    env.reset(episode=0)
+                n_episodes += 1
+
+    print(
+        "VectorFoodAllocationEnv({}): OK ({} envs, {} steps, {} episodes)".format(
+            situation_name, n_envs, n_steps, n_episodes
+        )
+    )
+
+
+def _flatten_obs(obs):
+    # MultiAgentEnv はエージェントごとに長さの違う観測のリストを返す
+    if isinstance(obs, tuple):
+        return np.concatenate(obs, axis=-1)
+    if isinstance(obs, list):
+        return np.concatenate(obs)
+    return obs
+
+
+def check_gym_equivalence(env_cls, vector_env_cls, n_envs=8, n_steps=2000, seed=0):
+    envs = [env_cls() for _ in range(n_envs)]
+    vector_env = vector_env_cls(n_envs, seed=seed)
+    multi_agent = isinstance(vector_env.single_action_space, gym.spaces.MultiDiscrete)
+
+    def sync_npc(i):
+        # NPCの巡回経路は各環境が random で選ぶので合わせる
+        vector_env.world.npc_vertical[i] = envs[i].world.npc.path.value == CorridorOrientation.VERTICAL.value
+
+    obs = [env.reset() for env in envs]
+    vector_obs, _ = vector_env.reset()
+    for i in range(n_envs):
+        sync_npc(i)
+
+    rng = np.random.RandomState(seed)
+    n_episodes = 0
+    for _ in range(n_steps):
+        assert np.allclose(
+            np.array([_flatten_obs(o) for o in obs], dtype=np.float32), _flatten_obs(vector_obs), atol=1e-6
+        ), "obs"
+
+        actions = rng.randint(0, 4, size=vector_env.action_space.shape)
+        results = [env.step(list(a) if multi_agent else a) for env, a in zip(envs, actions)]
+        vector_obs, rewards, terminated, truncated, infos = vector_env.step(actions)
+
+        assert np.allclose(np.array([r[1] for r in results]), rewards), "reward"
+        assert np.array_equal(np.array([r[2] for r in results]), terminated | truncated), "done"
+        assert np.array_equal(
+            np.array(["TimeLimit.truncated" in r[3] for r in results]), truncated
+        ), "truncated"
+        obs = [r[0] for r in results]
+        for i in np.flatnonzero(terminated | truncated):
+            assert results[i][3]["is_success"] == infos["is_success"][i], "is_success"
+            assert np.allclose(
+                _flatten_obs(obs[i]).astype(np.float32), _flatten_obs(infos["final_observation"][i]), atol=1e-6
+            ), "final_observation"
+            obs[i] = envs[i].reset()
+            sync_npc(i)
+            n_episodes += 1
+
+    for env in envs:
+        env.close()
+    print(
+        "{}: OK ({} envs, {} steps, {} episodes)".format(
+            vector_env_cls.__name__, n_envs, n_steps, n_episodes
+        )
+    )
+
+
+def check_async_equivalence(vector_env_cls, n_envs=10, n_workers=3, n_steps=500, seed=0):
+    async_env = AsyncShardedVectorEnv(vector_env_cls, n_envs, n_workers, seed=seed)
+    shard_sizes = [len(shard) for shard in np.array_split(np.arange(n_envs), n_workers)]
+    shards = [vector_env_cls(size, seed=seed + i) for i, size in enumerate(shard_sizes)]
+
+    def concatenate(parts):
+        return _flatten_obs(tuple(np.concatenate(part) for part in zip(*parts)) if isinstance(parts[0], tuple) else np.concatenate(parts))
+
+    obs, _ = async_env.reset()
+    assert np.array_equal(_flatten_obs(obs), concatenate([shard.reset()[0] for shard in shards])), "reset"
+    rng = np.random.RandomState(seed)
+    for _ in range(n_steps):
+        actions = rng.randint(0, 4, size=async_env.action_space.shape)
+        obs, rewards, terminated, truncated, _ = async_env.step(actions)
+        results = [shard.step(a) for shard, a in zip(shards, np.split(actions, np.cumsum(shard_sizes)[:-1]))]
+        assert np.array_equal(_flatten_obs(obs), concatenate([r[0] for r in results])), "obs"
+        assert np.array_equal(rewards, np.concatenate([r[1] for r in results])), "reward"
+        assert np.array_equal(terminated, np.concatenate([r[2] for r in results])), "terminated"
+        assert np.array_equal(truncated, np.concatenate([r[3] for r in results])), "truncated"
+    async_env.close()
+    print("AsyncShardedVectorEnv({}): OK ({} envs, {} workers)".format(vector_env_cls.__name__, n_envs, n_workers))
+
+
+if __name__ == "__main__":
+    check_equivalence(DiamondEnv, VectorDiamondEnv, DIAMOND_ARGS)
+    check_equivalence(CrossroadsEnv, VectorCrossroadsEnv, CROSSROADS_ARGS)
+    check_torch_equivalence(VectorDiamondEnv, TorchDiamondEnv, DIAMOND_ARGS)
+    check_torch_equivalence(VectorCrossroadsEnv, TorchCrossroadsEnv, CROSSROADS_ARGS)
+    check_food_equivalence("2a2f_*")
+    check_food_equivalence(["3a3f_*", "3a3f_p1"])
+    check_food_equivalence("10a10f_c8")
+    check_gym_equivalence(SingleAgentEnv, VectorSingleAgentEnv)
+    check_gym_equivalence(MultiAgentEnv, VectorMultiAgentEnv)
+    check_async_equivalence(VectorSingleAgentEnv)
+    check_async_equivalence(VectorMultiAgentEnv)